@@ -20,6 +20,10 @@ class UserBasicSerializer(serializers.ModelSerializer):
         fields = ['username', 'user_account', 'headshot_url']
     
     def get_headshot_url(self, user):
+        # 貼文列表已批次載入頭像時直接使用（見 social.prefetch.PostPrefetch）
+        prefetch = self.context.get('post_prefetch')
+        if prefetch is not None and user.id in prefetch.headshot_urls:
+            return prefetch.headshot_urls[user.id]
         return UserHeadshot.get_headshot_url(user)
 
 # 自定義 TokenObtainPairSerializer 以包含用戶資料
@@ -5,24 +5,33 @@ Accounts Signals
 
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import CustomUser
+from media.models import UserHeadshot
+from .models import CustomUser, UserFollow
+
+
+# 這些欄位的變更不影響用戶向量（例如每次登入都會更新 last_login）
+VECTOR_IRRELEVANT_FIELDS = {'last_login', 'password'}
 
 
 @receiver(post_save, sender=CustomUser)
-def update_user_vector_on_save(sender, instance, created, **kwargs):
+def update_user_vector_on_save(sender, instance, created, update_fields=None, **kwargs):
     """
     用戶創建或更新時，更新向量資料庫
 
     觸發時機：
     - 用戶註冊
     - 用戶資料更新（名稱、隱私設定等）
+
+    嵌入與寫入在交易提交後由背景佇列處理，不阻塞請求
     """
+    if update_fields and set(update_fields) <= VECTOR_IRRELEVANT_FIELDS:
+        return
     try:
-        from aiAgent.services.user_vector_updater import update_user_vector
-        update_user_vector(instance)
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('user', instance.id)
     except Exception as e:
         # 避免影響正常的用戶操作
-        print(f"⚠️ 更新用戶向量失敗（不影響用戶操作）: {str(e)}")
+        print(f"⚠️ 排入用戶向量更新失敗（不影響用戶操作）: {str(e)}")
 
 
 @receiver(post_delete, sender=CustomUser)
@@ -31,7 +40,75 @@ def remove_user_vector_on_delete(sender, instance, **kwargs):
     用戶刪除時，從向量資料庫移除
     """
     try:
-        from aiAgent.services.user_vector_updater import remove_user_vector
-        remove_user_vector(instance.id)
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('user', instance.id, 'remove')
     except Exception as e:
-        print(f"⚠️ 移除用戶向量失敗（不影響用戶操作）: {str(e)}")
\ No newline at end of file
+        print(f"⚠️ 排入用戶向量移除失敗（不影響用戶操作）: {str(e)}")
+
+
+@receiver(post_save, sender=CustomUser)
+def update_user_search_index_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    用戶創建或更新時，於交易提交後更新全文搜尋索引
+    """
+    if update_fields and set(update_fields) <= VECTOR_IRRELEVANT_FIELDS:
+        return
+    from utils.search_index import index_on_commit
+    index_on_commit('users', instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_user_search_index_on_delete(sender, instance, **kwargs):
+    """
+    用戶刪除時，從全文搜尋索引移除
+    """
+    from utils.search_index import remove_on_commit
+    remove_on_commit('users', instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_user_suggestion_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    用戶創建或更新時，於交易提交後更新搜尋建議索引
+    """
+    if update_fields and set(update_fields) <= VECTOR_IRRELEVANT_FIELDS:
+        return
+    from utils.suggestion_index import update_user_on_commit
+    update_user_on_commit(instance.id)
+
+
+@receiver(post_delete, sender=CustomUser)
+def remove_user_suggestion_on_delete(sender, instance, **kwargs):
+    """
+    用戶刪除時，從搜尋建議索引移除
+    """
+    from utils.suggestion_index import remove_user_on_commit
+    remove_user_on_commit(instance.id)
+
+
+@receiver(post_save, sender=UserFollow)
+@receiver(post_delete, sender=UserFollow)
+def update_followers_suggestion_weight(sender, instance, **kwargs):
+    """
+    追蹤關係變更（追蹤、確認、取消）時，更新被追蹤者在搜尋建議中的權重
+    """
+    from utils.suggestion_index import update_followers_on_commit
+    update_followers_on_commit(instance.follows_id)
+
+
+@receiver(post_save, sender=UserHeadshot)
+def update_headshot_suggestion_on_save(sender, instance, **kwargs):
+    """
+    用戶頭像更新時，更新搜尋建議中的頭像網址
+    """
+    from utils.suggestion_index import update_headshot_on_commit
+    update_headshot_on_commit(instance.user_id, instance.firebase_url)
+
+
+@receiver(post_delete, sender=UserHeadshot)
+def remove_headshot_suggestion_on_delete(sender, instance, **kwargs):
+    """
+    用戶頭像刪除時，清除搜尋建議中的頭像網址
+    """
+    from utils.suggestion_index import update_headshot_on_commit
+    update_headshot_on_commit(instance.user_id, '')
@@ -3,23 +3,25 @@ Django Management Command: 初始化向量資料庫
 """
 
 from django.core.management.base import BaseCommand
-from utils.recommendation_service import RecommendationService
+from aiAgent.services.singleton import get_recommendation_service
 from aiAgent.services.vector_db_implementations import (
     UserVectorDB,
     PetVectorDB,
     FeedVectorDB,
-    SystemOperationVectorDB
+    SystemOperationVectorDB,
+    SystemFAQVectorDB,
+    DiseaseArchiveVectorDB
 )
 
 
 class Command(BaseCommand):
-    help = '初始化所有向量資料庫（使用者、寵物、飼料、系統操作）'
+    help = '初始化所有向量資料庫（使用者、寵物、飼料、系統操作、FAQ、疾病檔案）'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--db',
             type=str,
-            choices=['user', 'pet', 'feed', 'system', 'all'],
+            choices=['user', 'pet', 'feed', 'system', 'faq', 'disease', 'all'],
             default='all',
             help='指定要初始化的資料庫'
         )
@@ -28,6 +30,23 @@ class Command(BaseCommand):
             action='store_true',
             help='強制重建現有的資料庫'
         )
+        parser.add_argument(
+            '--token-budget',
+            type=int,
+            default=None,
+            help='每批嵌入的 token 預算（預設使用 settings.EMBEDDING_TOKEN_BUDGET）'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=None,
+            help='建立索引時使用的 torch 執行緒數（預設使用所有核心）'
+        )
+        parser.add_argument(
+            '--quantize',
+            action='store_true',
+            help='對 BERT 模型套用 int8 動態量化（CPU）'
+        )
 
     def handle(self, *args, **options):
         db_type = options['db']
@@ -39,9 +58,22 @@ class Command(BaseCommand):
 
         # 初始化 BERT 服務
         self.stdout.write('載入 BERT 模型...')
-        embedding_service = RecommendationService()
+        embedding_service = get_recommendation_service()
         self.stdout.write(self.style.SUCCESS('✅ BERT 模型載入完成'))
 
+        # 調整共用嵌入引擎
+        engine = embedding_service.embedding_engine
+        if options['token_budget']:
+            engine.token_budget = max(options['token_budget'], engine.max_length)
+        if options['threads']:
+            engine.num_threads = options['threads']
+        if options['quantize'] and engine.quantize():
+            embedding_service.model = engine.model
+        self.stdout.write(
+            f'   - 嵌入引擎: token 預算 {engine.token_budget}、'
+            f'{engine.num_threads} 執行緒、{"int8 量化" if engine.quantized else "fp32"}'
+        )
+
         # 初始化指定的資料庫
         if db_type in ['user', 'all']:
             self._init_user_db(embedding_service, rebuild)
@@ -55,6 +87,12 @@ class Command(BaseCommand):
         if db_type in ['system', 'all']:
             self._init_system_db(embedding_service, rebuild)
 
+        if db_type in ['faq', 'all']:
+            self._init_faq_db(embedding_service, rebuild)
+
+        if db_type in ['disease', 'all']:
+            self._init_disease_db(embedding_service, rebuild)
+
         self.stdout.write(self.style.SUCCESS('=' * 60))
         self.stdout.write(self.style.SUCCESS('向量資料庫初始化完成！'))
         self.stdout.write(self.style.SUCCESS('=' * 60))
@@ -68,17 +106,15 @@ class Command(BaseCommand):
         try:
             db = UserVectorDB(embedding_service)
 
-            if rebuild and len(db.ids) > 0:
+            if rebuild and len(db.index) > 0:
                 self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
-                db.ids = []
-                db.embeddings = []
-                db.metadata = []
+                db.reset()
                 db.initialize_from_db()
-            elif len(db.ids) == 0:
+            elif len(db.index) == 0:
                 self.stdout.write('⚠️  資料庫為空，開始初始化...')
                 db.initialize_from_db()
             else:
-                self.stdout.write(self.style.SUCCESS(f'✅ 使用者資料庫已存在: {len(db.ids)} 筆'))
+                self.stdout.write(self.style.SUCCESS(f'✅ 使用者資料庫已存在: {len(db.index)} 筆'))
 
             # 顯示統計
             stats = db.get_stats()
@@ -97,17 +133,15 @@ class Command(BaseCommand):
         try:
             db = PetVectorDB(embedding_service)
 
-            if rebuild and len(db.ids) > 0:
+            if rebuild and len(db.index) > 0:
                 self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
-                db.ids = []
-                db.embeddings = []
-                db.metadata = []
+                db.reset()
                 db.initialize_from_db()
-            elif len(db.ids) == 0:
+            elif len(db.index) == 0:
                 self.stdout.write('⚠️  資料庫為空，開始初始化...')
                 db.initialize_from_db()
             else:
-                self.stdout.write(self.style.SUCCESS(f'✅ 寵物資料庫已存在: {len(db.ids)} 筆'))
+                self.stdout.write(self.style.SUCCESS(f'✅ 寵物資料庫已存在: {len(db.index)} 筆'))
 
             # 顯示統計
             stats = db.get_stats()
@@ -126,17 +160,15 @@ class Command(BaseCommand):
         try:
             db = FeedVectorDB(embedding_service)
 
-            if rebuild and len(db.ids) > 0:
+            if rebuild and len(db.index) > 0:
                 self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
-                db.ids = []
-                db.embeddings = []
-                db.metadata = []
+                db.reset()
                 db.initialize_from_db()
-            elif len(db.ids) == 0:
+            elif len(db.index) == 0:
                 self.stdout.write('⚠️  資料庫為空，開始初始化...')
                 db.initialize_from_db()
             else:
-                self.stdout.write(self.style.SUCCESS(f'✅ 飼料資料庫已存在: {len(db.ids)} 筆'))
+                self.stdout.write(self.style.SUCCESS(f'✅ 飼料資料庫已存在: {len(db.index)} 筆'))
 
             # 顯示統計
             stats = db.get_stats()
@@ -155,17 +187,69 @@ class Command(BaseCommand):
         try:
             db = SystemOperationVectorDB(embedding_service)
 
-            if rebuild and len(db.ids) > 0:
+            if rebuild and len(db.index) > 0:
+                self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
+                db.reset()
+                db.initialize_from_db()
+            elif len(db.index) == 0:
+                self.stdout.write('⚠️  資料庫為空，開始初始化...')
+                db.initialize_from_db()
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ 系統操作資料庫已存在: {len(db.index)} 筆'))
+
+            # 顯示統計
+            stats = db.get_stats()
+            self.stdout.write(self.style.SUCCESS(f'   - 總數: {stats["total_items"]} 筆'))
+            self.stdout.write(self.style.SUCCESS(f'   - 維度: {stats["embedding_dim"]}'))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ 初始化系統操作資料庫失敗: {str(e)}'))
+
+    def _init_faq_db(self, embedding_service, rebuild):
+        """初始化系統 FAQ 向量資料庫"""
+        self.stdout.write('\n' + '─' * 60)
+        self.stdout.write('初始化系統 FAQ 向量資料庫...')
+        self.stdout.write('─' * 60)
+
+        try:
+            db = SystemFAQVectorDB(embedding_service)
+
+            if rebuild and len(db.index) > 0:
+                self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
+                db.reset()
+                db.initialize_from_db()
+            elif len(db.index) == 0:
+                self.stdout.write('⚠️  資料庫為空，開始初始化...')
+                db.initialize_from_db()
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ FAQ 資料庫已存在: {len(db.index)} 筆'))
+
+            # 顯示統計
+            stats = db.get_stats()
+            self.stdout.write(self.style.SUCCESS(f'   - 總數: {stats["total_items"]} 筆'))
+            self.stdout.write(self.style.SUCCESS(f'   - 維度: {stats["embedding_dim"]}'))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ 初始化 FAQ 資料庫失敗: {str(e)}'))
+
+    def _init_disease_db(self, embedding_service, rebuild):
+        """初始化疾病檔案向量資料庫"""
+        self.stdout.write('\n' + '─' * 60)
+        self.stdout.write('初始化疾病檔案向量資料庫...')
+        self.stdout.write('─' * 60)
+
+        try:
+            db = DiseaseArchiveVectorDB(embedding_service)
+
+            if rebuild and len(db.index) > 0:
                 self.stdout.write(self.style.WARNING('⚠️  強制重建模式：刪除現有資料'))
-                db.ids = []
-                db.embeddings = []
-                db.metadata = []
+                db.reset()
                 db.initialize_from_db()
-            elif len(db.ids) == 0:
+            elif len(db.index) == 0:
                 self.stdout.write('⚠️  資料庫為空，開始初始化...')
                 db.initialize_from_db()
             else:
-                self.stdout.write(self.style.SUCCESS(f'✅ 系統操作資料庫已存在: {len(db.ids)} 筆'))
+                self.stdout.write(self.style.SUCCESS(f'✅ 疾病檔案資料庫已存在: {len(db.index)} 筆'))
 
             # 顯示統計
             stats = db.get_stats()
@@ -173,4 +257,4 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f'   - 維度: {stats["embedding_dim"]}'))
 
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'❌ 初始化系統操作資料庫失敗: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'❌ 初始化疾病檔案資料庫失敗: {str(e)}'))
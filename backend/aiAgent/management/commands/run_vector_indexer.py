@@ -0,0 +1,50 @@
+"""
+Django Management Command: 執行向量索引背景 worker
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from aiAgent.services.indexing_queue import BATCH_SIZE, process_pending_jobs, seconds_until_next_job
+
+
+class Command(BaseCommand):
+    help = '處理 signal 排入的向量索引工作（獨立程序，搭配 VECTOR_INDEXING_WORKER_THREAD = False 使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='處理完目前可處理的工作後結束'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='每批最多處理的工作數'
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=5.0,
+            help='沒有工作時的輪詢間隔（秒）'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        self.stdout.write(self.style.SUCCESS('🚀 向量索引 worker 啟動'))
+
+        total = 0
+        while True:
+            close_old_connections()
+            processed = process_pending_jobs(batch_size)
+            total += processed
+            if processed:
+                continue
+
+            if options['once']:
+                break
+            time.sleep(max(seconds_until_next_job(options['poll']), 0.1))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ 向量索引 worker 結束，共處理 {total} 筆工作'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aiAgent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VectorIndexJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('user', '使用者'), ('feed', '飼料'), ('disease_archive', '疾病檔案')], max_length=30, verbose_name='向量資料庫')),
+                ('object_id', models.BigIntegerField(verbose_name='實體 ID')),
+                ('action', models.CharField(choices=[('upsert', '新增或更新'), ('remove', '移除')], default='upsert', max_length=10, verbose_name='動作')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='附加資料')),
+                ('revision', models.PositiveIntegerField(default=1, verbose_name='版本')),
+                ('available_at', models.DateTimeField(db_index=True, verbose_name='可處理時間')),
+                ('attempts', models.IntegerField(default=0, verbose_name='失敗次數')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後錯誤')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '向量索引工作',
+                'verbose_name_plural': '向量索引工作',
+                'db_table': 'ai_vector_index_jobs',
+                'ordering': ['available_at'],
+                'unique_together': {('target', 'object_id')},
+            },
+        ),
+    ]
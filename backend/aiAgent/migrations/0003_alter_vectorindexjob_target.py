@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aiAgent', '0002_vectorindexjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vectorindexjob',
+            name='target',
+            field=models.CharField(choices=[('user', '使用者'), ('feed', '飼料'), ('disease_archive', '疾病檔案'), ('social_post', '社群貼文')], max_length=30, verbose_name='向量資料庫'),
+        ),
+    ]
@@ -257,4 +257,55 @@ class ConversationFeedback(models.Model):
         unique_together = [['message', 'user']]  # 每個使用者對每條訊息只能回饋一次
 
     def __str__(self):
-        return f"{self.user.user_account} - {self.get_rating_display()}"
\ No newline at end of file
+        return f"{self.user.user_account} - {self.get_rating_display()}"
+
+class VectorIndexJob(models.Model):
+    """向量索引待處理工作（持久化佇列，每個實體最多一筆）"""
+
+    TARGET_USER = 'user'
+    TARGET_FEED = 'feed'
+    TARGET_DISEASE_ARCHIVE = 'disease_archive'
+    TARGET_SOCIAL_POST = 'social_post'
+
+    TARGET_CHOICES = [
+        (TARGET_USER, '使用者'),
+        (TARGET_FEED, '飼料'),
+        (TARGET_DISEASE_ARCHIVE, '疾病檔案'),
+        (TARGET_SOCIAL_POST, '社群貼文'),
+    ]
+
+    ACTION_UPSERT = 'upsert'
+    ACTION_REMOVE = 'remove'
+
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, '新增或更新'),
+        (ACTION_REMOVE, '移除'),
+    ]
+
+    # 目標實體
+    target = models.CharField(max_length=30, choices=TARGET_CHOICES, verbose_name='向量資料庫')
+    object_id = models.BigIntegerField(verbose_name='實體 ID')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=ACTION_UPSERT, verbose_name='動作')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='附加資料')
+
+    # 每次重新排入都會遞增；處理完成時只刪除版本相同的工作，避免遺漏處理期間的新變更
+    revision = models.PositiveIntegerField(default=1, verbose_name='版本')
+
+    # 排程與重試
+    available_at = models.DateTimeField(db_index=True, verbose_name='可處理時間')
+    attempts = models.IntegerField(default=0, verbose_name='失敗次數')
+    last_error = models.TextField(blank=True, verbose_name='最後錯誤')
+
+    # 時間戳記
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+
+    class Meta:
+        db_table = 'ai_vector_index_jobs'
+        verbose_name = '向量索引工作'
+        verbose_name_plural = '向量索引工作'
+        ordering = ['available_at']
+        unique_together = [['target', 'object_id']]  # 同一實體的待處理更新只保留一筆
+
+    def __str__(self):
+        return f"{self.target}:{self.object_id} ({self.action})"
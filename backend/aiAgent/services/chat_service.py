@@ -0,0 +1,262 @@
+"""
+Chat Service
+AI 聊天的共用流程（同步 API 與 SSE 串流 API 共用）
+
+串流流程（stream_chat，於 ASGI 下執行）：
+1. 載入使用者與寵物資訊（意圖分析的提示詞需要）的同時，以 BERT 預先計算查詢向量（獨立執行緒）
+2. 意圖分析：本機分類器以快取的查詢向量判斷，信心不足時才做非同步 OpenAI 呼叫（等待期間不佔用 worker 執行緒）
+3. 向量檢索（直接取用快取的查詢向量）
+4. 串流生成回應，逐段送出 "response" 欄位的文字
+5. 串流結束後才豐富化回應並寫入對話與訊息，最後送出完整回應（含 conversationId）
+
+SSE 事件：
+- intent: {"intent": ..., "confidence": ...}
+- delta:  {"text": "回應文字片段"}
+- done:   完整回應（格式同同步 API）
+- error:  錯誤回應（格式同同步 API 的 500 回應）
+"""
+
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from ..models import Conversation, Message
+from .response_service import ResponseService
+from .singleton import get_intent_service
+
+
+ERROR_RESPONSE = '抱歉，我暫時無法處理您的請求。請稍後再試。'
+
+
+def build_user_context(user):
+    """
+    取得使用者與寵物資訊（加入對話上下文的 user 欄位）
+
+    Args:
+        user: 使用者
+
+    Returns:
+        dict: 使用者資訊
+    """
+    from pets.models import Pet
+
+    # 取得使用者的寵物資訊
+    pets_info = []
+    for pet in Pet.objects.filter(owner=user):
+        pets_info.append({
+            'id': pet.id,
+            'name': pet.pet_name,
+            'type': pet.pet_type,  # 貓/狗
+            'breed': pet.breed,    # 品種
+            'age': pet.age,
+            'stage': pet.pet_stage,  # 年齡階段 (幼犬、成犬/成貓等)
+            'weight': pet.weight,
+            'description': pet.description
+        })
+
+    return {
+        'id': user.id,
+        'username': user.user_account,
+        'fullname': user.user_fullname,
+        'pets': pets_info  # 加入寵物資訊
+    }
+
+
+def build_response(intent_result, response_service=None):
+    """
+    把處理結果格式化並豐富化為前端需要的回應
+
+    Args:
+        intent_result (dict): IntentService 的處理結果
+        response_service (ResponseService): 回應格式化服務
+
+    Returns:
+        dict: 前端需要的回應
+    """
+    response_service = response_service or ResponseService()
+    response_data = response_service.format_chat_response(intent_result)
+
+    # 豐富化回應（加入貼文詳細資料）
+    if intent_result.get('success') and intent_result.get('retrieved_data'):
+        response_data = response_service.enrich_with_post_details(
+            response_data,
+            intent_result
+        )
+
+    # 豐富化用戶推薦
+    if response_data.get('hasRecommendedUsers'):
+        response_data = response_service.enrich_with_user_recommendations(
+            response_data
+        )
+
+    return response_data
+
+
+def create_assistant_message(conversation, response_data, intent_result):
+    """
+    儲存 AI 回應訊息
+
+    Args:
+        conversation (Conversation): 對話
+        response_data (dict): 回應
+        intent_result (dict): IntentService 的處理結果
+
+    Returns:
+        Message: 建立的訊息
+    """
+    return Message.objects.create(
+        conversation=conversation,
+        role=Message.ROLE_ASSISTANT,
+        content=response_data.get('response', ''),
+        intent=intent_result.get('intent'),
+        confidence=intent_result.get('confidence'),
+        source=response_data.get('source', 'ai_agent'),
+        has_tutorial=response_data.get('hasTutorial', False),
+        tutorial_type=response_data.get('tutorialType'),
+        has_recommended_users=response_data.get('hasRecommendedUsers', False),
+        has_recommended_articles=response_data.get('hasRecommendedArticles', False),
+        has_calculator=response_data.get('hasCalculator', False),
+        has_operation=response_data.get('hasOperation', False),
+        operation_type=response_data.get('operationType'),
+        additional_data={
+            'recommended_user_ids': response_data.get('recommendedUserIds', []),
+            'recommended_user_details': response_data.get('recommendedUserDetails', []),  # 保存完整用戶詳情
+            'recommended_article_ids': response_data.get('recommendedArticleIds', []),
+            'social_post_details': response_data.get('socialPostDetails', []),
+            'forum_post_details': response_data.get('forumPostDetails', []),
+            'operation_params': response_data.get('operationParams', {}),  # 保存操作參數
+            'intent_source': intent_result.get('intent_source'),  # 意圖由本機分類器（local）或 OpenAI 判斷
+        },
+        entities=intent_result.get('entities') or {}
+    )
+
+
+def complete_exchange(user, conversation, context, user_message, intent_result):
+    """
+    串流結束後豐富化回應，並在一個交易中寫入對話、使用者訊息與 AI 回應訊息
+
+    Args:
+        user: 使用者
+        conversation (Conversation): 既有對話（None 表示建立新對話）
+        context (dict): 對話上下文
+        user_message (str): 使用者輸入
+        intent_result (dict): IntentService 的處理結果
+
+    Returns:
+        dict: 完整回應（含 conversationId）
+    """
+    response_data = build_response(intent_result)
+
+    with transaction.atomic():
+        if conversation is None:
+            # 建立新對話（標題將在第一條訊息時自動生成）
+            conversation = Conversation.objects.create(
+                user=user,
+                title='',
+                context_data=context
+            )
+        Message.objects.create(
+            conversation=conversation,
+            role=Message.ROLE_USER,
+            content=user_message
+        )
+        create_assistant_message(conversation, response_data, intent_result)
+
+    response_data['conversationId'] = conversation.id
+    return response_data
+
+
+def sse_event(event, data):
+    """
+    組成一個 server-sent event
+
+    Args:
+        event (str): 事件名稱
+        data: 可 JSON 序列化的資料
+
+    Returns:
+        str: SSE 文字
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def stream_chat(user, user_message, context, conversation=None):
+    """
+    以 SSE 串流處理一次 AI 聊天（非同步產生器）
+
+    Args:
+        user: 使用者
+        user_message (str): 使用者輸入
+        context (dict): 對話上下文（會加入 user 欄位）
+        conversation (Conversation): 既有對話（None 表示建立新對話）
+
+    Yields:
+        str: SSE 事件
+    """
+    try:
+        intent_service = await sync_to_async(get_intent_service)()
+        openai_service = intent_service.openai_service
+
+        # 查詢向量只需要使用者輸入，與載入使用者資訊同時進行（BERT 在獨立執行緒執行）
+        embedding_task = asyncio.ensure_future(sync_to_async(
+            intent_service.vector_service.prefetch_query_embedding,
+            thread_sensitive=False
+        )(user_message))
+
+        context['user'] = await sync_to_async(build_user_context)(user)
+        # 本機意圖分類器的 k-NN 與之後的檢索都取用快取的查詢向量；
+        # 等待查詢向量時 LLM 意圖分析已同時送出（本機判斷被採用時取消）
+        intent_result = await intent_service.analyze_intent_async(
+            user_message, context, embedding_task=embedding_task
+        )
+        # 完全比對命中時沒有等待查詢向量，檢索前確保已完成（不重複計算）
+        await embedding_task
+
+        if not intent_result['success']:
+            result = {
+                'success': False,
+                'error': 'Intent analysis failed',
+                'fallback': intent_result.get('fallback', {})
+            }
+        else:
+            intent_data = intent_result['data']
+            yield sse_event('intent', {
+                'intent': intent_data.get('intent'),
+                'confidence': intent_data.get('confidence', 0.0)
+            })
+
+            retrieved_data, case_details = await sync_to_async(intent_service.retrieve)(
+                intent_data, user_message, context
+            )
+
+            stream = openai_service.stream_response(intent_data, retrieved_data, user_message, case_details)
+            async for text in stream:
+                yield sse_event('delta', {'text': text})
+
+            if stream.result['success']:
+                result = intent_service.build_result(intent_data, stream.result['data'], retrieved_data)
+            else:
+                result = {
+                    'success': False,
+                    'error': 'Response generation failed',
+                    'fallback': stream.result.get('fallback', {})
+                }
+
+        if not result['success']:
+            yield sse_event('delta', {'text': ResponseService.format_chat_response(result)['response']})
+
+        response_data = await sync_to_async(complete_exchange)(user, conversation, context, user_message, result)
+        yield sse_event('done', response_data)
+
+    except Exception as e:
+        print(f"AI Agent Chat Stream 錯誤: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        yield sse_event('error', {
+            'error': '處理請求時發生錯誤',
+            'detail': str(e),
+            'response': ERROR_RESPONSE,
+            'source': 'error',
+            'confidence': 0.0
+        })
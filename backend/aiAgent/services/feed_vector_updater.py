@@ -3,7 +3,7 @@ Feed Vector Updater
 飼料向量資料庫更新服務（單例模式）
 """
 
-from .singleton import get_intent_service
+from .singleton import get_vector_service
 
 
 class FeedVectorUpdater:
@@ -21,13 +21,10 @@ class FeedVectorUpdater:
         if self._initialized:
             return
         self._initialized = True
-        self._intent_service = None
 
     def get_feed_db(self):
         """獲取飼料向量資料庫實例"""
-        if self._intent_service is None:
-            self._intent_service = get_intent_service()
-        return self._intent_service.vector_service.feed_db
+        return get_vector_service().feed_db
 
     def update_feed_vector(self, feed):
         """
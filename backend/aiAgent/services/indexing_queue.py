@@ -0,0 +1,313 @@
+"""
+Indexing Queue
+向量索引的持久化背景更新佇列
+
+signal 只在資料庫交易提交後寫入一筆 VectorIndexJob（以資料表作為佇列），
+實際的 BERT 嵌入與向量資料庫寫入由背景 worker 批次處理：
+- 每個實體（例如同一位使用者）最多只有一筆待處理工作，
+  短時間內多次變更（例如連續編輯十隻寵物）只會重新嵌入飼主一次
+- 新工作會延遲 VECTOR_INDEXING_COALESCE_SECONDS 秒才處理，讓連續的變更合併
+- worker 一次取出一批工作，依向量資料庫分組後整批嵌入、整批寫入 WAL
+- 工作存在資料庫中，程序重啟後仍會繼續處理；失敗的工作以指數退避重試
+
+worker 可以是 web 程序內的背景執行緒（VECTOR_INDEXING_WORKER_THREAD = True），
+也可以是獨立程序（python manage.py run_vector_indexer）。
+"""
+
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+# 每批最多處理的工作數
+BATCH_SIZE = 100
+
+# 取出工作後的租約時間（秒），worker 中途結束時工作會在租約到期後重新處理
+LEASE_SECONDS = 300
+
+# 失敗重試的最長間隔（秒）
+MAX_RETRY_SECONDS = 600
+
+
+def _coalesce_delay():
+    return timedelta(seconds=getattr(settings, 'VECTOR_INDEXING_COALESCE_SECONDS', 2))
+
+
+def _upsert_job(target, object_id, action, payload, delay):
+    """寫入（或合併到既有的）待處理工作"""
+    from aiAgent.models import VectorIndexJob
+
+    now = timezone.now()
+    updates = {
+        'action': action,
+        'payload': payload or {},
+        'revision': F('revision') + 1,
+        'attempts': 0,
+        'last_error': '',
+        'updated_at': now,
+    }
+    # 已有待處理的工作時只更新內容，不延後處理時間（連續變更會合併成一次）
+    if VectorIndexJob.objects.filter(target=target, object_id=object_id).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            VectorIndexJob.objects.create(
+                target=target,
+                object_id=object_id,
+                action=action,
+                payload=payload or {},
+                available_at=now + delay,
+            )
+    except IntegrityError:
+        # 其他程序剛好同時建立了同一筆工作
+        VectorIndexJob.objects.filter(target=target, object_id=object_id).update(**updates)
+
+
+def enqueue_indexing(target, object_id, action='upsert', payload=None):
+    """
+    在目前的資料庫交易提交後，排入一筆向量索引更新（外部調用接口）
+
+    Args:
+        target (str): 向量資料庫（'user'、'feed'、'disease_archive'、'social_post'）
+        object_id (int): 實體 ID
+        action (str): 'upsert'（依目前資料新增 / 更新 / 移除）或 'remove'（實體已刪除）
+        payload (dict): 附加資料（例如已刪除疾病檔案的 post_frame_id）
+    """
+    if not getattr(settings, 'VECTOR_INDEXING_ASYNC', True):
+        # 同步模式：交易提交後立即處理（管理指令、除錯用）
+        def run_now():
+            _upsert_job(target, object_id, action, payload, timedelta(0))
+            process_pending_jobs()
+        transaction.on_commit(run_now)
+        return
+
+    def enqueue():
+        _upsert_job(target, object_id, action, payload, _coalesce_delay())
+        if getattr(settings, 'VECTOR_INDEXING_WORKER_THREAD', True):
+            _worker.wake()
+    transaction.on_commit(enqueue)
+
+
+# ----------------------------------------------------------------------
+# 各向量資料庫的批次處理
+# ----------------------------------------------------------------------
+
+def _apply_user_jobs(vector_service, jobs):
+    from accounts.models import CustomUser
+
+    user_db = vector_service.user_db
+    upsert_ids = [job.object_id for job in jobs if job.action == 'upsert']
+    users = list(CustomUser.objects.filter(id__in=upsert_ids).prefetch_related('pets'))
+    found = {user.id for user in users}
+
+    user_db.add_users(users)
+    user_db.delete_items([job.object_id for job in jobs if job.object_id not in found])
+
+
+def _apply_feed_jobs(vector_service, jobs):
+    from feeds.models import Feed
+
+    feed_db = vector_service.feed_db
+    upsert_ids = [job.object_id for job in jobs if job.action == 'upsert']
+    feeds = list(Feed.objects.filter(id__in=upsert_ids))
+    found = {feed.id for feed in feeds}
+
+    feed_db.add_feeds(feeds)
+    feed_db.delete_items([job.object_id for job in jobs if job.object_id not in found])
+
+
+def _apply_disease_archive_jobs(vector_service, jobs):
+    from pets.models import DiseaseArchiveContent
+
+    disease_archive_db = vector_service.disease_archive_db
+    upsert_ids = [job.object_id for job in jobs if job.action == 'upsert']
+    archives = list(
+        DiseaseArchiveContent.objects.filter(id__in=upsert_ids).select_related(
+            'pet', 'pet__owner', 'postFrame'
+        ).prefetch_related(
+            'illnesses__illness',
+            'abnormal_posts__post__symptoms__symptom'
+        )
+    )
+
+    disease_archive_db.sync_archives(archives)
+    # 已刪除的疾病檔案以 PostFrame ID 移除（工作中記錄了刪除當下的 post_frame_id）
+    disease_archive_db.delete_items([
+        job.payload['post_frame_id'] for job in jobs
+        if job.action == 'remove' and job.payload.get('post_frame_id')
+    ])
+
+
+def _apply_social_post_jobs(vector_service, jobs):
+    from social.apps import SocialConfig
+    from social.models import SoLContent
+
+    # 社群貼文向量存在推薦服務的貼文索引，不在 AI 向量服務中
+    recommendation_service = SocialConfig.load_recommendation_service()
+    upsert_ids = [job.object_id for job in jobs if job.action == 'upsert']
+    contents = dict(
+        SoLContent.objects.filter(postFrame_id__in=upsert_ids).values_list('postFrame_id', 'content_text')
+    )
+
+    recommendation_service.embed_posts(list(contents.items()), content_type='social')
+    recommendation_service.delete_posts(
+        [job.object_id for job in jobs if job.object_id not in contents], content_type='social'
+    )
+
+
+_HANDLERS = {
+    'user': _apply_user_jobs,
+    'feed': _apply_feed_jobs,
+    'disease_archive': _apply_disease_archive_jobs,
+    'social_post': _apply_social_post_jobs,
+}
+
+
+def _claim_jobs(limit):
+    """取出可處理的工作並設定租約（以可處理時間作為樂觀鎖，避免多個 worker 重複處理）"""
+    from aiAgent.models import VectorIndexJob
+
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    claimed = []
+    for job in VectorIndexJob.objects.filter(available_at__lte=now)[:limit]:
+        if VectorIndexJob.objects.filter(id=job.id, available_at=job.available_at).update(available_at=lease_until):
+            claimed.append(job)
+    return claimed
+
+
+def _finish_jobs(jobs):
+    """處理完成：刪除版本未變的工作；處理期間又有新變更的工作重新排程"""
+    from aiAgent.models import VectorIndexJob
+
+    for job in jobs:
+        deleted, _ = VectorIndexJob.objects.filter(id=job.id, revision=job.revision).delete()
+        if not deleted:
+            VectorIndexJob.objects.filter(id=job.id).update(available_at=timezone.now() + _coalesce_delay())
+
+
+def _fail_jobs(jobs, error):
+    """處理失敗：以指數退避重新排程"""
+    from aiAgent.models import VectorIndexJob
+
+    now = timezone.now()
+    for job in jobs:
+        delay = min(5 * (2 ** job.attempts), MAX_RETRY_SECONDS)
+        VectorIndexJob.objects.filter(id=job.id).update(
+            attempts=F('attempts') + 1,
+            last_error=str(error)[:2000],
+            available_at=now + timedelta(seconds=delay),
+        )
+
+
+def process_pending_jobs(limit=BATCH_SIZE):
+    """
+    處理一批可處理的工作
+
+    Args:
+        limit (int): 本批最多處理的工作數
+
+    Returns:
+        int: 成功處理的工作數
+    """
+    jobs = _claim_jobs(limit)
+    if not jobs:
+        return 0
+
+    from .singleton import get_vector_service
+    vector_service = get_vector_service()
+
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.target, []).append(job)
+
+    processed = 0
+    for target, target_jobs in groups.items():
+        handler = _HANDLERS.get(target)
+        try:
+            if handler is None:
+                raise ValueError(f"未知的向量資料庫: {target}")
+            handler(vector_service, target_jobs)
+        except Exception as e:
+            print(f"⚠️ 背景向量索引失敗（{target}，{len(target_jobs)} 筆）: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            _fail_jobs(target_jobs, e)
+            continue
+
+        _finish_jobs(target_jobs)
+        processed += len(target_jobs)
+        print(f"✅ 背景向量索引完成: {target} {len(target_jobs)} 筆")
+
+    return processed
+
+
+def seconds_until_next_job(default):
+    """距離下一筆工作可處理的秒數（沒有工作時返回 default）"""
+    from aiAgent.models import VectorIndexJob
+
+    next_job = VectorIndexJob.objects.order_by('available_at').values_list('available_at', flat=True).first()
+    if next_job is None:
+        return default
+    return min(max((next_job - timezone.now()).total_seconds(), 0.0), default)
+
+
+class IndexingWorker:
+    """web 程序內的背景 worker 執行緒"""
+
+    # 沒有新工作通知時的輪詢間隔（秒），用於處理重試與其他程序排入的工作
+    POLL_SECONDS = 30
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """啟動 worker 執行緒（已啟動時不做任何事）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vector-indexing', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """通知 worker 有新工作（只在已啟動 worker 的程序中有作用）"""
+        with self._lock:
+            started = self._thread is not None
+        if started:
+            self._event.set()
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                while process_pending_jobs():
+                    pass
+                timeout = seconds_until_next_job(self.POLL_SECONDS)
+            except Exception as e:
+                print(f"⚠️ 背景向量索引 worker 發生錯誤: {str(e)}")
+                timeout = self.POLL_SECONDS
+            finally:
+                close_old_connections()
+
+            self._event.wait(timeout)
+            self._event.clear()
+
+
+# 程序內共用的 worker
+_worker = IndexingWorker()
+
+
+def start_worker():
+    """
+    啟動程序內的背景 worker（處理重啟前遺留的工作）
+
+    只由處理請求的程序呼叫（gradProject/wsgi.py、asgi.py；runserver 的服務子程序也經由 wsgi.py），
+    管理指令、runserver 的自動重載父程序與 run_vector_indexer 不會啟動，
+    它們排入的工作由 web 程序輪詢或 run_vector_indexer 處理。
+    """
+    if getattr(settings, 'VECTOR_INDEXING_ASYNC', True) and getattr(settings, 'VECTOR_INDEXING_WORKER_THREAD', True):
+        _worker.start()
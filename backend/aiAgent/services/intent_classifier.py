@@ -0,0 +1,433 @@
+"""
+Intent Classifier
+本機意圖分類器：意圖分析的第一階段，信心足夠時不呼叫 LLM
+
+分類方式：
+1. 正規化後的文字與範例完全相同 → 直接採用範例的意圖
+2. 以 BERT 查詢向量（與向量檢索共用同一份快取）對所有範例做 k-NN，
+   依相似度加權投票；最相近範例的相似度與得票比例都超過門檻才採用
+
+兩個步驟也可以分開呼叫（predict_exact / predict_similar）：完全比對不需要查詢向量，
+沒有結果時呼叫端可先送出 LLM 請求，再等待查詢向量做 k-NN（IntentService.analyze_intent_async）。
+
+範例來源：
+- SystemOperationVectorDB 的操作 use_cases → operation（sub_type 為 operation_type）
+- SystemFAQVectorDB 的 FAQ use_cases → tutorial（sub_type 為 tutorial_type）
+- 內建的問候語 → general
+- 歷史對話：使用者訊息與其後 AI 回應訊息的 Message.intent（只取 LLM 判斷且信心足夠的）
+
+只有 settings.AI_INTENT_FAST_PATH_INTENTS 中的意圖會略過 LLM，
+需要 LLM 萃取實體（症狀、品種、時間範圍等）的意圖一律交給 LLM。
+
+統計（存於共用快取，各程序合計）：
+- requests / local_hits / llm_fallbacks / not_ready：命中率
+- audits / audit_agreements：本機命中時依 AI_INTENT_FAST_PATH_AUDIT_RATE 抽樣再呼叫 LLM 比對（命中的準確率）
+- shadow / shadow_agreements：信心不足時的本機預測與 LLM 結果比對（用來調整門檻）
+"""
+
+import bisect
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from utils.cache_counters import get_counters, incr_counter
+
+
+# k-NN 的鄰居數
+NEIGHBORS = 5
+
+# 歷史對話範例的筆數上限與最低信心
+HISTORY_LIMIT = 2000
+HISTORY_MIN_CONFIDENCE = 0.8
+
+# 範例索引的重建間隔（秒），讓新的歷史對話加入範例
+REFRESH_SECONDS = 3600
+
+# 內建的一般對話範例
+GENERAL_EXAMPLES = [
+    '你好', '您好', '嗨', '哈囉', 'hi', 'hello', '早安', '午安', '晚安',
+    '謝謝', '謝謝你', '感謝', '感謝你的幫忙', '掰掰', '再見', '你是誰', '你會做什麼',
+]
+
+# 統計計數器在共用快取中的鍵前綴
+METRICS_PREFIX = 'ai_intent_fast_path:'
+METRIC_NAMES = (
+    'requests', 'local_hits', 'llm_fallbacks', 'not_ready',
+    'audits', 'audit_agreements', 'shadow', 'shadow_agreements',
+)
+
+_PUNCTUATION = re.compile(r'[\s\W_]+', re.UNICODE)
+
+# 分類結果：accepted 表示採用（略過 LLM）；audited 表示信心足夠但被抽中交給 LLM 比對
+IntentPrediction = namedtuple(
+    'IntentPrediction',
+    ['intent', 'sub_type', 'confidence', 'similarity', 'example', 'accepted', 'audited']
+)
+
+
+def normalize_text(text):
+    """正規化文字（全形轉半形、小寫、去除空白與標點），用於完全比對"""
+    return _PUNCTUATION.sub('', unicodedata.normalize('NFKC', str(text or '')).lower())
+
+
+class _ExampleIndex:
+    """範例索引（建立後不再修改，重建時整個替換）"""
+
+    def __init__(self, texts, labels, embeddings):
+        self.texts = texts
+        self.labels = labels          # [(intent, sub_type)]
+        self.embeddings = embeddings  # (n, hidden) 正規化向量
+        self.built_at = time.monotonic()
+
+        # 正規化文字 -> 範例位置（同一句話有不同意圖的不列入）
+        self.exact = {}
+        conflicts = set()
+        for i, text in enumerate(texts):
+            key = normalize_text(text)
+            if not key:
+                continue
+            if key in self.exact and labels[self.exact[key]][0] != labels[i][0]:
+                conflicts.add(key)
+            self.exact.setdefault(key, i)
+        for key in conflicts:
+            del self.exact[key]
+
+
+class LocalIntentClassifier:
+    """以範例 k-NN 判斷意圖的本機分類器"""
+
+    def __init__(self, vector_service):
+        """
+        Args:
+            vector_service (VectorService): 共用的向量資料庫服務（提供 BERT 與系統操作 / FAQ 資料）
+        """
+        self.vector_service = vector_service
+        self._index = None
+        self._lock = threading.Lock()
+        self._building = False
+
+    # ------------------------------------------------------------------
+    # 設定
+    # ------------------------------------------------------------------
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'AI_INTENT_FAST_PATH_ENABLED', True)
+
+    @property
+    def fast_path_intents(self):
+        return set(getattr(settings, 'AI_INTENT_FAST_PATH_INTENTS', ['general', 'tutorial']))
+
+    @property
+    def threshold(self):
+        return getattr(settings, 'AI_INTENT_FAST_PATH_THRESHOLD', 0.8)
+
+    @property
+    def min_similarity(self):
+        return getattr(settings, 'AI_INTENT_FAST_PATH_MIN_SIMILARITY', 0.9)
+
+    @property
+    def audit_rate(self):
+        return getattr(settings, 'AI_INTENT_FAST_PATH_AUDIT_RATE', 0.05)
+
+    # ------------------------------------------------------------------
+    # 範例索引
+    # ------------------------------------------------------------------
+
+    @property
+    def ready(self):
+        return self._index is not None
+
+    def ensure_index(self):
+        """索引不存在或過期時在背景執行緒重建（不阻塞請求）"""
+        index = self._index
+        if index is not None and time.monotonic() - index.built_at < REFRESH_SECONDS:
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_in_background, name='intent-classifier-build', daemon=True).start()
+
+    def _build_in_background(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"❌ 建立意圖範例索引失敗: {str(e)}")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def build(self):
+        """
+        收集範例並以 BERT 建立範例索引
+
+        Returns:
+            int: 範例數
+        """
+        texts, labels = [], []
+
+        def add(text, intent, sub_type=None):
+            if text and intent:
+                texts.append(str(text))
+                labels.append((intent, sub_type))
+
+        for operation in self.vector_service.system_operation_db.metadata.values():
+            for use_case in operation.get('use_cases', []):
+                add(use_case, 'operation', operation.get('operation_type'))
+
+        for faq in self.vector_service.system_faq_db.metadata.values():
+            for use_case in faq.get('use_cases', []):
+                add(use_case, 'tutorial', faq.get('tutorial_type'))
+
+        for text in GENERAL_EXAMPLES:
+            add(text, 'general')
+
+        for text, intent in self._history_examples():
+            add(text, intent)
+
+        embedding_engine = self.vector_service.recommendation_service.embedding_engine
+        embeddings = embedding_engine.encode(texts)
+        self._index = _ExampleIndex(texts, labels, embeddings)
+        print(f"✅ 意圖範例索引建立完成：{len(texts)} 筆範例")
+        return len(texts)
+
+    @staticmethod
+    def _history_examples():
+        """
+        歷史對話範例：每則 AI 回應訊息的意圖配上同一對話中前一則使用者訊息
+
+        Returns:
+            list: [(使用者訊息, 意圖)]
+        """
+        from ..models import Message
+
+        assistant_messages = list(
+            Message.objects.filter(
+                role=Message.ROLE_ASSISTANT,
+                intent__isnull=False,
+                confidence__gte=HISTORY_MIN_CONFIDENCE,
+            )
+            .exclude(intent='')
+            .exclude(additional_data__intent_source='local')  # 本機分類器自己的判斷不回頭當範例
+            .order_by('-id')
+            .values_list('id', 'conversation_id', 'intent')[:HISTORY_LIMIT]
+        )
+        if not assistant_messages:
+            return []
+
+        # 各對話的使用者訊息（依 id 排序）
+        user_messages = {}
+        for message_id, conversation_id, content in (
+            Message.objects.filter(
+                role=Message.ROLE_USER,
+                conversation_id__in={conversation_id for _, conversation_id, _ in assistant_messages},
+            )
+            .order_by('id')
+            .values_list('id', 'conversation_id', 'content')
+        ):
+            ids, contents = user_messages.setdefault(conversation_id, ([], []))
+            ids.append(message_id)
+            contents.append(content)
+
+        examples = []
+        for message_id, conversation_id, intent in assistant_messages:
+            ids, contents = user_messages.get(conversation_id, ([], []))
+            position = bisect.bisect_left(ids, message_id)
+            if position:
+                examples.append((contents[position - 1], intent))
+        return examples
+
+    # ------------------------------------------------------------------
+    # 分類
+    # ------------------------------------------------------------------
+
+    def predict(self, user_input):
+        """
+        判斷使用者輸入的意圖
+
+        Args:
+            user_input (str): 使用者輸入
+
+        Returns:
+            IntentPrediction: 分類結果（未啟用、索引尚未建立或查詢向量失敗時為 None）
+        """
+        index = self._begin()
+        if index is None:
+            return None
+        prediction = self._match_exact(index, user_input) or self._match_similar(index, user_input)
+        return self._finish(prediction)
+
+    def predict_exact(self, user_input):
+        """
+        只做完全比對（不計算查詢向量），分兩階段判斷時的第一步
+
+        Args:
+            user_input (str): 使用者輸入
+
+        Returns:
+            IntentPrediction: 分類結果（沒有完全相同的範例時為 None，接著呼叫 predict_similar）
+        """
+        index = self._begin()
+        if index is None:
+            return None
+        return self._finish(self._match_exact(index, user_input))
+
+    def predict_similar(self, user_input):
+        """
+        k-NN 判斷，分兩階段判斷時 predict_exact 沒有結果後的第二步（不重複計入 requests）
+
+        Args:
+            user_input (str): 使用者輸入
+
+        Returns:
+            IntentPrediction: 分類結果（索引尚未建立或查詢向量失敗時為 None）
+        """
+        index = self._index if self.enabled else None
+        if index is None:
+            return None
+        return self._finish(self._match_similar(index, user_input))
+
+    def _begin(self):
+        """計入請求並取得範例索引（未啟用或尚未建立時為 None）"""
+        if not self.enabled:
+            return None
+
+        self._incr('requests')
+        self.ensure_index()
+        index = self._index
+        if index is None:
+            self._incr('not_ready')
+        return index
+
+    def _finish(self, prediction):
+        if prediction is not None and prediction.accepted:
+            self._incr('local_hits')
+        return prediction
+
+    def _match_exact(self, index, user_input):
+        # 1. 完全比對
+        position = index.exact.get(normalize_text(user_input))
+        if position is None:
+            return None
+        intent, sub_type = index.labels[position]
+        return self._prediction(intent, sub_type, 1.0, 1.0, index.texts[position])
+
+    def _match_similar(self, index, user_input):
+        # 2. k-NN（查詢向量與之後的向量檢索共用快取）
+        query_embedding = self.vector_service._generate_query_embedding(user_input)
+        if query_embedding is None or not index.texts:
+            return None
+
+        similarities = index.embeddings @ query_embedding.reshape(-1)
+        k = min(NEIGHBORS, len(similarities))
+        neighbors = np.argpartition(-similarities, k - 1)[:k]
+        neighbors = neighbors[np.argsort(-similarities[neighbors])]
+
+        votes = {}
+        for i in neighbors:
+            intent = index.labels[i][0]
+            votes[intent] = votes.get(intent, 0.0) + max(float(similarities[i]), 0.0)
+        total = sum(votes.values())
+        if total <= 0:
+            return None
+
+        intent = max(votes, key=votes.get)
+        # 該意圖最相近的範例（提供 sub_type 與相似度）
+        nearest = next(i for i in neighbors if index.labels[i][0] == intent)
+        return self._prediction(
+            intent,
+            index.labels[nearest][1],
+            votes[intent] / total,
+            float(similarities[nearest]),
+            index.texts[nearest],
+        )
+
+    def _prediction(self, intent, sub_type, confidence, similarity, example):
+        confident = (
+            intent in self.fast_path_intents
+            and confidence >= self.threshold
+            and similarity >= self.min_similarity
+        )
+        # 信心足夠時依抽樣比例仍交給 LLM，用來估計本機命中的準確率
+        audited = confident and random.random() < self.audit_rate
+        return IntentPrediction(
+            intent, sub_type, round(confidence, 3), round(similarity, 3), example,
+            accepted=confident and not audited,
+            audited=audited,
+        )
+
+    @staticmethod
+    def as_intent_data(prediction):
+        """
+        轉成與 OpenAIService.analyze_intent 相同格式的意圖資料
+
+        Args:
+            prediction (IntentPrediction): 分類結果
+
+        Returns:
+            dict: 意圖資料（source 為 local）
+        """
+        return {
+            'intent': prediction.intent,
+            'sub_type': prediction.sub_type,
+            'confidence': prediction.confidence,
+            'entities': {},
+            'reason': f"本機分類器：與範例「{prediction.example}」相近（相似度 {prediction.similarity}）",
+            'source': 'local',
+        }
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+
+    def record_llm_result(self, prediction, intent_result):
+        """
+        呼叫 LLM 後記錄統計
+
+        Args:
+            prediction (IntentPrediction): 本機分類結果（可為 None）
+            intent_result (dict): OpenAIService.analyze_intent 的結果
+        """
+        audited = prediction is not None and prediction.audited
+        if not audited:
+            self._incr('llm_fallbacks')
+        if prediction is None or not intent_result.get('success'):
+            return
+        agreed = prediction.intent == intent_result['data'].get('intent')
+        if audited:
+            self._incr('audits')
+            if agreed:
+                self._incr('audit_agreements')
+        else:
+            self._incr('shadow')
+            if agreed:
+                self._incr('shadow_agreements')
+
+    @staticmethod
+    def _incr(name):
+        incr_counter(METRICS_PREFIX + name)
+
+    @staticmethod
+    def get_metrics():
+        """
+        取得各程序合計的統計
+
+        Returns:
+            dict: 計數器與命中率、準確率
+        """
+        metrics = get_counters(METRICS_PREFIX, METRIC_NAMES)
+
+        def ratio(numerator, denominator):
+            return round(metrics[numerator] / metrics[denominator], 4) if metrics[denominator] else None
+
+        metrics['hit_rate'] = ratio('local_hits', 'requests')
+        metrics['audit_accuracy'] = ratio('audit_agreements', 'audits')
+        metrics['shadow_accuracy'] = ratio('shadow_agreements', 'shadow')
+        return metrics
@@ -3,8 +3,13 @@ Intent Service
 整合 OpenAI 意圖識別與向量資料庫檢索
 """
 
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from .intent_classifier import LocalIntentClassifier
 from .openai_service import OpenAIService
-from .vector_service import VectorService
+from .singleton import get_vector_service
 
 
 class IntentService:
@@ -12,7 +17,9 @@ class IntentService:
 
     def __init__(self):
         self.openai_service = OpenAIService()
-        self.vector_service = VectorService()
+        self.vector_service = get_vector_service()
+        self.intent_classifier = LocalIntentClassifier(self.vector_service)
+        self.intent_classifier.ensure_index()
 
     def process_user_input(self, user_input, context=None):
         """
@@ -26,8 +33,8 @@ class IntentService:
             dict: 處理結果
         """
         try:
-            # 步驟 1: 使用 OpenAI 分析意圖
-            intent_result = self.openai_service.analyze_intent(user_input, context)
+            # 步驟 1: 分析意圖（本機分類器信心不足時才使用 OpenAI）
+            intent_result = self.analyze_intent(user_input, context)
 
             if not intent_result['success']:
                 return {
@@ -38,18 +45,8 @@ class IntentService:
 
             intent_data = intent_result['data']
 
-            # 步驟 2: 根據意圖從向量資料庫檢索相關資料
-            retrieved_data = self.vector_service.search_relevant_content(
-                intent_data,
-                user_input,
-                top_k=3,  # 最多返回 3 篇相關文章
-                context=context  # 傳遞 context 以便排除當前使用者
-            )
-
-            # 步驟 2.5: 如果是健康諮詢，取得完整案例詳情
-            case_details = None
-            if intent_data.get('intent') == 'health_consultation':
-                case_details = self._get_case_details(retrieved_data)
+            # 步驟 2: 根據意圖從向量資料庫檢索相關資料（健康諮詢另外取得完整案例詳情）
+            retrieved_data, case_details = self.retrieve(intent_data, user_input, context)
 
             # 步驟 3: 使用 OpenAI 生成最終回應
             response_result = self.openai_service.generate_response(
@@ -66,19 +63,8 @@ class IntentService:
                     'fallback': response_result.get('fallback', {})
                 }
 
-            response_data = response_result['data']
-
             # 整合所有資訊
-            return {
-                'success': True,
-                'response': response_data.get('response', ''),
-                'intent': intent_data.get('intent'),
-                'confidence': intent_data.get('confidence', 0.0),
-                'entities': intent_data.get('entities', {}),
-                'ui_controls': response_data.get('ui_controls', {}),
-                'additional_data': response_data.get('additional_data', {}),
-                'retrieved_data': retrieved_data
-            }
+            return self.build_result(intent_data, response_result['data'], retrieved_data)
 
         except Exception as e:
             print(f"Intent Service 處理失敗: {str(e)}")
@@ -90,6 +76,115 @@ class IntentService:
                 'additional_data': {}
             }
 
+    def analyze_intent(self, user_input, context=None):
+        """
+        分析意圖：先以本機分類器判斷，信心不足時才呼叫 OpenAI
+
+        Args:
+            user_input (str): 使用者輸入
+            context (dict): 對話上下文
+
+        Returns:
+            dict: 格式同 OpenAIService.analyze_intent
+        """
+        prediction = self.intent_classifier.predict(user_input)
+        if prediction is not None and prediction.accepted:
+            return {'success': True, 'data': self.intent_classifier.as_intent_data(prediction)}
+
+        intent_result = self.openai_service.analyze_intent(user_input, context)
+        self.intent_classifier.record_llm_result(prediction, intent_result)
+        return intent_result
+
+    async def analyze_intent_async(self, user_input, context=None, embedding_task=None):
+        """
+        analyze_intent 的非同步版本（本機分類在獨立執行緒執行，OpenAI 呼叫不佔用執行緒）
+
+        完全比對不需要查詢向量，先行判斷；沒有完全相同的範例時，LLM 意圖分析與
+        查詢向量的計算、k-NN 同時進行，本機判斷被採用時取消 LLM 請求。
+
+        Args:
+            user_input (str): 使用者輸入
+            context (dict): 對話上下文
+            embedding_task (Awaitable): 正在計算查詢向量的工作（完成後 k-NN 直接取用快取）
+
+        Returns:
+            dict: 格式同 OpenAIService.analyze_intent
+        """
+        classifier = self.intent_classifier
+        prediction = await sync_to_async(classifier.predict_exact, thread_sensitive=False)(user_input)
+
+        if prediction is None:
+            llm_task = asyncio.ensure_future(self.openai_service.analyze_intent_async(user_input, context))
+            try:
+                if embedding_task is not None:
+                    await embedding_task
+                prediction = await sync_to_async(classifier.predict_similar, thread_sensitive=False)(user_input)
+            except BaseException:
+                llm_task.cancel()
+                raise
+
+            if prediction is not None and prediction.accepted:
+                llm_task.cancel()
+                return {'success': True, 'data': classifier.as_intent_data(prediction)}
+            intent_result = await llm_task
+
+        elif prediction.accepted:
+            return {'success': True, 'data': classifier.as_intent_data(prediction)}
+
+        else:
+            intent_result = await self.openai_service.analyze_intent_async(user_input, context)
+
+        await sync_to_async(classifier.record_llm_result, thread_sensitive=False)(
+            prediction, intent_result
+        )
+        return intent_result
+
+    def retrieve(self, intent_data, user_input, context=None):
+        """
+        根據意圖從向量資料庫檢索相關資料
+
+        Args:
+            intent_data (dict): 意圖分析結果
+            user_input (str): 使用者輸入
+            context (dict): 對話上下文
+
+        Returns:
+            tuple: (檢索結果, 健康諮詢的完整案例詳情或 None)
+        """
+        retrieved_data = self.vector_service.search_relevant_content(
+            intent_data,
+            user_input,
+            top_k=3,  # 最多返回 3 篇相關文章
+            context=context  # 傳遞 context 以便排除當前使用者
+        )
+
+        # 如果是健康諮詢，取得完整案例詳情
+        case_details = None
+        if intent_data.get('intent') == 'health_consultation':
+            case_details = self._get_case_details(retrieved_data)
+
+        return retrieved_data, case_details
+
+    @staticmethod
+    def build_result(intent_data, response_data, retrieved_data):
+        """
+        整合意圖、生成的回應與檢索結果
+
+        Returns:
+            dict: 處理結果（格式同 process_user_input）
+        """
+        return {
+            'success': True,
+            'response': response_data.get('response', ''),
+            'intent': intent_data.get('intent'),
+            'confidence': intent_data.get('confidence', 0.0),
+            'entities': intent_data.get('entities', {}),
+            'intent_source': intent_data.get('source', 'openai'),
+            'ui_controls': response_data.get('ui_controls', {}),
+            'additional_data': response_data.get('additional_data', {}),
+            'retrieved_data': retrieved_data
+        }
+
     def _get_case_details(self, retrieved_data):
         """
         從檢索結果中取得完整案例詳情
@@ -1,22 +1,172 @@
 """
 OpenAI Service
 處理所有與 OpenAI API 的互動
+
+同步方法（analyze_intent / generate_response）供一般 view 使用；
+非同步方法（analyze_intent_async / stream_response）供 ASGI 串流端點使用，
+等待 API 回應時不佔用 worker 執行緒。
+settings.AI_AGENT_LLM_BACKEND = 'stub' 時改用本機 stub（見 stub_llm.py）。
+回應生成（同步與串流共用同一個快取鍵）經由 utils/llm_cache.py 快取，相同的 prompt 不重複呼叫 LLM。
 """
 
 import os
+import re
 import json
-from openai import OpenAI
+import asyncio
+import weakref
+from asgiref.sync import sync_to_async
+from openai import AsyncOpenAI, OpenAI
 from django.conf import settings
 
+from utils import llm_cache
+
+
+class ResponseFieldParser:
+    """
+    從串流中的 JSON 文字逐段取出 "response" 欄位的字串內容
+
+    回應生成使用 JSON 模式，"response" 欄位之外（ui_controls 等）的內容要等完整 JSON 收到後才解析。
+    """
+
+    VALUE_START = re.compile(r'"response"\s*:\s*"')
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = None      # 字串內容在 buffer 中目前的解析位置（None 表示尚未收到欄位開頭）
+        self.done = False
+
+    def feed(self, text):
+        """
+        加入新收到的 JSON 片段
+
+        Args:
+            text (str): JSON 片段
+
+        Returns:
+            str: 新解析出的回應文字（可能為空字串）
+        """
+        self.buffer += text
+        if self.done:
+            return ''
+        if self.pos is None:
+            match = self.VALUE_START.search(self.buffer)
+            if match is None:
+                return ''
+            self.pos = match.end()
+
+        output = []
+        buffer, pos = self.buffer, self.pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.done = True
+                break
+            if char != '\\':
+                output.append(char)
+                pos += 1
+                continue
+            # 跳脫字元：不完整時等下一個片段
+            if pos + 1 >= len(buffer):
+                break
+            if buffer[pos + 1] == 'u':
+                # \uXXXX（含 surrogate pair）
+                end = pos + 6
+                if end > len(buffer):
+                    break
+                if 0xD800 <= int(buffer[pos + 2:end], 16) <= 0xDBFF:
+                    end = pos + 12
+                    if end > len(buffer):
+                        break
+            else:
+                end = pos + 2
+            output.append(json.loads(f'"{buffer[pos:end]}"'))
+            pos = end
+        self.pos = pos
+        return ''.join(output)
+
+
+class ResponseStream:
+    """
+    串流回應
+
+    以 async for 逐段取得 "response" 欄位的文字；迭代結束後 result 為完整結果
+    （{'success': True, 'data': {...}} 或錯誤時的 fallback，格式同 generate_response）
+    """
+
+    def __init__(self, create_stream, on_error, cache_key=None):
+        self._create_stream = create_stream
+        self._on_error = on_error
+        self._cache_key = cache_key
+        self.result = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        parser = ResponseFieldParser()
+        try:
+            cached = None
+            if self._cache_key:
+                cached = await sync_to_async(llm_cache.get_cached, thread_sensitive=False)(self._cache_key)
+
+            if cached is not None:
+                # 快取命中：整段回應一次送出
+                text = parser.feed(cached)
+                if text:
+                    yield text
+            else:
+                if self._cache_key:
+                    await sync_to_async(llm_cache.record_miss, thread_sensitive=False)()
+                stream = await self._create_stream()
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    text = parser.feed(content)
+                    if text:
+                        yield text
+
+            self.result = {
+                'success': True,
+                'data': json.loads(parser.buffer)
+            }
+            if cached is None and self._cache_key:
+                await sync_to_async(llm_cache.store, thread_sensitive=False)(self._cache_key, parser.buffer)
+        except Exception as e:
+            self.result = self._on_error(e)
+
 
 class OpenAIService:
     """OpenAI API 服務封裝"""
 
     def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY') or getattr(settings, 'OPENAI_API_KEY', None)
-        )
+        self.backend = getattr(settings, 'AI_AGENT_LLM_BACKEND', 'openai')
+        if self.backend == 'stub':
+            from .stub_llm import StubLLMClient
+            self.client = StubLLMClient()
+        else:
+            self.client = OpenAI(api_key=self._api_key())
         self.model = getattr(settings, 'OPENAI_MODEL', 'gpt-4o-mini')
+        # 非同步客戶端的連線池綁定 event loop，每個 loop 各自建立
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _api_key():
+        return os.getenv('OPENAI_API_KEY') or getattr(settings, 'OPENAI_API_KEY', None)
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            if self.backend == 'stub':
+                from .stub_llm import AsyncStubLLMClient
+                client = AsyncStubLLMClient()
+            else:
+                client = AsyncOpenAI(api_key=self._api_key())
+            self._async_clients[loop] = client
+        return client
 
     def analyze_intent(self, user_input, context=None):
         """
@@ -29,6 +179,66 @@ class OpenAIService:
         Returns:
             dict: 意圖分析結果
         """
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._intent_messages(user_input, context),
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+
+            result = json.loads(response.choices[0].message.content)
+            return {
+                'success': True,
+                'data': result
+            }
+
+        except Exception as e:
+            return self._intent_error(e)
+
+    async def analyze_intent_async(self, user_input, context=None):
+        """
+        分析使用者意圖（非同步版本，等待 API 回應時不佔用執行緒）
+
+        Args:
+            user_input (str): 使用者輸入
+            context (dict): 對話上下文
+
+        Returns:
+            dict: 意圖分析結果（格式同 analyze_intent）
+        """
+        try:
+            response = await self._get_async_client().chat.completions.create(
+                model=self.model,
+                messages=self._intent_messages(user_input, context),
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+
+            result = json.loads(response.choices[0].message.content)
+            return {
+                'success': True,
+                'data': result
+            }
+
+        except Exception as e:
+            return self._intent_error(e)
+
+    @staticmethod
+    def _intent_error(e):
+        print(f"OpenAI 意圖分析錯誤: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'fallback': {
+                'intent': 'general',
+                'confidence': 0.0,
+                'entities': {}
+            }
+        }
+
+    def _intent_messages(self, user_input, context=None):
+        """組成意圖分析的對話訊息"""
         system_prompt = """你是一個寵物社交平台的 AI 助理，專門分析使用者意圖。
 
 請分析使用者的輸入，並返回以下 JSON 格式：
@@ -144,38 +354,42 @@ class OpenAIService:
             if additional_context:
                 user_message += f"\n\n對話歷史：{json.dumps(additional_context, ensure_ascii=False)}"
 
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+
+    def generate_response(self, intent_data, retrieved_data, user_input, case_details=None):
+        """
+        生成最終回應
+
+        Args:
+            intent_data (dict): 意圖分析結果
+            retrieved_data (dict): 從向量資料庫取得的資料
+            user_input (str): 原始使用者輸入
+            case_details (list): 案例詳細內容（用於健康諮詢）
+
+        Returns:
+            dict: 格式化的回應
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
+            # 相同的 prompt（相同意圖、檢索結果與使用者資訊）直接使用快取的回應
+            result = llm_cache.chat_completion(
+                self.client,
+                parse=json.loads,
+                **self._response_params(intent_data, retrieved_data, user_input, case_details)
             )
-
-            result = json.loads(response.choices[0].message.content)
             return {
                 'success': True,
                 'data': result
             }
 
         except Exception as e:
-            print(f"OpenAI 意圖分析錯誤: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'fallback': {
-                    'intent': 'general',
-                    'confidence': 0.0,
-                    'entities': {}
-                }
-            }
+            return self._response_error(e)
 
-    def generate_response(self, intent_data, retrieved_data, user_input, case_details=None):
+    def stream_response(self, intent_data, retrieved_data, user_input, case_details=None):
         """
-        生成最終回應
+        以串流方式生成最終回應
 
         Args:
             intent_data (dict): 意圖分析結果
@@ -184,8 +398,39 @@ class OpenAIService:
             case_details (list): 案例詳細內容（用於健康諮詢）
 
         Returns:
-            dict: 格式化的回應
+            ResponseStream: 以 async for 逐段取得回應文字，結束後 .result 為完整結果（格式同 generate_response）
         """
+        params = self._response_params(intent_data, retrieved_data, user_input, case_details)
+        return ResponseStream(
+            lambda: self._get_async_client().chat.completions.create(stream=True, **params),
+            on_error=self._response_error,
+            cache_key=llm_cache.make_key(params)
+        )
+
+    def _response_params(self, intent_data, retrieved_data, user_input, case_details=None):
+        """回應生成的請求參數（同步與串流共用，快取鍵也相同）"""
+        return {
+            'model': self.model,
+            'messages': self._response_messages(intent_data, retrieved_data, user_input, case_details),
+            'temperature': 0.7,
+            'response_format': {"type": "json_object"},
+        }
+
+    @staticmethod
+    def _response_error(e):
+        print(f"OpenAI 回應生成錯誤: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e),
+            'fallback': {
+                'response': '抱歉，我暫時無法處理您的請求。請稍後再試。',
+                'ui_controls': {},
+                'additional_data': {}
+            }
+        }
+
+    def _response_messages(self, intent_data, retrieved_data, user_input, case_details=None):
+        """組成回應生成的對話訊息"""
         # 判斷意圖類型
         intent = intent_data.get('intent')
         is_health_consultation = intent == 'health_consultation'
@@ -408,34 +653,10 @@ class OpenAIService:
 
 請生成適當的回應。"""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-
-            result = json.loads(response.choices[0].message.content)
-            return {
-                'success': True,
-                'data': result
-            }
-
-        except Exception as e:
-            print(f"OpenAI 回應生成錯誤: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'fallback': {
-                    'response': '抱歉，我暫時無法處理您的請求。請稍後再試。',
-                    'ui_controls': {},
-                    'additional_data': {}
-                }
-            }
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
 
     def _format_case_details(self, case_details):
         """
@@ -98,13 +98,19 @@ class ResponseService:
     def _get_social_post_details(post_ids):
         """獲取社交貼文詳細資料"""
         try:
-            # PostFrame 是容器，需要取得其內容
-            post_frames = SocialPost.objects.filter(id__in=post_ids).select_related('user').prefetch_related('contents')
+            # PostFrame 是容器，內容、作者與頭像以批次查詢一次載入
+            from social.prefetch import PostPrefetch
+            prefetch = PostPrefetch(post_ids)
 
             result = []
-            for post_frame in post_frames:
+            # 保持向量搜尋的相似度順序
+            for post_id in post_ids:
+                post_frame = prefetch.post_frames.get(post_id)
+                if post_frame is None:
+                    continue
+
                 # 取得第一個內容
-                content_obj = post_frame.contents.first()
+                content_obj = prefetch.contents.get(post_id)
                 content_text = content_obj.content_text if content_obj else ''
                 location = content_obj.location if content_obj else None
 
@@ -113,7 +119,7 @@ class ResponseService:
                     'author': {
                         'username': post_frame.user.user_account,
                         'fullname': post_frame.user.user_fullname,
-                        'avatar': getattr(post_frame.user, 'headshot_url', None)
+                        'avatar': prefetch.get_user_info(post_id)['headshot_url']
                     },
                     'content': content_text[:200] + '...' if len(content_text) > 200 else content_text,
                     'location': location,
@@ -2,10 +2,48 @@
 Singleton Service Manager
 確保所有 AI 服務在後端啟動時載入一次，之後所有請求共用同一個實例
 並在每次 API 請求時檢查向量資料庫是否過期（超過 24 小時）
+
+向量子系統（BERT 推薦服務 + 各向量資料庫）在每個程序中只有一份：
+signals、views 與 IntentService 都透過這裡取得同一個實例
 """
 
+import threading
+
 # 全局單例實例
 _intent_service_instance = None
+_vector_service_instance = None
+_lock = threading.RLock()
+
+
+def get_recommendation_service():
+    """
+    取得程序內共用的 RecommendationService（與 social app 共用同一份 BERT 模型）
+
+    Returns:
+        RecommendationService: 全局共用的推薦服務
+    """
+    from django.apps import apps
+    return apps.get_app_config('social').load_recommendation_service()
+
+
+def get_vector_service():
+    """
+    取得程序內共用的 VectorService 單例
+
+    Returns:
+        VectorService: 全局共用的向量資料庫服務
+    """
+    global _vector_service_instance
+
+    if _vector_service_instance is None:
+        with _lock:
+            if _vector_service_instance is None:
+                from .vector_service import VectorService
+                print("🚀 初始化 VectorService 單例...")
+                _vector_service_instance = VectorService(get_recommendation_service())
+                print("✅ VectorService 單例初始化完成")
+
+    return _vector_service_instance
 
 
 def get_intent_service():
@@ -19,10 +57,12 @@ def get_intent_service():
     global _intent_service_instance
 
     if _intent_service_instance is None:
-        from .intent_service import IntentService
-        print("🚀 初始化 IntentService 單例...")
-        _intent_service_instance = IntentService()
-        print("✅ IntentService 單例初始化完成")
+        with _lock:
+            if _intent_service_instance is None:
+                from .intent_service import IntentService
+                print("🚀 初始化 IntentService 單例...")
+                _intent_service_instance = IntentService()
+                print("✅ IntentService 單例初始化完成")
     else:
         # 檢查並刷新過期的向量資料庫
         _check_and_refresh_vector_databases()
@@ -63,6 +103,7 @@ def reset_services():
     """
     重置所有服務實例（用於測試或重新載入）
     """
-    global _intent_service_instance
+    global _intent_service_instance, _vector_service_instance
     _intent_service_instance = None
+    _vector_service_instance = None
     print("🔄 服務實例已重置")
\ No newline at end of file
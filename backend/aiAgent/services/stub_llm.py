@@ -0,0 +1,129 @@
+"""
+Stub LLM
+本機測試用的 LLM 客戶端，不需要 OpenAI API 金鑰或網路
+
+提供 OpenAIService 用到的 chat.completions.create() 介面（同步與非同步版本，支援 stream=True），
+以關鍵字判斷意圖、以固定格式產生回應，結果可預期，適合測試聊天流程與串流端點。
+
+使用方式：settings.AI_AGENT_LLM_BACKEND = 'stub'（或環境變數 AI_AGENT_LLM_BACKEND=stub）
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from django.conf import settings
+
+
+# 意圖關鍵字（依序比對，第一個命中的意圖）
+INTENT_KEYWORDS = [
+    ('health_consultation', 'symptom_similar', ['咳嗽', '嘔吐', '發燒', '拉肚子', '食慾不振', '症狀', '生病']),
+    ('feeding', 'nutrition', ['飼料', '營養', '吃什麼']),
+    ('user_recommendation', 'by_pet', ['推薦', '朋友', '飼主', '用戶']),
+    ('tutorial', 'createPost', ['如何', '怎麼', '教學']),
+    ('operation', 'findHealthRecords', ['幫我找', '提醒', '記錄']),
+]
+
+# 串流時每個片段的字元數
+STREAM_CHUNK_CHARS = 8
+
+
+def _stub_intent(user_input):
+    for intent, sub_type, keywords in INTENT_KEYWORDS:
+        matched = [keyword for keyword in keywords if keyword in user_input]
+        if matched:
+            entities = {'symptoms': matched} if intent == 'health_consultation' else {}
+            return {
+                'intent': intent,
+                'sub_type': sub_type,
+                'confidence': 0.9,
+                'entities': entities,
+                'reason': f"stub：命中關鍵字 {matched[0]}"
+            }
+    return {'intent': 'general', 'sub_type': None, 'confidence': 0.5, 'entities': {}, 'reason': 'stub：無關鍵字'}
+
+
+def _stub_response(messages):
+    """依請求內容產生回應的 JSON 文字"""
+    system_prompt = messages[0]['content']
+    user_message = messages[-1]['content']
+
+    # 意圖分析請求
+    if '專門分析使用者意圖' in system_prompt:
+        user_input = user_message.split('\n', 1)[0].replace('使用者輸入：', '', 1)
+        return json.dumps(_stub_intent(user_input), ensure_ascii=False)
+
+    # 回應生成請求
+    first_line = user_message.split('\n', 1)[0]
+    return json.dumps({
+        'response': f"這是測試用的回應。{first_line}\n請依實際情況諮詢專業意見。",
+        'ui_controls': {
+            'hasTutorial': False,
+            'tutorialType': None,
+            'hasRecommendedUsers': False,
+            'hasRecommendedArticles': False,
+            'hasCalculator': False,
+            'hasOperation': False,
+            'operationType': None
+        },
+        'additional_data': {
+            'recommended_user_ids': [],
+            'recommended_article_ids': [],
+            'operation_params': {}
+        }
+    }, ensure_ascii=False)
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def _split(content):
+    return [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+
+
+def _latency():
+    """每次呼叫 / 每個串流片段模擬的延遲（秒）"""
+    return getattr(settings, 'AI_AGENT_STUB_LLM_LATENCY', 0.0)
+
+
+class _Completions:
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        time.sleep(_latency())
+        content = _stub_response(messages)
+        if stream:
+            return iter([_chunk(piece) for piece in _split(content)])
+        return _completion(content)
+
+
+class _AsyncCompletions:
+    async def create(self, model=None, messages=None, stream=False, **kwargs):
+        await asyncio.sleep(_latency())
+        content = _stub_response(messages)
+        if stream:
+            return self._stream(content)
+        return _completion(content)
+
+    @staticmethod
+    async def _stream(content):
+        for piece in _split(content):
+            await asyncio.sleep(_latency())
+            yield _chunk(piece)
+
+
+class StubLLMClient:
+    """同步 stub 客戶端（介面同 openai.OpenAI）"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_Completions())
+
+
+class AsyncStubLLMClient:
+    """非同步 stub 客戶端（介面同 openai.AsyncOpenAI）"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions())
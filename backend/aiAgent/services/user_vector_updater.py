@@ -3,7 +3,7 @@ User Vector Updater
 用戶向量資料庫更新服務（單例模式）
 """
 
-from .singleton import get_intent_service
+from .singleton import get_vector_service
 
 
 class UserVectorUpdater:
@@ -21,13 +21,10 @@ class UserVectorUpdater:
         if self._initialized:
             return
         self._initialized = True
-        self._intent_service = None
 
     def get_user_db(self):
         """獲取用戶向量資料庫實例"""
-        if self._intent_service is None:
-            self._intent_service = get_intent_service()
-        return self._intent_service.vector_service.user_db
+        return get_vector_service().user_db
 
     def update_user_vector(self, user):
         """
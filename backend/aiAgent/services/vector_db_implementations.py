@@ -17,15 +17,8 @@ class UserVectorDB(BaseVectorDBManager):
 
     def _ensure_vector_files_exist(self):
         """確保向量檔案存在，如果不存在則初始化"""
-        import os
-        from django.conf import settings
-
-        base_dir = settings.BASE_DIR
-        emb_path = os.path.join(base_dir, 'user_embs.npy')
-        ids_path = os.path.join(base_dir, 'user_ids.npy')
-
         # 如果檔案不存在，從資料庫初始化
-        if not os.path.exists(emb_path) or not os.path.exists(ids_path):
+        if not self.store.exists():
             print("🔨 用戶向量檔案不存在，正在從資料庫建立...")
             self.initialize_from_db()
         else:
@@ -39,20 +32,9 @@ class UserVectorDB(BaseVectorDBManager):
 
         users = CustomUser.objects.filter(
             account_privacy='public'  # 只索引公開帳號
-        ).select_related()
+        ).prefetch_related('pets')
 
-        data_array = []
-        for user in users:
-            text = self.get_text_for_embedding(user)
-            data_array.append({
-                'id': user.id,
-                'text': text,
-                'metadata': {
-                    'username': user.user_account,
-                    'fullname': user.user_fullname,
-                    'privacy': user.account_privacy
-                }
-            })
+        data_array = [self._build_item(user) for user in users]
 
         if data_array:
             self.build_index(data_array)
@@ -84,6 +66,18 @@ class UserVectorDB(BaseVectorDBManager):
 
         return ' '.join(text_parts)
 
+    def _build_item(self, user):
+        """組合單一用戶的索引資料（id、text、metadata）"""
+        return {
+            'id': user.id,
+            'text': self.get_text_for_embedding(user),
+            'metadata': {
+                'username': user.user_account,
+                'fullname': user.user_fullname,
+                'privacy': user.account_privacy
+            }
+        }
+
     def add_user(self, user):
         """
         添加或更新用戶向量
@@ -95,25 +89,31 @@ class UserVectorDB(BaseVectorDBManager):
         if user.account_privacy != 'public':
             print(f"⚠️ 用戶 {user.user_account} 不是公開帳戶，跳過向量添加")
             # 如果之前是公開的，現在改為私人，需要刪除
-            if user.id in self.ids:
+            if self.contains(user.id):
                 self.delete_item(user.id)
             return
 
-        text = self.get_text_for_embedding(user)
-        metadata = {
-            'username': user.user_account,
-            'fullname': user.user_fullname,
-            'privacy': user.account_privacy
-        }
+        item = self._build_item(user)
 
         # 如果用戶已存在，先刪除舊的
-        if user.id in self.ids:
+        if user.id in self.index:
             self.delete_item(user.id)
 
         # 添加新的向量
-        self.add_item(user.id, text, metadata)
+        self.add_item(item['id'], item['text'], item['metadata'])
         print(f"✅ 已更新用戶向量: {user.user_account} (ID={user.id})")
 
+    def add_users(self, users):
+        """
+        批次添加或更新用戶向量（非公開帳戶會被移除）
+
+        Args:
+            users: CustomUser 實例列表（建議先 prefetch_related('pets')）
+        """
+        users = list(users)
+        self.delete_items([user.id for user in users if user.account_privacy != 'public'])
+        self.add_items([self._build_item(user) for user in users if user.account_privacy == 'public'])
+
     def remove_user(self, user_id):
         """
         移除用戶向量
@@ -197,7 +197,7 @@ class FeedVectorDB(BaseVectorDBManager):
 
     def _ensure_vector_files_exist(self):
         """確保向量檔案存在，如果不存在則初始化"""
-        if not os.path.exists(self.emb_path):
+        if not self.store.exists():
             print("🔨 飼料向量檔案不存在，正在從資料庫建立...")
             self.initialize_from_db()
         else:
@@ -213,22 +213,7 @@ class FeedVectorDB(BaseVectorDBManager):
             # 查詢所有飼料（包含未驗證的）
             feeds = Feed.objects.all()
 
-            data_array = []
-            for feed in feeds:
-                text = self.get_text_for_embedding(feed)
-                data_array.append({
-                    'id': feed.id,
-                    'text': text,
-                    'metadata': {
-                        'name': feed.name,
-                        'brand': feed.brand,
-                        'pet_type': feed.get_pet_type_display(),
-                        'protein': feed.protein,
-                        'fat': feed.fat,
-                        'price': float(feed.price) if feed.price else 0,
-                        'is_verified': feed.is_verified,  # 加入驗證狀態
-                    }
-                })
+            data_array = [self._build_item(feed) for feed in feeds]
 
             if data_array:
                 self.build_index(data_array)
@@ -276,23 +261,34 @@ class FeedVectorDB(BaseVectorDBManager):
 
         return ' '.join(text_parts)
 
+    def _build_item(self, feed):
+        """組合單一飼料的索引資料（id、text、metadata）"""
+        return {
+            'id': feed.id,
+            'text': self.get_text_for_embedding(feed),
+            'metadata': {
+                'name': feed.name,
+                'brand': feed.brand,
+                'pet_type': feed.get_pet_type_display(),
+                'protein': feed.protein,
+                'fat': feed.fat,
+                'price': float(feed.price) if feed.price else 0,
+                'is_verified': feed.is_verified,  # 加入驗證狀態
+            }
+        }
+
     def add_feed(self, feed):
         """添加或更新飼料向量（包含所有飼料，不限制驗證狀態）"""
-        text = self.get_text_for_embedding(feed)
-        metadata = {
-            'name': feed.name,
-            'brand': feed.brand,
-            'pet_type': feed.get_pet_type_display(),
-            'protein': feed.protein,
-            'fat': feed.fat,
-            'price': float(feed.price) if feed.price else 0,
-            'is_verified': feed.is_verified,  # 加入驗證狀態
-        }
+        item = self._build_item(feed)
 
         # 如果已存在，先刪除舊的再添加新的
-        if feed.id in self.ids:
+        if feed.id in self.index:
             self.delete_item(feed.id)
-        self.add_item(feed.id, text, metadata)
+        self.add_item(item['id'], item['text'], item['metadata'])
+
+    def add_feeds(self, feeds):
+        """批次添加或更新飼料向量"""
+        self.add_items([self._build_item(feed) for feed in feeds])
 
     def remove_feed(self, feed_id):
         """移除飼料向量"""
@@ -308,7 +304,7 @@ class SystemOperationVectorDB(BaseVectorDBManager):
 
     def _ensure_vector_files_exist(self):
         """確保向量檔案存在，如果不存在則初始化"""
-        if not os.path.exists(self.emb_path):
+        if not self.store.exists():
             print("🔨 系統操作向量檔案不存在，正在從 JSON 建立...")
             self.initialize_from_db()
         else:
@@ -388,7 +384,7 @@ class SystemFAQVectorDB(BaseVectorDBManager):
 
     def _ensure_vector_files_exist(self):
         """確保向量檔案存在，如果不存在則初始化"""
-        if not os.path.exists(self.emb_path):
+        if not self.store.exists():
             print("🔨 系統 FAQ 向量檔案不存在，正在從 JSON 建立...")
             self.initialize_from_db()
         else:
@@ -473,16 +469,8 @@ class DiseaseArchiveVectorDB(BaseVectorDBManager):
 
     def _ensure_vector_files_exist(self):
         """確保向量檔案存在，如果不存在則初始化"""
-        import os
-        from django.conf import settings
-
-        base_dir = settings.BASE_DIR
-        emb_path = os.path.join(base_dir, 'disease_archive_embs.npy')
-        ids_path = os.path.join(base_dir, 'disease_archive_ids.npy')
-        metadata_path = os.path.join(base_dir, 'disease_archive_metadata.npy')
-
         # 如果檔案不存在，從資料庫初始化
-        if not os.path.exists(emb_path) or not os.path.exists(ids_path) or not os.path.exists(metadata_path):
+        if not self.store.exists():
             print("🔨 疾病檔案向量檔案不存在，正在從資料庫建立...")
             self.initialize_from_db()
         else:
@@ -511,55 +499,7 @@ class DiseaseArchiveVectorDB(BaseVectorDBManager):
 
         print(f"📊 找到 {archives.count()} 筆公開的疾病檔案")
 
-        data_array = []
-        for archive in archives:
-            # 獲取寵物資訊
-            pet = archive.pet
-            owner = pet.owner if pet else None
-
-            # 構建用於向量化的文字
-            text = self.get_text_for_embedding(archive)
-
-            # 收集疾病和症狀資訊
-            illness_names = []
-            try:
-                illnesses = archive.illnesses.all()
-                illness_names = [rel.illness.illness_name for rel in illnesses]
-            except:
-                pass
-
-            symptom_names = []
-            try:
-                abnormal_posts = archive.abnormal_posts.all()
-                symptoms_set = set()
-                for rel in abnormal_posts:
-                    post = rel.post
-                    post_symptoms = post.symptoms.all()
-                    for symptom_rel in post_symptoms:
-                        symptoms_set.add(symptom_rel.symptom.symptom_name)
-                symptom_names = list(symptoms_set)
-            except:
-                pass
-
-            data_array.append({
-                'id': archive.postFrame.id,  # 使用 PostFrame ID 作為主鍵
-                'text': text,
-                'metadata': {
-                    'archive_id': archive.id,  # 疾病檔案 ID
-                    'post_frame_id': archive.postFrame.id,  # PostFrame ID
-                    'pet_id': pet.id if pet else None,
-                    'pet_name': pet.pet_name if pet else '',
-                    'pet_type': pet.pet_type if pet else '',
-                    'pet_breed': pet.breed if pet else '',
-                    'owner_id': owner.id if owner else None,
-                    'owner_account': owner.user_account if owner else '',
-                    'owner_fullname': owner.user_fullname if owner else '',
-                    'illnesses': ', '.join(illness_names),  # 疾病列表
-                    'symptoms': ', '.join(symptom_names),  # 症狀列表
-                    'health_status': archive.health_status or '',
-                    'created_at': archive.postFrame.created_at.isoformat() if archive.postFrame.created_at else ''
-                }
-            })
+        data_array = [self._build_item(archive) for archive in archives]
 
         if data_array:
             print(f"📦 找到 {len(data_array)} 筆疾病檔案資料")
@@ -687,6 +627,56 @@ class DiseaseArchiveVectorDB(BaseVectorDBManager):
         # 沒有過濾條件，直接返回前 top_k 個結果
         return results[:top_k]
 
+    def _build_item(self, archive):
+        """組合單一疾病檔案的索引資料（以 PostFrame ID 為主鍵）"""
+        # 獲取寵物資訊
+        pet = archive.pet
+        owner = pet.owner if pet else None
+
+        # 構建用於向量化的文字
+        text = self.get_text_for_embedding(archive)
+
+        # 收集疾病和症狀資訊
+        illness_names = []
+        try:
+            illnesses = archive.illnesses.all()
+            illness_names = [rel.illness.illness_name for rel in illnesses]
+        except:
+            pass
+
+        symptom_names = []
+        try:
+            abnormal_posts = archive.abnormal_posts.all()
+            symptoms_set = set()
+            for rel in abnormal_posts:
+                post = rel.post
+                post_symptoms = post.symptoms.all()
+                for symptom_rel in post_symptoms:
+                    symptoms_set.add(symptom_rel.symptom.symptom_name)
+            symptom_names = list(symptoms_set)
+        except:
+            pass
+
+        return {
+            'id': archive.postFrame.id,  # 使用 PostFrame ID 作為主鍵
+            'text': text,
+            'metadata': {
+                'archive_id': archive.id,  # 疾病檔案 ID
+                'post_frame_id': archive.postFrame.id,  # PostFrame ID
+                'pet_id': pet.id if pet else None,
+                'pet_name': pet.pet_name if pet else '',
+                'pet_type': pet.pet_type if pet else '',
+                'pet_breed': pet.breed if pet else '',
+                'owner_id': owner.id if owner else None,
+                'owner_account': owner.user_account if owner else '',
+                'owner_fullname': owner.user_fullname if owner else '',
+                'illnesses': ', '.join(illness_names),  # 疾病列表
+                'symptoms': ', '.join(symptom_names),  # 症狀列表
+                'health_status': archive.health_status or '',
+                'created_at': archive.postFrame.created_at.isoformat() if archive.postFrame.created_at else ''
+            }
+        }
+
     def add_or_update_archive(self, archive):
         """
         添加或更新疾病檔案到向量資料庫
@@ -701,65 +691,34 @@ class DiseaseArchiveVectorDB(BaseVectorDBManager):
                 return
 
             post_frame_id = archive.postFrame.id
-            pet = archive.pet
-            owner = pet.owner if pet else None
 
             # 如果已存在，先刪除舊的
-            if post_frame_id in self.ids:
+            if post_frame_id in self.index:
                 self.delete_item(post_frame_id)
                 print(f"🔄 更新疾病檔案向量: PostFrame ID={post_frame_id}")
             else:
                 print(f"➕ 添加疾病檔案向量: PostFrame ID={post_frame_id}")
 
-            # 構建文字
-            text = self.get_text_for_embedding(archive)
-
-            # 收集疾病和症狀資訊
-            illness_names = []
-            try:
-                illnesses = archive.illnesses.all()
-                illness_names = [rel.illness.illness_name for rel in illnesses]
-            except:
-                pass
-
-            symptom_names = []
-            try:
-                abnormal_posts = archive.abnormal_posts.all()
-                symptoms_set = set()
-                for rel in abnormal_posts:
-                    post = rel.post
-                    post_symptoms = post.symptoms.all()
-                    for symptom_rel in post_symptoms:
-                        symptoms_set.add(symptom_rel.symptom.symptom_name)
-                symptom_names = list(symptoms_set)
-            except:
-                pass
-
-            # 構建 metadata
-            metadata = {
-                'archive_id': archive.id,
-                'post_frame_id': post_frame_id,
-                'pet_id': pet.id if pet else None,
-                'pet_name': pet.pet_name if pet else '',
-                'pet_type': pet.pet_type if pet else '',
-                'pet_breed': pet.breed if pet else '',
-                'owner_id': owner.id if owner else None,
-                'owner_account': owner.user_account if owner else '',
-                'owner_fullname': owner.user_fullname if owner else '',
-                'illnesses': ', '.join(illness_names),
-                'symptoms': ', '.join(symptom_names),
-                'health_status': archive.health_status or '',
-                'created_at': archive.postFrame.created_at.isoformat() if archive.postFrame.created_at else ''
-            }
-
             # 添加新的向量
-            self.add_item(post_frame_id, text, metadata)
+            item = self._build_item(archive)
+            self.add_item(item['id'], item['text'], item['metadata'])
 
         except Exception as e:
             print(f"❌ 更新疾病檔案向量失敗: {str(e)}")
             import traceback
             traceback.print_exc()
 
+    def sync_archives(self, archives):
+        """
+        批次同步疾病檔案：公開的加入或更新，私人的移除
+
+        Args:
+            archives: DiseaseArchiveContent 實例列表（建議先預載寵物、疾病與症狀）
+        """
+        archives = [archive for archive in archives if archive.postFrame_id]
+        self.delete_items([archive.postFrame_id for archive in archives if archive.is_private])
+        self.add_items([self._build_item(archive) for archive in archives if not archive.is_private])
+
     def remove_archive(self, archive):
         """
         從向量資料庫刪除疾病檔案
@@ -780,7 +739,7 @@ class DiseaseArchiveVectorDB(BaseVectorDBManager):
                 post_frame_id = archive
 
             # 刪除向量（如果存在）
-            if post_frame_id in self.ids:
+            if self.contains(post_frame_id):
                 self.delete_item(post_frame_id)
                 print(f"🗑️ 已刪除疾病檔案向量: PostFrame ID={post_frame_id}")
             # 如果不存在也不需要警告，因為可能本來就是私人檔案
@@ -4,12 +4,16 @@ Vector Database Manager
 """
 
 import os
+import copy
+import hashlib
+import threading
 import numpy as np
-import faiss
-import torch
 from datetime import datetime, timedelta
 from django.conf import settings
 from abc import ABC, abstractmethod
+from utils.vector_index import VectorIndex
+from utils.vector_store import SegmentedVectorStore
+from utils.ttl_cache import TTLCache
 
 
 class BaseVectorDBManager(ABC):
@@ -18,6 +22,13 @@ class BaseVectorDBManager(ABC):
     # 過期時間：禁用自動過期（改用增量更新）
     EXPIRY_HOURS = None  # 設為 None 表示不自動過期
 
+    # 向量維度（BERT 768 維）
+    EMBEDDING_DIM = 768
+
+    # 搜尋結果快取（以索引版本失效，TTL 僅作為保險）
+    SEARCH_CACHE_SIZE = 512
+    SEARCH_CACHE_TTL = 3600
+
     def __init__(self, db_name, embedding_service, enable_expiry=False):
         """
         初始化向量資料庫管理器
@@ -32,11 +43,28 @@ class BaseVectorDBManager(ABC):
         self.base_dir = settings.BASE_DIR
         self.enable_expiry = enable_expiry
 
-        # 定義檔案路徑
+        # 舊版 .npy 檔案路徑（僅用於一次性遷移）
         self.emb_path = os.path.join(self.base_dir, f'{db_name}_embs.npy')
         self.ids_path = os.path.join(self.base_dir, f'{db_name}_ids.npy')
         self.metadata_path = os.path.join(self.base_dir, f'{db_name}_metadata.npy')
 
+        # Append-only 向量儲存（WAL + segment）
+        self.store = SegmentedVectorStore(
+            os.path.join(self.base_dir, 'vector_store', db_name),
+            self.EMBEDDING_DIM
+        )
+
+        # 常駐 FAISS 索引（以項目 ID 為鍵，增量更新）
+        self.index = VectorIndex(self.EMBEDDING_DIM)
+        self.metadata = {}  # 項目 ID -> metadata
+
+        # 常駐索引已同步到的儲存位置（背景索引 worker 等其他程序的寫入，查詢前補上）
+        self._store_position = None
+        self._refresh_lock = threading.Lock()
+
+        # 搜尋結果快取：鍵包含索引版本，新增 / 刪除後舊的結果自然不再命中
+        self._search_cache = TTLCache(self.SEARCH_CACHE_SIZE, self.SEARCH_CACHE_TTL)
+
         # 載入或初始化資料庫
         self.load_or_initialize()
 
@@ -51,11 +79,11 @@ class BaseVectorDBManager(ABC):
         if not self.enable_expiry or self.EXPIRY_HOURS is None:
             return False
 
-        if not os.path.exists(self.emb_path):
+        file_mtime = self.store.last_modified()
+        if file_mtime is None:
             return True
 
         # 取得檔案最後修改時間
-        file_mtime = os.path.getmtime(self.emb_path)
         file_datetime = datetime.fromtimestamp(file_mtime)
         now = datetime.now()
 
@@ -73,49 +101,114 @@ class BaseVectorDBManager(ABC):
         """
         if self.is_expired():
             print(f"🔄 開始重新初始化 {self.db_name}...")
-            self.embeddings = np.array([]).reshape(0, 768)
-            self.ids = np.array([])
-            self.metadata = np.array([])
+            self.reset()
             self.initialize_from_db()
             print(f"✅ {self.db_name} 重新初始化完成")
 
+    @property
+    def version(self):
+        """索引版本（每次新增 / 刪除 / 重建都會遞增）"""
+        self.refresh()
+        return self.index.version
+
+    @property
+    def ids(self):
+        """目前索引中的所有項目 ID"""
+        self.refresh()
+        return np.array(self.index.ids(), dtype=np.int64)
+
+    def contains(self, item_id):
+        """
+        項目是否在資料庫中（先同步其他程序的寫入）
+
+        Args:
+            item_id (int): 項目 ID
+
+        Returns:
+            bool: 是否存在
+        """
+        self.refresh()
+        return item_id in self.index
+
+    def reset(self):
+        """清空記憶體中的索引與 metadata（重建前使用）"""
+        self.index.reset()
+        self.metadata = {}
+        # 之後沒有重建時，下次同步從向量儲存重新載入
+        self._store_position = None
+
+    def _load_store(self):
+        """從向量儲存載入常駐索引與 metadata（segment 以 mmap 映射，WAL 重播至增量層）"""
+        segments, delta, metadata, position = self.store.load_versioned()
+        self.index.reset_segments(segments, *delta)
+        self.metadata = metadata
+        self._store_position = position
+
+    def refresh(self):
+        """
+        同步其他程序寫入向量儲存的變更
+
+        背景索引工作只會更新執行它的程序的常駐索引；其他程序在查詢前以此補上：
+        WAL 只有新增紀錄時重播新的部分，封存 / compaction / 重建後重新載入。
+        本程序自己的寫入也會被重播一次（新增為覆蓋、刪除為移除，結果相同）。
+        """
+        with self._refresh_lock:
+            position, changes = self.store.read_changes(self._store_position)
+            if changes is None:
+                self._load_store()
+                return
+            for item_id, embedding, meta in changes:
+                if embedding is not None and meta:
+                    self.metadata[item_id] = meta
+                else:
+                    self.metadata.pop(item_id, None)
+            if changes:
+                self.index.apply_changes(changes)
+            self._store_position = position
+
     def load_or_initialize(self):
         """載入現有資料庫或初始化新的"""
-        if os.path.exists(self.emb_path) and os.path.exists(self.ids_path):
+        if not self.store.exists() and os.path.exists(self.emb_path) and os.path.exists(self.ids_path):
+            self._migrate_legacy_files()
+
+        if self.store.exists():
             # 檢查是否過期（如果啟用）
             if self.is_expired():
                 print(f"⚠️ 向量資料庫 {self.db_name} 已過期，準備重新初始化...")
-                self.embeddings = np.array([]).reshape(0, 768)  # BERT 768 維
-                self.ids = np.array([])
-                self.metadata = np.array([])
+                self.reset()
                 self.initialize_from_db()
             else:
-                # 載入現有資料
-                self.embeddings = np.load(self.emb_path)
-                self.ids = np.load(self.ids_path)
-
-                # 嘗試載入 metadata
-                if os.path.exists(self.metadata_path):
-                    self.metadata = np.load(self.metadata_path, allow_pickle=True)
-                else:
-                    self.metadata = np.array([])
+                # 載入現有資料（segment 以 mmap 映射，WAL 重播至增量層）
+                self._load_store()
 
                 # 顯示載入資訊
                 if self.enable_expiry and self.EXPIRY_HOURS:
-                    file_mtime = os.path.getmtime(self.emb_path)
-                    file_datetime = datetime.fromtimestamp(file_mtime)
+                    file_datetime = datetime.fromtimestamp(self.store.last_modified())
                     age_hours = (datetime.now() - file_datetime).total_seconds() / 3600
                     remaining_hours = self.EXPIRY_HOURS - age_hours
-                    print(f"✅ 載入向量資料庫 {self.db_name}: {len(self.ids)} 筆資料（剩餘 {remaining_hours:.1f} 小時有效）")
+                    print(f"✅ 載入向量資料庫 {self.db_name}: {len(self.index)} 筆資料（剩餘 {remaining_hours:.1f} 小時有效）")
                 else:
-                    print(f"✅ 載入向量資料庫 {self.db_name}: {len(self.ids)} 筆資料（增量更新模式）")
+                    print(f"✅ 載入向量資料庫 {self.db_name}: {len(self.index)} 筆資料（增量更新模式）")
         else:
             print(f"⚠️ 向量資料庫 {self.db_name} 不存在，準備初始化...")
-            self.embeddings = np.array([]).reshape(0, 768)  # BERT 768 維
-            self.ids = np.array([])
-            self.metadata = np.array([])
+            self.reset()
             self.initialize_from_db()
 
+    def _migrate_legacy_files(self):
+        """把舊版 *_embs.npy / *_ids.npy / *_metadata.npy 匯入 append-only 儲存"""
+        try:
+            embeddings = np.load(self.emb_path)
+            ids = np.load(self.ids_path)
+            metadata = None
+            if os.path.exists(self.metadata_path):
+                legacy_metadata = np.load(self.metadata_path, allow_pickle=True)
+                if len(legacy_metadata) == len(ids):
+                    metadata = list(legacy_metadata)
+            self.store.write_snapshot(ids, embeddings, metadata)
+            print(f"📦 已將 {self.db_name} 舊版 .npy 檔案遷移至向量儲存: {len(ids)} 筆")
+        except Exception as e:
+            print(f"⚠️ 遷移 {self.db_name} 舊版 .npy 檔案失敗，將重新建立: {str(e)}")
+
     @abstractmethod
     def initialize_from_db(self):
         """
@@ -150,54 +243,26 @@ class BaseVectorDBManager(ABC):
             return
 
         print(f"🔨 開始建立 {self.db_name} 向量索引...")
-        batch_size = 4
-        all_ids = []
-        all_embeddings = []
-
-        for i in range(0, len(data_array), batch_size):
-            batch = data_array[i : i + batch_size]
-            texts = [item['text'] for item in batch]
-            ids = [item['id'] for item in batch]
-
-            # 使用 BERT 生成嵌入
-            encoded = self.embedding_service.tokenizer(
-                texts,
-                padding=True,
-                truncation=True,
-                max_length=512,
-                return_tensors="pt"
-            ).to(self.embedding_service.device)
-
-            with torch.no_grad():
-                outputs = self.embedding_service.model(**encoded)
-                embs = self.embedding_service._RecommendationService__mean_pooling(
-                    outputs,
-                    encoded.attention_mask
-                )
-                embs = torch.nn.functional.normalize(embs, p=2, dim=1)
-
-            all_ids.extend(ids)
-            all_embeddings.append(embs.cpu().numpy())
-
-            if (i + batch_size) % 20 == 0:
-                print(f"  處理進度: {i + batch_size}/{len(data_array)}")
-
-        self.ids = np.array(all_ids)
-        self.embeddings = np.vstack(all_embeddings)
+
+        # 使用共用嵌入引擎：依長度分桶、以 token 預算決定批次大小
+        ids = np.array([item['id'] for item in data_array], dtype=np.int64)
+        embeddings = self.embedding_service.embedding_engine.encode(
+            [item['text'] for item in data_array],
+            bulk=True,
+            progress_label=self.db_name
+        )
 
         # 儲存 metadata（可選）
-        if data_array and 'metadata' in data_array[0]:
-            self.metadata = np.array([item['metadata'] for item in data_array])
+        metadata = [item.get('metadata') for item in data_array]
 
-        self.save()
-        print(f"✅ {self.db_name} 向量索引建立完成: {len(self.ids)} 筆")
+        # 以單一 segment 原子取代舊資料，再以 mmap 重新映射建立常駐索引
+        self.store.write_snapshot(ids, embeddings, metadata)
+        self._load_store()
+        print(f"✅ {self.db_name} 向量索引建立完成: {len(self.index)} 筆")
 
     def save(self):
-        """儲存向量資料庫到磁碟"""
-        np.save(self.emb_path, self.embeddings)
-        np.save(self.ids_path, self.ids)
-        if len(self.metadata) > 0:
-            np.save(self.metadata_path, self.metadata)
+        """把 WAL 封存成 segment（一般新增 / 刪除不需要呼叫）"""
+        self.store.flush()
         print(f"💾 {self.db_name} 已儲存")
 
     def add_item(self, item_id, text, metadata=None):
@@ -209,41 +274,65 @@ class BaseVectorDBManager(ABC):
             text (str): 文本內容
             metadata (dict): 元數據（可選）
         """
-        # 生成嵌入
-        encoded = self.embedding_service.tokenizer(
-            [text],
-            padding=True,
-            truncation=True,
-            max_length=512,
-            return_tensors="pt"
-        ).to(self.embedding_service.device)
-
-        with torch.no_grad():
-            outputs = self.embedding_service.model(**encoded)
-            emb = self.embedding_service._RecommendationService__mean_pooling(
-                outputs,
-                encoded.attention_mask
-            )
-            emb = torch.nn.functional.normalize(emb, p=2, dim=1)
-            emb = emb.cpu().numpy()
-
-        # 添加到資料庫
-        if len(self.embeddings) == 0:
-            self.embeddings = emb
-        else:
-            self.embeddings = np.vstack([self.embeddings, emb])
+        # 生成嵌入（經由微批次處理器，與同時送達的請求合併成一次 forward）
+        emb = self.embedding_service.embedding_batcher.embed(text)
 
-        self.ids = np.append(self.ids, item_id)
+        # 寫入 WAL（O(1) I/O），再增量更新常駐索引
+        self.store.append(item_id, emb, metadata)
+        self.index.add([item_id], emb)
 
         if metadata:
-            if len(self.metadata) == 0:
-                self.metadata = np.array([metadata])
-            else:
-                self.metadata = np.append(self.metadata, metadata)
+            self.metadata[int(item_id)] = metadata
+        else:
+            self.metadata.pop(int(item_id), None)
 
-        self.save()
         print(f"➕ 添加項目到 {self.db_name}: ID={item_id}")
 
+    def add_items(self, items):
+        """
+        批次添加或更新多個項目（整批一次 forward、一次 WAL 寫入）
+
+        Args:
+            items (list): 每個元素包含 id、text 與 metadata（可選）
+        """
+        if not items:
+            return
+
+        ids = [int(item['id']) for item in items]
+        metadata = [item.get('metadata') for item in items]
+        embeddings = self.embedding_service.embedding_engine.encode([item['text'] for item in items])
+
+        # 寫入 WAL（整批一次 fsync），再增量更新常駐索引
+        self.store.append_many(ids, embeddings, metadata)
+        self.index.add(ids, embeddings)
+
+        for item_id, meta in zip(ids, metadata):
+            if meta:
+                self.metadata[item_id] = meta
+            else:
+                self.metadata.pop(item_id, None)
+
+        print(f"➕ 批次添加 {len(ids)} 個項目到 {self.db_name}")
+
+    def delete_items(self, item_ids):
+        """
+        批次刪除多個項目（不存在的 ID 會被略過）
+
+        Args:
+            item_ids (list): 項目 ID 列表
+        """
+        item_ids = [int(item_id) for item_id in item_ids]
+        if not item_ids:
+            return
+
+        # tombstone 一律寫入（可重複）：項目可能由其他程序加入，不在本程序的常駐索引中
+        self.store.delete_many(item_ids)
+        removed = self.index.remove(item_ids)
+        for item_id in item_ids:
+            self.metadata.pop(item_id, None)
+
+        print(f"➖ 從 {self.db_name} 批次刪除 {removed} 個項目")
+
     def delete_item(self, item_id):
         """
         從向量資料庫刪除項目
@@ -251,18 +340,15 @@ class BaseVectorDBManager(ABC):
         Args:
             item_id (int): 項目 ID
         """
-        if item_id in self.ids:
-            idx = np.where(self.ids == item_id)[0][0]
-            self.ids = np.delete(self.ids, idx)
-            self.embeddings = np.delete(self.embeddings, idx, axis=0)
+        # 寫入 tombstone（O(1) I/O，可重複），再增量更新常駐索引；
+        # 項目可能由其他程序加入，不以本程序的常駐索引判斷是否寫入
+        self.store.delete(item_id)
+        self.metadata.pop(int(item_id), None)
 
-            if len(self.metadata) > 0:
-                self.metadata = np.delete(self.metadata, idx)
-
-            self.save()
+        if self.index.remove([item_id]):
             print(f"➖ 從 {self.db_name} 刪除項目: ID={item_id}")
         else:
-            print(f"⚠️ 項目 ID {item_id} 不存在於 {self.db_name}")
+            print(f"⚠️ 項目 ID {item_id} 不存在於 {self.db_name} 的常駐索引")
 
     def search(self, query_embedding, top_k=5, min_similarity=0.0):
         """
@@ -276,53 +362,61 @@ class BaseVectorDBManager(ABC):
         Returns:
             list: 搜尋結果
         """
-        if len(self.embeddings) == 0:
+        # 先補上其他程序（背景索引 worker 等）寫入的變更
+        self.refresh()
+        if len(self.index) == 0:
             return []
 
-        # 建立 FAISS 索引
-        dimension = self.embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(self.embeddings.astype(np.float32))
-
-        # 搜尋
-        q = query_embedding.astype("float32").reshape(1, -1)
-        distances, indices = index.search(q, k=min(top_k, len(self.ids)))
+        # 相同查詢向量、參數且索引未變動時直接返回快取結果
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(-1)
+        cache_key = (
+            self.index.version,
+            hashlib.blake2b(query.tobytes(), digest_size=16).digest(),
+            int(top_k),
+            float(min_similarity),
+        )
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            print(f"      ⚡ {self.db_name} 搜尋結果快取命中: {len(cached)} 筆")
+            return copy.deepcopy(cached)
+
+        # 直接在常駐索引上執行 k-NN 搜尋
+        result_ids, similarities = self.index.search(query, top_k)
 
         # 調試：顯示所有搜尋結果（包括被閾值過濾的）
-        print(f"      🔍 FAISS 搜尋返回 {len(indices[0])} 個結果（閾值前）:")
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.ids):
-                similarity = float(distances[0][i])
-                passed = "✅" if similarity >= min_similarity else "❌"
-                metadata_str = ""
-                if len(self.metadata) > 0:
-                    meta = self.metadata[idx]
-                    metadata_str = f"案例 {meta.get('archive_id', 'N/A')}"
-                print(f"        {passed} {metadata_str}: 相似度={similarity:.3f} (閾值={min_similarity})")
+        print(f"      🔍 FAISS 搜尋返回 {len(result_ids)} 個結果（閾值前）:")
+        for item_id, similarity in zip(result_ids, similarities):
+            passed = "✅" if similarity >= min_similarity else "❌"
+            metadata_str = ""
+            meta = self.metadata.get(item_id)
+            if meta is not None:
+                metadata_str = f"案例 {meta.get('archive_id', 'N/A')}"
+            print(f"        {passed} {metadata_str}: 相似度={similarity:.3f} (閾值={min_similarity})")
 
         # 格式化結果
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.ids):
-                similarity = float(distances[0][i])
-                if similarity >= min_similarity:
-                    result = {
-                        'id': int(self.ids[idx]),
-                        'similarity': similarity
-                    }
-                    # 加入 metadata（如果有）
-                    if len(self.metadata) > 0:
-                        result['metadata'] = self.metadata[idx]
-                    results.append(result)
-
+        for item_id, similarity in zip(result_ids, similarities):
+            if similarity >= min_similarity:
+                result = {
+                    'id': item_id,
+                    'similarity': similarity
+                }
+                # 加入 metadata（如果有）
+                meta = self.metadata.get(item_id)
+                if meta is not None:
+                    result['metadata'] = meta
+                results.append(result)
+
+        self._search_cache.set(cache_key, copy.deepcopy(results))
         return results
 
     def get_stats(self):
         """獲取資料庫統計資訊"""
+        self.refresh()
         return {
             'name': self.db_name,
-            'total_items': len(self.ids),
-            'embedding_dim': self.embeddings.shape[1] if len(self.embeddings) > 0 else 0,
+            'total_items': len(self.index),
+            'embedding_dim': self.index.dimension if len(self.index) > 0 else 0,
             'has_metadata': len(self.metadata) > 0,
-            'file_exists': os.path.exists(self.emb_path)
+            'file_exists': self.store.exists()
         }
\ No newline at end of file
@@ -6,8 +6,10 @@ Vector Service
 
 import numpy as np
 import os
+import threading
 from django.conf import settings
 from utils.recommendation_service import RecommendationService
+from utils.ttl_cache import TTLCache
 from .vector_db_implementations import (
     UserVectorDB,
     PetVectorDB,
@@ -21,10 +23,20 @@ from .vector_db_implementations import (
 class VectorService:
     """向量資料庫服務 - 統一管理所有向量資料庫"""
 
-    def __init__(self):
+    # 查詢向量快取（以正規化後的文字為鍵，所有實例共用）
+    _query_embedding_cache = TTLCache(maxsize=2048, ttl=6 * 3600)
+
+    def __init__(self, recommendation_service=None):
+        """
+        初始化向量資料庫服務（一般請透過 singleton.get_vector_service() 取得共用實例）
+
+        Args:
+            recommendation_service: 共用的推薦服務（BERT + FAISS），未指定時才自行載入
+        """
         # 使用現有的推薦服務（BERT + FAISS）
-        self.recommendation_service = RecommendationService()
+        self.recommendation_service = recommendation_service or RecommendationService()
         self.base_dir = settings.BASE_DIR
+        self._db_lock = threading.RLock()
 
         # 初始化各種向量資料庫（延遲載入）
         self._user_db = None
@@ -44,44 +56,43 @@ class VectorService:
     @property
     def user_db(self):
         """使用者向量資料庫（延遲載入）"""
-        if self._user_db is None:
-            self._user_db = UserVectorDB(self.recommendation_service)
-        return self._user_db
+        return self._get_db('_user_db', UserVectorDB)
 
     @property
     def pet_db(self):
         """寵物向量資料庫（延遲載入）"""
-        if self._pet_db is None:
-            self._pet_db = PetVectorDB(self.recommendation_service)
-        return self._pet_db
+        return self._get_db('_pet_db', PetVectorDB)
 
     @property
     def feed_db(self):
         """飼料向量資料庫（延遲載入）"""
-        if self._feed_db is None:
-            self._feed_db = FeedVectorDB(self.recommendation_service)
-        return self._feed_db
+        return self._get_db('_feed_db', FeedVectorDB)
 
     @property
     def system_operation_db(self):
         """系統操作資訊向量資料庫（延遲載入）"""
-        if self._system_operation_db is None:
-            self._system_operation_db = SystemOperationVectorDB(self.recommendation_service)
-        return self._system_operation_db
+        return self._get_db('_system_operation_db', SystemOperationVectorDB)
 
     @property
     def system_faq_db(self):
         """系統導覽 FAQ 向量資料庫（延遲載入）"""
-        if self._system_faq_db is None:
-            self._system_faq_db = SystemFAQVectorDB(self.recommendation_service)
-        return self._system_faq_db
+        return self._get_db('_system_faq_db', SystemFAQVectorDB)
 
     @property
     def disease_archive_db(self):
         """疾病檔案向量資料庫（延遲載入）"""
-        if self._disease_archive_db is None:
-            self._disease_archive_db = DiseaseArchiveVectorDB(self.recommendation_service)
-        return self._disease_archive_db
+        return self._get_db('_disease_archive_db', DiseaseArchiveVectorDB)
+
+    def _get_db(self, attr, db_class):
+        """延遲載入向量資料庫（在鎖內建立，避免請求與背景索引執行緒同時載入兩份）"""
+        db = getattr(self, attr)
+        if db is None:
+            with self._db_lock:
+                db = getattr(self, attr)
+                if db is None:
+                    db = db_class(self.recommendation_service)
+                    setattr(self, attr, db)
+        return db
 
     def _load_vector_db(self, db_name):
         """
@@ -98,7 +109,7 @@ class VectorService:
             ids_path = os.path.join(self.base_dir, f'{db_name}_ids.npy')
 
             if os.path.exists(emb_path) and os.path.exists(ids_path):
-                embeddings = np.load(emb_path)
+                embeddings = np.load(emb_path, mmap_mode='r')
                 ids = np.load(ids_path)
                 print(f"載入向量資料庫 {db_name}: {len(ids)} 筆資料")
                 return {
@@ -535,6 +546,15 @@ class VectorService:
             print(f"搜尋貼文失敗: {str(e)}")
             return {}
 
+    def prefetch_query_embedding(self, query_text):
+        """
+        預先計算查詢向量並放入快取（可與意圖分析同時執行，之後的檢索直接取用快取）
+
+        Args:
+            query_text (str): 查詢文字
+        """
+        self._generate_query_embedding(query_text)
+
     def _generate_query_embedding(self, query_text):
         """
         使用 BERT 模型生成查詢向量
@@ -546,26 +566,18 @@ class VectorService:
             np.array: 查詢向量
         """
         try:
-            import torch
-
-            # 使用推薦服務的 tokenizer 和 model
-            encoded = self.recommendation_service.tokenizer(
-                [query_text],
-                padding=True,
-                truncation=True,
-                return_tensors="pt"
-            ).to(self.recommendation_service.device)
-
-            with torch.no_grad():
-                outputs = self.recommendation_service.model(**encoded)
-                emb = self.recommendation_service._RecommendationService__mean_pooling(
-                    outputs,
-                    encoded.attention_mask
-                )
-                emb = torch.nn.functional.normalize(emb, p=2, dim=1)
-                emb = emb.cpu().numpy()
-
-            return emb[0]  # 返回單個向量
+            # 常見問題（如「如何發布貼文」）直接使用快取的向量，不經過 BERT；
+            # 以正規化後的文字（合併空白、轉小寫）作為鍵，向量也由同一字串計算，
+            # 鍵相同的查詢不論誰先寫入快取都得到相同的向量
+            normalized = ' '.join(str(query_text).split()).lower()
+            cached = VectorService._query_embedding_cache.get(normalized)
+            if cached is not None:
+                return cached.copy()
+
+            # 經由推薦服務的微批次處理器，與同時送達的查詢合併成一次 forward
+            emb = self.recommendation_service.embedding_batcher.embed(normalized)
+            VectorService._query_embedding_cache.set(normalized, emb)
+            return emb.copy()
 
         except Exception as e:
             print(f"生成查詢向量失敗: {str(e)}")
@@ -584,34 +596,19 @@ class VectorService:
             list: 搜尋結果（id 和相似度）
         """
         try:
-            import faiss
-
-            # 載入向量資料庫
-            post_ids = np.load(os.path.join(self.base_dir, f'{content_type}_post_ids.npy'))
-            post_embeddings = np.load(os.path.join(self.base_dir, f'{content_type}_post_embs.npy'))
+            # 使用推薦服務的常駐索引（不重新載入 .npy、不重建索引）
+            index = self.recommendation_service.get_post_index(content_type)
 
-            if len(post_ids) == 0:
+            if len(index) == 0:
                 return []
 
-            # 建立 FAISS 索引
-            dimension = post_embeddings.shape[1]
-            index = faiss.IndexFlatIP(dimension)  # Inner Product for cosine similarity
-            index.add(post_embeddings.astype(np.float32))
-
-            # 搜尋
-            q = query_embedding.astype("float32").reshape(1, -1)
-            distances, indices = index.search(q, k=min(top_k, len(post_ids)))
+            post_ids, similarities = index.search(query_embedding, top_k)
 
             # 格式化結果
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(post_ids):  # 確保索引有效
-                    results.append({
-                        'id': int(post_ids[idx]),
-                        'similarity': float(distances[0][i])
-                    })
-
-            return results
+            return [
+                {'id': post_id, 'similarity': similarity}
+                for post_id, similarity in zip(post_ids, similarities)
+            ]
 
         except Exception as e:
             print(f"FAISS 搜尋失敗 ({content_type}): {str(e)}")
@@ -5,6 +5,7 @@ AI Agent URL Configuration
 from django.urls import path
 from .views import (
     AIAgentChatView,
+    AIAgentChatStreamView,
     AIAgentHealthCheckView,
     ConversationListView,
     ConversationDetailView,
@@ -20,6 +21,7 @@ from .views import (
 urlpatterns = [
     # AI 聊天
     path('chat/', AIAgentChatView.as_view(), name='ai-agent-chat'),
+    path('chat/stream/', AIAgentChatStreamView.as_view(), name='ai-agent-chat-stream'),
     path('health/', AIAgentHealthCheckView.as_view(), name='ai-agent-health'),
 
     # 對話管理
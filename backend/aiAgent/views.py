@@ -3,6 +3,10 @@ AI Agent Views
 提供 AI 聊天服務的 API endpoints
 """
 
+import json
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
@@ -10,10 +14,16 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from utils import llm_cache
 
 from .services import ResponseService
+from .services.chat_service import build_response, build_user_context, create_assistant_message, stream_chat
+from .services.intent_classifier import LocalIntentClassifier
 from .services.singleton import get_intent_service
 from .models import Conversation, Message, ConversationFeedback
 from .serializers import (
@@ -126,30 +136,8 @@ class AIAgentChatView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # 加入使用者資訊到上下文
-            from pets.models import Pet
-
-            # 取得使用者的寵物資訊
-            user_pets = Pet.objects.filter(owner=request.user)
-            pets_info = []
-            for pet in user_pets:
-                pets_info.append({
-                    'id': pet.id,
-                    'name': pet.pet_name,
-                    'type': pet.pet_type,  # 貓/狗
-                    'breed': pet.breed,    # 品種
-                    'age': pet.age,
-                    'stage': pet.pet_stage,  # 年齡階段 (幼犬、成犬/成貓等)
-                    'weight': pet.weight,
-                    'description': pet.description
-                })
-
-            context['user'] = {
-                'id': request.user.id,
-                'username': request.user.user_account,
-                'fullname': request.user.user_fullname,
-                'pets': pets_info  # 加入寵物資訊
-            }
+            # 加入使用者與寵物資訊到上下文
+            context['user'] = build_user_context(request.user)
 
             # 取得或建立對話
             if conversation_id:
@@ -179,47 +167,11 @@ class AIAgentChatView(APIView):
                 context
             )
 
-            # 格式化回應
-            response_data = self.response_service.format_chat_response(intent_result)
-
-            # 豐富化回應（加入貼文詳細資料）
-            if intent_result.get('success') and intent_result.get('retrieved_data'):
-                response_data = self.response_service.enrich_with_post_details(
-                    response_data,
-                    intent_result
-                )
-
-            # 豐富化用戶推薦
-            if response_data.get('hasRecommendedUsers'):
-                response_data = self.response_service.enrich_with_user_recommendations(
-                    response_data
-                )
+            # 格式化並豐富化回應（加入貼文詳細資料、用戶推薦）
+            response_data = build_response(intent_result, self.response_service)
 
             # 儲存 AI 回應訊息
-            ai_msg = Message.objects.create(
-                conversation=conversation,
-                role=Message.ROLE_ASSISTANT,
-                content=response_data.get('response', ''),
-                intent=intent_result.get('intent_data', {}).get('intent'),
-                confidence=intent_result.get('intent_data', {}).get('confidence'),
-                source=response_data.get('source', 'ai_agent'),
-                has_tutorial=response_data.get('hasTutorial', False),
-                tutorial_type=response_data.get('tutorialType'),
-                has_recommended_users=response_data.get('hasRecommendedUsers', False),
-                has_recommended_articles=response_data.get('hasRecommendedArticles', False),
-                has_calculator=response_data.get('hasCalculator', False),
-                has_operation=response_data.get('hasOperation', False),
-                operation_type=response_data.get('operationType'),
-                additional_data={
-                    'recommended_user_ids': response_data.get('recommendedUserIds', []),
-                    'recommended_user_details': response_data.get('recommendedUserDetails', []),  # 保存完整用戶詳情
-                    'recommended_article_ids': response_data.get('recommendedArticleIds', []),
-                    'social_post_details': response_data.get('socialPostDetails', []),
-                    'forum_post_details': response_data.get('forumPostDetails', []),
-                    'operation_params': response_data.get('operationParams', {}),  # 保存操作參數
-                },
-                entities=intent_result.get('intent_data', {}).get('entities', {})
-            )
+            ai_msg = create_assistant_message(conversation, response_data, intent_result)
 
             # 加入 conversationId 到回應
             response_data['conversationId'] = conversation.id
@@ -242,6 +194,74 @@ class AIAgentChatView(APIView):
             )
 
 
+def _authenticate(request):
+    """以 REST framework 設定的認證方式（JWT）驗證一般 Django 請求，失敗時返回 None"""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if result is not None:
+            return result[0]
+    return None
+
+
+class AIAgentChatStreamView(View):
+    """
+    AI Agent 串流聊天 API（server-sent events）
+
+    ASGI 原生的非同步 view：意圖分析與回應生成以非同步方式呼叫 OpenAI，等待期間不佔用 worker 執行緒；
+    回應文字生成時即逐段送出（event: delta），串流結束後才寫入對話與訊息，
+    最後送出與同步 API 相同格式的完整回應（event: done，含 conversationId）。
+    事件格式見 aiAgent/services/chat_service.py。
+
+    Request Body 同 chat/（message、conversationId、context）
+    """
+
+    http_method_names = ['post', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # 與 REST framework 的 APIView 相同，以 JWT 認證，不使用 CSRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def post(self, request):
+        user = await sync_to_async(_authenticate)(request)
+        if user is None:
+            return JsonResponse({'detail': '身份認證信息未提供或無效。'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except (TypeError, ValueError):
+            return JsonResponse({'error': '請求格式錯誤'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(data, dict):
+            return JsonResponse({'error': '請求格式錯誤'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_message = data.get('message')
+        conversation_id = data.get('conversationId')
+        context = data.get('context')
+        if not isinstance(context, dict):
+            context = {}
+
+        if not user_message:
+            return JsonResponse({'error': '訊息不能為空'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 既有對話需屬於目前使用者（在開始串流前檢查，才能回傳 404）
+        conversation = None
+        if conversation_id:
+            conversation = await Conversation.objects.filter(id=conversation_id, user=user).afirst()
+            if conversation is None:
+                return JsonResponse({'error': '對話不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            stream_chat(user, user_message, context, conversation),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # 反向代理不緩衝，片段即時送達
+        return response
+
+
 class AIAgentHealthCheckView(APIView):
     """
     AI Agent 健康檢查 API
@@ -259,6 +279,8 @@ class AIAgentHealthCheckView(APIView):
                     properties={
                         'status': openapi.Schema(type=openapi.TYPE_STRING),
                         'services': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'intent_classifier': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'llm_cache': openapi.Schema(type=openapi.TYPE_OBJECT),
                     }
                 )
             )
@@ -290,7 +312,9 @@ class AIAgentHealthCheckView(APIView):
                     'vector_db_social': 'available' if social_embs_exist else 'not_found',
                     'vector_db_forum': 'available' if forum_embs_exist else 'not_found',
                     'bert_model': 'loaded'
-                }
+                },
+                'intent_classifier': LocalIntentClassifier.get_metrics(),  # 本機意圖分類器的命中率與準確率（各程序合計）
+                'llm_cache': llm_cache.get_metrics()  # LLM 回應快取的命中率（各程序合計）
             }, status=status.HTTP_200_OK)
 
         except Exception as e:
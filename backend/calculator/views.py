@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from utils.firebase_service import FirebaseStorageService
+from utils.llm_cache import chat_completion
 from drf_yasg import openapi
 from openai import OpenAI, APIError
 from dotenv import load_dotenv
@@ -988,7 +989,9 @@ class PetNutritionCalculator(APIView):
             else:  # zh-TW
                 system_prompt = "你是一名專業的寵物營養師。請用繁體中文提供清楚、簡潔的分析報告。\n\n格式要求：\n1. 使用簡單的段落格式，每個主題間空一行\n2. 使用 '-' 開頭的條列式來列出營養數值\n3. 不要使用 **粗體**、*斜體*、表格或代碼區塊\n4. 數值資訊請用中文單位（公克、大卡）\n5. 內容應包含：每日飼料量、各項營養素建議量與實際量對比、健康建議"
 
-            response = client.chat.completions.create(
+            # 相同的寵物、飼料與營養素會產生相同的 prompt，直接使用快取的建議
+            content = chat_completion(
+                client,
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -997,7 +1000,7 @@ class PetNutritionCalculator(APIView):
                 max_tokens=1500,
                 temperature=0.5
             )
-            return response.choices[0].message.content.strip()
+            return content.strip()
         except APIError as e:
             return f"無法產生建議：API 錯誤 - {str(e)}"
         except Exception as e:
@@ -86,11 +86,22 @@ class CommentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'popularity']
 
+    def get_prefetch(self, obj):
+        """貼文列表批次載入的熱門留言資料（PostPrefetch，未載入時返回 None）"""
+        prefetch = self.context.get('post_prefetch')
+        if prefetch is not None and obj.id in prefetch.comment_ids:
+            return prefetch
+        return None
+
     def get_images(self, obj):
         """獲取評論關聯的圖片"""
         # 如果是已刪除評論，不返回圖片
         if obj.content == "[此評論已刪除]":
             return []
+
+        prefetch = self.get_prefetch(obj)
+        if prefetch:
+            return CommentImageSerializer(prefetch.comment_images.get(obj.id, []), many=True).data
             
         comment_type = ContentType.objects.get_for_model(Comment)
         images = CommentImage.objects.filter(
@@ -101,6 +112,10 @@ class CommentSerializer(serializers.ModelSerializer):
     
     def get_isLiked(self, obj):
         """檢查當前用戶是否點讚了此評論"""
+        prefetch = self.get_prefetch(obj)
+        if prefetch:
+            return obj.id in prefetch.liked_comments
+
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             user = request.user
@@ -121,6 +136,10 @@ class CommentSerializer(serializers.ModelSerializer):
     
     def get_likes(self, obj):
         """獲取評論總按讚數"""
+        prefetch = self.get_prefetch(obj)
+        if prefetch:
+            return prefetch.comment_likes.get(obj.id, 0)
+
         return UserInteraction.objects.filter(
             interactables=obj,
             relation='liked'
@@ -1,7 +1,25 @@
 from rest_framework import serializers
+from django.db.models import Prefetch
 from feeds.models import Feed, UserFeed, FeedReview, FeedErrorReport, UserFeedMark
 from media.models import FeedImage
 
+# 飼料列表顯示的圖片類型
+LISTING_IMAGE_TYPES = ('front', 'nutrition')
+
+
+def listing_queryset(queryset):
+    """
+    飼料列表用的查詢：一併載入建立者，並以一次查詢預先載入正面 / 營養標籤圖片
+    （使用 FeedImage 的 (feed, image_type) 索引）
+    """
+    return queryset.select_related('created_by').prefetch_related(
+        Prefetch(
+            'feed_images',
+            queryset=FeedImage.objects.filter(image_type__in=LISTING_IMAGE_TYPES),
+            to_attr='listing_images'
+        )
+    )
+
 class FeedSerializer(serializers.ModelSerializer):
     # 保留原有的 URL 欄位以維持向後相容性
     front_image_url = serializers.SerializerMethodField()
@@ -46,6 +64,108 @@ class FeedSerializer(serializers.ModelSerializer):
         nutrition_image = obj.feed_images.filter(image_type='nutrition').first()
         return nutrition_image.firebase_url if nutrition_image else None
 
+class FeedListingListSerializer(serializers.ListSerializer):
+    """
+    many=True 時以一次查詢取得目前使用者標記過的飼料，放入 context['marked_feed_ids']
+    """
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        request = self._context.get('request')
+        if 'marked_feed_ids' not in self._context and request is not None and request.user.is_authenticated:
+            self._context['marked_feed_ids'] = set(
+                UserFeedMark.objects.filter(
+                    user=request.user,
+                    feed_id__in=[feed.id for feed in items]
+                ).values_list('feed_id', flat=True)
+            )
+        return super().to_representation(items)
+
+class FeedListingSerializer(serializers.ModelSerializer):
+    """
+    飼料列表（所有飼料、預覽、搜尋）共用的序列化器
+
+    模型欄位保留原始值（價格、時間的 JSON 格式與原本手動組裝的資料相同），
+    查詢請使用 listing_queryset() 預先載入圖片；
+    context['relevance_scores'] 存在時加上搜尋相關分數
+    """
+    front_image_url = serializers.SerializerMethodField()
+    nutrition_image_url = serializers.SerializerMethodField()
+    created_by = serializers.SerializerMethodField()
+    created_by_id = serializers.SerializerMethodField()
+    created_by_name = serializers.SerializerMethodField()
+    is_marked = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Feed
+        list_serializer_class = FeedListingListSerializer
+        fields = [
+            "id",
+            "name",
+            "brand",
+            "pet_type",
+            "protein",
+            "fat",
+            "carbohydrate",
+            "calcium",
+            "phosphorus",
+            "magnesium",
+            "sodium",
+            "price",
+            "review_count",
+            "is_verified",
+            "front_image_url",
+            "nutrition_image_url",
+            "created_at",
+            "updated_at",
+            "created_by",
+            "created_by_id",
+            "created_by_name",
+            "is_marked",
+        ]
+
+    def build_field(self, field_name, info, model_class, nested_depth):
+        # 模型欄位直接輸出原始值
+        return serializers.ReadOnlyField, {}
+
+    def _get_image_url(self, obj, image_type):
+        images = getattr(obj, 'listing_images', None)
+        if images is None:
+            image = obj.feed_images.filter(image_type=image_type).first()
+        else:
+            image = next((image for image in images if image.image_type == image_type), None)
+        return image.firebase_url if image else None
+
+    def get_front_image_url(self, obj):
+        return self._get_image_url(obj, 'front')
+
+    def get_nutrition_image_url(self, obj):
+        return self._get_image_url(obj, 'nutrition')
+
+    def get_created_by(self, obj):
+        return obj.created_by.username if obj.created_by else None
+
+    def get_created_by_id(self, obj):
+        return obj.created_by.id if obj.created_by else None
+
+    def get_created_by_name(self, obj):
+        return obj.created_by.username if obj.created_by else None
+
+    def get_is_marked(self, obj):
+        marked_feed_ids = self.context.get('marked_feed_ids')
+        if marked_feed_ids is not None:
+            return obj.id in marked_feed_ids
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return False
+        return UserFeedMark.objects.filter(user=request.user, feed=obj).exists()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        scores = self.context.get('relevance_scores')
+        if scores is not None:
+            data['relevance'] = scores.get(instance.id, 0.0)
+        return data
+
 class UserFeedSerializer(serializers.ModelSerializer):
     feed = FeedSerializer(read_only=True)
     pet_name = serializers.CharField(source='pet.pet_name', read_only=True)
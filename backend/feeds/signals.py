@@ -19,12 +19,13 @@ def update_feed_vector_on_save(sender, instance, created, **kwargs):
     - 飼料驗證狀態變更
 
     只有已驗證（is_verified=True）的飼料會被索引
+    嵌入與寫入在交易提交後由背景佇列處理，不阻塞請求
     """
     try:
-        from aiAgent.services.feed_vector_updater import update_feed_vector
-        update_feed_vector(instance)
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('feed', instance.id)
     except Exception as e:
-        print(f"⚠️ 更新飼料向量失敗（不影響飼料操作）: {str(e)}")
+        print(f"⚠️ 排入飼料向量更新失敗（不影響飼料操作）: {str(e)}")
 
 
 @receiver(post_delete, sender=Feed)
@@ -33,7 +34,25 @@ def remove_feed_vector_on_delete(sender, instance, **kwargs):
     飼料刪除時，從向量資料庫移除
     """
     try:
-        from aiAgent.services.feed_vector_updater import remove_feed_vector
-        remove_feed_vector(instance.id)
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('feed', instance.id, 'remove')
     except Exception as e:
-        print(f"⚠️ 移除飼料向量失敗（不影響飼料操作）: {str(e)}")
\ No newline at end of file
+        print(f"⚠️ 排入飼料向量移除失敗（不影響飼料操作）: {str(e)}")
+
+
+@receiver(post_save, sender=Feed)
+def update_feed_search_index_on_save(sender, instance, **kwargs):
+    """
+    飼料創建或更新時，於交易提交後更新全文搜尋索引
+    """
+    from utils.search_index import index_on_commit
+    index_on_commit('feeds', instance)
+
+
+@receiver(post_delete, sender=Feed)
+def remove_feed_search_index_on_delete(sender, instance, **kwargs):
+    """
+    飼料刪除時，從全文搜尋索引移除
+    """
+    from utils.search_index import remove_on_commit
+    remove_on_commit('feeds', instance.pk)
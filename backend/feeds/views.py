@@ -13,10 +13,15 @@ from utils.firebase_service import FirebaseStorageService
 import os
 from django.conf import settings
 from django.db import transaction
-from django.db.models import F
+from django.core import signing
+from django.db.models import F, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from feeds.models import Feed, FeedReview, FeedErrorReport, UserFeedMark, UserFeed
-from feeds.serializers import FeedReviewSerializer, FeedErrorReportSerializer, UserFeedMarkSerializer
+from feeds.serializers import (
+    FeedReviewSerializer, FeedErrorReportSerializer, UserFeedMarkSerializer,
+    FeedListingSerializer, listing_queryset
+)
 
 NUTRIENT_KEYWORDS = {
     'protein': ['protein', '蛋白', '粗蛋白', '粗蛋白質'],
@@ -715,7 +720,75 @@ class RecentlyUsedFeedsView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class AllFeedsView(APIView):
+class FeedListingMixin:
+    """
+    飼料列表共用的查詢與序列化
+
+    列表類 API（所有飼料、預覽、搜尋）共用同一個序列化器：
+    建立者以 select_related、正面 / 營養標示圖片以單一 Prefetch 載入，
+    目前使用者的標記狀態整頁只查詢一次，每頁的查詢數固定，不隨筆數增加。
+    """
+    CURSOR_SALT = 'feeds.listing.cursor'
+
+    def serialize_feeds(self, request, feeds, relevance_scores=None):
+        """
+        序列化飼料列表
+
+        Args:
+            request: 目前的請求（用於查詢標記狀態）
+            feeds (list): 已經過 listing_queryset() 的飼料
+            relevance_scores (dict): {feed_id: 搜尋相關分數}（搜尋結果才有）
+
+        Returns:
+            list: 飼料資料
+        """
+        context = {'request': request}
+        if relevance_scores is not None:
+            context['relevance_scores'] = relevance_scores
+        return FeedListingSerializer(feeds, many=True, context=context).data
+
+    def paginate_feeds(self, queryset, limit, cursor=None):
+        """
+        以 (created_at, id) 遊標分頁（keyset），不需要 OFFSET 也不需要另外的 exists() 查詢
+
+        Args:
+            queryset (QuerySet): 已篩選的飼料
+            limit (int): 每頁筆數
+            cursor (str): 上一頁回傳的 next_cursor
+
+        Returns:
+            tuple: (飼料列表, 下一頁的遊標；沒有下一頁時為 None)
+
+        Raises:
+            ValueError: 遊標無效
+        """
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor:
+            try:
+                position = signing.loads(cursor, salt=self.CURSOR_SALT)
+                created_at = parse_datetime(position['t'])
+                feed_id = int(position['i'])
+            except (signing.BadSignature, KeyError, TypeError, ValueError):
+                raise ValueError('無效的分頁遊標')
+            if created_at is None:
+                raise ValueError('無效的分頁遊標')
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=feed_id)
+            )
+
+        # 多取一筆判斷是否還有下一頁
+        feeds = list(listing_queryset(queryset)[:limit + 1])
+        next_cursor = None
+        if len(feeds) > limit:
+            feeds = feeds[:limit]
+            last = feeds[-1]
+            next_cursor = signing.dumps(
+                {'t': last.created_at.isoformat(), 'i': last.id}, salt=self.CURSOR_SALT
+            )
+        return feeds, next_cursor
+
+
+class AllFeedsView(FeedListingMixin, APIView):
     """所有飼料 API"""
     permission_classes = [IsAuthenticated]
     
@@ -742,6 +815,13 @@ class AllFeedsView(APIView):
                 type=openapi.TYPE_INTEGER,
                 required=False,
                 description="限制返回數量，默認為50"
+            ),
+            openapi.Parameter(
+                name="cursor",
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=False,
+                description="分頁遊標（上一頁回傳的 next_cursor）"
             )
         ],
         responses={
@@ -758,9 +838,10 @@ class AllFeedsView(APIView):
         pet_type = request.query_params.get('pet_type')
         search = request.query_params.get('search', '').strip()
         limit = int(request.query_params.get('limit', 50))
+        cursor = request.query_params.get('cursor')
         
         # 顯示所有飼料（不限制驗證狀態）
-        queryset = Feed.objects.all().order_by('-created_at')
+        queryset = Feed.objects.all()
         
         # 寵物類型篩選
         if pet_type in ['cat', 'dog']:
@@ -774,70 +855,33 @@ class AllFeedsView(APIView):
                 models.Q(brand__icontains=search)
             )
         
-        # 限制數量
-        feeds = queryset[:limit]
+        try:
+            feeds, next_cursor = self.paginate_feeds(queryset, limit, cursor)
+        except ValueError as e:
+            return Response({
+                'data': [],
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if not feeds.exists():
+        if not feeds:
             return Response({
                 'data': [],
-                'message': '暫無飼料資料'
+                'message': '暫無飼料資料',
+                'has_more': False,
+                'next_cursor': None
             }, status=status.HTTP_200_OK)
         
-        # 檢查每個飼料是否被當前使用者標記
-        marked_feed_ids = set(
-            UserFeedMark.objects.filter(
-                user=request.user,
-                feed__in=feeds
-            ).values_list('feed_id', flat=True)
-        )
-        
-        # 組裝數據
-        data = []
-        for feed in feeds:
-            feed_data = {
-                'id': feed.id,
-                'name': feed.name,
-                'brand': feed.brand,
-                'pet_type': feed.pet_type,
-                'protein': feed.protein,
-                'fat': feed.fat,
-                'carbohydrate': feed.carbohydrate,
-                'calcium': feed.calcium,
-                'phosphorus': feed.phosphorus,
-                'magnesium': feed.magnesium,
-                'sodium': feed.sodium,
-                'price': feed.price,
-                'review_count': feed.review_count,
-                'is_verified': feed.is_verified,
-                'front_image_url': None,
-                'nutrition_image_url': None,
-                'created_at': feed.created_at,
-                'updated_at': feed.updated_at,
-                'created_by': feed.created_by.username if feed.created_by else None,
-                'created_by_id': feed.created_by.id if feed.created_by else None,
-                'created_by_name': feed.created_by.username if feed.created_by else None,
-                # 標記狀態
-                'is_marked': feed.id in marked_feed_ids
-            }
-            
-            # 獲取圖片 URL
-            front_image = feed.feed_images.filter(image_type='front').first()
-            if front_image:
-                feed_data['front_image_url'] = front_image.firebase_url
-                
-            nutrition_image = feed.feed_images.filter(image_type='nutrition').first()
-            if nutrition_image:
-                feed_data['nutrition_image_url'] = nutrition_image.firebase_url
-            
-            data.append(feed_data)
+        data = self.serialize_feeds(request, feeds)
         
         return Response({
             'data': data,
-            'message': f'共 {len(data)} 筆飼料資料'
+            'message': f'共 {len(data)} 筆飼料資料',
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor
         }, status=status.HTTP_200_OK)
 
 
-class AllFeedsPreviewView(APIView):
+class AllFeedsPreviewView(FeedListingMixin, APIView):
     """所有飼料預覽 API（可自訂數量限制）"""
     permission_classes = [IsAuthenticated]
     
@@ -867,7 +911,7 @@ class AllFeedsPreviewView(APIView):
     def get(self, request):
         limit = int(request.query_params.get('limit', 3))
         # 顯示所有飼料（不限制驗證狀態）
-        queryset = Feed.objects.all().order_by('-created_at')
+        queryset = Feed.objects.all().order_by('-created_at', '-id')
         total_count = queryset.count()
         
         if total_count == 0:
@@ -879,55 +923,8 @@ class AllFeedsPreviewView(APIView):
             }, status=status.HTTP_200_OK)
         
         # 根據limit參數限制數量
-        feeds = queryset[:limit]
-        
-        # 檢查每個飼料是否被當前使用者標記
-        marked_feed_ids = set(
-            UserFeedMark.objects.filter(
-                user=request.user,
-                feed__in=feeds
-            ).values_list('feed_id', flat=True)
-        )
-        
-        # 組裝數據
-        data = []
-        for feed in feeds:
-            feed_data = {
-                'id': feed.id,
-                'name': feed.name,
-                'brand': feed.brand,
-                'pet_type': feed.pet_type,
-                'protein': feed.protein,
-                'fat': feed.fat,
-                'carbohydrate': feed.carbohydrate,
-                'calcium': feed.calcium,
-                'phosphorus': feed.phosphorus,
-                'magnesium': feed.magnesium,
-                'sodium': feed.sodium,
-                'price': feed.price,
-                'review_count': feed.review_count,
-                'is_verified': feed.is_verified,
-                'front_image_url': None,
-                'nutrition_image_url': None,
-                'created_at': feed.created_at,
-                'updated_at': feed.updated_at,
-                'created_by': feed.created_by.username if feed.created_by else None,
-                'created_by_id': feed.created_by.id if feed.created_by else None,
-                'created_by_name': feed.created_by.username if feed.created_by else None,
-                # 標記狀態
-                'is_marked': feed.id in marked_feed_ids
-            }
-            
-            # 獲取圖片 URL
-            front_image = feed.feed_images.filter(image_type='front').first()
-            if front_image:
-                feed_data['front_image_url'] = front_image.firebase_url
-                
-            nutrition_image = feed.feed_images.filter(image_type='nutrition').first()
-            if nutrition_image:
-                feed_data['nutrition_image_url'] = nutrition_image.firebase_url
-            
-            data.append(feed_data)
+        feeds = list(listing_queryset(queryset)[:limit])
+        data = self.serialize_feeds(request, feeds)
         
         return Response({
             'data': data,
@@ -1071,7 +1068,7 @@ class FeedDetailView(APIView):
         return Response(feed_data, status=status.HTTP_200_OK)
 
 
-class FeedSearchView(APIView):
+class FeedSearchView(FeedListingMixin, APIView):
     """飼料搜尋 API"""
     permission_classes = [IsAuthenticated]
     
@@ -1125,23 +1122,17 @@ class FeedSearchView(APIView):
                 'total_count': 0
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 搜尋飼料名稱和品牌
-        from django.db import models
-        queryset = Feed.objects.filter(
-            models.Q(name__icontains=query) | 
-            models.Q(brand__icontains=query)
-        ).order_by('-created_at')
-        
-        # 寵物類型篩選
-        if pet_type in ['cat', 'dog']:
-            queryset = queryset.filter(pet_type=pet_type)
-        
-        total_count = queryset.count()
+        # 以全文搜尋索引搜尋飼料名稱和品牌（依相關程度排序）
+        from utils.search_index import get_search_index, order_by_ids
+        search_index = get_search_index()
+        filters = {'pet_type': pet_type} if pet_type in ['cat', 'dog'] else None
+        hits = search_index.search_ids('feeds', query, limit=limit, filters=filters)
+        total_count = search_index.count('feeds', query, filters=filters)
         
-        # 限制數量
-        feeds = queryset[:limit]
+        scores = dict(hits)
+        feeds = order_by_ids(listing_queryset(Feed.objects.all()), [feed_id for feed_id, _ in hits])
         
-        if not feeds.exists():
+        if not feeds:
             return Response({
                 'data': [],
                 'message': f'找不到與「{query}」相關的飼料',
@@ -1149,53 +1140,8 @@ class FeedSearchView(APIView):
                 'total_count': 0
             }, status=status.HTTP_200_OK)
         
-        # 檢查每個飼料是否被當前使用者標記
-        marked_feed_ids = set(
-            UserFeedMark.objects.filter(
-                user=request.user,
-                feed__in=feeds
-            ).values_list('feed_id', flat=True)
-        )
-        
-        # 組裝數據
-        data = []
-        for feed in feeds:
-            feed_data = {
-                'id': feed.id,
-                'name': feed.name,
-                'brand': feed.brand,
-                'pet_type': feed.pet_type,
-                'protein': feed.protein,
-                'fat': feed.fat,
-                'carbohydrate': feed.carbohydrate,
-                'calcium': feed.calcium,
-                'phosphorus': feed.phosphorus,
-                'magnesium': feed.magnesium,
-                'sodium': feed.sodium,
-                'price': feed.price,
-                'review_count': feed.review_count,
-                'is_verified': feed.is_verified,
-                'front_image_url': None,
-                'nutrition_image_url': None,
-                'created_at': feed.created_at,
-                'updated_at': feed.updated_at,
-                'created_by': feed.created_by.username if feed.created_by else None,
-                'created_by_id': feed.created_by.id if feed.created_by else None,
-                'created_by_name': feed.created_by.username if feed.created_by else None,
-                # 標記狀態
-                'is_marked': feed.id in marked_feed_ids
-            }
-            
-            # 獲取圖片 URL
-            front_image = feed.feed_images.filter(image_type='front').first()
-            if front_image:
-                feed_data['front_image_url'] = front_image.firebase_url
-                
-            nutrition_image = feed.feed_images.filter(image_type='nutrition').first()
-            if nutrition_image:
-                feed_data['nutrition_image_url'] = nutrition_image.firebase_url
-            
-            data.append(feed_data)
+        # 加上搜尋相關分數
+        data = self.serialize_feeds(request, feeds, relevance_scores=scores)
         
         return Response({
             'data': data,
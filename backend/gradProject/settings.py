@@ -273,6 +273,68 @@ DATABASES = {
 AUTH_USER_MODEL = 'accounts.CustomUser'
 RECOMMENDATIONS_ENABLED = False
 
+# BERT embedding engine (utils/embedding_engine.py)
+EMBEDDING_TOKEN_BUDGET = 8192   # 每批 token 預算（批次筆數 × 最長序列長度）
+EMBEDDING_NUM_THREADS = None    # 建立索引時的 torch 執行緒數，None 表示使用所有核心
+EMBEDDING_QUANTIZE = False      # int8 動態量化（CPU）；啟用後需重建向量資料庫
+EMBEDDING_BATCH_WAIT_MS = 5     # 微批次收集單筆嵌入請求的最長等待時間（毫秒）
+EMBEDDING_MAX_BATCH = 64        # 微批次單次 forward 最多合併的請求數
+VECTOR_INDEXING_ASYNC = True    # signal 觸發的向量更新交由背景佇列處理（False 則於交易提交後同步執行）
+VECTOR_INDEXING_COALESCE_SECONDS = 2   # 新工作延遲處理的秒數，讓連續變更合併成一次
+VECTOR_INDEXING_WORKER_THREAD = True   # 在 web 程序內啟動背景 worker；改用 run_vector_indexer 獨立程序時設為 False
+
+# AI 聊天的 LLM 後端：'openai'，或 'stub'（aiAgent/services/stub_llm.py，本機測試用，不需要 API 金鑰）
+AI_AGENT_LLM_BACKEND = os.getenv('AI_AGENT_LLM_BACKEND', 'openai')
+AI_AGENT_STUB_LLM_LATENCY = 0.0   # stub 每次呼叫 / 每個串流片段模擬的延遲（秒）
+
+# 本機意圖分類器（aiAgent/services/intent_classifier.py），信心足夠時不呼叫 LLM 分析意圖
+AI_INTENT_FAST_PATH_ENABLED = True
+AI_INTENT_FAST_PATH_INTENTS = ['general', 'tutorial']   # 可略過 LLM 的意圖（不需要 LLM 萃取實體的）
+AI_INTENT_FAST_PATH_THRESHOLD = 0.8        # k-NN 加權得票比例門檻
+AI_INTENT_FAST_PATH_MIN_SIMILARITY = 0.9   # 最相近範例的餘弦相似度門檻
+AI_INTENT_FAST_PATH_AUDIT_RATE = 0.05      # 本機命中時仍抽樣呼叫 LLM 比對的比例（估計準確率）
+
+# 全文搜尋索引（SQLite FTS5，utils/search_index.py），不存在時第一次搜尋會自動建立
+SEARCH_INDEX_PATH = BASE_DIR / 'search_index.sqlite3'
+
+# 搜尋建議前綴索引（utils/suggestion_index.py），各 worker 共用快照檔
+SUGGESTION_INDEX_SNAPSHOT_PATH = BASE_DIR / 'suggestion_index.pickle'
+SUGGESTION_INDEX_REFRESH_SECONDS = 600  # 快照過期時間（秒），過期後重新載入或從資料庫重建
+
+# 互動狀態快取（列表端點的按讚 / 收藏等狀態，互動變更時自動失效）
+INTERACTION_STATE_CACHE_TTL = 300     # 秒；0 表示不快取
+
+# 快取
+# default：各 worker 程序共用的 SQLite 快取檔（utils/sqlite_cache.py），不需要外部服務
+# images：ImageService 的兩層快取（utils/tiered_cache.py），程序內 LRU + default；
+#         失效時遞增 default 中的版本鍵，其他程序最多 SYNC_INTERVAL 秒後清空自己的 LRU
+# llm：LLM 回應快取（utils/llm_cache.py），獨立的 SQLite 檔，超過 MAX_ENTRIES 時淘汰最早到期的回應
+CACHES = {
+    'default': {
+        'BACKEND': 'utils.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'images': {
+        'BACKEND': 'utils.tiered_cache.TieredCache',
+        'LOCATION': 'images',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'SHARED': 'default',
+            'LOCAL_MAX_ENTRIES': 2048,
+            'SYNC_INTERVAL': 1.0,   # 秒
+            'LOCAL_TIMEOUT': 60,    # 秒；LRU 項目的存活上限
+        },
+    },
+    'llm': {
+        'BACKEND': 'utils.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'llm_cache.sqlite3',
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -319,6 +381,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Firebase Storage 配置
 FIREBASE_CREDENTIALS_PATH = os.path.join(BASE_DIR, 'config', 'petapp-c2e46-firebase-adminsdk-fbsvc-0ec3a87ef4.json')
 FIREBASE_STORAGE_BUCKET = 'petapp-c2e46.firebasestorage.app'
+FIREBASE_UPLOAD_MAX_WORKERS = 8     # 批量上傳 / 刪除的並行執行緒數（所有請求共用）
+FIREBASE_UPLOAD_RETRIES = 3         # 暫時性錯誤（逾時、429、5xx）的重試次數
+FIREBASE_STORAGE_LOCAL_DIR = None   # 設定目錄時改用本機 bucket（utils/local_bucket.py），測試 / 開發用
+
+# 貼文圖片背景上傳（social/post_media.py），建立 / 編輯貼文的交易不等待上傳
+POST_MEDIA_UPLOAD_ASYNC = True      # False 則於交易提交後在請求中同步上傳（測試、除錯用）
+POST_MEDIA_UPLOAD_WORKERS = 2       # 同時處理的上傳工作數（每個工作內的圖片再由 FIREBASE_UPLOAD_MAX_WORKERS 並行上傳）
+POST_MEDIA_JOB_STALE_MINUTES = 15   # pending / running 超過此分鐘數未更新的工作視為中斷，標記為 failed
 
 # 日誌配置
 LOGGING = {
@@ -17,3 +17,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gradProject.settings')
 
 application = get_wsgi_application()
+
+# 只在處理請求的程序啟動背景向量索引 worker（由 VECTOR_INDEXING_WORKER_THREAD 控制）
+from aiAgent.services.indexing_queue import start_worker  # noqa: E402
+
+start_worker()
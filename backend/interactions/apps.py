@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InteractionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'interactions'
+
+    def ready(self):
+        """應用初始化完成後執行"""
+        # 導入信號處理器
+        import interactions.signals  # noqa
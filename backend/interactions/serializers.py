@@ -2,9 +2,42 @@ from rest_framework import serializers
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
 from .models import UserInteraction
+from .services import get_interaction_states, get_interaction_state, empty_interaction_state
 
 User = get_user_model()
 
+class InteractionStateListSerializer(serializers.ListSerializer):
+    """
+    many=True 時以一次查詢取得整頁項目的互動狀態，放入 context['interaction_states']
+    （子序列化器需使用 InteractionStateMixin）
+    """
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        request = self._context.get('request')
+        if 'interaction_states' not in self._context and request is not None:
+            self._context['interaction_states'] = get_interaction_states(
+                request.user,
+                [self.child.get_interactable_id(item) for item in items]
+            )
+        return super().to_representation(items)
+
+class InteractionStateMixin:
+    """讀取批次查詢的互動狀態（單筆序列化時查詢一次）"""
+    def get_interactable_id(self, obj):
+        """項目對應的 Interactables ID（子類可覆蓋）"""
+        return obj.id
+
+    def get_user_interaction_state(self, obj):
+        interactable_id = self.get_interactable_id(obj)
+        states = self.context.get('interaction_states')
+        if states is not None and interactable_id in states:
+            return states[interactable_id]
+
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return empty_interaction_state()
+        return get_interaction_state(request.user, interactable_id)
+
 class UserInteractionSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserInteraction
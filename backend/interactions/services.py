@@ -0,0 +1,143 @@
+"""
+Interaction State Service
+使用者對多個互動物件（貼文、疾病檔案、留言）的互動狀態批次查詢
+
+列表端點原本對每個項目各查詢五次 exists()（按讚 / 點讚 / 踩 / 收藏 / 分享），
+這裡改為一次查詢取回使用者對整頁項目的所有互動關係，並可依使用者快取：
+快取以「使用者世代號」組成鍵，任何 UserInteraction 新增 / 刪除時遞增世代號，
+舊的快取項目自然失效（見 interactions/signals.py）。
+"""
+
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# 互動狀態欄位與 UserInteraction.relation 的對應
+INTERACTION_FIELDS = {
+    'is_liked': 'liked',
+    'is_upvoted': 'upvoted',
+    'is_downvoted': 'downvoted',
+    'is_saved': 'saved',
+    'is_shared': 'shared',
+}
+
+# 預設快取時間（秒），可用 settings.INTERACTION_STATE_CACHE_TTL 覆蓋，0 表示不使用快取
+DEFAULT_CACHE_TTL = 300
+
+# 使用者世代號的存活時間（秒），需長於狀態快取時間
+GENERATION_TTL = 24 * 60 * 60
+
+
+def empty_interaction_state():
+    """沒有任何互動時的狀態"""
+    return {field: False for field in INTERACTION_FIELDS}
+
+
+def build_interaction_state(relations):
+    """
+    由互動關係集合建立狀態字典
+
+    Args:
+        relations (iterable): UserInteraction.relation 的集合
+
+    Returns:
+        dict: {'is_liked': bool, 'is_upvoted': bool, ...}
+    """
+    relations = set(relations)
+    return {field: relation in relations for field, relation in INTERACTION_FIELDS.items()}
+
+
+def _cache_ttl():
+    return getattr(settings, 'INTERACTION_STATE_CACHE_TTL', DEFAULT_CACHE_TTL)
+
+
+def _generation_key(user_id):
+    return f"interaction_state:{user_id}:generation"
+
+
+def _get_generation(user_id):
+    generation = cache.get(_generation_key(user_id))
+    if generation is None:
+        # 以時間作為初始值：世代號被淘汰後重新建立時，不會撞到仍在快取中的舊項目
+        cache.add(_generation_key(user_id), time.time_ns() // 1000, GENERATION_TTL)
+        generation = cache.get(_generation_key(user_id))
+    return generation
+
+
+def invalidate_interaction_states(user_id):
+    """讓使用者所有已快取的互動狀態失效"""
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        # 世代號不存在（從未快取或已過期），沒有需要失效的項目
+        pass
+
+
+def get_interaction_relations(user, interactable_ids, use_cache=True):
+    """
+    取得使用者對多個互動物件的互動關係（一次查詢）
+
+    Args:
+        user: 使用者（未登入時所有項目都沒有互動）
+        interactable_ids (iterable): Interactables ID（PostFrame / Comment ID）
+        use_cache (bool): 是否使用依使用者的快取
+
+    Returns:
+        dict: {interactable_id: set(relation)}，沒有互動的項目為空集合
+    """
+    from .models import UserInteraction
+
+    interactable_ids = [pk for pk in dict.fromkeys(interactable_ids) if pk is not None]
+    relations = {pk: set() for pk in interactable_ids}
+    if not interactable_ids or user is None or not user.is_authenticated:
+        return relations
+
+    ttl = _cache_ttl()
+    use_cache = use_cache and ttl > 0
+    missing = interactable_ids
+    if use_cache:
+        prefix = f"interaction_state:{user.id}:{_get_generation(user.id)}:"
+        cached = cache.get_many([prefix + str(pk) for pk in interactable_ids])
+        missing = []
+        for pk in interactable_ids:
+            value = cached.get(prefix + str(pk))
+            if value is None:
+                missing.append(pk)
+            else:
+                relations[pk] = set(value)
+
+    if missing:
+        for pk, relation in UserInteraction.objects.filter(
+            user_id=user.id, interactables_id__in=missing
+        ).values_list('interactables_id', 'relation'):
+            relations[pk].add(relation)
+
+        if use_cache:
+            cache.set_many({prefix + str(pk): sorted(relations[pk]) for pk in missing}, ttl)
+
+    return relations
+
+
+def get_interaction_states(user, interactable_ids, use_cache=True):
+    """
+    取得使用者對多個互動物件的互動狀態（外部調用接口）
+
+    Args:
+        user: 使用者
+        interactable_ids (iterable): Interactables ID
+        use_cache (bool): 是否使用依使用者的快取
+
+    Returns:
+        dict: {interactable_id: {'is_liked': bool, ...}}
+    """
+    return {
+        pk: build_interaction_state(relations)
+        for pk, relations in get_interaction_relations(user, interactable_ids, use_cache).items()
+    }
+
+
+def get_interaction_state(user, interactable_id, use_cache=True):
+    """取得使用者對單一互動物件的互動狀態"""
+    if interactable_id is None:
+        return empty_interaction_state()
+    return get_interaction_states(user, [interactable_id], use_cache)[interactable_id]
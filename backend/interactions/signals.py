@@ -0,0 +1,22 @@
+"""
+Interactions Signals
+互動新增 / 刪除時讓使用者的互動狀態快取失效
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import UserInteraction
+from .services import invalidate_interaction_states
+
+
+@receiver(post_save, sender=UserInteraction)
+@receiver(post_delete, sender=UserInteraction)
+def invalidate_interaction_state_cache(sender, instance, **kwargs):
+    """
+    任何寫入路徑（互動視圖、疾病檔案按讚 / 收藏、刪除貼文時的級聯刪除）都會觸發，
+    交易提交後才失效，避免其他請求在提交前重新快取舊狀態
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_interaction_states(user_id))
@@ -267,13 +267,16 @@ class UserLikedPostsView(APIView):
             else:
                 liked_interactions = liked_interactions.order_by('-interactables__created_at')
             
-            # 提取貼文物件
-            post_frames = [
-                interaction.interactables.postframe 
-                for interaction in liked_interactions
-            ]
-
-            solContent = SoLContent.get_content(postFrameList=post_frames)
+            # 提取貼文 ID（不逐筆讀取 PostFrame 子表）
+            liked_interactions = list(liked_interactions)
+            post_ids = [interaction.interactables_id for interaction in liked_interactions]
+
+            # 貼文內容依排序選項的順序排列
+            position = {post_id: index for index, post_id in enumerate(post_ids)}
+            solContent = sorted(
+                SoLContent.objects.filter(postFrame_id__in=post_ids),
+                key=lambda content: position[content.postFrame_id]
+            )
 
             # 序列化貼文數據
             serializer = SolPostSerializer(
@@ -284,14 +287,10 @@ class UserLikedPostsView(APIView):
             
             # 為每個貼文添加按讚日期
             serialized_data = serializer.data
-            for i, post_data in enumerate(serialized_data):
-                # 找到對應的按讚記錄
-                interaction = next(
-                    (inter for inter in liked_interactions if inter.interactables.id == post_data['post_id']),
-                    None
-                )
-                if interaction:
-                    post_data['liked_at'] = interaction.created_at
+            interaction_dates = {interaction.interactables_id: interaction.created_at for interaction in liked_interactions}
+            for post_data in serialized_data:
+                if post_data['post_id'] in interaction_dates:
+                    post_data['liked_at'] = interaction_dates[post_data['post_id']]
             
             return Response(
                 create_response(
@@ -354,13 +353,16 @@ class UserSavedPostsView(APIView):
             else:
                 saved_interactions = saved_interactions.order_by('-interactables__created_at')
             
-            # 提取貼文物件
-            post_frames = [
-                interaction.interactables.postframe 
-                for interaction in saved_interactions
-            ]
-
-            solContent = SoLContent.get_content(postFrameList=post_frames)
+            # 提取貼文 ID（不逐筆讀取 PostFrame 子表）
+            saved_interactions = list(saved_interactions)
+            post_ids = [interaction.interactables_id for interaction in saved_interactions]
+
+            # 貼文內容依排序選項的順序排列
+            position = {post_id: index for index, post_id in enumerate(post_ids)}
+            solContent = sorted(
+                SoLContent.objects.filter(postFrame_id__in=post_ids),
+                key=lambda content: position[content.postFrame_id]
+            )
 
             # 序列化貼文數據
             serializer = SolPostSerializer(
@@ -371,14 +373,10 @@ class UserSavedPostsView(APIView):
             
             # 為每個貼文添加按讚日期
             serialized_data = serializer.data
-            for i, post_data in enumerate(serialized_data):
-                # 找到對應的按讚記錄
-                interaction = next(
-                    (inter for inter in saved_interactions if inter.interactables.id == post_data['post_id']),
-                    None
-                )
-                if interaction:
-                    post_data['liked_at'] = interaction.created_at
+            interaction_dates = {interaction.interactables_id: interaction.created_at for interaction in saved_interactions}
+            for post_data in serialized_data:
+                if post_data['post_id'] in interaction_dates:
+                    post_data['liked_at'] = interaction_dates[post_data['post_id']]
             
             return Response(
                 create_response(
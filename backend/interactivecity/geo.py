@@ -0,0 +1,80 @@
+"""
+Geo Utilities
+站點距離計算（haversine）與附近範圍的邊界框
+
+原本每次都以 geopy.geodesic 逐一計算距離；這裡改用球面 haversine 公式，
+並以 NumPy 一次計算多個站點的距離。簽到範圍只有數十到數百公尺，
+與 geodesic（WGS-84 橢球）的誤差小於 0.5%。
+"""
+
+import math
+import numpy as np
+
+# 地球平均半徑（公尺，IUGG）
+EARTH_RADIUS_M = 6371008.8
+
+# 每一度緯度的距離（公尺）
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    """
+    計算兩點之間的距離
+
+    Args:
+        lat1, lng1: 第一點的緯度 / 經度（度）
+        lat2, lng2: 第二點的緯度 / 經度（度）
+
+    Returns:
+        float: 距離（公尺）
+    """
+    phi1, phi2 = math.radians(float(lat1)), math.radians(float(lat2))
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(float(lng2) - float(lng1))
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distances_meters(lat, lng, lats, lngs):
+    """
+    計算一個位置到多個站點的距離（向量化）
+
+    Args:
+        lat, lng: 使用者位置（度）
+        lats, lngs: 站點的緯度 / 經度陣列（度）
+
+    Returns:
+        numpy.ndarray: 距離陣列（公尺）
+    """
+    phi = math.radians(float(lat))
+    phis = np.radians(np.asarray(lats, dtype=np.float64))
+    d_phi = phis - phi
+    d_lambda = np.radians(np.asarray(lngs, dtype=np.float64) - float(lng))
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi) * np.cos(phis) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius):
+    """
+    涵蓋以 (lat, lng) 為中心、半徑 radius 公尺圓形範圍的經緯度邊界框
+
+    Args:
+        lat, lng: 中心位置（度）
+        radius (float): 半徑（公尺）
+
+    Returns:
+        tuple: (最小緯度, 最大緯度, 最小經度, 最大經度)；
+               範圍跨越極點或換日線時經度為 (-180, 180)
+    """
+    lat, lng = float(lat), float(lng)
+    d_lat = radius / METERS_PER_DEGREE
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    # 高緯度的經度間距較小，以邊界框中離赤道最遠的緯度計算
+    d_lng = d_lat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    min_lng, max_lng = lng - d_lng, lng + d_lng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
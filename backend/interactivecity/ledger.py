@@ -0,0 +1,148 @@
+"""
+Coin Ledger
+金幣帳本：交易紀錄與使用者餘額的原子更新
+
+原本 CoinTransaction.save 先讀取餘額、在 Python 計算交易後餘額再整個覆寫，
+同時發生的簽到獎勵與競標退款會互相覆蓋（遺失更新），total_earned / total_spent 也從未維護。
+
+這裡所有入帳都在同一個資料庫交易中完成：
+1. 依 user_id 排序後以 select_for_update 鎖定相關使用者的餘額列
+   （只鎖這些使用者，固定的加鎖順序避免死鎖）
+2. 依序計算每筆交易的交易前 / 交易後餘額，餘額不足時整批回滾
+3. 一次 bulk_create 寫入交易紀錄，餘額以 F() 運算式增減
+
+入帳是一批一批的：例如每日任務的所有獎勵可以在一次交易中結算。
+帳本的不變量為 balance = total_earned - total_spent = Σ 入帳 - Σ 出帳，
+可以用 python manage.py reconcile_coin_ledger 檢查與修正。
+"""
+
+from collections import OrderedDict
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+# 增加餘額的交易類型
+CREDIT_TYPES = {'earn', 'refund', 'bonus'}
+
+# 減少餘額的交易類型
+DEBIT_TYPES = {'spend'}
+
+
+class InsufficientCoinsError(ValueError):
+    """餘額不足（整批入帳已回滾）"""
+
+    def __init__(self, user_id, balance, amount):
+        self.user_id = user_id
+        self.balance = balance
+        self.amount = amount
+        super().__init__(f"使用者 {user_id} 餘額不足：餘額 {balance}，需要 {amount}")
+
+
+def signed_amount(type, amount):
+    """交易對餘額的影響（入帳為正、出帳為負）"""
+    if type in CREDIT_TYPES:
+        return amount
+    if type in DEBIT_TYPES:
+        return -amount
+    raise ValueError(f"未知的金幣交易類型: {type}")
+
+
+def _totals_delta(type, amount):
+    """交易對 (total_earned, total_spent) 的影響；退款視為沖銷消費"""
+    if type == 'spend':
+        return 0, amount
+    if type == 'refund':
+        return 0, -amount
+    return amount, 0
+
+
+def post_transactions(transactions):
+    """
+    原子性地入帳一批金幣交易
+
+    Args:
+        transactions (list): 尚未儲存的 CoinTransaction；同一使用者的交易依列表順序入帳
+
+    Returns:
+        list: 已儲存的交易（balance_before / balance_after 已填入）
+
+    Raises:
+        InsufficientCoinsError: 任一使用者的餘額不足以支付（整批不入帳）
+    """
+    from .models import CoinTransaction, UserCoinBalance
+
+    transactions = list(transactions)
+    if not transactions:
+        return []
+
+    by_user = OrderedDict()
+    for coin_transaction in transactions:
+        if coin_transaction.amount is None or coin_transaction.amount <= 0:
+            raise ValueError("金幣交易金額必須大於 0")
+        by_user.setdefault(coin_transaction.user_id, []).append(coin_transaction)
+    user_ids = sorted(by_user)
+
+    with transaction.atomic():
+        # 第一次入帳的使用者先建立餘額列（已存在時略過）
+        UserCoinBalance.objects.bulk_create(
+            [UserCoinBalance(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        balances = dict(
+            UserCoinBalance.objects.select_for_update()
+            .filter(user_id__in=user_ids).order_by('user_id')
+            .values_list('user_id', 'balance')
+        )
+
+        deltas = {}
+        for user_id in user_ids:
+            balance = balances[user_id]
+            earned = spent = 0
+            for coin_transaction in by_user[user_id]:
+                delta = signed_amount(coin_transaction.type, coin_transaction.amount)
+                if balance + delta < 0:
+                    raise InsufficientCoinsError(user_id, balance, coin_transaction.amount)
+                coin_transaction.balance_before = balance
+                balance += delta
+                coin_transaction.balance_after = balance
+                earned_delta, spent_delta = _totals_delta(coin_transaction.type, coin_transaction.amount)
+                earned += earned_delta
+                spent += spent_delta
+            deltas[user_id] = (balance - balances[user_id], earned, spent)
+
+        CoinTransaction.objects.bulk_create(transactions)
+
+        now = timezone.now()
+        for user_id, (delta, earned, spent) in deltas.items():
+            UserCoinBalance.objects.filter(user_id=user_id).update(
+                balance=F('balance') + delta,
+                total_earned=F('total_earned') + earned,
+                total_spent=F('total_spent') + spent,
+                last_updated=now,
+            )
+
+    return transactions
+
+
+def post(user, type, amount, reason, reference_type='', reference_id=''):
+    """
+    入帳單筆金幣交易（外部調用接口）
+
+    Returns:
+        CoinTransaction: 已儲存的交易
+
+    Raises:
+        InsufficientCoinsError: 餘額不足
+    """
+    from .models import CoinTransaction
+
+    coin_transaction = CoinTransaction(
+        user=user,
+        type=type,
+        amount=amount,
+        reason=reason,
+        reference_type=reference_type,
+        reference_id=reference_id,
+    )
+    return post_transactions([coin_transaction])[0]
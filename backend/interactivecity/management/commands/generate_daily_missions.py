@@ -0,0 +1,76 @@
+"""
+Django Management Command: 批次產生每日任務
+"""
+
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from interactivecity.missions import CHUNK_SIZE, generate_daily_missions
+from interactivecity.models import User
+
+
+class Command(BaseCommand):
+    help = '替所有啟用中的使用者產生今天的每日任務（可重複執行，已有任務的使用者會略過）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='每批處理的使用者數'
+        )
+        parser.add_argument(
+            '--active-days',
+            type=int,
+            default=None,
+            help='只處理最近 N 天內登入過的使用者（預設全部啟用中的使用者）'
+        )
+        parser.add_argument(
+            '--uniform',
+            action='store_true',
+            help='不依站點熱門度加權，均勻抽樣'
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='常駐執行：產生完成後等到隔天午夜再產生下一天的任務'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            self._generate(options)
+            if not options['watch']:
+                break
+
+            # 等到本地時間的下一個午夜（多等一分鐘，避免時鐘誤差落在前一天）
+            now = timezone.localtime()
+            next_run = timezone.make_aware(
+                datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            ) + timedelta(minutes=1)
+            self.stdout.write(f'下一次產生時間：{next_run:%Y-%m-%d %H:%M}')
+            time.sleep(max((next_run - timezone.now()).total_seconds(), 1.0))
+
+    def _generate(self, options):
+        users = User.objects.filter(is_active=True)
+        if options['active_days'] is not None:
+            users = users.filter(last_login__gte=timezone.now() - timedelta(days=options['active_days']))
+
+        self.stdout.write(f'開始產生 {timezone.localdate()} 的每日任務...')
+        started = time.time()
+        result = generate_daily_missions(
+            users=users,
+            chunk_size=options['chunk_size'],
+            weighted=not options['uniform'],
+            progress=lambda processed, created: self.stdout.write(
+                f'已處理 {processed} 位使用者，新建 {created} 個任務...'
+            ),
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"完成！共處理 {result['users']} 位使用者，新建 {result['missions']} 個任務"
+                f"（{time.time() - started:.1f}s）。"
+            )
+        )
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from interactivecity.ledger import CREDIT_TYPES, DEBIT_TYPES
+from interactivecity.models import CoinTransaction, UserCoinBalance
+
+
+def _ledger_totals(queryset):
+    """依交易紀錄計算每位使用者應有的 (餘額, 累計獲得, 累計消費)"""
+    rows = queryset.values('user_id').annotate(
+        credits=Sum('amount', filter=Q(type__in=CREDIT_TYPES)),
+        debits=Sum('amount', filter=Q(type__in=DEBIT_TYPES)),
+        earned=Sum('amount', filter=Q(type__in=CREDIT_TYPES - {'refund'})),
+        refunds=Sum('amount', filter=Q(type='refund')),
+    )
+    return {
+        row['user_id']: (
+            (row['credits'] or 0) - (row['debits'] or 0),
+            row['earned'] or 0,
+            (row['debits'] or 0) - (row['refunds'] or 0),
+        )
+        for row in rows
+    }
+
+
+class Command(BaseCommand):
+    help = '核對金幣帳本：以交易紀錄重新計算每位使用者的餘額、累計獲得與累計消費'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='將不一致的餘額修正為交易紀錄計算的結果'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('開始核對金幣帳本...')
+
+        expected = _ledger_totals(CoinTransaction.objects.all())
+        actual = {
+            user_id: (balance, total_earned, total_spent)
+            for user_id, balance, total_earned, total_spent in UserCoinBalance.objects.values_list(
+                'user_id', 'balance', 'total_earned', 'total_spent'
+            )
+        }
+
+        mismatched = []
+        for user_id in sorted(set(expected) | set(actual)):
+            ledger = expected.get(user_id, (0, 0, 0))
+            stored = actual.get(user_id)
+            if stored != ledger:
+                mismatched.append(user_id)
+                self.stdout.write(
+                    f'  使用者 {user_id}: 帳本 餘額/獲得/消費 = {ledger}，目前 = {stored}'
+                )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS(f'完成！{len(actual)} 位使用者的餘額皆與交易紀錄一致。'))
+            return
+
+        if not options['fix']:
+            self.stdout.write(
+                self.style.WARNING(f'共 {len(mismatched)} 位使用者不一致（使用 --fix 修正）。')
+            )
+            return
+
+        fixed = 0
+        for user_id in mismatched:
+            with transaction.atomic():
+                # 先鎖定餘額列再重新計算，避免與同時進行的入帳交錯
+                UserCoinBalance.objects.get_or_create(user_id=user_id)
+                UserCoinBalance.objects.select_for_update().filter(user_id=user_id).first()
+                balance, total_earned, total_spent = _ledger_totals(
+                    CoinTransaction.objects.filter(user_id=user_id)
+                ).get(user_id, (0, 0, 0))
+                UserCoinBalance.objects.filter(user_id=user_id).update(
+                    balance=balance,
+                    total_earned=total_earned,
+                    total_spent=total_spent,
+                )
+                fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'完成！共修正了 {fixed} 位使用者的金幣餘額。'))
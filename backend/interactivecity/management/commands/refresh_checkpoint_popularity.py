@@ -0,0 +1,40 @@
+"""
+Django Management Command: 批次更新站點熱門度
+"""
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from interactivecity.popularity import POPULARITY_WINDOW_DAYS, refresh_popularity_scores
+
+
+class Command(BaseCommand):
+    help = f'以最近 {POPULARITY_WINDOW_DAYS} 天的每日簽到計數重新計算全部站點的熱門度'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-old-counts',
+            action='store_true',
+            help='不清除超出時間窗的每日計數'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='常駐執行，每隔 N 秒更新一次（預設只執行一次）'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = time.time()
+            result = refresh_popularity_scores(prune=not options['keep_old_counts'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"完成！更新了 {result['checkpoints']} 個站點的熱門度，"
+                    f"清除 {result['pruned']} 筆過期的每日計數（{time.time() - started:.1f}s）。"
+                )
+            )
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
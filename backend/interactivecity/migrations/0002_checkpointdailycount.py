@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 10:00
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_counts(apps, schema_editor):
+    """以最近 30 天的有效簽到建立每日計數"""
+    CheckIn = apps.get_model('interactivecity', 'CheckIn')
+    CheckpointDailyCount = apps.get_model('interactivecity', 'CheckpointDailyCount')
+
+    since = timezone.now() - timedelta(days=30)
+    rows = (
+        CheckIn.objects.filter(is_valid=True, timestamp__gte=since)
+        .annotate(date=TruncDate('timestamp'))
+        .values('checkpoint_id', 'date')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    CheckpointDailyCount.objects.bulk_create(
+        [CheckpointDailyCount(checkpoint_id=row['checkpoint_id'], date=row['date'], count=row['count']) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interactivecity', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('count', models.IntegerField(default=0, verbose_name='簽到次數')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_counts', to='interactivecity.checkpoint', verbose_name='站點')),
+            ],
+            options={
+                'verbose_name': '站點每日簽到計數',
+                'verbose_name_plural': '站點每日簽到計數',
+                'indexes': [models.Index(fields=['date'], name='interactive_date_dc20de_idx')],
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'date'), name='unique_checkpoint_daily_count')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,186 @@
+"""
+Daily Missions
+每日任務的批次產生
+
+原本每日任務在使用者當天第一次請求時才產生：載入全部啟用的站點，
+每個任務各一次 Mission.objects.create 與 N 次 MissionCheckpoint.objects.create
+（每位使用者每天約 15 次 INSERT），第一個請求要承擔全部延遲。
+
+這裡改為排程批次產生（python manage.py generate_daily_missions）：
+- 站點只讀取一次（ID 與熱門度），以 NumPy 一次替一批使用者抽樣：
+  Gumbel-top-k 技巧（log 權重 + Gumbel 雜訊後取前 k 大）等同於依權重不放回抽樣
+- 每批使用者在同一個資料庫交易中以 bulk_create 寫入任務與任務站點
+- 已有當天每日任務的使用者會略過，因此可以重複執行（冪等），中斷後重跑會從未完成的使用者繼續
+"""
+
+from datetime import timedelta
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Checkpoint, Mission, MissionCheckpoint, User
+
+
+MISSION_CONFIGS = [
+    {'difficulty': 'easy', 'count': 2, 'reward': 10, 'title': '輕鬆散步'},
+    {'difficulty': 'medium', 'count': 4, 'reward': 25, 'title': '活力漫步'},
+    {'difficulty': 'hard', 'count': 6, 'reward': 50, 'title': '挑戰極限'},
+]
+
+# 每批處理的使用者數
+CHUNK_SIZE = 500
+
+# 熱門度加權時每個站點的基礎權重（讓沒有簽到紀錄的站點也有機會被選到）
+BASE_WEIGHT = 1.0
+
+
+def load_checkpoint_pool(weighted=True):
+    """
+    讀取可用站點（一次查詢）
+
+    Args:
+        weighted (bool): 是否依熱門度加權
+
+    Returns:
+        tuple: (站點 ID 陣列, 抽樣用的 log 權重陣列)
+    """
+    rows = list(Checkpoint.objects.filter(status='active').values_list('id', 'popularity_score'))
+    ids = np.array([row[0] for row in rows], dtype=object)
+    if weighted:
+        weights = np.array([max(row[1] or 0.0, 0.0) for row in rows], dtype=np.float64) + BASE_WEIGHT
+    else:
+        weights = np.ones(len(rows), dtype=np.float64)
+    return ids, np.log(weights)
+
+
+def sample_checkpoints(log_weights, n_users, k, rng):
+    """
+    替多位使用者各自不放回地抽出 k 個站點（向量化）
+
+    Args:
+        log_weights (numpy.ndarray): 站點的 log 權重
+        n_users (int): 使用者數
+        k (int): 每位使用者抽出的站點數
+        rng (numpy.random.Generator): 亂數產生器
+
+    Returns:
+        numpy.ndarray: (n_users, k) 的站點索引
+    """
+    keys = log_weights + rng.gumbel(size=(n_users, len(log_weights)))
+    top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    # argpartition 不保證順序，依分數排序讓站點順序也是隨機的
+    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def mission_date():
+    """目前的任務日期（本地時區）"""
+    return timezone.localdate()
+
+
+def _expires_at():
+    return timezone.now().replace(hour=23, minute=59, second=59) + timedelta(days=1)
+
+
+def _users_with_missions(user_ids, date):
+    return set(
+        Mission.objects.filter(
+            user_id__in=user_ids, type='daily', created_at__date=date
+        ).values_list('user_id', flat=True)
+    )
+
+
+def create_missions_for_users(user_ids, pool, rng=None, date=None):
+    """
+    替一批使用者建立當天的每日任務（同一個交易，bulk_create）
+
+    Args:
+        user_ids (list): 使用者 ID
+        pool (tuple): load_checkpoint_pool() 的結果
+        rng (numpy.random.Generator): 亂數產生器（預設新建）
+        date (date): 任務日期（預設今天）
+
+    Returns:
+        list: 新建立的 Mission（已有當天任務的使用者會略過）
+    """
+    checkpoint_ids, log_weights = pool
+    rng = rng or np.random.default_rng()
+    date = date or mission_date()
+    configs = [config for config in MISSION_CONFIGS if config['count'] <= len(checkpoint_ids)]
+    if len(checkpoint_ids) < 2 or not configs:
+        return []
+
+    with transaction.atomic():
+        # 鎖定這批使用者，排程與請求同時產生同一位使用者的任務時只有一方會寫入
+        list(User.objects.select_for_update().filter(id__in=user_ids).values_list('id', flat=True))
+        existing = _users_with_missions(user_ids, date)
+        user_ids = [user_id for user_id in user_ids if user_id not in existing]
+        if not user_ids:
+            return []
+
+        expires_at = _expires_at()
+        missions = []
+        mission_checkpoints = []
+        for config in configs:
+            samples = sample_checkpoints(log_weights, len(user_ids), config['count'], rng)
+            for user_id, indices in zip(user_ids, samples):
+                mission = Mission(
+                    user_id=user_id,
+                    title=config['title'],
+                    description=f"經過 {config['count']} 個站點完成今日散步",
+                    type='daily',
+                    difficulty=config['difficulty'],
+                    required_checkins=config['count'],
+                    reward_coins=config['reward'],
+                    expires_at=expires_at
+                )
+                missions.append(mission)
+                mission_checkpoints.extend(
+                    MissionCheckpoint(mission=mission, checkpoint_id=checkpoint_ids[index], order=i + 1)
+                    for i, index in enumerate(indices.tolist())
+                )
+
+        Mission.objects.bulk_create(missions)
+        MissionCheckpoint.objects.bulk_create(mission_checkpoints)
+    return missions
+
+
+def generate_daily_missions(users=None, chunk_size=CHUNK_SIZE, weighted=True, seed=None, progress=None):
+    """
+    替所有使用者產生當天的每日任務（外部調用接口）
+
+    Args:
+        users (QuerySet): 要產生任務的使用者（預設所有啟用中的使用者）
+        chunk_size (int): 每批處理的使用者數
+        weighted (bool): 是否依站點熱門度加權抽樣
+        seed (int): 亂數種子（測試用）
+        progress (callable): 每批完成後呼叫 progress(已處理使用者數, 新建任務數)
+
+    Returns:
+        dict: {'users': 處理的使用者數, 'missions': 新建任務數}
+    """
+    if users is None:
+        users = User.objects.filter(is_active=True)
+
+    pool = load_checkpoint_pool(weighted)
+    rng = np.random.default_rng(seed)
+    date = mission_date()
+
+    processed = created = 0
+    last_id = None
+    while True:
+        # 依 ID 分批（keyset），不受其他程序新增使用者影響
+        chunk = users.order_by('id')
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        user_ids = list(chunk.values_list('id', flat=True)[:chunk_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        created += len(create_missions_for_users(user_ids, pool, rng, date))
+        processed += len(user_ids)
+        if progress:
+            progress(processed, created)
+
+    return {'users': processed, 'missions': created}
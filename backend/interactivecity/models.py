@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
+from .geo import bounding_box, distance_meters, distances_meters
 import uuid
 
 User = get_user_model()
@@ -79,25 +80,22 @@ class Checkpoint(models.Model):
         return f"{self.name} ({self.latitude}, {self.longitude})"
     
     def update_popularity_score(self):
-        """更新熱門度分數（基於最近的簽到次數）"""
-        from datetime import timedelta
-        recent_checkins = self.checkins.filter(
-            timestamp__gte=timezone.now() - timedelta(days=30)
-        ).count()
+        """更新熱門度分數（基於最近的每日簽到計數，全部站點請用 refresh_checkpoint_popularity 批次更新）"""
+        from .popularity import popularity_score, recent_checkin_counts
         
-        # 計算熱門度分數（近30天簽到次數 + 總簽到次數權重）
-        self.popularity_score = recent_checkins * 2 + self.total_checkins * 0.1
+        # 總簽到次數以 F() 遞增，先讀取資料庫中的最新值
+        self.refresh_from_db(fields=['total_checkins'])
+        recent_checkins = recent_checkin_counts([self.id]).get(self.id, 0)
+        self.popularity_score = popularity_score(recent_checkins, self.total_checkins)
         self.save(update_fields=['popularity_score'])
         
+    def distance_to(self, lat, lng):
+        """計算到指定位置的距離（公尺）"""
+        return distance_meters(self.latitude, self.longitude, lat, lng)
+
     def is_within_range(self, user_lat, user_lng):
         """檢查使用者位置是否在簽到範圍內"""
-        from geopy.distance import geodesic
-        
-        checkpoint_location = (float(self.latitude), float(self.longitude))
-        user_location = (float(user_lat), float(user_lng))
-        
-        distance = geodesic(checkpoint_location, user_location).meters
-        return distance <= self.radius
+        return self.distance_to(user_lat, user_lng) <= self.radius
 
 
 class Mission(models.Model):
@@ -184,19 +182,28 @@ class Mission(models.Model):
     def mark_completed(self):
         """標記任務完成"""
         if self.status == 'active' and self.progress >= self.required_checkins:
-            self.status = 'completed'
-            self.completed_at = timezone.now()
-            self.save(update_fields=['status', 'completed_at'])
-            
-            # 發放金幣獎勵
-            CoinTransaction.objects.create(
-                user=self.user,
-                type='earn',
-                amount=self.reward_coins + self.bonus_reward,
-                reason=f'完成任務：{self.title}',
-                reference_type='mission',
-                reference_id=str(self.id)
-            )
+            from django.db import transaction
+            from .ledger import post
+
+            completed_at = timezone.now()
+            with transaction.atomic():
+                # 以條件更新搶佔完成狀態，同時完成的簽到只有一個會發放獎勵
+                if not Mission.objects.filter(id=self.id, status='active').update(
+                    status='completed', completed_at=completed_at
+                ):
+                    return False
+                self.status = 'completed'
+                self.completed_at = completed_at
+                
+                # 發放金幣獎勵
+                post(
+                    user=self.user,
+                    type='earn',
+                    amount=self.reward_coins + self.bonus_reward,
+                    reason=f'完成任務：{self.title}',
+                    reference_type='mission',
+                    reference_id=str(self.id)
+                )
             return True
         return False
 
@@ -266,47 +273,61 @@ class CheckIn(models.Model):
     def save(self, *args, **kwargs):
         # 計算到站點的距離
         if not self.distance_to_checkpoint:
-            from geopy.distance import geodesic
-            user_location = (float(self.user_latitude), float(self.user_longitude))
-            checkpoint_location = (float(self.checkpoint.latitude), float(self.checkpoint.longitude))
-            self.distance_to_checkpoint = geodesic(user_location, checkpoint_location).meters
+            self.distance_to_checkpoint = self.checkpoint.distance_to(self.user_latitude, self.user_longitude)
         
         # 驗證簽到是否在有效範圍內
         if self.distance_to_checkpoint > self.checkpoint.radius:
             self.is_valid = False
             self.validation_notes = f"距離站點 {self.distance_to_checkpoint:.1f} 公尺，超出有效範圍 {self.checkpoint.radius} 公尺"
         
+        adding = self._state.adding
         super().save(*args, **kwargs)
         
-        # 更新站點統計
-        if self.is_valid:
-            self.checkpoint.total_checkins += 1
-            self.checkpoint.save(update_fields=['total_checkins'])
-            self.checkpoint.update_popularity_score()
+        # 更新站點統計（只在新增有效簽到時，固定次數的寫入，不重新計數）
+        if adding and self.is_valid:
+            from django.db.models import F
+            from .popularity import record_checkin
+            
+            record_checkin(self.checkpoint_id, timezone.localdate(self.timestamp))
             
             # 更新任務進度
-            if self.mission:
-                mission_checkpoint = MissionCheckpoint.objects.filter(
-                    mission=self.mission,
-                    checkpoint=self.checkpoint
-                ).first()
+            if self.mission_id:
+                completed = MissionCheckpoint.objects.filter(
+                    mission_id=self.mission_id,
+                    checkpoint_id=self.checkpoint_id,
+                    is_completed=False
+                ).update(is_completed=True, completed_at=self.timestamp)
                 
-                if mission_checkpoint and not mission_checkpoint.is_completed:
-                    mission_checkpoint.is_completed = True
-                    mission_checkpoint.completed_at = self.timestamp
-                    mission_checkpoint.save()
-                    
+                if completed:
                     # 更新任務進度
-                    self.mission.progress = MissionCheckpoint.objects.filter(
-                        mission=self.mission,
-                        is_completed=True
-                    ).count()
-                    self.mission.save(update_fields=['progress'])
+                    Mission.objects.filter(id=self.mission_id).update(progress=F('progress') + completed)
+                    self.mission.refresh_from_db(fields=['progress'])
                     
                     # 檢查是否完成任務
                     self.mission.mark_completed()
 
 
+class CheckpointDailyCount(models.Model):
+    """站點每日簽到計數（熱門度的滾動時間窗，見 interactivecity/popularity.py）"""
+    
+    checkpoint = models.ForeignKey(Checkpoint, on_delete=models.CASCADE, related_name='daily_counts', verbose_name='站點')
+    date = models.DateField(verbose_name='日期')
+    count = models.IntegerField(default=0, verbose_name='簽到次數')
+    
+    class Meta:
+        verbose_name = '站點每日簽到計數'
+        verbose_name_plural = '站點每日簽到計數'
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'date'], name='unique_checkpoint_daily_count')
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.checkpoint_id} {self.date}: {self.count}"
+
+
 class CoinTransaction(models.Model):
     """金幣交易模型"""
     
@@ -349,22 +370,13 @@ class CoinTransaction(models.Model):
         return f"{self.user.username} {type_display} {self.amount} 金幣 - {self.reason}"
     
     def save(self, *args, **kwargs):
-        # 計算交易前後餘額
-        if not self.balance_before:
-            user_profile, created = UserCoinBalance.objects.get_or_create(user=self.user)
-            self.balance_before = user_profile.balance
-            
-            if self.type in ['earn', 'refund', 'bonus']:
-                self.balance_after = self.balance_before + self.amount
-            else:  # spend
-                self.balance_after = self.balance_before - self.amount
+        # 新交易一律經由帳本入帳（鎖定餘額列、計算交易前後餘額、以 F() 更新餘額）
+        if self._state.adding:
+            from .ledger import post_transactions
+            post_transactions([self])
+            return
         
         super().save(*args, **kwargs)
-        
-        # 更新使用者金幣餘額
-        user_profile, created = UserCoinBalance.objects.get_or_create(user=self.user)
-        user_profile.balance = self.balance_after
-        user_profile.save()
 
 
 class UserCoinBalance(models.Model):
@@ -468,51 +480,61 @@ class Auction(models.Model):
     
     def place_bid(self, user, amount):
         """出價"""
-        if not self.is_active:
-            return False, "競標未進行中"
-        
-        if amount <= self.current_bid:
-            return False, "出價必須高於當前最高出價"
-        
-        if amount < self.min_bid:
-            return False, f"出價不能低於最低出價 {self.min_bid}"
-        
-        if not UserCoinBalance.can_spend(user, amount):
+        from django.db import transaction
+        from .ledger import InsufficientCoinsError, post_transactions
+
+        try:
+            with transaction.atomic():
+                # 鎖定這場競標（只鎖這一列），同時的出價依序處理
+                auction = Auction.objects.select_for_update().get(pk=self.pk)
+                if not auction.is_active:
+                    return False, "競標未進行中"
+                
+                if amount <= auction.current_bid:
+                    return False, "出價必須高於當前最高出價"
+                
+                if amount < auction.min_bid:
+                    return False, f"出價不能低於最低出價 {auction.min_bid}"
+                
+                coin_transactions = []
+                # 退還前一個出價者的金幣
+                if auction.current_bidder_id:
+                    coin_transactions.append(CoinTransaction(
+                        user_id=auction.current_bidder_id,
+                        type='refund',
+                        amount=auction.current_bid,
+                        reason=f'競標被超越退款：{self.checkpoint.name}',
+                        reference_type='auction',
+                        reference_id=str(self.id)
+                    ))
+                
+                # 凍結新出價者的金幣（與退款在同一批入帳，餘額不足時整批回滾）
+                coin_transactions.append(CoinTransaction(
+                    user=user,
+                    type='spend',
+                    amount=amount,
+                    reason=f'競標出價：{self.checkpoint.name}',
+                    reference_type='auction',
+                    reference_id=str(self.id)
+                ))
+                post_transactions(coin_transactions)
+                
+                # 記錄新的出價
+                AuctionBid.objects.create(
+                    auction=auction,
+                    bidder=user,
+                    amount=amount
+                )
+                
+                # 更新競標資訊
+                auction.current_bid = amount
+                auction.current_bidder = user
+                auction.save(update_fields=['current_bid', 'current_bidder'])
+        except InsufficientCoinsError:
             return False, "金幣餘額不足"
         
-        # 退還前一個出價者的金幣
-        if self.current_bidder:
-            CoinTransaction.objects.create(
-                user=self.current_bidder,
-                type='refund',
-                amount=self.current_bid,
-                reason=f'競標被超越退款：{self.checkpoint.name}',
-                reference_type='auction',
-                reference_id=str(self.id)
-            )
-        
-        # 記錄新的出價
-        AuctionBid.objects.create(
-            auction=self,
-            bidder=user,
-            amount=amount
-        )
-        
-        # 凍結新出價者的金幣
-        CoinTransaction.objects.create(
-            user=user,
-            type='spend',
-            amount=amount,
-            reason=f'競標出價：{self.checkpoint.name}',
-            reference_type='auction',
-            reference_id=str(self.id)
-        )
-        
-        # 更新競標資訊
         self.current_bid = amount
         self.current_bidder = user
-        self.save(update_fields=['current_bid', 'current_bidder'])
-        
         return True, "出價成功"
     
     def end_auction(self):
@@ -654,12 +676,16 @@ class InteractiveCityManager:
     
     @staticmethod
     def create_daily_missions(user, date=None):
-        """為使用者創建每日任務"""
-        from datetime import timedelta
-        import random
+        """
+        為使用者創建每日任務
+
+        每日任務通常已由排程批次產生（python manage.py generate_daily_missions），
+        這裡只在使用者還沒有今日任務時補建
+        """
+        from .missions import create_missions_for_users, load_checkpoint_pool, mission_date
         
         if date is None:
-            date = timezone.now().date()
+            date = mission_date()
         
         # 檢查是否已有今日任務
         existing_missions = Mission.objects.filter(
@@ -671,68 +697,55 @@ class InteractiveCityManager:
         if existing_missions.exists():
             return existing_missions
         
-        # 獲取可用站點
-        available_checkpoints = list(Checkpoint.objects.filter(status='active'))
-        if len(available_checkpoints) < 2:
-            return []
-        
-        missions = []
-        mission_configs = [
-            {'difficulty': 'easy', 'count': 2, 'reward': 10, 'title': '輕鬆散步'},
-            {'difficulty': 'medium', 'count': 4, 'reward': 25, 'title': '活力漫步'},
-            {'difficulty': 'hard', 'count': 6, 'reward': 50, 'title': '挑戰極限'},
-        ]
-        
-        expires_at = timezone.now().replace(hour=23, minute=59, second=59) + timedelta(days=1)
-        
-        for config in mission_configs:
-            if len(available_checkpoints) >= config['count']:
-                selected_checkpoints = random.sample(available_checkpoints, config['count'])
-                
-                mission = Mission.objects.create(
-                    user=user,
-                    title=config['title'],
-                    description=f"經過 {config['count']} 個站點完成今日散步",
-                    type='daily',
-                    difficulty=config['difficulty'],
-                    required_checkins=config['count'],
-                    reward_coins=config['reward'],
-                    expires_at=expires_at
-                )
-                
-                # 添加目標站點
-                for i, checkpoint in enumerate(selected_checkpoints):
-                    MissionCheckpoint.objects.create(
-                        mission=mission,
-                        checkpoint=checkpoint,
-                        order=i + 1
-                    )
-                
-                missions.append(mission)
-        
-        return missions
+        return create_missions_for_users([user.id], load_checkpoint_pool(), date=date)
     
     @staticmethod
     def get_user_coin_balance(user):
         """獲取使用者金幣餘額"""
         return UserCoinBalance.get_balance(user)
     
+    @staticmethod
+    def annotate_distances(checkpoints, lat, lng):
+        """
+        批次計算使用者位置到多個站點的距離（地圖頁面使用）
+
+        Args:
+            checkpoints (list): Checkpoint 列表
+            lat, lng: 使用者位置
+
+        Returns:
+            list: 同一批 Checkpoint，每個都設定了 distance 屬性（公尺）
+        """
+        checkpoints = list(checkpoints)
+        if not checkpoints:
+            return checkpoints
+        distances = distances_meters(
+            lat, lng,
+            [float(checkpoint.latitude) for checkpoint in checkpoints],
+            [float(checkpoint.longitude) for checkpoint in checkpoints],
+        )
+        for checkpoint, distance in zip(checkpoints, distances.tolist()):
+            checkpoint.distance = distance
+        return checkpoints
+
     @staticmethod
     def get_nearby_checkpoints(lat, lng, radius=1000):
-        """獲取附近的站點"""
-        from geopy.distance import geodesic
-        
-        checkpoints = Checkpoint.objects.filter(status='active')
-        nearby = []
-        
-        user_location = (float(lat), float(lng))
-        
-        for checkpoint in checkpoints:
-            checkpoint_location = (float(checkpoint.latitude), float(checkpoint.longitude))
-            distance = geodesic(user_location, checkpoint_location).meters
-            
-            if distance <= radius:
-                checkpoint.distance = distance
-                nearby.append(checkpoint)
-        
-        return sorted(nearby, key=lambda x: x.distance)
\ No newline at end of file
+        """
+        獲取附近的站點
+
+        先以經緯度邊界框篩選（使用 latitude / longitude 索引），
+        只對框內的站點計算實際距離
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        checkpoints = Checkpoint.objects.filter(
+            status='active',
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lng, max_lng),
+        )
+
+        nearby = [
+            checkpoint
+            for checkpoint in InteractiveCityManager.annotate_distances(checkpoints, lat, lng)
+            if checkpoint.distance <= radius
+        ]
+        return sorted(nearby, key=lambda x: x.distance)
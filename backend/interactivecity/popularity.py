@@ -0,0 +1,111 @@
+"""
+Checkpoint Popularity
+站點熱門度的滾動時間窗計數
+
+原本每次有效簽到都會 COUNT 站點最近 30 天的全部簽到，再儲存熱門度；
+熱門站點的簽到越多，每次簽到的成本越高。
+
+這裡改為每日計數（CheckpointDailyCount）：
+- 簽到時以 F() 運算式把當天的計數與站點總簽到次數各加一（固定兩次寫入）
+- 熱門度由批次工作一次計算全部站點（python manage.py refresh_checkpoint_popularity）：
+  每個站點最近 POPULARITY_WINDOW_DAYS 天的計數加總，只需讀取每日彙總列
+- 超出時間窗的每日計數由批次工作清除
+"""
+
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+# 熱門度的時間窗（天）
+POPULARITY_WINDOW_DAYS = 30
+
+# 熱門度分數 = 近期簽到次數 × RECENT_WEIGHT + 總簽到次數 × TOTAL_WEIGHT
+RECENT_WEIGHT = 2
+TOTAL_WEIGHT = 0.1
+
+
+def popularity_score(recent_checkins, total_checkins):
+    """計算熱門度分數（近30天簽到次數 + 總簽到次數權重）"""
+    return recent_checkins * RECENT_WEIGHT + total_checkins * TOTAL_WEIGHT
+
+
+def window_start(today=None):
+    """時間窗的第一天（含）"""
+    today = today or timezone.localdate()
+    return today - timedelta(days=POPULARITY_WINDOW_DAYS - 1)
+
+
+def record_checkin(checkpoint_id, date):
+    """
+    記錄一次有效簽到（當天計數與站點總簽到次數各加一）
+
+    Args:
+        checkpoint_id: 站點 ID
+        date (date): 簽到日期（本地時區）
+    """
+    from .models import Checkpoint, CheckpointDailyCount
+
+    Checkpoint.objects.filter(id=checkpoint_id).update(total_checkins=F('total_checkins') + 1)
+
+    if CheckpointDailyCount.objects.filter(checkpoint_id=checkpoint_id, date=date).update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CheckpointDailyCount.objects.create(checkpoint_id=checkpoint_id, date=date, count=1)
+    except IntegrityError:
+        # 其他請求剛好同時建立了當天的計數
+        CheckpointDailyCount.objects.filter(checkpoint_id=checkpoint_id, date=date).update(count=F('count') + 1)
+
+
+def recent_checkin_counts(checkpoint_ids=None, today=None):
+    """
+    取得站點在時間窗內的簽到次數
+
+    Args:
+        checkpoint_ids (list): 站點 ID（預設全部站點）
+        today (date): 時間窗的最後一天（預設今天）
+
+    Returns:
+        dict: {checkpoint_id: 簽到次數}，沒有簽到的站點不會出現
+    """
+    from .models import CheckpointDailyCount
+
+    counts = CheckpointDailyCount.objects.filter(date__gte=window_start(today))
+    if checkpoint_ids is not None:
+        counts = counts.filter(checkpoint_id__in=checkpoint_ids)
+    return dict(
+        counts.values('checkpoint_id').annotate(total=Sum('count')).values_list('checkpoint_id', 'total')
+    )
+
+
+def refresh_popularity_scores(batch_size=1000, prune=True):
+    """
+    批次重新計算全部站點的熱門度（外部調用接口）
+
+    Args:
+        batch_size (int): bulk_update 每批的站點數
+        prune (bool): 是否清除超出時間窗的每日計數
+
+    Returns:
+        dict: {'checkpoints': 更新的站點數, 'pruned': 清除的每日計數列數}
+    """
+    from .models import Checkpoint, CheckpointDailyCount
+
+    today = timezone.localdate()
+    recent = recent_checkin_counts(today=today)
+
+    changed = []
+    for checkpoint in Checkpoint.objects.only('id', 'total_checkins', 'popularity_score').iterator(chunk_size=batch_size):
+        score = popularity_score(recent.get(checkpoint.id, 0), checkpoint.total_checkins)
+        if checkpoint.popularity_score != score:
+            checkpoint.popularity_score = score
+            changed.append(checkpoint)
+    Checkpoint.objects.bulk_update(changed, ['popularity_score'], batch_size=batch_size)
+
+    pruned = 0
+    if prune:
+        pruned, _ = CheckpointDailyCount.objects.filter(date__lt=window_start(today)).delete()
+
+    return {'checkpoints': len(changed), 'pruned': pruned}
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import *
-from interactions.serializers import InteractionStatusSerializer
+from interactions.serializers import (
+    InteractionStatusSerializer, InteractionStateListSerializer, InteractionStateMixin
+)
 
 # === Pet (寵物基本資料) ===
 class PetSerializer(serializers.ModelSerializer):
@@ -159,7 +161,7 @@ class IllnessSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # === DiseaseArchiveContent (疾病檔案內容) ===
-class DiseaseArchiveContentSerializer(serializers.ModelSerializer):
+class DiseaseArchiveContentSerializer(InteractionStateMixin, serializers.ModelSerializer):
     pet_name = serializers.CharField(source='pet.pet_name', read_only=True)
     user = serializers.CharField(source='postFrame.user')
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -181,6 +183,10 @@ class DiseaseArchiveContentSerializer(serializers.ModelSerializer):
             'updated_at', 'pet_info', 'user_info', 'illness_names', 'illnesses_data', 
             'interaction_stats', 'user_interaction', 'is_private', 'postFrame'
         ]
+        list_serializer_class = InteractionStateListSerializer
+
+    def get_interactable_id(self, obj):
+        return obj.postFrame_id
     
     def get_pet_info(self, obj):
         """獲取寵物資訊（前端期望格式）"""
@@ -253,23 +259,7 @@ class DiseaseArchiveContentSerializer(serializers.ModelSerializer):
     
     def get_user_interaction(self, obj):
         """獲取當前用戶與疾病檔案的互動狀態"""
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user.is_authenticated:
-            user = request.user
-            return {
-                'is_liked': obj.check_user_interaction(user, 'liked'),
-                'is_upvoted': obj.check_user_interaction(user, 'upvoted'),
-                'is_downvoted': obj.check_user_interaction(user, 'downvoted'),
-                'is_saved': obj.check_user_interaction(user, 'saved'),
-                'is_shared': obj.check_user_interaction(user, 'shared')
-            }
-        return {
-            'is_liked': False,
-            'is_upvoted': False,
-            'is_downvoted': False,
-            'is_saved': False,
-            'is_shared': False
-        }
+        return self.get_user_interaction_state(obj)
 
 # === ArchiveAbnormalPostRelation (病程紀錄和異常紀錄的關聯) ===
 class ArchiveAbnormalPostRelationSerializer(serializers.ModelSerializer):
@@ -284,7 +274,7 @@ class ArchiveIllnessRelationSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # === DiseaseArchiveSearchSerializer (搜尋用的簡化版序列化器) ===
-class DiseaseArchiveSearchSerializer(serializers.ModelSerializer):
+class DiseaseArchiveSearchSerializer(InteractionStateMixin, serializers.ModelSerializer):
     # 基本資料
     pet_name = serializers.CharField(source='pet.pet_name', read_only=True)
     pet_type = serializers.CharField(source='pet.pet_type', read_only=True)
@@ -308,6 +298,10 @@ class DiseaseArchiveSearchSerializer(serializers.ModelSerializer):
             'health_status', 'illness_names', 'user_info', 'pet_info',
             'interaction_stats', 'user_interaction', 'postFrame', 'is_private'
         ]
+        list_serializer_class = InteractionStateListSerializer
+
+    def get_interactable_id(self, obj):
+        return obj.postFrame_id
     
     def get_illness_names(self, obj):
         """獲取疾病名稱陣列"""
@@ -367,20 +361,4 @@ class DiseaseArchiveSearchSerializer(serializers.ModelSerializer):
     
     def get_user_interaction(self, obj):
         """獲取當前用戶與檔案的互動狀態"""
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user.is_authenticated:
-            user = request.user
-            return {
-                'is_liked': obj.check_user_interaction(user, 'liked'),
-                'is_upvoted': obj.check_user_interaction(user, 'upvoted'),
-                'is_downvoted': obj.check_user_interaction(user, 'downvoted'),
-                'is_saved': obj.check_user_interaction(user, 'saved'),
-                'is_shared': obj.check_user_interaction(user, 'shared')
-            }
-        return {
-            'is_liked': False,
-            'is_upvoted': False,
-            'is_downvoted': False,
-            'is_saved': False,
-            'is_shared': False
-        }
+        return self.get_user_interaction_state(obj)
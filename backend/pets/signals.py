@@ -18,13 +18,14 @@ def update_owner_vector_on_pet_save(sender, instance, created, **kwargs):
     - 寵物資料更新（名稱、品種等）
 
     因為飼主的向量包含寵物資訊，所以寵物變更時需要更新飼主向量
+    （由背景佇列處理，連續編輯多隻寵物只會重新嵌入飼主一次）
     """
-    if instance.owner:
+    if instance.owner_id:
         try:
-            from aiAgent.services.user_vector_updater import update_user_vector
-            update_user_vector(instance.owner)
+            from aiAgent.services.indexing_queue import enqueue_indexing
+            enqueue_indexing('user', instance.owner_id)
         except Exception as e:
-            print(f"⚠️ 更新飼主向量失敗（不影響寵物操作）: {str(e)}")
+            print(f"⚠️ 排入飼主向量更新失敗（不影響寵物操作）: {str(e)}")
 
 
 @receiver(post_delete, sender=Pet)
@@ -34,12 +35,12 @@ def update_owner_vector_on_pet_delete(sender, instance, **kwargs):
 
     因為飼主的向量包含寵物資訊，所以寵物刪除時需要更新飼主向量
     """
-    if instance.owner:
+    if instance.owner_id:
         try:
-            from aiAgent.services.user_vector_updater import update_user_vector
-            update_user_vector(instance.owner)
+            from aiAgent.services.indexing_queue import enqueue_indexing
+            enqueue_indexing('user', instance.owner_id)
         except Exception as e:
-            print(f"⚠️ 更新飼主向量失敗（不影響寵物操作）: {str(e)}")
+            print(f"⚠️ 排入飼主向量更新失敗（不影響寵物操作）: {str(e)}")
 
 
 @receiver(post_save, sender=DiseaseArchiveContent)
@@ -55,24 +56,13 @@ def update_disease_archive_vector_on_save(sender, instance, created, **kwargs):
     邏輯：
     - 只有公開的疾病檔案（is_private=False）才會加入向量資料庫
     - 轉為私人時會從向量資料庫移除
+    - 嵌入與寫入在交易提交後由背景佇列處理，不阻塞請求
     """
     try:
-        from aiAgent.services.vector_service import VectorService
-        vector_service = VectorService()
-
-        # 檢查是否為公開狀態
-        if not instance.is_private:
-            # 公開：加入或更新向量資料庫
-            vector_service.disease_archive_db.add_or_update_archive(instance)
-            print(f"✅ 疾病檔案 {instance.id} 已加入向量資料庫（公開）")
-        else:
-            # 私人：如果存在於向量資料庫中，則移除
-            vector_service.disease_archive_db.remove_archive(instance)
-            print(f"🔒 疾病檔案 {instance.id} 已從向量資料庫移除（私人）")
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('disease_archive', instance.id)
     except Exception as e:
-        print(f"⚠️ 更新疾病檔案向量失敗（不影響疾病檔案操作）: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        print(f"⚠️ 排入疾病檔案向量更新失敗（不影響疾病檔案操作）: {str(e)}")
 
 
 @receiver(post_delete, sender=DiseaseArchiveContent)
@@ -80,13 +70,30 @@ def delete_disease_archive_vector_on_delete(sender, instance, **kwargs):
     """
     疾病檔案刪除時，從向量資料庫移除
 
-    確保向量資料庫與資料庫保持同步
+    確保向量資料庫與資料庫保持同步（由背景佇列處理）
     """
+    if not instance.postFrame_id:
+        return
     try:
-        from aiAgent.services.vector_service import VectorService
-        vector_service = VectorService()
-        vector_service.disease_archive_db.remove_archive(instance)
+        from aiAgent.services.indexing_queue import enqueue_indexing
+        enqueue_indexing('disease_archive', instance.id, 'remove', {'post_frame_id': instance.postFrame_id})
     except Exception as e:
-        print(f"⚠️ 刪除疾病檔案向量失敗（不影響疾病檔案操作）: {str(e)}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        print(f"⚠️ 排入疾病檔案向量刪除失敗（不影響疾病檔案操作）: {str(e)}")
+
+
+@receiver(post_save, sender=DiseaseArchiveContent)
+def update_disease_archive_search_index_on_save(sender, instance, **kwargs):
+    """
+    疾病檔案創建或更新時，於交易提交後更新全文搜尋索引
+    """
+    from utils.search_index import index_on_commit
+    index_on_commit('archives', instance)
+
+
+@receiver(post_delete, sender=DiseaseArchiveContent)
+def remove_disease_archive_search_index_on_delete(sender, instance, **kwargs):
+    """
+    疾病檔案刪除時，從全文搜尋索引移除
+    """
+    from utils.search_index import remove_on_commit
+    remove_on_commit('archives', instance.pk)
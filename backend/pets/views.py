@@ -16,6 +16,7 @@ from utils.api_response import APIResponse
 from django.db.models import Prefetch
 from utils.query_optimization import log_queries
 from utils.image_service import ImageService
+from utils.llm_cache import chat_completion
 from django.contrib.contenttypes.models import ContentType
 from rest_framework import status as drf_status
 from django.db import transaction
@@ -1624,7 +1625,9 @@ class GenerateDiseaseArchiveContentAPIView(APIView):
 
             system_message = system_messages.get(language, system_messages['zh-TW'])
 
-            response = client.chat.completions.create(
+            # 相同的異常記錄組合會產生相同的 prompt，直接使用快取的內容
+            generated_content = chat_completion(
+                client,
                 model="gpt-4o",
                 messages=[
                     {
@@ -1636,9 +1639,7 @@ class GenerateDiseaseArchiveContentAPIView(APIView):
                 max_tokens=2000,
                 temperature=0.3,
                 timeout=50  # 設置 GPT API 超時時間
-            )
-            
-            generated_content = response.choices[0].message.content.strip()
+            ).strip()
             
             # 移除標頭（1. 開頭概述：、2. 日期分段記錄：、3. 總結與回顧：）
             import re
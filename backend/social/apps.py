@@ -1,29 +1,77 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.db import close_old_connections
+import sys
 import threading
+import time
 
 
 class SocialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'social'
     _recommendation_service = None
+    _recommendation_service_lock = threading.Lock()
 
     def ready(self):
+        # 導入信號處理器
+        import social.signals  # noqa
+
         if not hasattr(SocialConfig, '_init_started'):
             SocialConfig._init_started = True
             # Initialize in a separate thread
             threading.Thread(target=self._initialize_recommendation_service, daemon=True).start()
             print("請等待推薦服務初始化完成...")
 
+            # 以下工作會查詢資料庫（migrate 時資料表可能尚未建立）
+            if 'migrate' not in sys.argv and 'makemigrations' not in sys.argv:
+                threading.Thread(target=self._initialize_suggestion_index, daemon=True).start()
+                # 重啟前中斷的圖片上傳工作標記為失敗
+                threading.Thread(target=self._fail_stale_media_jobs, daemon=True).start()
+
     def _initialize_recommendation_service(self):
         """Initialize the recommendation service after a delay"""
         try:
-            from utils.recommendation_service import RecommendationService
-            if SocialConfig._recommendation_service is None:
-                print("Initializing Social Recommendation Service")
-                SocialConfig._recommendation_service = RecommendationService()
+            SocialConfig.load_recommendation_service()
         except Exception as e:
             print(f"Error initializing recommendation service: {e}")
 
+    def _initialize_suggestion_index(self):
+        """Load (or build) the search suggestion index so the first keystroke doesn't pay for it"""
+        try:
+            # Query only after every app's ready() has run
+            while not apps.ready:
+                time.sleep(0.1)
+            close_old_connections()
+            from utils.suggestion_index import get_suggestion_index
+            get_suggestion_index()
+        except Exception as e:
+            print(f"Error initializing suggestion index: {e}")
+        finally:
+            close_old_connections()
+
+    def _fail_stale_media_jobs(self):
+        """Mark upload jobs interrupted by a previous shutdown as failed"""
+        try:
+            # Query only after every app's ready() has run
+            while not apps.ready:
+                time.sleep(0.1)
+            from .post_media import fail_stale_jobs
+            fail_stale_jobs()
+        except Exception as e:
+            print(f"Error sweeping stale post media jobs: {e}")
+        finally:
+            close_old_connections()
+
     @classmethod
     def get_recommendation_service(cls):
         return cls._recommendation_service
+
+    @classmethod
+    def load_recommendation_service(cls):
+        """Return the process-wide RecommendationService, loading BERT at most once per process"""
+        if cls._recommendation_service is None:
+            with cls._recommendation_service_lock:
+                if cls._recommendation_service is None:
+                    from utils.recommendation_service import RecommendationService
+                    print("Initializing Social Recommendation Service")
+                    cls._recommendation_service = RecommendationService()
+        return cls._recommendation_service
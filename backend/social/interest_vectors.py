@@ -0,0 +1,181 @@
+"""
+User Interest Vectors
+使用者興趣向量的增量維護
+
+推薦用的使用者向量是互動過的貼文向量加權平均：
+    w = 互動權重 × exp(-λ × (now - t) 小時)
+整體再做 L2 正規化，因此共同的衰減倍數 exp(-λ × now) 會被消去，
+只需要保存以 ref_time 為基準的累積向量 Σ 互動權重 × exp(λ × (t - ref_time)) × v，
+新增 / 刪除事件時加上或減去一項即可，讀取時不必重讀互動歷史。
+"""
+
+import math
+import numpy as np
+from django.db import transaction
+
+from .models import UserInterestVector
+
+# 與 RecommendationService.embed_user_history 預設值相同
+DECAY_LAMBDA_PER_HOUR = 0.1
+
+# seen_posts 最多保留的貼文數（最近互動的優先保留）
+MAX_SEEN_POSTS = 100
+
+CONTENT_TYPE = 'social'
+
+
+def _decode(record, dimension):
+    if not record.vector:
+        return np.zeros(dimension, dtype=np.float64)
+    return np.frombuffer(bytes(record.vector), dtype=np.float32).astype(np.float64)
+
+
+def _encode(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _rebase(vector, ref_time, timestamp):
+    """把累積向量的時間基準移到較新的時間點，避免指數溢位"""
+    if timestamp <= ref_time:
+        return vector, ref_time
+    return vector * math.exp(-DECAY_LAMBDA_PER_HOUR * (timestamp - ref_time) / 3600.0), timestamp
+
+
+def _contribution(recommendation_service, embedding, action, timestamp, ref_time):
+    weight = recommendation_service.ACTION_WEIGHTS.get(action, 1.0)
+    return embedding.astype(np.float64) * weight * math.exp(
+        DECAY_LAMBDA_PER_HOUR * (timestamp - ref_time) / 3600.0
+    )
+
+
+def _touch_seen(seen, post_id, delta):
+    key = str(post_id)
+    count = seen.pop(key, 0) + delta
+    if count > 0:
+        seen[key] = count   # 重新插入，最近互動的排在最後
+    while len(seen) > MAX_SEEN_POSTS:
+        seen.pop(next(iter(seen)))
+
+
+def _mark_stale(user_id):
+    UserInterestVector.objects.filter(user_id=user_id).update(is_stale=True)
+
+
+def apply_event(recommendation_service, user_id, post_id, action, timestamp, sign=1):
+    """
+    套用一筆互動事件到使用者興趣向量
+
+    Args:
+        recommendation_service: RecommendationService（None 表示尚未載入）
+        user_id (int): 使用者 ID
+        post_id (int): PostFrame ID
+        action (str): 互動類型（liked / saved / comment ...）
+        timestamp (float): 事件時間（epoch 秒）
+        sign (int): 1 為新增事件，-1 為移除事件
+    """
+    if recommendation_service is None:
+        # 推薦服務尚未載入，無法取得貼文向量：下次讀取時重建
+        _mark_stale(user_id)
+        return
+
+    embedding = recommendation_service.get_post_index(CONTENT_TYPE).get(post_id)
+    if embedding is None:
+        # 不是日常貼文（或尚未建立向量），不影響推薦
+        return
+
+    with transaction.atomic():
+        record = UserInterestVector.objects.select_for_update().filter(user_id=user_id).first()
+        if record is None:
+            # 還沒有興趣向量：第一次讀取時會從互動歷史完整建立
+            return
+        if record.is_stale:
+            return
+
+        vector = _decode(record, embedding.shape[0])
+        vector, record.ref_time = _rebase(vector, record.ref_time, timestamp)
+        vector += sign * _contribution(recommendation_service, embedding, action, timestamp, record.ref_time)
+
+        record.vector = _encode(vector)
+        record.event_count = max(record.event_count + sign, 0)
+        seen = dict(record.seen_posts)
+        _touch_seen(seen, post_id, sign)
+        record.seen_posts = seen
+        record.save(update_fields=['vector', 'ref_time', 'event_count', 'seen_posts', 'updated_at'])
+
+
+def rebuild(recommendation_service, user):
+    """
+    從互動與留言歷史完整重建使用者興趣向量（兩次查詢）
+
+    Returns:
+        UserInterestVector: 重建後的紀錄
+    """
+    from interactions.models import UserInteraction
+    from comments.models import Comment
+
+    index = recommendation_service.get_post_index(CONTENT_TYPE)
+
+    events = [
+        (post_id, relation, created_at.timestamp())
+        for post_id, relation, created_at in UserInteraction.objects.filter(
+            user=user, interactables_id__isnull=False
+        ).values_list('interactables_id', 'relation', 'created_at')
+    ]
+    events += [
+        (post_id, 'comment', created_at.timestamp())
+        for post_id, created_at in Comment.objects.filter(
+            user=user, postFrame_id__isnull=False
+        ).values_list('postFrame_id', 'created_at')
+    ]
+    events.sort(key=lambda event: event[2])
+
+    vector = np.zeros(index.dimension, dtype=np.float64)
+    ref_time = events[-1][2] if events else 0.0
+    seen = {}
+    count = 0
+    for post_id, action, timestamp in events:
+        embedding = index.get(post_id)
+        if embedding is None:
+            continue
+        vector += _contribution(recommendation_service, embedding, action, timestamp, ref_time)
+        _touch_seen(seen, post_id, 1)
+        count += 1
+
+    record, _ = UserInterestVector.objects.update_or_create(
+        user=user,
+        defaults={
+            'vector': _encode(vector),
+            'ref_time': ref_time,
+            'event_count': count,
+            'seen_posts': seen,
+            'is_stale': False,
+        }
+    )
+    return record
+
+
+def get_user_interest(recommendation_service, user):
+    """
+    取得使用者目前的興趣向量（不存在或過期時先重建）
+
+    Returns:
+        tuple | None: (正規化後的使用者向量, 互動過的貼文 ID 列表)，沒有互動歷史時返回 None
+    """
+    record = UserInterestVector.objects.filter(user=user).first()
+    if record is None or record.is_stale:
+        record = rebuild(recommendation_service, user)
+
+    if record.event_count <= 0:
+        return None
+
+    index = recommendation_service.get_post_index(CONTENT_TYPE)
+    vector = _decode(record, index.dimension)
+    norm = np.linalg.norm(vector)
+    if norm < 1e-12:
+        vector = index.mean()
+        if vector is None:
+            return None
+        norm = np.linalg.norm(vector)
+
+    seen_ids = [int(post_id) for post_id in record.seen_posts]
+    return (vector / norm).astype(np.float32), seen_ids
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from utils.search_index import SEARCH_INDEXES, get_search_index
+
+class Command(BaseCommand):
+    help = '從資料庫重建全文搜尋索引（用戶、貼文、標籤、疾病檔案、飼料）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'indexes',
+            nargs='*',
+            choices=list(SEARCH_INDEXES),
+            help='要重建的索引（預設全部）'
+        )
+
+    def handle(self, *args, **options):
+        search_index = get_search_index()
+        names = options['indexes'] or list(SEARCH_INDEXES)
+
+        for name in names:
+            self.stdout.write(f'重建搜尋索引: {name}...')
+            count = search_index.rebuild(name)
+            self.stdout.write(f'  共寫入 {count} 筆')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'完成！共重建 {len(names)} 個搜尋索引（{search_index.path}）。')
+        )
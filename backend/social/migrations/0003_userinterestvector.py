@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 03:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('social', '0002_postframe_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserInterestVector',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='interest_vector', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('vector', models.BinaryField(help_text='加權累積向量（float32）')),
+                ('ref_time', models.FloatField(default=0, help_text='累積向量的時間基準（epoch 秒）')),
+                ('event_count', models.IntegerField(default=0, help_text='計入的事件數')),
+                ('seen_posts', models.JSONField(blank=True, default=dict, help_text='互動過的貼文 {post_id: 事件數}')),
+                ('is_stale', models.BooleanField(default=False, help_text='有事件未能套用，下次讀取時重建')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0003_userinterestvector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMediaJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', '等待上傳'), ('running', '上傳中'), ('done', '完成'), ('partial', '部分失敗'), ('failed', '失敗')], default='pending', max_length=10)),
+                ('total', models.IntegerField(default=0, help_text='要上傳的圖片數')),
+                ('uploaded', models.IntegerField(default=0, help_text='成功上傳的圖片數')),
+                ('message', models.TextField(blank=True, help_text='結果或錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('postFrame', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_jobs', to='social.postframe')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -407,7 +407,18 @@ class ImageAnnotation(models.Model):
         Returns:
         - str: 根據 target_type 和 target_id 動態獲取的名稱
         """
-        target_object = self.get_target_object()
+        return self.get_display_name(self.get_target_object())
+
+    def get_display_name(self, target_object):
+        """
+        根據已載入的標註目標取得顯示名稱（批次序列化時可先批次載入目標）
+        
+        Parameters:
+        - target_object: 標註目標（用戶或寵物物件，不存在時為 None）
+        
+        Returns:
+        - str: 標註目標的名稱
+        """
         if target_object is None:
             return f"{self.target_type}_{self.target_id}"  # 回退到類型_ID
         
@@ -446,4 +457,80 @@ class ImageAnnotation(models.Model):
             self.save(update_fields=update_fields)
             return True
         
-        return False
\ No newline at end of file
+        return False
+
+#----------使用者興趣向量----------
+class UserInterestVector(models.Model):
+    """
+    使用者興趣向量（推薦用）
+
+    由按讚 / 收藏 / 留言等事件增量維護，不需要每次請求都重建互動歷史。
+    vector 儲存以 ref_time 為時間基準的加權累積向量（float32），
+    時間衰減在讀取時套用。
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='interest_vector',
+        primary_key=True
+    )
+    vector = models.BinaryField(help_text="加權累積向量（float32）")
+    ref_time = models.FloatField(default=0, help_text="累積向量的時間基準（epoch 秒）")
+    event_count = models.IntegerField(default=0, help_text="計入的事件數")
+    seen_posts = models.JSONField(default=dict, blank=True, help_text="互動過的貼文 {post_id: 事件數}")
+    is_stale = models.BooleanField(default=False, help_text="有事件未能套用，下次讀取時重建")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Interest vector of {self.user_id} ({self.event_count} events)"
+
+#----------貼文圖片上傳工作----------
+class PostMediaJob(models.Model):
+    """
+    貼文圖片的背景上傳工作
+
+    建立 / 編輯貼文時圖片在交易提交後才於背景上傳（social/post_media.py），
+    前端以此紀錄的狀態輪詢上傳進度。
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_PARTIAL = 'partial'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待上傳'),
+        (STATUS_RUNNING, '上傳中'),
+        (STATUS_DONE, '完成'),
+        (STATUS_PARTIAL, '部分失敗'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    postFrame = models.ForeignKey(
+        PostFrame,
+        on_delete=models.CASCADE,
+        related_name='media_jobs'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total = models.IntegerField(default=0, help_text="要上傳的圖片數")
+    uploaded = models.IntegerField(default=0, help_text="成功上傳的圖片數")
+    message = models.TextField(blank=True, help_text="結果或錯誤訊息")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Media job {self.id} of post {self.postFrame_id} ({self.status})"
+
+    def to_dict(self):
+        """狀態資料（API 回應用）"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'uploaded': self.uploaded,
+            'message': self.message,
+            'updated_at': self.updated_at,
+        }
@@ -0,0 +1,274 @@
+"""
+Post Media
+貼文圖片的背景上傳
+
+原本建立 / 編輯貼文時，圖片上傳到 Firebase 與 BERT 嵌入都在 @transaction.atomic 內同步執行，
+SQLite 的寫入鎖要持有數秒，這段期間其他請求的寫入全部排隊。
+
+這裡把貼文寫入拆成兩段：
+- 交易內只寫入貼文、內容、標籤與寵物關聯，並建立一筆 PostMediaJob（寫入鎖只持有數毫秒）
+- 交易提交後（transaction.on_commit）把圖片交給背景執行緒池上傳，上傳完成後才以一個短交易
+  寫入 Image、圖片標註與標註產生的寵物關聯；進度記錄在 PostMediaJob
+  （pending → running → done / partial / failed），前端可輪詢 posts/<id>/media-status/
+嵌入則由 SoLContent 的 signal 排入 social_post 向量索引工作（aiAgent.services.indexing_queue）。
+
+上傳的檔案在交易開始前先讀入記憶體（請求結束後 Django 會刪除暫存檔）；
+程序在上傳完成前結束時，工作會停留在 pending / running，超過 POST_MEDIA_JOB_STALE_MINUTES
+沒有更新的工作由 fail_stale_jobs() 標記為 failed（啟動時與查詢上傳狀態時執行），需要重新上傳。
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ImageAnnotation, PostFrame, PostMediaJob, PostPets
+
+logger = logging.getLogger(__name__)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'POST_MEDIA_UPLOAD_WORKERS', 2),
+                    thread_name_prefix='post-media'
+                )
+    return _executor
+
+
+def buffer_uploads(image_files):
+    """
+    把上傳的檔案讀入記憶體（請求結束後仍可使用）
+
+    在開始資料庫交易前呼叫，讀檔不佔用寫入鎖的時間
+    """
+    buffered = []
+    for image_file in image_files:
+        image_file.seek(0)
+        buffered.append(SimpleUploadedFile(
+            name=image_file.name,
+            content=image_file.read(),
+            content_type=getattr(image_file, 'content_type', None)
+        ))
+    return buffered
+
+
+def parse_annotations(annotations_data):
+    """
+    解析請求中的圖片標註
+
+    Args:
+        annotations_data: JSON 字串或已解析的列表
+
+    Returns:
+        list: 標註列表（格式錯誤時為空列表）
+    """
+    if not annotations_data:
+        return []
+    try:
+        if isinstance(annotations_data, str):
+            annotations = json.loads(annotations_data)
+        else:
+            annotations = annotations_data
+        return list(annotations)
+    except (TypeError, ValueError) as e:
+        logger.error(f"處理圖片標註時出錯: {str(e)}")
+        return []
+
+
+def schedule_post_images(post_frame, user, image_files, start_sort_order=0, annotations=None, tagged_pet_ids=()):
+    """
+    建立圖片上傳工作，交易提交後於背景上傳（需在貼文的交易中呼叫）
+
+    Args:
+        post_frame (PostFrame): 貼文
+        user: 上傳者
+        image_files (list): buffer_uploads() 讀入記憶體的圖片
+        start_sort_order (int): 第一張圖片的排序順序
+        annotations (list): 圖片標註（image_index 為 image_files 中的位置）
+        tagged_pet_ids: 已標記的寵物 ID（標註的寵物不會重複建立關聯）
+
+    Returns:
+        PostMediaJob: 上傳工作（沒有圖片時為 None）
+    """
+    if not image_files:
+        return None
+
+    job = PostMediaJob.objects.create(postFrame=post_frame, total=len(image_files))
+    args = (job.id, post_frame.id, user.id, list(image_files), start_sort_order, annotations or [], set(tagged_pet_ids))
+
+    if getattr(settings, 'POST_MEDIA_UPLOAD_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_background, *args))
+    else:
+        # 同步模式：交易提交後立即上傳（測試、除錯用）
+        transaction.on_commit(lambda: run_job(*args))
+    return job
+
+
+def _save_images(post_id, user_id, uploaded_images, start_sort_order, annotations, tagged_pet_ids):
+    """在一個短交易中寫入已上傳的圖片、標註與標註產生的寵物關聯"""
+    from media.models import Image
+    from pets.models import Pet
+
+    with transaction.atomic():
+        # 鎖定貼文，確認上傳期間沒有被刪除
+        if not PostFrame.objects.select_for_update().filter(id=post_id).exists():
+            raise PostFrame.DoesNotExist(f"貼文 {post_id} 已刪除")
+
+        Image.objects.bulk_create([
+            Image(
+                postFrame_id=post_id,
+                firebase_url=image_data['firebase_url'],
+                firebase_path=image_data['firebase_path'],
+                sort_order=image_data.get('sort_order', 0),
+                original_filename=image_data.get('original_filename'),
+                file_size=image_data.get('file_size'),
+                content_type_mime=image_data.get('content_type'),
+                alt_text=image_data.get('alt_text', f"用戶 {user_id} 的貼文圖片")
+            )
+            for image_data in uploaded_images
+        ])
+
+        # 標註的 image_index 對應上傳順序；上傳失敗的圖片上的標註略過
+        urls_by_index = {
+            image_data['sort_order'] - start_sort_order: image_data['firebase_url']
+            for image_data in uploaded_images
+        }
+        new_annotations = []
+        annotated_pet_ids = []
+        for annotation in annotations:
+            try:
+                image_index = int(annotation.get('image_index', 0))
+                firebase_url = urls_by_index.get(image_index)
+                if not firebase_url:
+                    logger.warning(f"標註的圖片索引 {image_index} 超出範圍或上傳失敗")
+                    continue
+                new_annotations.append(ImageAnnotation(
+                    firebase_url=firebase_url,
+                    x_position=float(annotation.get('x_position', 0)),
+                    y_position=float(annotation.get('y_position', 0)),
+                    target_type=annotation.get('target_type', 'user'),
+                    target_id=int(annotation.get('target_id', 0)),
+                    created_by_id=user_id
+                ))
+                if annotation.get('target_type') == 'pet':
+                    annotated_pet_ids.append(int(annotation.get('target_id', 0)))
+            except (AttributeError, TypeError, ValueError) as e:
+                logger.error(f"處理圖片標註時出錯: {str(e)}")
+        ImageAnnotation.objects.bulk_create(new_annotations)
+
+        # 標註的寵物（屬於上傳者且尚未標記）建立 PostPets 關聯
+        new_pet_ids = set(annotated_pet_ids) - set(tagged_pet_ids)
+        if new_pet_ids:
+            owned = set(Pet.objects.filter(id__in=new_pet_ids, owner_id=user_id).values_list('id', flat=True))
+            PostPets.objects.bulk_create([PostPets(postFrame_id=post_id, pet_id=pet_id) for pet_id in owned])
+            for pet_id in new_pet_ids - owned:
+                logger.warning(f"標註的寵物 ID {pet_id} 不存在或不屬於當前用戶")
+
+
+def _set_status(job_id, status, **fields):
+    """更新工作狀態（QuerySet.update 不會自動更新 updated_at）"""
+    return PostMediaJob.objects.filter(id=job_id).update(status=status, updated_at=timezone.now(), **fields)
+
+
+def run_job(job_id, post_id, user_id, files, start_sort_order, annotations, tagged_pet_ids):
+    """
+    執行一筆圖片上傳工作（背景執行緒）
+
+    Args:
+        job_id (int): PostMediaJob ID
+        post_id (int): 貼文 ID
+        user_id (int): 上傳者 ID
+        files (list): 已讀入記憶體的圖片
+        start_sort_order (int): 第一張圖片的排序順序
+        annotations (list): 圖片標註
+        tagged_pet_ids (set): 已標記的寵物 ID
+    """
+    from utils.firebase_service import firebase_storage_service
+    from utils.image_service import ImageService
+
+    try:
+        if not _set_status(job_id, PostMediaJob.STATUS_RUNNING):
+            return  # 貼文已刪除
+
+        success, message, uploaded_images = firebase_storage_service.upload_post_images_batch(
+            user_id=user_id,
+            post_id=post_id,
+            image_files=files,
+            start_sort_order=start_sort_order
+        )
+
+        try:
+            _save_images(post_id, user_id, uploaded_images, start_sort_order, annotations, tagged_pet_ids)
+        except PostFrame.DoesNotExist:
+            # 上傳期間貼文被刪除，移除已上傳的檔案
+            firebase_storage_service.delete_post_images_batch(
+                [image_data['firebase_path'] for image_data in uploaded_images]
+            )
+            logger.info(f"貼文 {post_id} 已刪除，捨棄上傳的圖片")
+            return
+        ImageService.invalidate_post_image_cache(post_id)
+
+        if success:
+            status = PostMediaJob.STATUS_DONE
+            logger.info(f"所有圖片上傳成功: {message}")
+        else:
+            status = PostMediaJob.STATUS_PARTIAL if uploaded_images else PostMediaJob.STATUS_FAILED
+            logger.warning(f"部分圖片上傳失敗: {message}")
+        _set_status(job_id, status, uploaded=len(uploaded_images), message=message)
+
+    except Exception as e:
+        logger.error(f"處理圖片上傳時出錯: {str(e)}", exc_info=True)
+        _set_status(job_id, PostMediaJob.STATUS_FAILED, message=f"圖片上傳失敗: {str(e)}")
+
+
+def fail_stale_jobs(post_frame=None):
+    """
+    把逾時未更新的 pending / running 工作標記為 failed
+
+    工作所在的程序在上傳完成前結束（重啟、部署、崩潰）時，工作不會再被執行；
+    以 updated_at 判斷，其他程序仍在上傳中的工作不受影響。
+
+    Args:
+        post_frame (PostFrame): 只檢查此貼文的工作（None 時檢查全部）
+
+    Returns:
+        int: 標記為 failed 的工作數
+    """
+    stale_minutes = getattr(settings, 'POST_MEDIA_JOB_STALE_MINUTES', 15)
+    jobs = PostMediaJob.objects.filter(
+        status__in=(PostMediaJob.STATUS_PENDING, PostMediaJob.STATUS_RUNNING),
+        updated_at__lt=timezone.now() - timedelta(minutes=stale_minutes)
+    )
+    if post_frame is not None:
+        jobs = jobs.filter(postFrame=post_frame)
+
+    count = jobs.update(
+        status=PostMediaJob.STATUS_FAILED,
+        message="圖片上傳中斷（伺服器重新啟動），請重新上傳圖片",
+        updated_at=timezone.now()
+    )
+    if count:
+        logger.warning(f"{count} 筆圖片上傳工作逾 {stale_minutes} 分鐘未更新，已標記為失敗")
+    return count
+
+
+def _run_in_background(*args):
+    """背景執行緒的進入點（使用執行緒自己的資料庫連線）"""
+    close_old_connections()
+    try:
+        run_job(*args)
+    finally:
+        close_old_connections()
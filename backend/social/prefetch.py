@@ -0,0 +1,252 @@
+"""
+Post Prefetch
+貼文序列化所需關聯資料的批次載入
+
+PostFrameSerializer / SolPostSerializer 的每個 SerializerMethodField 原本各自查詢
+（內容、標籤、寵物、圖片、留言數、互動狀態、標註、熱門留言），一頁貼文的查詢數
+隨貼文數線性增加。PostPrefetch 以一頁的 PostFrame ID 為單位，用固定次數的批次查詢
+載入全部資料，透過序列化器 context 的 'post_prefetch' 交給序列化器使用。
+
+使用方式：
+    prefetch = PostPrefetch.for_post_frames(post_frames, user=request.user)
+    PostFrameSerializer(post_frames, many=True, context={'request': request, 'post_prefetch': prefetch})
+
+以 many=True 序列化時，序列化器會自動建立 PostPrefetch，一般不需要手動建立。
+"""
+
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from interactions.services import get_interaction_relations, build_interaction_state
+
+from .models import PostFrame, SoLContent, PostHashtag, PostPets, ImageAnnotation
+
+# 每篇貼文顯示的熱門留言數（與 PostFrameSerializer.get_top_comments 相同）
+TOP_COMMENTS = 2
+
+
+def _headshot_url(owner):
+    """讀取已透過 select_related 載入的頭像（不存在時返回 None，不產生查詢）"""
+    try:
+        if hasattr(owner, 'headshot') and owner.headshot:
+            return owner.headshot.firebase_url
+    except Exception:
+        pass
+    return None
+
+
+class PostPrefetch:
+    """一頁貼文的關聯資料（固定次數的批次查詢）"""
+
+    def __init__(self, post_ids, user=None):
+        """
+        批次載入貼文的關聯資料
+
+        Args:
+            post_ids (list): PostFrame ID 列表
+            user: 目前的使用者（未登入時為 None，不載入互動狀態）
+        """
+        from media.models import Image
+        from comments.models import Comment
+
+        post_ids = list(dict.fromkeys(post_ids))
+        self.user = user if user is not None and user.is_authenticated else None
+
+        self.post_frames = PostFrame.objects.select_related('user', 'user__headshot').in_bulk(post_ids)
+
+        # 每篇貼文的第一筆內容（與原本 .first() 的主鍵順序相同）
+        self.contents = {}
+        for content in SoLContent.objects.filter(postFrame_id__in=post_ids).order_by('id'):
+            self.contents.setdefault(content.postFrame_id, content)
+
+        self.hashtags = defaultdict(list)
+        for hashtag in PostHashtag.objects.filter(postFrame_id__in=post_ids):
+            self.hashtags[hashtag.postFrame_id].append(hashtag)
+
+        self.tagged_pets = defaultdict(list)
+        for relation in PostPets.objects.filter(postFrame_id__in=post_ids).select_related('pet', 'pet__headshot'):
+            self.tagged_pets[relation.postFrame_id].append(relation.pet)
+
+        self.images = defaultdict(list)
+        for image in Image.objects.filter(postFrame_id__in=post_ids).order_by('sort_order', 'id'):
+            self.images[image.postFrame_id].append(image)
+
+        self.comment_counts = dict(
+            Comment.objects.filter(postFrame_id__in=post_ids)
+            .values('postFrame_id').annotate(count=Count('id'))
+            .values_list('postFrame_id', 'count')
+        )
+
+        self.annotations = self._load_annotations()
+        self._load_top_comments(post_ids)
+
+        # 目前使用者對貼文與熱門留言的互動關係（一次查詢，可能來自快取）
+        self.interactions = get_interaction_relations(self.user, post_ids + list(self.comment_ids))
+        self.liked_comments = {
+            comment_id for comment_id in self.comment_ids if 'liked' in self.interactions[comment_id]
+        }
+
+    @classmethod
+    def for_post_frames(cls, post_frames, user=None):
+        """以 PostFrame（或其 ID）列表建立"""
+        return cls([getattr(post_frame, 'id', post_frame) for post_frame in post_frames], user=user)
+
+    @classmethod
+    def for_contents(cls, sol_contents, user=None):
+        """以 SoLContent 列表建立"""
+        return cls([content.postFrame_id for content in sol_contents], user=user)
+
+    def covers(self, post_id):
+        """是否已載入指定貼文的資料"""
+        return post_id in self.post_frames
+
+    def _load_annotations(self):
+        """批次載入圖片標註與標註目標名稱（每篇貼文依建立時間排序）"""
+        from accounts.models import CustomUser
+        from pets.models import Pet
+
+        posts_by_url = defaultdict(list)
+        for post_id, images in self.images.items():
+            for image in images:
+                if image.firebase_url:
+                    posts_by_url[image.firebase_url].append(post_id)
+
+        annotations = defaultdict(list)
+        if not posts_by_url:
+            return annotations
+
+        records = list(
+            ImageAnnotation.objects.filter(firebase_url__in=list(posts_by_url))
+            .select_related('created_by').order_by('created_at')
+        )
+        targets = {
+            'user': CustomUser.objects.in_bulk(
+                [a.target_id for a in records if a.target_type == 'user']
+            ),
+            'pet': Pet.objects.in_bulk(
+                [a.target_id for a in records if a.target_type == 'pet']
+            ),
+        }
+
+        for annotation in records:
+            target_object = targets.get(annotation.target_type, {}).get(annotation.target_id)
+            data = {
+                'id': annotation.id,
+                'firebase_url': annotation.firebase_url,
+                'x_position': annotation.x_position,
+                'y_position': annotation.y_position,
+                'display_name': annotation.get_display_name(target_object),
+                'target_type': annotation.target_type,
+                'target_id': annotation.target_id,
+                'created_by': {
+                    'id': annotation.created_by.id,
+                    'username': annotation.created_by.username,
+                    'user_account': annotation.created_by.user_account
+                }
+            }
+            for post_id in dict.fromkeys(posts_by_url[annotation.firebase_url]):
+                annotations[post_id].append(data)
+        return annotations
+
+    def _load_top_comments(self, post_ids):
+        """批次載入每篇貼文的熱門留言，以及 CommentSerializer 需要的圖片與按讚數"""
+        from comments.models import Comment
+        from interactions.models import UserInteraction
+        from media.models import CommentImage
+
+        self.top_comments = defaultdict(list)
+        for comment in Comment.objects.filter(postFrame_id__in=post_ids, parent=None).annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F('postFrame_id')],
+                order_by=[F('popularity').desc(), F('created_at').desc()],
+            )
+        ).filter(rank__lte=TOP_COMMENTS).select_related('user', 'user__headshot').order_by('postFrame_id', 'rank'):
+            self.top_comments[comment.postFrame_id].append(comment)
+
+        comments = [comment for comments in self.top_comments.values() for comment in comments]
+        self.comment_ids = {comment.id for comment in comments}
+
+        # 貼文作者與留言作者的頭像（UserBasicSerializer 使用，空字串表示沒有頭像）
+        self.headshot_urls = {
+            post_frame.user_id: _headshot_url(post_frame.user) or ''
+            for post_frame in self.post_frames.values()
+        }
+        self.headshot_urls.update({comment.user_id: _headshot_url(comment.user) or '' for comment in comments})
+
+        self.comment_images = defaultdict(list)
+        self.comment_likes = {}
+        if not self.comment_ids:
+            return
+
+        for image in CommentImage.objects.filter(
+            content_type=ContentType.objects.get_for_model(Comment),
+            object_id__in=self.comment_ids
+        ).order_by('sort_order'):
+            self.comment_images[image.object_id].append(image)
+
+        self.comment_likes = dict(
+            UserInteraction.objects.filter(interactables_id__in=self.comment_ids, relation='liked')
+            .values('interactables_id').annotate(count=Count('id'))
+            .values_list('interactables_id', 'count')
+        )
+
+    # ------------------------------------------------------------------
+    # 序列化器使用的格式化方法
+    # ------------------------------------------------------------------
+
+    def get_user_info(self, post_id):
+        user = self.post_frames[post_id].user
+        return {
+            'id': user.id,
+            'username': user.username,
+            'user_account': getattr(user, 'user_account', ''),
+            'user_fullname': getattr(user, 'user_fullname', ''),
+            'headshot_url': _headshot_url(user)
+        }
+
+    def get_hashtags(self, post_id):
+        return [{'id': hashtag.id, 'tag': hashtag.tag} for hashtag in self.hashtags.get(post_id, [])]
+
+    def get_tagged_pets(self, post_id):
+        pets_data = []
+        for pet in self.tagged_pets.get(post_id, []):
+            headshot_url = None
+            if hasattr(pet, 'headshot') and pet.headshot:
+                headshot_url = pet.headshot.url
+            pets_data.append({
+                'id': pet.id,
+                'pet_name': pet.pet_name,
+                'pet_type': getattr(pet, 'pet_type', 'unknown'),
+                'headshot_url': headshot_url
+            })
+        return pets_data
+
+    def get_images(self, post_id):
+        return [
+            {
+                'id': image.id,
+                'firebase_url': image.firebase_url,
+                'firebase_path': image.firebase_path,
+                'url': image.url,
+                'alt_text': image.alt_text,
+                'sort_order': image.sort_order
+            }
+            for image in self.images.get(post_id, [])
+        ]
+
+    def get_interaction_stats(self, post_id):
+        stats = self.post_frames[post_id].get_interaction_stats()
+        return {
+            'upvotes': stats[0],
+            'downvotes': stats[1],
+            'saves': stats[2],
+            'shares': stats[3],
+            'likes': stats[4],
+            'comments': self.comment_counts.get(post_id, 0),
+            'total_score': stats[0] - stats[1]
+        }
+
+    def get_user_interaction(self, post_id):
+        return build_interaction_state(self.interactions.get(post_id, ()))
@@ -6,15 +6,43 @@ from django.contrib.contenttypes.models import ContentType
 from pets.models import Pet
 from social.models import ImageAnnotation
 from interactions.models import UserInteraction
+from interactions.services import get_interaction_state, empty_interaction_state
+from interactions.serializers import InteractionStateListSerializer, InteractionStateMixin
 from accounts.serializers import UserBasicSerializer
 from accounts.models import CustomUser
 from comments.models import Comment
 from comments.serializers import CommentSerializer
+from .prefetch import PostPrefetch
 
 User = get_user_model()
 
+# === 批次載入關聯資料 ===
+class PostPrefetchListSerializer(serializers.ListSerializer):
+    """
+    many=True 時先以 PostPrefetch 批次載入整頁貼文的關聯資料，
+    放入 context['post_prefetch']，讓每篇貼文的序列化不再各自查詢
+    """
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        if 'post_prefetch' not in self._context:
+            request = self._context.get('request')
+            user = getattr(request, 'user', None)
+            if isinstance(self.child, SolPostSerializer):
+                self._context['post_prefetch'] = PostPrefetch.for_contents(items, user=user)
+            else:
+                self._context['post_prefetch'] = PostPrefetch.for_post_frames(items, user=user)
+        return super().to_representation(items)
+
+class PostPrefetchMixin:
+    """讀取 context 中已批次載入的資料（未載入時返回 None，沿用逐筆查詢）"""
+    def get_prefetch(self, post_id):
+        prefetch = self.context.get('post_prefetch')
+        if prefetch is not None and prefetch.covers(post_id):
+            return prefetch
+        return None
+
 # === PostFrame 序列化器 ===
-class PostFrameSerializer(serializers.ModelSerializer):
+class PostFrameSerializer(PostPrefetchMixin, serializers.ModelSerializer):
     """
     PostFrame 完整序列化器，包含所有相關資訊
     """
@@ -45,8 +73,13 @@ class PostFrameSerializer(serializers.ModelSerializer):
             'top_comments',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = PostPrefetchListSerializer
     
     def get_user_info(self, postFrame: PostFrame):
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_user_info(postFrame.id)
+
         user = postFrame.getUser()
         headshot_url = None
         try:
@@ -66,7 +99,11 @@ class PostFrameSerializer(serializers.ModelSerializer):
     def get_content(self, postFrame: PostFrame):
         """獲取貼文內容"""
         try:
-            content = SoLContent.objects.filter(postFrame=postFrame).first()
+            prefetch = self.get_prefetch(postFrame.id)
+            if prefetch:
+                content = prefetch.contents.get(postFrame.id)
+            else:
+                content = SoLContent.objects.filter(postFrame=postFrame).first()
             if content:
                 return {
                     'content_text': content.content_text,
@@ -77,6 +114,10 @@ class PostFrameSerializer(serializers.ModelSerializer):
             return {'content_text': '', 'location': None}
     
     def get_hashtags(self, postFrame: PostFrame):
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_hashtags(postFrame.id)
+
         hashtags = PostHashtag.objects.filter(postFrame=postFrame)
         hashtag_data = [{'id': hashtag.id, 'tag': hashtag.tag} for hashtag in hashtags]
         
@@ -88,6 +129,10 @@ class PostFrameSerializer(serializers.ModelSerializer):
         return hashtag_data
 
     def get_tagged_pets(self, postFrame: PostFrame):
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_tagged_pets(postFrame.id)
+
         pets_relations = PostPets.objects.filter(postFrame=postFrame).select_related('pet')
         pets_data = []
         for relation in pets_relations:
@@ -106,6 +151,10 @@ class PostFrameSerializer(serializers.ModelSerializer):
     
     def get_images(self, postFrame: PostFrame):
         """獲取貼文的所有圖片"""
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_images(postFrame.id)
+
         try:
             from utils.image_service import ImageService
             images = ImageService.get_post_images(postFrame.id, use_cache=True)
@@ -124,6 +173,10 @@ class PostFrameSerializer(serializers.ModelSerializer):
             return []
     
     def get_interaction_stats(self, postFrame: PostFrame):
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_interaction_stats(postFrame.id)
+
         from comments.models import Comment
         stats = postFrame.get_interaction_stats()
         # 動態計算留言總數（包含回覆）
@@ -139,38 +192,22 @@ class PostFrameSerializer(serializers.ModelSerializer):
         }
 
     def get_user_interaction(self, postFrame: PostFrame):
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.get_user_interaction(postFrame.id)
+
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        user = CustomUser.objects.filter(username=request.user.username).first()
-        if not user:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        records = UserInteraction.objects.filter(user=user, interactables=postFrame)
+            return empty_interaction_state()
 
-        return {
-            'is_liked': records.filter(relation='liked').exists(),
-            'is_upvoted': records.filter(relation='upvoted').exists(),
-            'is_downvoted': records.filter(relation='downvoted').exists(),
-            'is_saved': records.filter(relation='saved').exists(),
-            'is_shared': records.filter(relation='shared').exists()
-        }
+        return get_interaction_state(request.user, postFrame.id)
     
     def get_annotations(self, postFrame: PostFrame):
         """獲取貼文圖片的標註"""
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            return prefetch.annotations.get(postFrame.id, [])
+
         try:
             images = Image.objects.filter(postFrame=postFrame)
             image_urls = [img.firebase_url for img in images if img.firebase_url]
@@ -200,14 +237,18 @@ class PostFrameSerializer(serializers.ModelSerializer):
             return []
         
     def get_top_comments(self, postFrame: PostFrame):
-        comments = Comment.get_comments(postFrame)[:2]
+        prefetch = self.get_prefetch(postFrame.id)
+        if prefetch:
+            comments = prefetch.top_comments.get(postFrame.id, [])
+        else:
+            comments = Comment.get_comments(postFrame)[:2]
 
         serializers = CommentSerializer(comments, many=True, context=self.context)
 
         return serializers.data
 
 # === SoLContent 序列化器 (簡化版，用於特定場景) ===
-class SolPostSerializer(serializers.ModelSerializer):
+class SolPostSerializer(PostPrefetchMixin, serializers.ModelSerializer):
     """
     SoLContent 序列化器 - 專注於內容的輕量級版本
     """
@@ -236,14 +277,22 @@ class SolPostSerializer(serializers.ModelSerializer):
             'user_interaction',
             'annotations'
         ]
+        list_serializer_class = PostPrefetchListSerializer
     
     def get_post_id(self, solContent: SoLContent):
-        return solContent.get_postFrame().id
+        return solContent.postFrame_id
     
     def get_created_at(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.post_frames[solContent.postFrame_id].created_at
         return solContent.get_postFrame().created_at
 
     def get_user_info(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_user_info(solContent.postFrame_id)
+
         user = solContent.get_postFrame().getUser()
         headshot_url = None
         try:
@@ -261,10 +310,18 @@ class SolPostSerializer(serializers.ModelSerializer):
         }
     
     def get_hashtags(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_hashtags(solContent.postFrame_id)
+
         hashtags = PostHashtag.objects.filter(postFrame=solContent.postFrame)
         return [{'id': hashtag.id, 'tag': hashtag.tag} for hashtag in hashtags]
 
     def get_tagged_pets(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_tagged_pets(solContent.postFrame_id)
+
         pets_relations = PostPets.objects.filter(postFrame=solContent.postFrame).select_related('pet')
         pets_data = []
         for relation in pets_relations:
@@ -283,6 +340,10 @@ class SolPostSerializer(serializers.ModelSerializer):
     
     def get_images(self, solContent: SoLContent):
         """獲取貼文的所有圖片"""
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_images(solContent.postFrame_id)
+
         try:
             from utils.image_service import ImageService
             images = ImageService.get_post_images(solContent.postFrame.id, use_cache=True)
@@ -301,6 +362,10 @@ class SolPostSerializer(serializers.ModelSerializer):
             return []
     
     def get_interaction_stats(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_interaction_stats(solContent.postFrame_id)
+
         from comments.models import Comment
         postFrame = solContent.get_postFrame()
         stats = postFrame.get_interaction_stats()
@@ -317,38 +382,22 @@ class SolPostSerializer(serializers.ModelSerializer):
         }
 
     def get_user_interaction(self, solContent: SoLContent):
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.get_user_interaction(solContent.postFrame_id)
+
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        user = CustomUser.objects.filter(username=request.user.username).first()
-        if not user:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        records = UserInteraction.objects.filter(user=user, interactables=solContent.postFrame)
+            return empty_interaction_state()
 
-        return {
-            'is_liked': records.filter(relation='liked').exists(),
-            'is_upvoted': records.filter(relation='upvoted').exists(),
-            'is_downvoted': records.filter(relation='downvoted').exists(),
-            'is_saved': records.filter(relation='saved').exists(),
-            'is_shared': records.filter(relation='shared').exists()
-        }
+        return get_interaction_state(request.user, solContent.postFrame_id)
     
     def get_annotations(self, solContent: SoLContent):
         """獲取貼文圖片的標註"""
+        prefetch = self.get_prefetch(solContent.postFrame_id)
+        if prefetch:
+            return prefetch.annotations.get(solContent.postFrame_id, [])
+
         try:
             from media.models import Image
             images = Image.objects.filter(postFrame=solContent.postFrame)
@@ -401,7 +450,7 @@ class UserDetailSearchSerializer(serializers.ModelSerializer):
         return None
         
 # === 預覽用 PostFrame 序列化器 ===
-class PostPreviewSerializer(serializers.ModelSerializer):
+class PostPreviewSerializer(InteractionStateMixin, serializers.ModelSerializer):
     first_image_url = serializers.SerializerMethodField()
     content_preview = serializers.SerializerMethodField()
     user_info = serializers.SerializerMethodField()
@@ -411,6 +460,7 @@ class PostPreviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostFrame
         fields = ['id', 'created_at', 'first_image_url', 'content_preview', 'user_info', 'interaction_stats', 'user_interaction']
+        list_serializer_class = InteractionStateListSerializer
 
     def get_first_image_url(self, postFrame: PostFrame):
         """獲取第一張圖片URL"""
@@ -458,35 +508,7 @@ class PostPreviewSerializer(serializers.ModelSerializer):
     
     def get_user_interaction(self, postFrame: PostFrame):
         """獲取用戶互動狀態"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        user = CustomUser.objects.filter(username=request.user.username).first()
-        if not user:
-            return {
-                'is_liked': False,
-                'is_upvoted': False,
-                'is_downvoted': False,
-                'is_saved': False,
-                'is_shared': False
-            }
-
-        records = UserInteraction.objects.filter(user=user, interactables=postFrame)
-
-        return {
-            'is_liked': records.filter(relation='liked').exists(),
-            'is_upvoted': records.filter(relation='upvoted').exists(),
-            'is_downvoted': records.filter(relation='downvoted').exists(),
-            'is_saved': records.filter(relation='saved').exists(),
-            'is_shared': records.filter(relation='shared').exists()
-        }
+        return self.get_user_interaction_state(postFrame)
 
 # === 搜尋關鍵字建議序列化器 ===
 class SearchSuggestionSerializer(serializers.Serializer):
@@ -0,0 +1,127 @@
+"""
+Social Signals
+處理推薦與搜尋索引相關的信號事件
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from interactions.models import UserInteraction
+from comments.models import Comment
+from .models import SoLContent, PostHashtag
+
+
+def _apply_interest_event(user_id, post_id, action, created_at, sign):
+    """交易提交後把事件套用到使用者興趣向量（只更新一個向量與一筆紀錄）"""
+    def apply():
+        try:
+            from .apps import SocialConfig
+            from .interest_vectors import apply_event
+            apply_event(
+                SocialConfig.get_recommendation_service(),
+                user_id, post_id, action, created_at.timestamp(), sign
+            )
+        except Exception as e:
+            print(f"⚠️ 更新使用者興趣向量失敗（不影響互動操作）: {str(e)}")
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=UserInteraction)
+def update_interest_on_interaction_save(sender, instance, created, **kwargs):
+    """
+    新增互動（按讚 / 收藏 / 點讚等）時，更新使用者興趣向量
+    """
+    if created and instance.interactables_id:
+        _apply_interest_event(instance.user_id, instance.interactables_id, instance.relation, instance.created_at, 1)
+
+
+@receiver(post_delete, sender=UserInteraction)
+def update_interest_on_interaction_delete(sender, instance, **kwargs):
+    """
+    取消互動時，從使用者興趣向量減去該事件
+    """
+    if instance.interactables_id:
+        _apply_interest_event(instance.user_id, instance.interactables_id, instance.relation, instance.created_at, -1)
+
+
+@receiver(post_save, sender=Comment)
+def update_interest_on_comment_save(sender, instance, created, **kwargs):
+    """
+    新增留言時，更新使用者興趣向量
+    """
+    if created and instance.postFrame_id:
+        _apply_interest_event(instance.user_id, instance.postFrame_id, 'comment', instance.created_at, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def update_interest_on_comment_delete(sender, instance, **kwargs):
+    """
+    刪除留言時，從使用者興趣向量減去該事件
+    """
+    if instance.postFrame_id:
+        _apply_interest_event(instance.user_id, instance.postFrame_id, 'comment', instance.created_at, -1)
+
+
+@receiver(post_save, sender=SoLContent)
+def update_post_embedding_on_save(sender, instance, **kwargs):
+    """
+    貼文內容創建或更新時，於交易提交後排入背景向量索引（BERT 嵌入不在請求的交易中執行）
+    """
+    from aiAgent.services.indexing_queue import enqueue_indexing
+    enqueue_indexing('social_post', instance.postFrame_id)
+
+
+@receiver(post_delete, sender=SoLContent)
+def remove_post_embedding_on_delete(sender, instance, **kwargs):
+    """
+    貼文內容刪除時，於交易提交後從推薦用的貼文向量索引移除
+    """
+    from aiAgent.services.indexing_queue import enqueue_indexing
+    enqueue_indexing('social_post', instance.postFrame_id, 'remove')
+
+
+@receiver(post_save, sender=SoLContent)
+def update_post_content_search_index_on_save(sender, instance, **kwargs):
+    """
+    貼文內容創建或更新時，於交易提交後更新全文搜尋索引
+    """
+    from utils.search_index import index_on_commit
+    index_on_commit('posts', instance)
+
+
+@receiver(post_delete, sender=SoLContent)
+def remove_post_content_search_index_on_delete(sender, instance, **kwargs):
+    """
+    貼文內容刪除時，從全文搜尋索引移除
+    """
+    from utils.search_index import remove_on_commit
+    remove_on_commit('posts', instance.pk)
+
+
+@receiver(post_save, sender=PostHashtag)
+def update_hashtag_search_index_on_save(sender, instance, **kwargs):
+    """
+    貼文標籤創建或更新時，於交易提交後更新全文搜尋索引
+    """
+    from utils.search_index import index_on_commit
+    index_on_commit('hashtags', instance)
+
+
+@receiver(post_delete, sender=PostHashtag)
+def remove_hashtag_search_index_on_delete(sender, instance, **kwargs):
+    """
+    貼文標籤刪除時，從全文搜尋索引移除
+    """
+    from utils.search_index import remove_on_commit
+    remove_on_commit('hashtags', instance.pk)
+
+
+@receiver(post_save, sender=PostHashtag)
+@receiver(post_delete, sender=PostHashtag)
+def update_hashtag_suggestion(sender, instance, **kwargs):
+    """
+    貼文標籤新增或刪除時，於交易提交後重新計算搜尋建議中的標籤使用次數
+    """
+    from utils.suggestion_index import update_hashtag_on_commit
+    update_hashtag_on_commit(instance.tag)
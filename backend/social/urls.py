@@ -3,7 +3,7 @@ from .views import (
     UserPostsPreviewListAPIView, SearchAPIView, SearchSuggestionAPIView, 
     CreatePostAPIView, PostDetailAPIView, DeletePostAPIView, UpdatePostAPIView, PostTagPetsAPIView, UserPostListAPIView, PostListAPIView,
     CheckAnnotationPermissionAPIView, ImageAnnotationListCreateAPIView, 
-    ImageAnnotationDetailAPIView, PetRelatedPostsAPIView
+    ImageAnnotationDetailAPIView, PetRelatedPostsAPIView, PostMediaStatusAPIView
 )
 
 urlpatterns = [
@@ -23,6 +23,7 @@ urlpatterns = [
     path('posts/<int:pk>/', PostDetailAPIView.as_view(), name='post-detail'),
     path('posts/<int:pk>/update/', UpdatePostAPIView.as_view(), name='update-post'),
     path('posts/<int:pk>/delete/', DeletePostAPIView.as_view(), name='delete-post'),
+    path('posts/<int:pk>/media-status/', PostMediaStatusAPIView.as_view(), name='post-media-status'),
     path('posts/tag-pets/', PostTagPetsAPIView.as_view(), name='post-tag-pets'),
     
     # 圖片標註相關
@@ -1,10 +1,14 @@
 from rest_framework import generics, status as drf_status
-from .models import PostHashtag, PostFrame, SoLContent, PostPets, ImageAnnotation
+from .models import PostHashtag, PostFrame, SoLContent, PostPets, ImageAnnotation, PostMediaJob
+from .post_media import buffer_uploads, fail_stale_jobs, parse_annotations, schedule_post_images
+from .interest_vectors import get_user_interest
 from .serializers import *
 from rest_framework.permissions import IsAuthenticated
 from utils.api_response import APIResponse
 from utils.query_optimization import log_queries
 from utils.image_service import ImageService
+from utils.search_index import get_search_index, order_by_ids
+from utils.suggestion_index import get_suggestion_index
 from django.contrib.contenttypes.models import ContentType
 from media.models import Image, PetHeadshot
 from rest_framework.views import APIView
@@ -17,11 +21,14 @@ from django.db import transaction
 from django.utils.text import slugify
 from django.utils import timezone
 from django.apps import apps
+from django.core import signing
+from django.core.cache import cache
 from datetime import datetime
 import json
 import re
 import logging
 import random
+import secrets
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -68,6 +75,41 @@ class DataHandler:
         except (ValueError, AttributeError):
             return []
 
+    @staticmethod
+    def create_hashtags(postFrame, hashtags):
+        """
+        以一次 bulk_create 建立貼文標籤
+
+        bulk_create 不會觸發 post_save，搜尋索引與搜尋建議改為在這裡排入交易提交後的更新
+        """
+        from utils.search_index import index_on_commit
+        from utils.suggestion_index import update_hashtag_on_commit
+
+        created = PostHashtag.objects.bulk_create([
+            # 不使用 slugify，直接使用原始標籤以支援中文（只移除前後空白）
+            PostHashtag(postFrame=postFrame, tag=tag.strip())
+            for tag in hashtags if tag and tag.strip()
+        ])
+        for hashtag in created:
+            index_on_commit('hashtags', hashtag)
+            update_hashtag_on_commit(hashtag.tag)
+        logger.info(f"成功創建標籤: {[hashtag.tag for hashtag in created]}")
+        return created
+
+    @staticmethod
+    def tag_pets(postFrame, pets, user):
+        """
+        以一次 bulk_create 建立寵物標記關聯（只標記屬於當前用戶的寵物）
+
+        Returns:
+            set: 已標記的寵物 ID
+        """
+        tagged_pet_ids = {pet.id for pet in pets if pet.owner_id == user.id}
+        PostPets.objects.bulk_create([
+            PostPets(postFrame=postFrame, pet_id=pet_id) for pet_id in tagged_pet_ids
+        ])
+        return tagged_pet_ids
+
 #----------用戶貼文預覽 API----------
 class UserPostsPreviewListAPIView(generics.ListAPIView):
     """獲取用戶的貼文預覽列表"""
@@ -130,8 +172,11 @@ class UserPostsPreviewListAPIView(generics.ListAPIView):
 
 #----------搜尋 API----------
 class SearchAPIView(APIView):
-    """搜尋 API - 支援用戶、標籤和論壇搜尋"""
+    """搜尋 API - 支援用戶、標籤和論壇搜尋（使用全文搜尋索引，結果依相關程度排序）"""
     permission_classes = [IsAuthenticated]
+
+    # 標籤搜尋取回的候選標籤數（多個標籤可能屬於同一篇貼文）
+    HASHTAG_CANDIDATES = 200
     
     @log_queries
     def get(self, request):
@@ -147,65 +192,56 @@ class SearchAPIView(APIView):
                 message="搜尋詞至少需要2個字符"
             )
         
+        search_index = get_search_index()
+
         # 如果以#開頭，搜尋Hashtag
         if query.startswith('#'):
             tag_query = query[1:]  # 去除#符號
-            
-            hashtags = PostHashtag.objects.filter(tag__icontains=tag_query)
-            postFrame_ids = hashtags.values_list('postFrame_id', flat=True)
-            solContents = SoLContent.objects.filter(
-                postFrame_id__in=postFrame_ids
-            ).order_by('-postFrame__created_at')[:50]
 
-            post_serializer = SolPostSerializer(solContents, many=True, context={'request': request})
+            # 每篇貼文取最相關的標籤分數，同分時較新的貼文在前
+            post_scores = {}
+            for _, score, attrs in search_index.search('hashtags', tag_query, limit=self.HASHTAG_CANDIDATES):
+                post_id = attrs['post_id']
+                post_scores[post_id] = max(score, post_scores.get(post_id, score))
+            post_ids = sorted(post_scores, key=lambda post_id: (-post_scores[post_id], -post_id))[:50]
+
+            post_data = self._serialize_posts(post_ids, post_scores, request)
             
             return APIResponse(
                 data={
                     'users': [],  # Hashtag 搜尋不返回使用者
-                    'posts': post_serializer.data,
+                    'posts': post_data,
                     'forums': []  # Hashtag 搜尋不返回論壇
                 },
                 message="根據Hashtag搜尋結果"
             )
         else:
             # 搜尋用戶
-            users = CustomUser.objects.filter(
-                Q(username__icontains=query) | 
-                Q(user_fullname__icontains=query) |
-                Q(user_account__icontains=query)
-            )[:10]
+            user_hits = search_index.search_ids('users', query, limit=10)
+            users = order_by_ids(CustomUser.objects.all(), [user_id for user_id, _ in user_hits])
             
-            # 搜尋論壇（DiseaseArchiveContent）- 優先標題，其次內容
+            # 搜尋論壇（DiseaseArchiveContent）- 標題命中的權重高於內容
             from pets.models import DiseaseArchiveContent
             from pets.serializers import DiseaseArchiveSearchSerializer
             
-            # 先搜尋標題匹配的
-            forums_by_title = DiseaseArchiveContent.objects.filter(
-                archive_title__icontains=query,
-                is_private=False  # 只搜尋公開的論壇
-            ).select_related('pet', 'postFrame', 'postFrame__user')[:20]
-            
-            # 再搜尋內容匹配的（排除已經標題匹配的）
-            title_ids = list(forums_by_title.values_list('id', flat=True))
-            forums_by_content = DiseaseArchiveContent.objects.filter(
-                content__icontains=query,
-                is_private=False
-            ).exclude(
-                id__in=title_ids
-            ).select_related('pet', 'postFrame', 'postFrame__user')[:30]
-            
-            # 合併結果，標題匹配的在前
-            forums = list(forums_by_title) + list(forums_by_content)
-            forums = forums[:30]  # 限制總數為30
+            forum_hits = search_index.search_ids(
+                'archives', query, limit=30, filters={'is_private': False}  # 只搜尋公開的論壇
+            )
+            forums = order_by_ids(
+                DiseaseArchiveContent.objects.select_related('pet', 'postFrame', 'postFrame__user'),
+                [archive_id for archive_id, _ in forum_hits]
+            )
             
             forum_serializer = DiseaseArchiveSearchSerializer(forums, many=True, context={'request': request})
+            forum_data = self._with_relevance(forum_serializer.data, dict(forum_hits), 'id')
             
-            if users.exists():
+            if users:
                 # 序列化找到的用戶
                 user_serializer = UserDetailSearchSerializer(users, many=True)
+                user_data = self._with_relevance(user_serializer.data, dict(user_hits), 'id')
                 
                 # 獲取這些用戶的貼文
-                user_ids = list(users.values_list('id', flat=True))
+                user_ids = [user.id for user in users]
                 solContents = SoLContent.objects.filter(
                     postFrame__user_id__in=user_ids
                 ).order_by('-postFrame__created_at')[:30]
@@ -214,29 +250,47 @@ class SearchAPIView(APIView):
                 
                 return APIResponse(
                     data={
-                        'users': user_serializer.data,  # 返回相關使用者
+                        'users': user_data,  # 返回相關使用者
                         'posts': post_serializer.data,   # 返回這些使用者的貼文
-                        'forums': forum_serializer.data  # 返回論壇搜尋結果
+                        'forums': forum_data  # 返回論壇搜尋結果
                     },
                     message="用戶、貼文及論壇搜尋結果"
                 )
             else:
                 # 若找不到用戶，則從貼文內容中搜尋
-                solContents = SoLContent.objects.filter(
-                    content_text__icontains=query
-                ).order_by('-postFrame__created_at')[:50]
+                post_scores = {}
+                for _, score, attrs in search_index.search('posts', query, limit=50):
+                    post_scores.setdefault(attrs['post_id'], score)
 
-                post_serializer = SolPostSerializer(solContents, many=True, context={'request': request})
+                post_data = self._serialize_posts(list(post_scores), post_scores, request)
                 
                 return APIResponse(
                     data={
                         'users': [],  # 沒有相關使用者
-                        'posts': post_serializer.data,
-                        'forums': forum_serializer.data  # 返回論壇搜尋結果
+                        'posts': post_data,
+                        'forums': forum_data  # 返回論壇搜尋結果
                     },
                     message="根據貼文內容及論壇搜尋結果"
                 )
 
+    @staticmethod
+    def _with_relevance(serialized, scores, key):
+        """在序列化結果加上搜尋相關分數"""
+        data = [dict(item) for item in serialized]
+        for item in data:
+            item['relevance'] = scores.get(item[key], 0.0)
+        return data
+
+    def _serialize_posts(self, post_ids, post_scores, request):
+        """依搜尋排序序列化貼文（每篇貼文取第一筆內容）"""
+        contents = {}
+        for content in SoLContent.objects.filter(postFrame_id__in=post_ids).order_by('id'):
+            contents.setdefault(content.postFrame_id, content)
+        solContents = [contents[post_id] for post_id in post_ids if post_id in contents]
+
+        post_serializer = SolPostSerializer(solContents, many=True, context={'request': request})
+        return self._with_relevance(post_serializer.data, post_scores, 'post_id')
+
 #----------搜尋建議 API----------
 class SearchSuggestionAPIView(APIView):
     """搜尋建議 API"""
@@ -254,42 +308,31 @@ class SearchSuggestionAPIView(APIView):
         
         suggestions = []
         
+        # 記憶體中的前綴索引，不查詢資料庫
+        suggestion_index = get_suggestion_index()
+
         # 如果以#開頭，建議Hashtags
         if query.startswith('#'):
             tag_query = query[1:]  # 去除#符號
-            hashtags = PostHashtag.objects.filter(
-                tag__icontains=tag_query
-            ).distinct()[:5]
-            
-            for hashtag in hashtags:
+            for tag in suggestion_index.suggest('hashtag', tag_query, 5):
                 suggestions.append({
                     'type': 'hashtag',
-                    'value': f'#{hashtag.tag}'
+                    'value': f'#{tag}'
                 })
         else:
-            # 建議用戶
-            users = CustomUser.objects.filter(
-                Q(username__icontains=query) | 
-                Q(user_fullname__icontains=query) |
-                Q(user_account__icontains=query)
-            )[:5]
-            
-            for user in users:
+            # 建議用戶（依追蹤者數排序）
+            for user_data in suggestion_index.suggest('user', query, 5):
                 suggestions.append({
                     'type': 'user',
-                    'value': UserBasicSerializer(user).data
+                    'value': user_data
                 })
                 
             # 如果建議不足5個，添加部分hashtag建議
             if len(suggestions) < 5:
-                hashtags = PostHashtag.objects.filter(
-                    tag__icontains=query
-                ).distinct()[:5-len(suggestions)]
-                
-                for hashtag in hashtags:
+                for tag in suggestion_index.suggest('hashtag', query, 5 - len(suggestions)):
                     suggestions.append({
                         'type': 'hashtag',
-                        'value': f'#{hashtag.tag}'
+                        'value': f'#{tag}'
                     })
         
         serializer = SearchSuggestionSerializer(suggestions, many=True)
@@ -303,7 +346,6 @@ class CreatePostAPIView(APIView):
     """建立新貼文"""
     permission_classes = [IsAuthenticated]
     
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
         try:
             user = request.user
@@ -323,140 +365,49 @@ class CreatePostAPIView(APIView):
                     status=drf_status.HTTP_400_BAD_REQUEST,
                 )
             
-            # 創建 PostFrame
-            postFrame = PostFrame.objects.create(user=user)
-
-            # 創建 SoLContent
-            solContent = SoLContent.objects.create(
-                postFrame=postFrame,
-                content_text=content,
-                location=location
-            )
-
-            recommendation_service = apps.get_app_config('social').get_recommendation_service()
-            recommendation_service.embed_new_post(post_id=postFrame.id, content=content, content_type="social")
-
-            # 創建標籤關聯
-            logger.info(f"準備創建標籤，解析得到的標籤: {hashtags}")
-            for tag in hashtags:
-                if tag:  # 確保標籤不為空
-                    # 不使用 slugify，直接使用原始標籤以支援中文
-                    created_hashtag = PostHashtag.objects.create(
-                        postFrame=postFrame,
-                        tag=tag.strip()  # 只移除前後空白，保留中文字符
-                    )
-                    logger.info(f"成功創建標籤: '{tag}' -> 資料庫中的值: '{created_hashtag.tag}'")
-            
-            # 驗證標籤是否正確存儲
-            saved_hashtags = PostHashtag.objects.filter(postFrame=postFrame)
-            logger.info(f"資料庫中實際存儲的標籤: {[h.tag for h in saved_hashtags]}")
-            
-            # 創建寵物標記關聯
+            # 讀檔與解析在交易外完成
+            image_files = buffer_uploads(uploaded_image_files)
+            annotations = parse_annotations(annotations_data)
             pets = DataHandler.parse_pets(pet_ids)
-            tagged_pet_ids = set()  # 用於追蹤已經標記的寵物，避免重複
-            
-            for pet in pets:
-                # 確認寵物屬於當前用戶
-                if pet.owner == user:
-                    PostPets.objects.create(
-                        postFrame=postFrame,
-                        pet=pet
-                    )
-                    tagged_pet_ids.add(pet.id)
             
-            # 處理圖片上傳
-            if uploaded_image_files:
-                try:
-                    from utils.firebase_service import firebase_storage_service
-                    from utils.image_service import ImageService
-                    
-                    # 使用批量上傳方法
-                    success, message, uploaded_images = firebase_storage_service.upload_post_images_batch(
-                        user_id=user.id,
-                        post_id=postFrame.id,
-                        image_files=uploaded_image_files
-                    )
-                    
-                    # 保存成功上傳的圖片到資料庫
-                    for image_data in uploaded_images:
-                        try:
-                            ImageService.save_post_image(
-                                image_data=image_data,
-                                post_frame_id=postFrame.id,
-                                user_id=user.id
-                            )
-                        except Exception as save_error:
-                            logger.error(f"保存圖片記錄失敗: {str(save_error)}")
-                    
-                    # 處理圖片標註
-                    if annotations_data and uploaded_images:
-                        try:
-                            import json
-                            if isinstance(annotations_data, str):
-                                annotations = json.loads(annotations_data)
-                            else:
-                                annotations = annotations_data
-                            
-                            # 為每個標註創建記錄
-                            for annotation in annotations:
-                                image_index = annotation.get('image_index', 0)
-                                
-                                # 檢查圖片索引是否有效
-                                if image_index < len(uploaded_images):
-                                    image_data = uploaded_images[image_index]
-                                    firebase_url = image_data.get('firebase_url')
-                                    
-                                    if firebase_url:
-                                        ImageAnnotation.create(
-                                            firebase_url=firebase_url,
-                                            x_position=float(annotation.get('x_position', 0)),
-                                            y_position=float(annotation.get('y_position', 0)),
-                                            target_type=annotation.get('target_type', 'user'),
-                                            target_id=int(annotation.get('target_id', 0)),
-                                            created_by=user
-                                        )
-                                        logger.info(f"創建標註成功: {annotation.get('target_type')}_{annotation.get('target_id')} 在圖片 {image_index}")
-                                        
-                                        # 如果標註的是寵物，建立 PostPets 關聯
-                                        if annotation.get('target_type') == 'pet':
-                                            target_pet_id = int(annotation.get('target_id', 0))
-                                            
-                                            # 檢查是否已經標記過這個寵物
-                                            if target_pet_id not in tagged_pet_ids:
-                                                try:
-                                                    # 獲取寵物並確認屬於當前用戶
-                                                    pet = Pet.objects.get(id=target_pet_id, owner=user)
-                                                    PostPets.objects.create(
-                                                        postFrame=postFrame,
-                                                        pet=pet
-                                                    )
-                                                    tagged_pet_ids.add(target_pet_id)
-                                                    logger.info(f"通過標註建立寵物關聯: {pet.pet_name} (ID: {target_pet_id})")
-                                                except Pet.DoesNotExist:
-                                                    logger.warning(f"標註的寵物 ID {target_pet_id} 不存在或不屬於當前用戶")
-                                                except Exception as pet_error:
-                                                    logger.error(f"建立寵物關聯失敗: {str(pet_error)}")
-                                else:
-                                    logger.warning(f"標註的圖片索引 {image_index} 超出範圍")
-                                    
-                        except Exception as annotation_error:
-                            logger.error(f"處理圖片標註時出錯: {str(annotation_error)}")
-                            # 標註創建失敗不影響貼文創建
-                    
-                    if not success:
-                        logger.warning(f"部分圖片上傳失敗: {message}")
-                    else:
-                        logger.info(f"所有圖片上傳成功: {message}")
-                            
-                except Exception as img_e:
-                    logger.error(f"處理圖片上傳時出錯: {str(img_e)}")
-                    # 圖片上傳失敗不影響貼文創建
+            # 交易內只寫入貼文本身（寫入鎖只持有數毫秒）；
+            # 向量嵌入由 SoLContent 的 signal 排入背景索引，圖片於交易提交後在背景上傳
+            with transaction.atomic():
+                # 創建 PostFrame
+                postFrame = PostFrame.objects.create(user=user)
+
+                # 創建 SoLContent
+                solContent = SoLContent.objects.create(
+                    postFrame=postFrame,
+                    content_text=content,
+                    location=location
+                )
+
+                # 創建標籤關聯
+                logger.info(f"準備創建標籤，解析得到的標籤: {hashtags}")
+                DataHandler.create_hashtags(postFrame, hashtags)
+                
+                # 創建寵物標記關聯
+                tagged_pet_ids = DataHandler.tag_pets(postFrame, pets, user)
+                
+                # 圖片與標註於交易提交後在背景上傳
+                media_job = schedule_post_images(
+                    postFrame,
+                    user,
+                    image_files,
+                    annotations=annotations,
+                    tagged_pet_ids=tagged_pet_ids
+                )
             
-            # 返回創建成功的貼文
+            # 返回創建成功的貼文（圖片上傳中時附上上傳工作狀態）
             serializer = PostFrameSerializer(postFrame, context={'request': request})
+            data = dict(serializer.data)
+            if media_job:
+                media_job.refresh_from_db()
+            data['media_upload'] = media_job.to_dict() if media_job else None
             
             return APIResponse(
-                data=serializer.data,
+                data=data,
                 message="貼文建立成功",
                 status=drf_status.HTTP_201_CREATED,
             )
@@ -573,10 +524,7 @@ class DeletePostAPIView(APIView):
                 logger.error(f"刪除貼文相關資料時出錯: {str(data_error)}")
                 # 繼續刪除主貼文
 
-            recommendation_service = apps.get_app_config('social').get_recommendation_service()
-            recommendation_service.delete_post_data(post_id=postFrame.id, content_type="social")
-
-            # 最後刪除 PostFrame
+            # 最後刪除 PostFrame（推薦用的貼文向量由 SoLContent 的 signal 於交易提交後移除）
             post_id = postFrame.id
             postFrame.delete()
             
@@ -684,104 +632,193 @@ class UserPostListAPIView(APIView):
 
 #----------全局貼文列表 API----------
 class PostListAPIView(generics.ListAPIView):
-    """獲取全局貼文列表"""
+    """
+    獲取全局貼文列表
+
+    推薦排序只取使用者向量最相近的 CANDIDATE_WINDOW 篇貼文（加上互動過的貼文），
+    排序結果依使用者快取，之後的分頁直接從快取的清單讀取；
+    推薦清單看完後接著顯示其餘的最新貼文。
+
+    分頁模式：
+    - offset（預設）：?offset=&limit=，保留原本的回應格式
+    - cursor：?pagination=cursor 或帶 ?cursor=，回應的 next_cursor 用於取得下一頁
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = PostFrameSerializer
-    
-    @log_queries
+
+    # 向量搜尋取回的推薦候選數
+    CANDIDATE_WINDOW = 200
+
+    # 推薦排序快取時間（秒），同時也是 cursor 的有效期限
+    RANKING_CACHE_TTL = 30 * 60
+
+    CURSOR_SALT = 'social.post_list.cursor'
+
     def get_queryset(self):
+        # 推薦清單以外的貼文依時間排序（id 作為同時間的次序，供 keyset 分頁使用）
+        return PostFrame.objects.all().order_by('-created_at', '-id')
+
+    @log_queries
+    def _rank_posts(self):
+        """
+        計算推薦排序的貼文 ID 清單（有界的候選集合）
+
+        Returns:
+            list: 推薦貼文 ID（已插入互動過的貼文），沒有推薦時返回空列表
+        """
         recommendation_service = apps.get_app_config('social').get_recommendation_service()
 
-        history = []
-        recommend_list = []
-        
         # 如果推薦服務還沒初始化，直接返回最新貼文
         if recommendation_service is None:
             print("推薦服務尚未初始化，返回最新貼文")
-            return PostFrame.objects.all().order_by('-created_at')
-
-        # 獲取用戶的互動歷史
-        # 先取得用戶和日常貼文SoLContent的互動歷史(互動不包含留言，留言會在下方單獨處理)
-        interaction_list = UserInteraction.objects.filter(user=self.request.user)[:50].values()
-        for interaction in interaction_list:
-            # 先假設用戶互動的是PostFrame，把按讚留言紀錄過濾掉
-            postFrame = PostFrame.get_postFrames(postID=interaction['interactables_id'])
-
-            # 根據找到的PostFrame獲取SoLContent(若不是SoLContent則忽略)
-            if postFrame is not None:
-                solContent = SoLContent.get_content(postFrame)
-
-                if solContent.exists():
-                    history.append({
-                        "id": interaction['interactables_id'],
-                        "action": interaction['relation'],
-                        "timestamp": int(interaction['created_at'].timestamp())
-                    })
+            return []
 
-        # 接者處理留言的歷史
-        comment_list = Comment.objects.filter(user=self.request.user)[:50].select_related('postFrame')
-        for comment in comment_list:
-            # 還是先抓留言來自哪個PostFrame
-            postFrame = comment.postFrame
-
-            # 根據找到的PostFrame獲取SoLContent(若不是SoLContent則忽略)
-            if postFrame is not None:
-                solContent = SoLContent.get_content(postFrame)
-
-                if solContent.exists():
-                    history.append({
-                        "id": postFrame.id,
-                        "action": "comment",
-                        "timestamp": int(comment.created_at.timestamp())
-                    })
+        # 讀取預先維護的使用者興趣向量（由互動 / 留言事件增量更新）
+        interest = get_user_interest(recommendation_service, self.request.user)
+        if interest is None:
+            print("無用戶互動歷史")
+            return []
 
-        seen_ids = {p['id'] for p in history}
+        user_vec, seen_list = interest
+        seen_ids = set(seen_list)
+        print(len(seen_ids), "篇互動過的貼文")
 
-        if len(history) > 0:
-            print(len(history), "條互動歷史")
+        search_list = recommendation_service.recommend_posts(
+            user_vec=user_vec, content_type="social", k=self.CANDIDATE_WINDOW
+        )
 
-            embedded_history = recommendation_service.embed_user_history(posts=[(p['id'], p['action'], p['timestamp']) for p in history], content_type="social")
-            search_list = recommendation_service.recommend_posts(user_vec=embedded_history, content_type="social")
+        # Add recommended posts first
+        recommend_list = [post_id for post_id in search_list if post_id not in seen_ids]
+        # Insert each seen_id at a deterministic (per-day) position in recommend_list
+        insert_pos = 0
+        for seen_id in seen_list:
+            offset = datetime.now().day + datetime.now().month + datetime.now().year
+            insert_pos = (insert_pos + offset) % (len(recommend_list) + 1)
+            recommend_list.insert(insert_pos, seen_id)
 
-            # Add recommended posts first
-            for post_id in search_list:
-                if post_id not in seen_ids:
-                    recommend_list.append(post_id)
-            # Randomly insert seen_ids into recommend_list
-            seen_list = list(seen_ids)
-            # random.shuffle(seen_list)
-            # Insert each seen_id at a random position in recommend_list
-            insert_pos = 0
-            for seen_id in seen_list:
-                # insert_pos = random.randint(0, len(recommend_list))
-                offset = datetime.now().day + datetime.now().month + datetime.now().year
-                insert_pos = (insert_pos + offset) % (len(recommend_list) + 1)
-                recommend_list.insert(insert_pos, seen_id)
+        print("推薦結果:", len(recommend_list), "篇")
+        return recommend_list
+
+    def _get_ranked_ids(self, session, refresh=False):
+        """
+        取得快取的推薦排序（不存在、過期或要求刷新時重新計算）
 
-            print("推薦結果:", recommend_list)
+        Args:
+            session (str): 排序快取的識別（cursor 的 session 或 'offset'）
+            refresh (bool): 是否強制重新計算
 
-            return PostFrame.get_postFrames(idList=recommend_list)
+        Returns:
+            list: 推薦貼文 ID
+        """
+        key = f"feed_rank:{self.request.user.id}:{session}"
+        ranked = None if refresh else cache.get(key)
+        if ranked is None:
+            ranked = self._rank_posts()
+            cache.set(key, ranked, self.RANKING_CACHE_TTL)
+        return ranked
+
+    def _get_page(self, ranked, offset, limit, after=None):
+        """
+        取得一頁貼文：先從推薦清單取，不足的部分以推薦清單以外的最新貼文補上
+
+        Args:
+            ranked (list): 推薦貼文 ID
+            offset (int): 在整體列表中的位置
+            limit (int): 每頁數量
+            after (tuple): 最新貼文部分的 keyset 位置 (created_at, id)，None 時以 offset 推算
+
+        Returns:
+            tuple: (貼文列表, 是否還有更多, 最後一篇最新貼文)
+        """
+        ranked_ids = ranked[offset:offset + limit]
+        posts_by_id = PostFrame.objects.in_bulk(ranked_ids) if ranked_ids else {}
+        # 已刪除的貼文直接略過
+        posts = [posts_by_id[post_id] for post_id in ranked_ids if post_id in posts_by_id]
+
+        latest = self.get_queryset()
+        if ranked:
+            latest = latest.exclude(id__in=ranked)
+
+        remaining = limit - len(ranked_ids)
+        if remaining <= 0:
+            return posts, offset + limit < len(ranked) or latest.exists(), None
+
+        if after is not None:
+            created_at, post_id = after
+            latest = latest.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+            latest_posts = list(latest[:remaining + 1])
         else:
-            print("無用戶互動歷史")
+            latest_offset = max(offset - len(ranked), 0)
+            latest_posts = list(latest[latest_offset:latest_offset + remaining + 1])
+
+        has_more = len(latest_posts) > remaining
+        latest_posts = latest_posts[:remaining]
+        posts.extend(latest_posts)
+        return posts, has_more, latest_posts[-1] if latest_posts else None
+
+    def _encode_cursor(self, session, offset, last_post=None):
+        data = {'s': session, 'o': offset}
+        if last_post is not None:
+            data['t'] = last_post.created_at.isoformat()
+            data['i'] = last_post.id
+        return signing.dumps(data, salt=self.CURSOR_SALT)
+
+    def _decode_cursor(self, cursor):
+        """解析 cursor，返回 (session, offset, keyset 位置)；無效或過期時拋出 ValueError"""
+        try:
+            data = signing.loads(cursor, salt=self.CURSOR_SALT, max_age=self.RANKING_CACHE_TTL)
+            after = None
+            if 't' in data:
+                after = (datetime.fromisoformat(data['t']), int(data['i']))
+            return str(data['s']), int(data['o']), after
+        except (signing.BadSignature, KeyError, TypeError) as e:
+            raise ValueError(f"無效的 cursor: {str(e)}")
 
-            return PostFrame.objects.all().order_by('-created_at')
+    def _list_by_cursor(self, request, page_size):
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            session, offset, after = self._decode_cursor(cursor)
+        else:
+            # 第一頁：建立新的排序 session
+            session, offset, after = secrets.token_urlsafe(8), 0, None
+
+        ranked = self._get_ranked_ids(session, refresh=not cursor)
+        posts, has_more, last_latest = self._get_page(ranked, offset, page_size, after)
+
+        next_cursor = None
+        if has_more:
+            # 進入最新貼文部分後改以 keyset 定位，不受新發佈貼文影響
+            next_cursor = self._encode_cursor(session, offset + page_size, last_latest)
+
+        serializer = self.get_serializer(posts, many=True, context={'request': request})
+        return APIResponse(
+            data={
+                'posts': serializer.data,
+                'has_more': has_more,
+                'next_cursor': next_cursor,
+                'limit': page_size
+            },
+            message="獲取貼文列表成功"
+        )
 
     def list(self, request, *args, **kwargs):
         try:
-            queryset = self.filter_queryset(self.get_queryset())
-            
             # 獲取分頁參數
             page_size = min(int(request.query_params.get('limit', 10)), 50)  # 最大50個
+
+            if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+                return self._list_by_cursor(request, page_size)
+
             offset = int(request.query_params.get('offset', 0))
-            
-            # 手動分頁
-            total_count = queryset.count()
-            posts = queryset[offset:offset + page_size]
-            has_more = offset + page_size < total_count
-            
+
+            # 第一頁重新計算推薦排序，之後的分頁沿用快取的排序
+            ranked = self._get_ranked_ids('offset', refresh=offset == 0)
+            posts, has_more, _ = self._get_page(ranked, offset, page_size)
+            total_count = len(ranked) + self.get_queryset().exclude(id__in=ranked).count()
+
             # 序列化數據
             serializer = self.get_serializer(posts, many=True, context={'request': request})
-            
+
             return APIResponse(
                 data={
                     'posts': serializer.data,
@@ -792,7 +829,7 @@ class PostListAPIView(generics.ListAPIView):
                 },
                 message="獲取貼文列表成功"
             )
-            
+
         except ValueError as e:
             return APIResponse(
                 message="分頁參數錯誤",
@@ -1249,7 +1286,6 @@ class UpdatePostAPIView(APIView):
     """更新現有貼文"""
     permission_classes = [IsAuthenticated]
     
-    @transaction.atomic
     def put(self, request, pk):
         try:
             # 獲取貼文
@@ -1283,95 +1319,62 @@ class UpdatePostAPIView(APIView):
                     status=drf_status.HTTP_400_BAD_REQUEST,
                 )
             
-            # 更新 SoLContent
-            try:
-                solContent = SoLContent.objects.get(postFrame=postFrame)
-                solContent.content_text = content
-                solContent.location = location
-                solContent.save()
-            except SoLContent.DoesNotExist:
-                # 如果沒有內容，創建新的
-                solContent = SoLContent.objects.create(
-                    postFrame=postFrame,
-                    content_text=content,
-                    location=location
-                )
-
-            recommendation_service = apps.get_app_config('social').get_recommendation_service()
-            recommendation_service.delete_post_data(post_id=postFrame.id, content_type="social")
-            recommendation_service.embed_new_post(post_id=postFrame.id, content=content, content_type="social")
-
-            # 處理標籤更新
+            # 讀檔在交易外完成
+            image_files = buffer_uploads(uploaded_image_files)
             hashtags = DataHandler.parse_hashtags(content, hashtag_data)
             
-            # 刪除舊標籤
-            PostHashtag.objects.filter(postFrame=postFrame).delete()
-            
-            # 創建新標籤
-            logger.info(f"準備更新標籤，解析得到的標籤: {hashtags}")
-            for tag in hashtags:
-                if tag:  # 確保標籤不為空
-                    created_hashtag = PostHashtag.objects.create(
+            # 交易內只更新貼文本身；向量嵌入由 SoLContent 的 signal 排入背景索引，
+            # 新增的圖片於交易提交後在背景上傳
+            with transaction.atomic():
+                # 更新 SoLContent
+                try:
+                    solContent = SoLContent.objects.get(postFrame=postFrame)
+                    solContent.content_text = content
+                    solContent.location = location
+                    solContent.save()
+                except SoLContent.DoesNotExist:
+                    # 如果沒有內容，創建新的
+                    solContent = SoLContent.objects.create(
                         postFrame=postFrame,
-                        tag=tag.strip()
+                        content_text=content,
+                        location=location
                     )
-                    logger.info(f"成功更新標籤: '{tag}' -> 資料庫中的值: '{created_hashtag.tag}'")
-            
-            # 驗證標籤是否正確存儲
-            saved_hashtags = PostHashtag.objects.filter(postFrame=postFrame)
-            logger.info(f"資料庫中實際存儲的標籤: {[h.tag for h in saved_hashtags]}")
-            
-            # 處理新增圖片上傳
-            if uploaded_image_files:
-                from utils.firebase_service import firebase_storage_service
-                from utils.image_service import ImageService
-                
-                logger.info(f"開始上傳 {len(uploaded_image_files)} 張圖片到貼文 {postFrame.id}")
-                
-                # 獲取當前圖片的最大排序值
-                from media.models import Image
 
-                current_max_sort_order = Image.objects.filter(
-                    postFrame=postFrame
-                ).aggregate(Max('sort_order'))['sort_order__max'] or -1
-                
-                # 批量上傳圖片到 Firebase
-                success, message, uploaded_images = firebase_storage_service.upload_post_images_batch(
-                    user_id=user.id,
-                    post_id=postFrame.id,
-                    image_files=uploaded_image_files,
-                    start_sort_order=current_max_sort_order + 1
-                )
+                # 處理標籤更新：刪除舊標籤後創建新標籤
+                PostHashtag.objects.filter(postFrame=postFrame).delete()
+                logger.info(f"準備更新標籤，解析得到的標籤: {hashtags}")
+                DataHandler.create_hashtags(postFrame, hashtags)
                 
-                if success:
-                    # 將圖片資訊保存到資料庫
-                    for image_data in uploaded_images:
-                        try:
-                            ImageService.save_post_image(
-                                image_data=image_data,
-                                post_frame_id=postFrame.id,
-                                user_id=user.id
-                            )
-                            logger.info(f"成功保存圖片到資料庫: {image_data.get('firebase_url', 'Unknown')}")
-                        except Exception as img_save_error:
-                            logger.error(f"保存圖片到資料庫失敗: {str(img_save_error)}")
+                # 處理新增圖片上傳（接在目前最大的排序值之後）
+                media_job = None
+                if image_files:
+                    from media.models import Image
+
+                    current_max_sort_order = Image.objects.filter(
+                        postFrame=postFrame
+                    ).aggregate(Max('sort_order'))['sort_order__max'] or -1
                     
-                    # 清除圖片快取
-                    ImageService.invalidate_post_image_cache(postFrame.id)
-                    logger.info(f"成功上傳並保存 {len(uploaded_images)} 張圖片")
-                else:
-                    logger.error(f"圖片上傳失敗: {message}")
-                    raise Exception(f"圖片上傳失敗: {message}")
-            
-            # 更新 PostFrame 的 updated_at 時間
-            postFrame.updated_at = timezone.now()
-            postFrame.save(update_fields=['updated_at'])
-            
-            # 返回更新後的貼文
+                    logger.info(f"排程上傳 {len(image_files)} 張圖片到貼文 {postFrame.id}")
+                    media_job = schedule_post_images(
+                        postFrame,
+                        user,
+                        image_files,
+                        start_sort_order=current_max_sort_order + 1
+                    )
+                
+                # 更新 PostFrame 的 updated_at 時間
+                postFrame.updated_at = timezone.now()
+                postFrame.save(update_fields=['updated_at'])
+            
+            # 返回更新後的貼文（圖片上傳中時附上上傳工作狀態）
             serializer = PostFrameSerializer(postFrame, context={'request': request})
+            data = dict(serializer.data)
+            if media_job:
+                media_job.refresh_from_db()
+            data['media_upload'] = media_job.to_dict() if media_job else None
             
             return APIResponse(
-                data=serializer.data,
+                data=data,
                 message="貼文更新成功",
                 status=drf_status.HTTP_200_OK,
             )
@@ -1381,4 +1384,41 @@ class UpdatePostAPIView(APIView):
             return APIResponse(
                 message=f"更新貼文失敗: {str(e)}",
                 status=drf_status.HTTP_400_BAD_REQUEST,
-            )
\ No newline at end of file
+            )
+
+#----------貼文圖片上傳狀態 API----------
+class PostMediaStatusAPIView(APIView):
+    """查詢貼文圖片的背景上傳狀態（建立 / 編輯貼文後輪詢）"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        try:
+            postFrame = PostFrame.objects.get(id=pk)
+        except PostFrame.DoesNotExist:
+            return APIResponse(
+                status=drf_status.HTTP_404_NOT_FOUND,
+                message="找不到指定的貼文"
+            )
+        
+        # 只有作者可以查詢上傳狀態
+        if postFrame.user_id != request.user.id:
+            return APIResponse(
+                status=drf_status.HTTP_403_FORBIDDEN,
+                message="您沒有權限查詢此貼文的上傳狀態"
+            )
+        
+        # 上傳中斷的工作（程序在上傳完成前結束）標記為失敗，前端不會一直輪詢
+        fail_stale_jobs(postFrame)
+        jobs = [job.to_dict() for job in PostMediaJob.objects.filter(postFrame=postFrame)]
+        in_progress = any(
+            job['status'] in (PostMediaJob.STATUS_PENDING, PostMediaJob.STATUS_RUNNING) for job in jobs
+        )
+        
+        return APIResponse(
+            data={
+                'post_id': postFrame.id,
+                'in_progress': in_progress,
+                'jobs': jobs,
+            },
+            message="圖片上傳中" if in_progress else "圖片上傳已完成"
+        )
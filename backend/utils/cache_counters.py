@@ -0,0 +1,42 @@
+"""
+Cache Counters
+存於 default 快取的統計計數器（各程序合計）
+
+計數器不設到期時間；統計失敗只輸出警告，不影響呼叫端的流程。
+"""
+
+from django.core.cache import cache
+
+
+def incr_counter(key, delta=1):
+    """
+    遞增計數器（不存在時建立）
+
+    Args:
+        key (str): 快取鍵
+        delta (int): 遞增量
+    """
+    try:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # 計數器不存在；兩個程序同時建立時，add 失敗的一方改為遞增
+            if not cache.add(key, delta, None):
+                cache.incr(key, delta)
+    except Exception as e:
+        print(f"⚠️ 更新統計計數器失敗 ({key}): {str(e)}")
+
+
+def get_counters(prefix, names):
+    """
+    一次取得多個計數器
+
+    Args:
+        prefix (str): 鍵前綴
+        names (iterable): 計數器名稱
+
+    Returns:
+        dict: 名稱 -> 數值（不存在時為 0）
+    """
+    values = cache.get_many([prefix + name for name in names])
+    return {name: values.get(prefix + name, 0) for name in names}
@@ -0,0 +1,143 @@
+"""
+Embedding Batcher
+查詢嵌入的微批次處理
+
+聊天查詢與 signal 觸發的單筆嵌入原本各自執行一次 BERT forward，
+在同一個 CPU 模型上彼此排隊。微批次處理器把幾毫秒內送達的請求合併成
+一次 forward（交給 EmbeddingEngine 依長度分桶），再把結果分別交回給呼叫者。
+
+- submit() 返回 concurrent.futures.Future，一般執行緒可直接 result()
+- aembed() 可在 asyncio 中 await
+- 背景執行緒在第一次送出請求時才啟動
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class EmbeddingBatcher:
+    """把同時送達的嵌入請求合併成單次 forward 的微批次處理器"""
+
+    # 收到第一筆請求後最多等待的時間（毫秒）
+    DEFAULT_MAX_WAIT_MS = 5
+
+    # 單次 forward 最多合併的請求數
+    DEFAULT_MAX_BATCH = 64
+
+    def __init__(self, engine, max_wait_ms=DEFAULT_MAX_WAIT_MS, max_batch=DEFAULT_MAX_BATCH):
+        """
+        初始化微批次處理器
+
+        Args:
+            engine: EmbeddingEngine 實例
+            max_wait_ms (float): 收集批次的最長等待時間（毫秒）
+            max_batch (int): 單批最多請求數
+        """
+        self.engine = engine
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='embedding-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, text):
+        """
+        送出一筆嵌入請求
+
+        Args:
+            text (str): 要嵌入的文字
+
+        Returns:
+            Future: 完成後的結果為 (hidden,) 的 float32 向量
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text, timeout=None):
+        """
+        同步取得單筆文字的嵌入向量（會與其他同時送達的請求合併處理）
+
+        Args:
+            text (str): 要嵌入的文字
+            timeout (float): 最長等待秒數
+
+        Returns:
+            np.array: (hidden,) 的 float32 向量
+        """
+        return self.submit(text).result(timeout=timeout)
+
+    async def aembed(self, text):
+        """
+        非同步取得單筆文字的嵌入向量
+
+        Args:
+            text (str): 要嵌入的文字
+
+        Returns:
+            np.array: (hidden,) 的 float32 向量
+        """
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self):
+        """阻塞等待第一筆請求，再於 max_wait 內盡量收集更多請求"""
+        batch = [self._queue.get()]
+        deadline = None
+        while len(batch) < self.max_batch:
+            try:
+                # 已在排隊的請求直接取走，不需等待
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+
+            if self.max_wait <= 0:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # 呼叫者已取消的請求不需計算
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # 相同文字只計算一次
+            unique = {}
+            for text, _ in batch:
+                unique.setdefault(text, len(unique))
+
+            try:
+                embeddings = self.engine.encode(list(unique))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for text, future in batch:
+                future.set_result(embeddings[unique[text]].copy())
+
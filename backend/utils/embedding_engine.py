@@ -0,0 +1,193 @@
+"""
+Embedding Engine
+共用的批次 BERT 嵌入引擎
+
+所有向量資料庫（使用者、寵物、飼料、系統操作、FAQ、疾病檔案）與貼文推薦
+都透過同一個引擎產生嵌入：
+- 先只做 tokenize（不 padding），依 token 長度排序分桶，
+  長度相近的文字放在同一批，避免整批被補到最長的那一筆
+- 每批以 token 預算（批次筆數 × 該批最長長度）決定大小，而不是固定 4 筆
+- 使用 torch.inference_mode 執行，並可選擇對 Linear 層做 int8 動態量化
+- 大量建立索引時暫時放寬 torch 執行緒數，讓矩陣運算用滿 CPU 核心
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+
+class EmbeddingEngine:
+    """批次、長度分桶的 BERT 嵌入引擎（mean pooling + L2 正規化）"""
+
+    # 預設每批 token 預算（批次筆數 × 最長序列長度）
+    DEFAULT_TOKEN_BUDGET = 8192
+
+    def __init__(self, tokenizer, model, device, max_length=512,
+                 token_budget=DEFAULT_TOKEN_BUDGET, num_threads=None, quantize=False):
+        """
+        初始化嵌入引擎
+
+        Args:
+            tokenizer: HuggingFace tokenizer
+            model: BERT 模型（已 eval）
+            device: torch.device
+            max_length (int): 單筆最大 token 數
+            token_budget (int): 每批 token 預算
+            num_threads (int): 大量建立索引時使用的 torch 執行緒數（None 表示使用所有核心）
+            quantize (bool): 是否對模型做 int8 動態量化（僅 CPU）
+        """
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.max_length = max_length
+        self.token_budget = max(int(token_budget), max_length)
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.quantized = False
+        self._threads_lock = threading.Lock()
+
+        if quantize:
+            self.quantize()
+
+    def quantize(self):
+        """
+        對模型的 Linear 層做 int8 動態量化（僅 CPU 有效）
+
+        注意：量化後的向量與原本的向量有些微差異，
+        啟用後應重建既有的向量資料庫，避免新舊向量混用。
+
+        Returns:
+            bool: 是否已量化
+        """
+        if self.quantized:
+            return True
+        if self.device.type != 'cpu':
+            print("⚠️ 動態量化僅支援 CPU，略過量化")
+            return False
+
+        self.model = torch.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        self.quantized = True
+        print("✅ BERT 模型已套用 int8 動態量化")
+        return True
+
+    @staticmethod
+    def mean_pooling(outputs, mask):
+        """以 attention mask 對 token 向量取平均"""
+        token_embeddings = outputs.last_hidden_state   # (batch, seq_len, hidden)
+        mask = mask.unsqueeze(-1).to(token_embeddings.dtype)
+        summed = (token_embeddings * mask).sum(1)       # (batch, hidden)
+        counts = mask.sum(1).clamp(min=1e-9)            # (batch, 1)
+        return summed / counts
+
+    def _batches(self, lengths):
+        """
+        依長度排序後，以 token 預算切出批次
+
+        Args:
+            lengths (list): 每筆文字的 token 數
+
+        Returns:
+            list: 每批的原始索引列表
+        """
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches = []
+        current = []
+        for i in order:
+            # 依長度遞增排序，因此加入這筆後該批的最長長度就是它的長度
+            if current and (len(current) + 1) * lengths[i] > self.token_budget:
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    @contextmanager
+    def _bulk_threads(self, enabled):
+        """大量建立索引時暫時提高 torch 執行緒數，結束後還原"""
+        if not enabled or self.device.type != 'cpu':
+            yield
+            return
+
+        with self._threads_lock:
+            previous = torch.get_num_threads()
+            if previous < self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            try:
+                yield
+            finally:
+                torch.set_num_threads(previous)
+
+    def encode(self, texts, bulk=False, progress_label=None):
+        """
+        產生正規化後的嵌入向量
+
+        Args:
+            texts (list): 文字列表
+            bulk (bool): 是否為大量建立索引（會暫時使用所有 CPU 核心）
+            progress_label (str): 進度輸出的名稱（None 表示不輸出）
+
+        Returns:
+            np.array: (len(texts), hidden) 的 float32 矩陣，順序與輸入相同
+        """
+        texts = [text if isinstance(text, str) else str(text or '') for text in texts]
+        hidden = self.model.config.hidden_size
+        if not texts:
+            return np.zeros((0, hidden), dtype=np.float32)
+
+        # 先只做 tokenize（不 padding），取得每筆的實際長度
+        tokenized = self.tokenizer(
+            texts,
+            padding=False,
+            truncation=True,
+            max_length=self.max_length,
+        )
+        input_ids = tokenized['input_ids']
+        token_type_ids = tokenized.get('token_type_ids')
+        lengths = [len(ids) for ids in input_ids]
+
+        result = np.empty((len(texts), hidden), dtype=np.float32)
+        batches = self._batches(lengths)
+        pad_id = self.tokenizer.pad_token_id or 0
+        done = 0
+
+        with self._bulk_threads(bulk), torch.inference_mode():
+            for batch in batches:
+                width = max(lengths[i] for i in batch)
+                ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+                mask = torch.zeros((len(batch), width), dtype=torch.long)
+                types = torch.zeros((len(batch), width), dtype=torch.long) if token_type_ids is not None else None
+                for row, i in enumerate(batch):
+                    n = lengths[i]
+                    ids[row, :n] = torch.tensor(input_ids[i], dtype=torch.long)
+                    mask[row, :n] = 1
+                    if types is not None:
+                        types[row, :n] = torch.tensor(token_type_ids[i], dtype=torch.long)
+
+                inputs = {'input_ids': ids.to(self.device), 'attention_mask': mask.to(self.device)}
+                if types is not None:
+                    inputs['token_type_ids'] = types.to(self.device)
+
+                outputs = self.model(**inputs)
+                embs = self.mean_pooling(outputs, inputs['attention_mask'])
+                embs = torch.nn.functional.normalize(embs, p=2, dim=1)
+                result[batch] = embs.float().cpu().numpy()
+
+                done += len(batch)
+                if progress_label and len(batches) > 1:
+                    print(f"  {progress_label} 處理進度: {done}/{len(texts)}")
+
+        return result
+
+    def encode_one(self, text):
+        """
+        產生單筆文字的嵌入向量
+
+        Returns:
+            np.array: (hidden,) 的 float32 向量
+        """
+        return self.encode([text])[0]
@@ -2,18 +2,59 @@
 Firebase Storage 服務模塊
 
 提供 Firebase Storage 的圖片上傳、刪除等功能
+
+批量上傳 / 刪除在共用的執行緒池上並行處理（上限 FIREBASE_UPLOAD_MAX_WORKERS），
+多張圖片的總延遲接近最慢的單張，結果仍依原本的順序（sort_order）回傳。
+上傳時直接以 publicRead 建立物件，不再另外 exists() 與 make_public()，
+每個檔案一次請求；暫時性錯誤（逾時、429、5xx）會重試 FIREBASE_UPLOAD_RETRIES 次。
 """
 
 import os
 import uuid
+import time
 import logging
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 
 logger = logging.getLogger(__name__)
 
 
+# 批量上傳 / 刪除的執行緒池（所有請求共用，限制對 Storage 的同時連線數）
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'FIREBASE_UPLOAD_MAX_WORKERS', 8),
+                    thread_name_prefix='firebase-storage'
+                )
+    return _executor
+
+
+def _is_not_found(error: Exception) -> bool:
+    return getattr(error, 'code', None) == 404
+
+
+def _is_transient(error: Exception) -> bool:
+    """是否為可重試的暫時性錯誤"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import requests
+        from google.api_core.retry import if_transient_error
+    except ImportError:
+        return False
+    return if_transient_error(error) or isinstance(error, requests.exceptions.RequestException)
+
+
 class FirebaseStorageService:
     """Firebase Storage 服務類"""
     
@@ -23,9 +64,30 @@ class FirebaseStorageService:
     # 最大檔案大小 (10MB)
     MAX_FILE_SIZE = 10 * 1024 * 1024
     
-    def __init__(self):
-        """初始化 Firebase Storage 服務"""
+    # 暫時性錯誤重試的初始等待時間（秒），每次重試加倍
+    RETRY_BACKOFF = 0.5
+    
+    def __init__(self, bucket=None):
+        """
+        初始化 Firebase Storage 服務
         
+        Parameters:
+        - bucket: 使用的 bucket（預設為 Firebase 預設 bucket；
+          設定 FIREBASE_STORAGE_LOCAL_DIR 時改用本機目錄，測試可直接傳入 LocalBucket）
+        """
+        if bucket is None:
+            local_dir = getattr(settings, 'FIREBASE_STORAGE_LOCAL_DIR', None)
+            if local_dir:
+                from utils.local_bucket import LocalBucket
+                bucket = LocalBucket(local_dir)
+            else:
+                bucket = self._firebase_bucket()
+        self.bucket = bucket
+        self.max_retries = getattr(settings, 'FIREBASE_UPLOAD_RETRIES', 3)
+        self._share_session()
+    
+    @staticmethod
+    def _firebase_bucket():
         import firebase_admin
         from firebase_admin import credentials, storage
         
@@ -34,9 +96,51 @@ class FirebaseStorageService:
               firebase_admin.initialize_app(cred, {
                   'storageBucket': settings.FIREBASE_STORAGE_BUCKET
               })
-        # 
-        self.bucket = storage.bucket()
-        pass
+        return storage.bucket()
+    
+    def _share_session(self):
+        """
+        讓所有上傳執行緒共用 bucket client 已認證的 HTTP session，
+        並把連線池放大到執行緒數，避免並行上傳時連線被丟棄重建
+        """
+        http = getattr(getattr(self.bucket, 'client', None), '_http', None)
+        if http is None or not hasattr(http, 'mount'):
+            return
+        from requests.adapters import HTTPAdapter
+        pool_size = getattr(settings, 'FIREBASE_UPLOAD_MAX_WORKERS', 8)
+        http.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    
+    def _with_retries(self, operation: Callable, description: str):
+        """
+        執行 Storage 操作，暫時性錯誤以指數退避重試
+        
+        Parameters:
+        - operation: 要執行的操作（每次重試都會重新呼叫）
+        - description: 日誌用的操作描述
+        """
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_transient(e):
+                    raise
+                delay = self.RETRY_BACKOFF * (2 ** attempt)
+                attempt += 1
+                logger.warning(f"{description} 失敗，{delay:.1f}s 後重試 ({attempt}/{self.max_retries}): {str(e)}")
+                time.sleep(delay)
+    
+    def _map_concurrently(self, func: Callable, items: list) -> list:
+        """
+        在共用執行緒池上並行處理，結果依 items 的順序回傳
+        
+        Parameters:
+        - func: 處理單一項目的函數（自行處理錯誤並回傳結果）
+        - items: 項目列表
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        return list(_get_executor().map(func, items))
     
     def validate_image(self, image_file) -> Tuple[bool, str]:
         """
@@ -123,49 +227,26 @@ class FirebaseStorageService:
             if not is_valid:
                 return False, error_msg, None
             
-            # 重置檔案流到開頭位置
+            # 上傳時使用的檔案流
             if isinstance(image_file, (InMemoryUploadedFile, TemporaryUploadedFile)):
-                image_file.file.seek(0)
+                file_obj = image_file.file
             else:
-                image_file.seek(0)
+                file_obj = image_file
+            content_type = getattr(image_file, 'content_type', None) or None
             
             # 建立 blob 物件
             blob = self.bucket.blob(file_path)
-            logger.info(f"Created blob for path: {file_path}")
-            logger.info(f"Bucket name: {self.bucket.name}")
-            
-            # 設定檔案內容類型
-            if hasattr(image_file, 'content_type') and image_file.content_type:
-                blob.content_type = image_file.content_type
-                logger.info(f"Set content type: {image_file.content_type}")
-            else:
-                logger.info("No content type available")
-            
-            # 上傳檔案
-            logger.info(f"開始上傳檔案到: {file_path}")
-            if isinstance(image_file, (InMemoryUploadedFile, TemporaryUploadedFile)):
-                logger.info(f"上傳檔案類型: {type(image_file)}, 大小: {image_file.size}")
-                blob.upload_from_file(image_file.file)
-            else:
-                logger.info(f"上傳檔案類型: {type(image_file)}")
-                blob.upload_from_file(image_file)
             
-            logger.info("檔案上傳到 Firebase Storage 完成")
+            def upload():
+                # 每次嘗試都從頭上傳
+                file_obj.seek(0)
+                # 建立時即設定公開讀取（取代上傳後的 exists() 與 make_public()）
+                blob.upload_from_file(file_obj, content_type=content_type, predefined_acl='publicRead')
             
-            # 檢查檔案是否真的存在
-            if blob.exists():
-                logger.info("確認檔案存在於 Firebase Storage")
-            else:
-                logger.error("檔案上傳後不存在於 Firebase Storage")
-                return False, "檔案上傳後不存在於 Firebase Storage", None
-            
-            # 設定公開存取權限
-            logger.info("設定公開存取權限")
-            blob.make_public()
+            self._with_retries(upload, f"上傳 {file_path}")
             
-            # 獲取公開 URL
+            # 公開 URL 由路徑組成，不需要額外請求
             firebase_url = blob.public_url
-            logger.info(f"獲取公開 URL: {firebase_url}")
             
             logger.info(f"圖片上傳成功: {file_path}")
             return True, "圖片上傳成功", firebase_url
@@ -186,18 +267,122 @@ class FirebaseStorageService:
         """
         try:
             blob = self.bucket.blob(file_path)
-            if blob.exists():
-                blob.delete()
-                logger.info(f"圖片刪除成功: {file_path}")
-                return True, "圖片刪除成功"
-            else:
-                logger.warning(f"圖片不存在: {file_path}")
-                return True, "圖片不存在，視為已刪除"
+            self._with_retries(blob.delete, f"刪除 {file_path}")
+            logger.info(f"圖片刪除成功: {file_path}")
+            return True, "圖片刪除成功"
             
         except Exception as e:
+            if _is_not_found(e):
+                logger.warning(f"圖片不存在: {file_path}")
+                return True, "圖片不存在，視為已刪除"
             logger.error(f"圖片刪除失敗: {str(e)}")
             return False, f"圖片刪除失敗: {str(e)}"
     
+    def _upload_images_batch(self, upload_one: Callable, image_files: list, start_sort_order: int,
+                             default_filename: str, item_label: str, error_label: str) -> Tuple[bool, str, list]:
+        """
+        並行上傳多張圖片（批量上傳的共用實作）
+        
+        Parameters:
+        - upload_one: upload_one(image_file, sort_order) -> (是否成功, 訊息, Firebase URL, Firebase 路徑)
+        - image_files: 圖片檔案列表
+        - start_sort_order: 起始排序順序
+        - default_filename: 檔案沒有名稱時使用的名稱前綴
+        - item_label / error_label: 訊息與日誌用的圖片類別名稱
+        
+        Returns:
+        - tuple: (是否全部成功, 訊息, 成功上傳的圖片資訊列表（依原本順序）)
+        """
+        uploaded_images = []
+        failed_count = 0
+        
+        def upload(indexed_file):
+            index, image_file = indexed_file
+            try:
+                return upload_one(image_file, start_sort_order + index)
+            except Exception as e:
+                return False, str(e), None, None
+        
+        try:
+            results = self._map_concurrently(upload, list(enumerate(image_files)))
+            
+            for index, (image_file, result) in enumerate(zip(image_files, results)):
+                success, message, firebase_url, firebase_path = result
+                
+                if success:
+                    uploaded_images.append({
+                        'firebase_url': firebase_url,
+                        'firebase_path': firebase_path,
+                        'sort_order': start_sort_order + index,
+                        'original_filename': getattr(image_file, 'name', f'{default_filename}_{index}'),
+                        'file_size': getattr(image_file, 'size', None),
+                        'content_type': getattr(image_file, 'content_type', None)
+                    })
+                else:
+                    failed_count += 1
+                    logger.error(f"{item_label} {index} 上傳失敗: {message}")
+            
+            total_files = len(image_files)
+            success_count = len(uploaded_images)
+            
+            if failed_count == 0:
+                return True, f"所有 {total_files} 張{item_label}上傳成功", uploaded_images
+            elif success_count > 0:
+                return False, f"{success_count}/{total_files} 張{item_label}上傳成功，{failed_count} 張失敗", uploaded_images
+            else:
+                return False, f"所有 {total_files} 張{item_label}上傳失敗", uploaded_images
+                
+        except Exception as e:
+            logger.error(f"批量上傳{error_label}時發生錯誤: {str(e)}")
+            return False, f"批量上傳失敗: {str(e)}", uploaded_images
+
+    def _delete_images_batch(self, delete_one: Callable, firebase_paths: list,
+                             item_label: str, error_label: str) -> Tuple[bool, str, dict]:
+        """
+        並行刪除多張圖片（批量刪除的共用實作）
+        
+        Parameters:
+        - delete_one: delete_one(firebase_path) -> (是否成功, 訊息)
+        - firebase_paths: Firebase Storage 檔案路徑列表
+        - item_label / error_label: 訊息與日誌用的圖片類別名稱
+        
+        Returns:
+        - tuple: (是否全部成功, 訊息, 詳細結果)
+        """
+        results = {
+            'success': [],
+            'failed': [],
+            'total': len(firebase_paths)
+        }
+        
+        def delete(path):
+            try:
+                return delete_one(path)
+            except Exception as e:
+                return False, str(e)
+        
+        try:
+            paths = [path for path in firebase_paths if path]  # 確保路徑不為空
+            for path, (success, message) in zip(paths, self._map_concurrently(delete, paths)):
+                if success:
+                    results['success'].append(path)
+                else:
+                    results['failed'].append({'path': path, 'error': message})
+            
+            success_count = len(results['success'])
+            failed_count = len(results['failed'])
+            
+            if failed_count == 0:
+                return True, f"所有 {success_count} 張{item_label}刪除成功", results
+            elif success_count > 0:
+                return False, f"{success_count}/{results['total']} 張{item_label}刪除成功，{failed_count} 張失敗", results
+            else:
+                return False, f"所有 {results['total']} 張{item_label}刪除失敗", results
+                
+        except Exception as e:
+            logger.error(f"批量刪除{error_label}時發生錯誤: {str(e)}")
+            return False, f"批量刪除失敗: {str(e)}", results
+
     def upload_user_avatar(self, user_id: int, avatar_file) -> Tuple[bool, str, Optional[str], Optional[str]]:
         """
         上傳用戶頭像
@@ -304,44 +489,16 @@ class FirebaseStorageService:
         Returns:
         - tuple: (是否全部成功, 訊息, 成功上傳的圖片資訊列表)
         """
-        uploaded_images = []
-        failed_count = 0
-        
-        try:
-            for index, image_file in enumerate(image_files):
-                success, message, firebase_url, firebase_path = self.upload_post_image(
-                    user_id=user_id,
-                    post_id=post_id, 
-                    image_file=image_file,
-                    sort_order=start_sort_order + index
-                )
-                
-                if success:
-                    uploaded_images.append({
-                        'firebase_url': firebase_url,
-                        'firebase_path': firebase_path,
-                        'sort_order': start_sort_order + index,
-                        'original_filename': getattr(image_file, 'name', f'image_{index}'),
-                        'file_size': getattr(image_file, 'size', None),
-                        'content_type': getattr(image_file, 'content_type', None)
-                    })
-                else:
-                    failed_count += 1
-                    logger.error(f"圖片 {index} 上傳失敗: {message}")
-            
-            total_files = len(image_files)
-            success_count = len(uploaded_images)
-            
-            if failed_count == 0:
-                return True, f"所有 {total_files} 張圖片上傳成功", uploaded_images
-            elif success_count > 0:
-                return False, f"{success_count}/{total_files} 張圖片上傳成功，{failed_count} 張失敗", uploaded_images
-            else:
-                return False, f"所有 {total_files} 張圖片上傳失敗", uploaded_images
-                
-        except Exception as e:
-            logger.error(f"批量上傳貼文圖片時發生錯誤: {str(e)}")
-            return False, f"批量上傳失敗: {str(e)}", uploaded_images
+        return self._upload_images_batch(
+            lambda image_file, sort_order: self.upload_post_image(
+                user_id=user_id,
+                post_id=post_id,
+                image_file=image_file,
+                sort_order=sort_order
+            ),
+            image_files, start_sort_order,
+            default_filename='image', item_label='圖片', error_label='貼文圖片'
+        )
 
     def delete_post_image(self, firebase_path: str) -> Tuple[bool, str]:
         """
@@ -374,34 +531,9 @@ class FirebaseStorageService:
         Returns:
         - tuple: (是否全部成功, 訊息, 詳細結果)
         """
-        results = {
-            'success': [],
-            'failed': [],
-            'total': len(firebase_paths)
-        }
-        
-        try:
-            for path in firebase_paths:
-                if path:  # 確保路徑不為空
-                    success, message = self.delete_post_image(path)
-                    if success:
-                        results['success'].append(path)
-                    else:
-                        results['failed'].append({'path': path, 'error': message})
-            
-            success_count = len(results['success'])
-            failed_count = len(results['failed'])
-            
-            if failed_count == 0:
-                return True, f"所有 {success_count} 張圖片刪除成功", results
-            elif success_count > 0:
-                return False, f"{success_count}/{results['total']} 張圖片刪除成功，{failed_count} 張失敗", results
-            else:
-                return False, f"所有 {results['total']} 張圖片刪除失敗", results
-                
-        except Exception as e:
-            logger.error(f"批量刪除貼文圖片時發生錯誤: {str(e)}")
-            return False, f"批量刪除失敗: {str(e)}", results
+        return self._delete_images_batch(
+            self.delete_post_image, firebase_paths, item_label='圖片', error_label='貼文圖片'
+        )
 
     def upload_feed_photo(self, feed_id: int, photo_file, photo_type: str, pet_type: str = 'cat') -> Tuple[bool, str, Optional[str], Optional[str]]:
         """
@@ -480,44 +612,16 @@ class FirebaseStorageService:
         Returns:
         - tuple: (是否全部成功, 訊息, 成功上傳的圖片資訊列表)
         """
-        uploaded_images = []
-        failed_count = 0
-        
-        try:
-            for index, image_file in enumerate(image_files):
-                success, message, firebase_url, firebase_path = self.upload_abnormal_record_image(
-                    user_id=user_id,
-                    pet_id=pet_id,
-                    image_file=image_file,
-                    sort_order=start_sort_order + index
-                )
-                
-                if success:
-                    uploaded_images.append({
-                        'firebase_url': firebase_url,
-                        'firebase_path': firebase_path,
-                        'sort_order': start_sort_order + index,
-                        'original_filename': getattr(image_file, 'name', f'abnormal_image_{index}'),
-                        'file_size': getattr(image_file, 'size', None),
-                        'content_type': getattr(image_file, 'content_type', None)
-                    })
-                else:
-                    failed_count += 1
-                    logger.error(f"異常記錄圖片 {index} 上傳失敗: {message}")
-            
-            total_files = len(image_files)
-            success_count = len(uploaded_images)
-            
-            if failed_count == 0:
-                return True, f"所有 {total_files} 張異常記錄圖片上傳成功", uploaded_images
-            elif success_count > 0:
-                return False, f"{success_count}/{total_files} 張異常記錄圖片上傳成功，{failed_count} 張失敗", uploaded_images
-            else:
-                return False, f"所有 {total_files} 張異常記錄圖片上傳失敗", uploaded_images
-                
-        except Exception as e:
-            logger.error(f"批量上傳異常記錄圖片時發生錯誤: {str(e)}")
-            return False, f"批量上傳失敗: {str(e)}", uploaded_images
+        return self._upload_images_batch(
+            lambda image_file, sort_order: self.upload_abnormal_record_image(
+                user_id=user_id,
+                pet_id=pet_id,
+                image_file=image_file,
+                sort_order=sort_order
+            ),
+            image_files, start_sort_order,
+            default_filename='abnormal_image', item_label='異常記錄圖片', error_label='異常記錄圖片'
+        )
 
     def upload_comment_image(self, user_id: int, comment_id: int, image_file, sort_order: int = 0) -> Tuple[bool, str, Optional[str], Optional[str]]:
         """
@@ -564,44 +668,16 @@ class FirebaseStorageService:
         Returns:
         - tuple: (是否全部成功, 訊息, 成功上傳的圖片資訊列表)
         """
-        uploaded_images = []
-        failed_count = 0
-
-        try:
-            for index, image_file in enumerate(image_files):
-                success, message, firebase_url, firebase_path = self.upload_comment_image(
-                    user_id=user_id,
-                    comment_id=comment_id,
-                    image_file=image_file,
-                    sort_order=start_sort_order + index
-                )
-
-                if success:
-                    uploaded_images.append({
-                        'firebase_url': firebase_url,
-                        'firebase_path': firebase_path,
-                        'sort_order': start_sort_order + index,
-                        'original_filename': getattr(image_file, 'name', f'comment_image_{index}'),
-                        'file_size': getattr(image_file, 'size', None),
-                        'content_type': getattr(image_file, 'content_type', None)
-                    })
-                else:
-                    failed_count += 1
-                    logger.error(f"留言圖片 {index} 上傳失敗: {message}")
-
-            total_files = len(image_files)
-            success_count = len(uploaded_images)
-
-            if failed_count == 0:
-                return True, f"所有 {total_files} 張留言圖片上傳成功", uploaded_images
-            elif success_count > 0:
-                return False, f"{success_count}/{total_files} 張留言圖片上傳成功，{failed_count} 張失敗", uploaded_images
-            else:
-                return False, f"所有 {total_files} 張留言圖片上傳失敗", uploaded_images
-
-        except Exception as e:
-            logger.error(f"批量上傳留言圖片時發生錯誤: {str(e)}")
-            return False, f"批量上傳失敗: {str(e)}", uploaded_images
+        return self._upload_images_batch(
+            lambda image_file, sort_order: self.upload_comment_image(
+                user_id=user_id,
+                comment_id=comment_id,
+                image_file=image_file,
+                sort_order=sort_order
+            ),
+            image_files, start_sort_order,
+            default_filename='comment_image', item_label='留言圖片', error_label='留言圖片'
+        )
 
     def delete_comment_image(self, firebase_path: str) -> Tuple[bool, str]:
         """
@@ -634,35 +710,9 @@ class FirebaseStorageService:
         Returns:
         - tuple: (是否全部成功, 訊息, 詳細結果)
         """
-        results = {
-            'success': [],
-            'failed': [],
-            'total': len(firebase_paths)
-        }
-
-        try:
-            for path in firebase_paths:
-                if path:  # 確保路徑不為空
-                    success, message = self.delete_comment_image(path)
-                    if success:
-                        results['success'].append(path)
-                    else:
-                        results['failed'].append({'path': path, 'error': message})
-
-            success_count = len(results['success'])
-            failed_count = len(results['failed'])
-
-            if failed_count == 0:
-                return True, f"所有 {success_count} 張留言圖片刪除成功", results
-            elif success_count > 0:
-                return False, f"{success_count}/{results['total']} 張留言圖片刪除成功，{failed_count} 張失敗", results
-            else:
-                return False, f"所有 {results['total']} 張留言圖片刪除失敗", results
-
-        except Exception as e:
-            logger.error(f"批量刪除留言圖片時發生錯誤: {str(e)}")
-            return False, f"批量刪除失敗: {str(e)}", results
-
+        return self._delete_images_batch(
+            self.delete_comment_image, firebase_paths, item_label='留言圖片', error_label='留言圖片'
+        )
 
 # 全域服務實例
 firebase_storage_service = FirebaseStorageService()
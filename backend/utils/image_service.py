@@ -8,17 +8,26 @@ from django.contrib.contenttypes.models import ContentType
 from django.db.models import Prefetch
 from collections import defaultdict
 import logging
-from django.core.cache import cache
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.utils.connection import ConnectionProxy
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+# 圖片快取使用 settings.CACHES 的 images（程序內 LRU + 共用快取），未設定時使用 default
+IMAGE_CACHE_ALIAS = 'images' if 'images' in settings.CACHES else DEFAULT_CACHE_ALIAS
+cache = ConnectionProxy(caches, IMAGE_CACHE_ALIAS)
+
 class ImageService:
     """圖片服務類，提供統一的圖片處理功能 - Firebase Storage 版本"""
     
     # 默認緩存超時時間（24小時）
     DEFAULT_CACHE_TIMEOUT = 60 * 60 * 24
     
+    # 沒有圖片的貼文（空列表）緩存時間（秒）；貼文建立後圖片才上傳，不能長時間緩存
+    EMPTY_CACHE_TIMEOUT = 60
+    
     @staticmethod
     def get_cache_key(model_name, object_id, position=None):
         """
@@ -182,20 +191,20 @@ class ImageService:
             
         # 刪除相關緩存
         # 首先刪除所有單張圖片的緩存
-        for position in ['first', 'last']:
-            cache_key = ImageService.get_cache_key(model_name, object_id, position)
-            cache.delete(cache_key)
+        positions = ['first', 'last']
             
         # 刪除所有數字位置的緩存（假設最多10張圖片）
-        for i in range(1, 11):
-            cache_key = ImageService.get_cache_key(model_name, object_id, str(i))
-            cache.delete(cache_key)
+        positions.extend(str(i) for i in range(1, 11))
             
         # 刪除特定模型的緩存（例如飼料的正面圖和營養圖）
         if model_name == 'feed':
-            for img_type in ['front', 'nutrition']:
-                cache_key = ImageService.get_cache_key(model_name, object_id, img_type)
-                cache.delete(cache_key)
+            positions.extend(['front', 'nutrition'])
+        
+        # 一次刪除（並通知其他程序清空程序內快取）
+        cache.delete_many([
+            ImageService.get_cache_key(model_name, object_id, position)
+            for position in positions
+        ])
     
     @staticmethod
     def preload_images_for_objects(objects, model_class=None, limit=None, use_cache=True):
@@ -247,10 +256,16 @@ class ImageService:
         uncached_object_ids = []
         
         if use_cache:
+            # 一次取回所有對象第一張圖片的緩存
+            cache_keys = {
+                obj_id: ImageService.get_cache_key(model_name, obj_id, 'first')
+                for obj_id in object_ids
+            }
+            cached_urls = cache.get_many(list(cache_keys.values()))
+            
             for obj_id in object_ids:
                 # 檢查第一張圖片是否在緩存中
-                cache_key = ImageService.get_cache_key(model_name, obj_id, 'first')
-                cached_url = cache.get(cache_key)
+                cached_url = cached_urls.get(cache_keys[obj_id])
                 
                 if cached_url is not None:
                     # 如果使用限制，且限制為1，直接返回緩存的URL
@@ -266,6 +281,8 @@ class ImageService:
         
         # 只查詢未緩存的對象的圖片
         image_map = defaultdict(list)
+        # 待寫入緩存的第一張圖片URL（最後一次寫入）
+        first_urls = {}
         
         if uncached_object_ids:
             # 查詢所有相關圖片
@@ -290,7 +307,7 @@ class ImageService:
                             image_url = image.firebase_url
                             if image_url:
                                 cache_key = ImageService.get_cache_key(model_name, image.object_id, 'first')
-                                cache.set(cache_key, image_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                                first_urls[cache_key] = image_url
                         
                 images = filtered_images
             else:
@@ -309,11 +326,14 @@ class ImageService:
                             image_url = obj_images[0].firebase_url
                             if image_url:
                                 cache_key = ImageService.get_cache_key(model_name, obj_id, 'first')
-                                cache.set(cache_key, image_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                                first_urls[cache_key] = image_url
                 
             # 將圖片按對象ID分組
             for image in images:
                 image_map[image.object_id].append(image)
+            
+            if first_urls:
+                cache.set_many(first_urls, ImageService.DEFAULT_CACHE_TIMEOUT)
                 
         # 合併緩存和查詢結果
         result_map = dict(image_map)
@@ -365,8 +385,9 @@ class ImageService:
             front_key = ImageService.get_cache_key('feed', feed_id, 'front')
             nutrition_key = ImageService.get_cache_key('feed', feed_id, 'nutrition')
             
-            front_url = cache.get(front_key)
-            nutrition_url = cache.get(nutrition_key)
+            cached_urls = cache.get_many([front_key, nutrition_key])
+            front_url = cached_urls.get(front_key)
+            nutrition_url = cached_urls.get(nutrition_key)
             
             if front_url is not None and nutrition_url is not None:
                 # 兩者都在緩存中，直接返回
@@ -393,13 +414,15 @@ class ImageService:
                 front_url = front_image.firebase_url if front_image else None
                 nutrition_url = nutrition_image.firebase_url if nutrition_image else None
                 
+                urls = {}
                 if front_url:
-                    front_key = ImageService.get_cache_key('feed', feed_id, 'front')
-                    cache.set(front_key, front_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                    urls[ImageService.get_cache_key('feed', feed_id, 'front')] = front_url
                     
                 if nutrition_url:
-                    nutrition_key = ImageService.get_cache_key('feed', feed_id, 'nutrition')
-                    cache.set(nutrition_key, nutrition_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                    urls[ImageService.get_cache_key('feed', feed_id, 'nutrition')] = nutrition_url
+                
+                if urls:
+                    cache.set_many(urls, ImageService.DEFAULT_CACHE_TIMEOUT)
                 
         return front_image, nutrition_image
     
@@ -420,8 +443,9 @@ class ImageService:
             front_key = ImageService.get_cache_key('feed', feed_id, 'front')
             nutrition_key = ImageService.get_cache_key('feed', feed_id, 'nutrition')
             
-            front_url = cache.get(front_key)
-            nutrition_url = cache.get(nutrition_key)
+            cached_urls = cache.get_many([front_key, nutrition_key])
+            front_url = cached_urls.get(front_key)
+            nutrition_url = cached_urls.get(nutrition_key)
             
             if front_url is not None and nutrition_url is not None:
                 # 兩者都在緩存中，直接返回
@@ -434,13 +458,15 @@ class ImageService:
         
         # 如果使用緩存，緩存URL
         if use_cache:
+            urls = {}
             if front_image_url:
-                front_key = ImageService.get_cache_key('feed', feed_id, 'front')
-                cache.set(front_key, front_image_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                urls[ImageService.get_cache_key('feed', feed_id, 'front')] = front_image_url
                 
             if nutrition_image_url:
-                nutrition_key = ImageService.get_cache_key('feed', feed_id, 'nutrition')
-                cache.set(nutrition_key, nutrition_image_url, ImageService.DEFAULT_CACHE_TIMEOUT)
+                urls[ImageService.get_cache_key('feed', feed_id, 'nutrition')] = nutrition_image_url
+            
+            if urls:
+                cache.set_many(urls, ImageService.DEFAULT_CACHE_TIMEOUT)
         
         return front_image_url, nutrition_image_url
     
@@ -503,7 +529,8 @@ class ImageService:
         if use_cache:
             # 緩存圖片查詢集（轉換為列表以便緩存）
             cached_images = list(images)
-            cache.set(cache_key, cached_images, ImageService.DEFAULT_CACHE_TIMEOUT)
+            timeout = ImageService.DEFAULT_CACHE_TIMEOUT if cached_images else ImageService.EMPTY_CACHE_TIMEOUT
+            cache.set(cache_key, cached_images, timeout)
             return cached_images
             
         return images
@@ -600,9 +627,16 @@ class ImageService:
         uncached_post_ids = []
         
         if use_cache:
+            # 一次取回所有貼文的緩存
+            position = f'limit_{limit}' if limit else 'all'
+            cache_keys = {
+                post_id: ImageService.get_cache_key('postframe', post_id, position)
+                for post_id in post_frame_ids
+            }
+            cached = cache.get_many(list(cache_keys.values()))
+            
             for post_id in post_frame_ids:
-                cache_key = ImageService.get_cache_key('postframe', post_id, f'limit_{limit}' if limit else 'all')
-                cached_images = cache.get(cache_key)
+                cached_images = cached.get(cache_keys[post_id])
                 
                 if cached_images is not None:
                     cached_image_maps[post_id] = cached_images
@@ -637,16 +671,24 @@ class ImageService:
             for image in images:
                 image_map[image.postFrame_id].append(image)
             
-            # 緩存結果
+            # 緩存結果（一次寫入）；沒有圖片的貼文只短暫緩存空列表，
+            # 圖片在貼文建立後才上傳完成時，很快就能查到新圖片
             if use_cache:
-                for post_id, post_images in image_map.items():
-                    cache_key = ImageService.get_cache_key('postframe', post_id, f'limit_{limit}' if limit else 'all')
-                    cache.set(cache_key, post_images, ImageService.DEFAULT_CACHE_TIMEOUT)
+                found = {cache_keys[post_id]: image_map[post_id]
+                         for post_id in uncached_post_ids if image_map.get(post_id)}
+                empty = {cache_keys[post_id]: []
+                         for post_id in uncached_post_ids if not image_map.get(post_id)}
+                if found:
+                    cache.set_many(found, ImageService.DEFAULT_CACHE_TIMEOUT)
+                if empty:
+                    cache.set_many(empty, ImageService.EMPTY_CACHE_TIMEOUT)
         
         # 合併緩存和查詢結果
         result_map = dict(image_map)
         for post_id, cached_images in cached_image_maps.items():
-            result_map[post_id] = cached_images
+            # 沒有圖片的貼文（緩存的空列表）不放入結果，與查詢結果一致
+            if cached_images:
+                result_map[post_id] = cached_images
             
         return result_map
     
@@ -691,8 +733,8 @@ class ImageService:
         for i in range(1, 11):
             cache_keys.append(ImageService.get_cache_key('postframe', post_frame_id, f'limit_{i}'))
         
-        for cache_key in cache_keys:
-            cache.delete(cache_key)
+        # 一次刪除（並通知其他程序清空程序內快取）
+        cache.delete_many(cache_keys)
     
     @staticmethod
     def save_post_image(image_data, post_frame_id, user_id):
@@ -0,0 +1,196 @@
+"""
+LLM Response Cache
+LLM 回應快取與相同請求合併
+
+以 model、messages 與生成參數（temperature、max_tokens、response_format 等）的雜湊為鍵，
+把回應文字存在 settings.CACHES 的 'llm' 快取（SQLite 檔，各程序共用、重啟後仍在），
+由快取後端處理 TIMEOUT 到期與 MAX_ENTRIES 的淘汰。輸入相同的請求（例如同一隻寵物、
+同一款飼料的營養計算）直接返回快取的回應，不呼叫 LLM。
+
+同時送達的相同請求只會呼叫一次 LLM：
+- 同一程序：後到的請求等待第一個請求的結果（Future）
+- 不同程序：以快取的 add 取得租約，取得租約的程序呼叫 LLM，其他程序輪詢快取等待結果；
+  租約到期（呼叫失敗或程序中止）後自行呼叫
+
+錯誤不會寫入快取。
+
+統計（存於 default 快取，各程序合計）：hits / misses / coalesced / errors
+
+使用方式：
+    content = chat_completion(client, model='gpt-4o', messages=[...], temperature=0.5)
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from django.core.cache import caches
+
+from utils.cache_counters import get_counters, incr_counter
+
+
+# 快取別名（未設定時使用 default）
+LLM_CACHE_ALIAS = 'llm'
+
+# 不影響回應內容、不列入鍵的參數
+KEY_EXCLUDED_PARAMS = {'timeout', 'extra_headers', 'stream'}
+
+# 跨程序租約的存活時間與等待時的輪詢間隔（秒）
+LEASE_SECONDS = 60
+POLL_INTERVAL = 0.2
+
+# 統計計數器在 default 快取中的鍵前綴
+METRICS_PREFIX = 'llm_cache:'
+METRIC_NAMES = ('hits', 'misses', 'coalesced', 'errors')
+
+# 程序內進行中的請求：鍵 -> Future
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _cache():
+    from django.conf import settings
+    return caches[LLM_CACHE_ALIAS if LLM_CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def make_key(params):
+    """
+    以請求參數產生快取鍵
+
+    Args:
+        params (dict): chat.completions.create 的參數
+
+    Returns:
+        str: 快取鍵
+    """
+    payload = {name: value for name, value in params.items() if name not in KEY_EXCLUDED_PARAMS}
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    ).hexdigest()
+    return f'llm:{digest}'
+
+
+def get_cached(key):
+    """
+    取得快取的回應（並記錄命中）
+
+    Returns:
+        str: 回應文字，沒有快取時為 None
+    """
+    content = _cache().get(key)
+    if content is not None:
+        _incr('hits')
+    return content
+
+
+def store(key, content):
+    """寫入回應（串流回應結束後由呼叫端寫入）"""
+    if content:
+        _cache().set(key, content)
+
+
+def record_miss():
+    """記錄一次未命中（由呼叫端自行呼叫 LLM 時使用，例如串流）"""
+    _incr('misses')
+
+
+def chat_completion(client, parse=None, **params):
+    """
+    呼叫 client.chat.completions.create，相同請求直接返回快取並合併同時送達的請求
+
+    Args:
+        client: OpenAI（或介面相同的）客戶端
+        parse (callable): 解析回應文字（例如 json.loads）；解析失敗的回應不寫入快取
+        **params: chat.completions.create 的參數
+
+    Returns:
+        回應文字（choices[0].message.content），有 parse 時為解析結果（每次呼叫各自解析）
+    """
+    content = _chat_completion(client, parse, params)
+    return parse(content) if parse else content
+
+
+def _chat_completion(client, parse, params):
+    key = make_key(params)
+    content = get_cached(key)
+    if content is not None:
+        return content
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+
+    if not owner:
+        # 同一程序已有相同請求在進行，等待它的結果
+        _incr('coalesced')
+        return future.result()
+
+    try:
+        content = _call_with_lease(client, key, params, parse)
+        future.set_result(content)
+        return content
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _call_with_lease(client, key, params, parse):
+    """取得跨程序租約後呼叫 LLM；其他程序正在呼叫時等待其結果"""
+    llm_cache = _cache()
+    lease_key = f'{key}:lease'
+
+    leased = llm_cache.add(lease_key, 1, LEASE_SECONDS)
+    if not leased:
+        deadline = time.monotonic() + LEASE_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            content = llm_cache.get(key)
+            if content is not None:
+                _incr('coalesced')
+                return content
+            if llm_cache.get(lease_key) is None:
+                # 對方呼叫失敗（不寫入快取）或程序中止
+                break
+
+    try:
+        _incr('misses')
+        try:
+            response = client.chat.completions.create(**params)
+        except Exception:
+            _incr('errors')
+            raise
+        content = response.choices[0].message.content
+        if parse:
+            parse(content)
+        store(key, content)
+        return content
+    finally:
+        # 只釋放自己取得的租約（等待逾時後自行呼叫時，租約可能屬於其他程序）
+        if leased:
+            llm_cache.delete(lease_key)
+
+
+def _incr(name):
+    incr_counter(METRICS_PREFIX + name)
+
+
+def get_metrics():
+    """
+    取得各程序合計的統計
+
+    Returns:
+        dict: 計數器與命中率
+    """
+    metrics = get_counters(METRICS_PREFIX, METRIC_NAMES)
+    # 合併的請求同樣沒有呼叫 LLM，計入命中
+    served = metrics['hits'] + metrics['coalesced']
+    total = served + metrics['misses']
+    metrics['hit_rate'] = round(served / total, 4) if total else None
+    return metrics
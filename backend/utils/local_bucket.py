@@ -0,0 +1,101 @@
+"""
+本機 Storage Bucket 模塊
+
+以本機目錄模擬 Firebase Storage bucket，提供 FirebaseStorageService 用到的 blob API
+（upload_from_file / delete / exists / public_url），測試與開發時不需要 Firebase 憑證或網路。
+
+使用方式：
+- settings.FIREBASE_STORAGE_LOCAL_DIR 設定目錄後，全域的 firebase_storage_service 會改用本機 bucket
+- 或直接建立 FirebaseStorageService(bucket=LocalBucket(tmp_dir))
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+
+class LocalBlobNotFound(Exception):
+    """檔案不存在（與 google.api_core.exceptions.NotFound 相同的 code）"""
+    code = 404
+
+
+class LocalBlob:
+    """本機 blob"""
+
+    def __init__(self, bucket: 'LocalBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.acl = None
+
+    @property
+    def local_path(self) -> str:
+        return os.path.join(self.bucket.root, *self.name.split('/'))
+
+    @property
+    def public_url(self) -> str:
+        return f"{self.bucket.base_url}/{self.name}"
+
+    def upload_from_file(self, file_obj, content_type=None, predefined_acl=None, **kwargs):
+        self.bucket.simulate_latency()
+        if content_type:
+            self.content_type = content_type
+        self.acl = predefined_acl
+
+        os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+        # 先寫入暫存檔再替換，讀取端不會看到寫到一半的檔案
+        tmp_path = f"{self.local_path}.{threading.get_ident()}.part"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(file_obj, f)
+        os.replace(tmp_path, self.local_path)
+        self.bucket.record('upload', self.name)
+
+    def exists(self, **kwargs) -> bool:
+        self.bucket.simulate_latency()
+        return os.path.exists(self.local_path)
+
+    def delete(self, **kwargs):
+        self.bucket.simulate_latency()
+        try:
+            os.remove(self.local_path)
+        except FileNotFoundError:
+            raise LocalBlobNotFound(f"No such object: {self.bucket.name}/{self.name}")
+        self.bucket.record('delete', self.name)
+
+    def make_public(self, **kwargs):
+        self.acl = 'publicRead'
+
+
+class LocalBucket:
+    """
+    本機 bucket
+
+    Parameters:
+    - root: 存放檔案的目錄
+    - base_url: 公開 URL 前綴（預設為 file:// 路徑）
+    - latency: 每次操作模擬的網路延遲（秒），用於觀察並行上傳的效果
+    """
+
+    def __init__(self, root: str, base_url: Optional[str] = None, latency: float = 0.0):
+        self.root = os.path.abspath(root)
+        self.name = os.path.basename(self.root) or 'local-bucket'
+        self.base_url = (base_url or f"file://{self.root}").rstrip('/')
+        self.latency = latency
+        self.client = None
+        self.operations = []
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def record(self, operation: str, name: str):
+        """記錄完成的操作（依完成順序），方便測試檢查"""
+        with self._lock:
+            self.operations.append((operation, name))
@@ -7,23 +7,36 @@ os.environ["NUMEXPR_NUM_THREADS"] = "1"
 
 from transformers import AutoTokenizer, AutoModel
 import numpy as np
-import faiss
 import json
 import warnings
+import threading
 import torch
 from transformers import logging
 import math
 from typing import List, Tuple
+from utils.vector_index import VectorIndex
+from utils.vector_store import SegmentedVectorStore
+from utils.embedding_engine import EmbeddingEngine
+from utils.embedding_batcher import EmbeddingBatcher
+from django.conf import settings
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="torch._utils")
 logging.set_verbosity_error()  # This will suppress transformers warnings
 script_dir = os.path.dirname(os.path.abspath(__file__))
+base_dir = os.path.dirname(script_dir)
 
 class RecommendationService:
+    # 常駐貼文索引與儲存（content_type -> VectorIndex / SegmentedVectorStore），所有實例共用同一份
+    _post_indexes = {}
+    _post_stores = {}
+    _post_indexes_lock = threading.Lock()
+    # Store position each resident index has caught up to (content_type -> StorePosition)
+    _post_positions = {}
+    _post_refresh_lock = threading.Lock()
+
     def __init__(self):
         ##---------HyperParameters---------##
-        self.BATCH_SIZE = 4
         self.ACTION_WEIGHTS = {"liked": 1.0, "comment": 1.5, "share": 2.0}
 
         ##---------Device Selection---------##
@@ -37,20 +50,30 @@ class RecommendationService:
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
         self.model = AutoModel.from_pretrained(model_path, local_files_only=True).eval().to(self.device)
 
+        # Shared batched embedding engine (length-bucketed, token budget, inference_mode)
+        self.embedding_engine = EmbeddingEngine(
+            self.tokenizer,
+            self.model,
+            self.device,
+            token_budget=getattr(settings, 'EMBEDDING_TOKEN_BUDGET', EmbeddingEngine.DEFAULT_TOKEN_BUDGET),
+            num_threads=getattr(settings, 'EMBEDDING_NUM_THREADS', None),
+            quantize=getattr(settings, 'EMBEDDING_QUANTIZE', False),
+        )
+        self.model = self.embedding_engine.model
+
+        # Micro-batcher for single-text embeddings (chat queries, signal-driven updates)
+        self.embedding_batcher = EmbeddingBatcher(
+            self.embedding_engine,
+            max_wait_ms=getattr(settings, 'EMBEDDING_BATCH_WAIT_MS', EmbeddingBatcher.DEFAULT_MAX_WAIT_MS),
+            max_batch=getattr(settings, 'EMBEDDING_MAX_BATCH', EmbeddingBatcher.DEFAULT_MAX_BATCH),
+        )
 
         #----------Load embeddings and post IDs----------#
-        # Get the project root directory (where post_embs.npy is located)
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        social_emb_path = os.path.join(base_dir, 'social_post_embs.npy')
-        social_ids_path = os.path.join(base_dir, 'social_post_ids.npy')
-        forum_emb_path = os.path.join(base_dir, 'forum_post_embs.npy')
-        forum_ids_path = os.path.join(base_dir, 'forum_post_ids.npy')
-
-        #print(f"Looking for files in: {base_dir}")
-        #print(f"Embeddings path: {emb_path}")
-        #print(f"IDs path: {ids_path}")
-
-        if not os.path.exists(social_emb_path) or not os.path.exists(social_ids_path):
+        # Post vectors live in append-only stores under <project root>/vector_store/
+        social_store = self.get_post_store("social")
+        forum_store = self.get_post_store("forum")
+
+        if not social_store.exists():
             data_array = []
             from social.models import SoLContent, PostHashtag
             all_posts = SoLContent.objects.all()
@@ -70,7 +93,7 @@ class RecommendationService:
             else:
                 print(f"No data found to initialize for social contents")
 
-        if not os.path.exists(forum_emb_path) or not os.path.exists(forum_ids_path):
+        if not forum_store.exists():
             data_array = []
             from pets.models import DiseaseArchiveContent
             all_posts = DiseaseArchiveContent.objects.all()
@@ -92,13 +115,68 @@ class RecommendationService:
 
         print("推薦服務初始化已完成")
 
+    #----------Post Vector Store----------#
+    def get_post_store(self, content_type: str) -> SegmentedVectorStore:
+        """Return the shared append-only store for a content type, migrating legacy .npy files once."""
+        store = RecommendationService._post_stores.get(content_type)
+        if store is not None:
+            return store
+
+        with RecommendationService._post_indexes_lock:
+            store = RecommendationService._post_stores.get(content_type)
+            if store is None:
+                store = SegmentedVectorStore(os.path.join(base_dir, 'vector_store', f'{content_type}_post'))
+                emb_path = os.path.join(base_dir, f'{content_type}_post_embs.npy')
+                ids_path = os.path.join(base_dir, f'{content_type}_post_ids.npy')
+                if not store.exists() and os.path.exists(emb_path) and os.path.exists(ids_path):
+                    store.write_snapshot(np.load(ids_path), np.load(emb_path))
+                    print(f"Migrated legacy {content_type} post vectors into the vector store")
+                RecommendationService._post_stores[content_type] = store
+        return store
+
+    #----------Resident Post Index----------#
+    def get_post_index(self, content_type: str) -> VectorIndex:
+        """Return the shared in-memory index for a content type, caught up with the store."""
+        index = RecommendationService._post_indexes.get(content_type)
+        if index is not None:
+            self._refresh_post_index(content_type, index)
+            return index
+
+        store = self.get_post_store(content_type)
+        with RecommendationService._post_indexes_lock:
+            index = RecommendationService._post_indexes.get(content_type)
+            if index is None:
+                index = VectorIndex()
+                # Segments are memory-mapped and searched in place, so workers share one page-cache copy
+                self._load_post_index(content_type, index)
+                RecommendationService._post_indexes[content_type] = index
+        return index
+
+    def _load_post_index(self, content_type: str, index: VectorIndex):
+        segments, delta, _, position = self.get_post_store(content_type).load_versioned()
+        index.reset_segments(segments, *delta)
+        RecommendationService._post_positions[content_type] = position
+
+    def _refresh_post_index(self, content_type: str, index: VectorIndex):
+        """
+        Apply writes other processes made to the store since the index was loaded.
+
+        Embedding jobs update only the resident index of the process that runs them, so every
+        other worker replays the new WAL records here (its own writes replay idempotently).
+        A flush, compaction or snapshot replaces the manifest and the WAL, forcing a reload.
+        """
+        store = self.get_post_store(content_type)
+        with RecommendationService._post_refresh_lock:
+            position, changes = store.read_changes(RecommendationService._post_positions.get(content_type))
+            if changes is None:
+                self._load_post_index(content_type, index)
+            elif changes:
+                index.apply_changes(changes)
+                RecommendationService._post_positions[content_type] = position
+
     #----------Mean Pooling----------#
     def __mean_pooling(self, outputs, mask):
-        token_embeddings = outputs.last_hidden_state  # (batch, seq_len, hidden)
-        mask = mask.unsqueeze(-1).float()             # (batch, seq_len, 1)
-        summed = (token_embeddings * mask).sum(1)     # (batch, hidden)
-        counts = mask.sum(1).clamp(min=1e-9)          # (batch, 1)
-        return summed / counts
+        return EmbeddingEngine.mean_pooling(outputs, mask)
 
     #----------Build FAISS Index----------#
     def __initialize(self, data_array, content_type):
@@ -107,34 +185,19 @@ class RecommendationService:
             return
 
         print("Initializing FAISS index...")
-        batch_size = self.BATCH_SIZE
-        all_ids     = []
-        all_embeddings = []
-
-        for i in range(0, len(data_array), batch_size):
-            batch = data_array[i : i + batch_size]
-            texts = [p["content"] for p in batch]
-            ids   = [p["id"]   for p in batch]
-
-            encoded = self.tokenizer(
-                texts,
-                padding=True,
-                truncation=True,
-                return_tensors="pt"
-            ).to(self.device)
-
-            with torch.no_grad():
-                outputs = self.model(**encoded)
-                embs    = self.__mean_pooling(outputs, encoded.attention_mask)
-                embs    = torch.nn.functional.normalize(embs, p=2, dim=1)
-
-            all_ids.extend(ids)
-            all_embeddings.append(embs.cpu().numpy())
-
-        post_ids        = np.array(all_ids)                          # shape: (N_posts,)
-        post_embeddings = np.vstack(all_embeddings)                  # shape: (N_posts, hidden_dim)
-        np.save(f'{content_type}_post_ids.npy', post_ids)
-        np.save(f'{content_type}_post_embs.npy', post_embeddings)
+        post_ids        = np.array([p["id"] for p in data_array])   # shape: (N_posts,)
+        post_embeddings = self.embedding_engine.encode(              # shape: (N_posts, hidden_dim)
+            [p["content"] for p in data_array],
+            bulk=True,
+            progress_label=f"{content_type} posts"
+        )
+        store = self.get_post_store(content_type)
+        store.write_snapshot(post_ids, post_embeddings)
+
+        with RecommendationService._post_indexes_lock:
+            index = RecommendationService._post_indexes.setdefault(content_type, VectorIndex())
+        with RecommendationService._post_refresh_lock:
+            self._load_post_index(content_type, index)
 
     #----------Embedding New Post----------#
     def embed_new_post(self, post_id: int, content: str, content_type: str) -> np.ndarray:
@@ -142,33 +205,12 @@ class RecommendationService:
             print(f"Warning: Unsupported content type '{content_type}'.")
             return
 
-        post_embeddings = np.load(f'{content_type}_post_embs.npy')
-        post_ids = np.load(f'{content_type}_post_ids.npy')
-
-        # Encode the text
-        encoded = self.tokenizer(
-            [content],
-            padding=True,
-            truncation=True,
-            return_tensors="pt"
-        ).to(self.device)
-
-        # Generate embedding
-        with torch.no_grad():
-            outputs = self.model(**encoded)
-            emb = self.__mean_pooling(outputs, encoded.attention_mask)
-            emb = torch.nn.functional.normalize(emb, p=2, dim=1)
-            emb = emb.cpu().numpy()
-
-        # Add new embedding and ID to the arrays
-        post_embeddings = np.vstack([post_embeddings, emb])
-        post_ids = np.append(post_ids, post_id)
+        emb = self.embedding_batcher.embed(content)
 
-        # Save updated arrays
-        np.save(f'{content_type}_post_ids.npy', post_ids)
-        np.save(f'{content_type}_post_embs.npy', post_embeddings)
-
-        print(post_embeddings.shape)
+        # Append to the write-ahead log (O(1) I/O), then update the resident index in place
+        self.get_post_store(content_type).append(post_id, emb)
+        index = self.get_post_index(content_type)
+        index.add([post_id], emb)
 
     #----------Delete Post Data----------#
     def delete_post_data(self, post_id: int, content_type: str):
@@ -176,19 +218,41 @@ class RecommendationService:
             print(f"Warning: Unsupported content type '{content_type}'.")
             return
 
-        post_ids = np.load(f'{content_type}_post_ids.npy')
-        post_embeddings = np.load(f'{content_type}_post_embs.npy')
+        # Always write the tombstone (O(1) I/O, idempotent): the post may have been embedded by
+        # another process, so this process's resident index is not proof that the store lacks it
+        self.get_post_store(content_type).delete(post_id)
+        if not self.get_post_index(content_type).remove([post_id]):
+            print(f"Post ID {post_id} not found in resident index")
 
-        if post_id in post_ids:
-            idx = np.where(post_ids == post_id)[0][0]
-            post_ids = np.delete(post_ids, idx)
-            post_embeddings = np.delete(post_embeddings, idx, axis=0)
-            np.save(f'{content_type}_post_ids.npy', post_ids)
-            np.save(f'{content_type}_post_embs.npy', post_embeddings)
+    #----------Embedding Posts (batch)----------#
+    def embed_posts(self, posts: List[Tuple[int, str]], content_type: str):
+        """Embed and upsert many posts at once: one batched forward pass, one WAL write."""
+        if content_type not in ["social", "forum"]:
+            print(f"Warning: Unsupported content type '{content_type}'.")
+            return
+        if not posts:
+            return
 
-            print(post_embeddings.shape)
-        else:
-            print(f"Post ID {post_id} not found in vector store")
+        post_ids = np.array([post_id for post_id, _ in posts])
+        embs = self.embedding_engine.encode([content for _, content in posts])
+
+        # The store and the index both overwrite existing IDs, so edits need no separate delete
+        self.get_post_store(content_type).append_many(post_ids, embs)
+        self.get_post_index(content_type).add(post_ids, embs)
+
+    #----------Delete Posts (batch)----------#
+    def delete_posts(self, post_ids: List[int], content_type: str):
+        """Remove many posts from the store and the resident index (tombstones are idempotent)."""
+        if content_type not in ["social", "forum"]:
+            print(f"Warning: Unsupported content type '{content_type}'.")
+            return
+        if not post_ids:
+            return
+
+        # The store delete must not depend on this process's index: the posts may have been
+        # embedded by another process. VectorIndex.remove skips IDs it does not hold.
+        self.get_post_store(content_type).delete_many(post_ids)
+        self.get_post_index(content_type).remove(post_ids)
 
     #----------Embedding User History----------#
     def embed_user_history(self,
@@ -201,15 +265,13 @@ class RecommendationService:
             print(f"Warning: Unsupported content type '{content_type}'.")
             return
 
-        post_ids = np.load(f'{content_type}_post_ids.npy')
-        post_embeddings = np.load(f'{content_type}_post_embs.npy')
+        index = self.get_post_index(content_type)
 
         now = max(ts for _, _, ts in posts)
-        emb_map = dict(zip(post_ids, post_embeddings))
 
         vecs, ws = [], []
         for pid, action, ts in posts:
-            emb = emb_map.get(pid)
+            emb = index.get(pid)
             if emb is None: continue
             age_hours = (now - ts) / 3600.0
             w = self.ACTION_WEIGHTS.get(action, 1.0) * math.exp(-decay_lambda_per_hour * age_hours)
@@ -217,7 +279,7 @@ class RecommendationService:
             ws.append(w)
 
         if not vecs:
-            agg = np.mean(post_embeddings, axis=0)
+            agg = index.mean()
         else:
             agg = np.sum(vecs, axis=0) / np.sum(ws)
 
@@ -227,25 +289,18 @@ class RecommendationService:
     def recommend_posts(
         self,
         user_vec: np.ndarray,
-        content_type: str
+        content_type: str,
+        k: int = None
     ) -> List[int]:  # Changed from np.ndarray to List[int]
         
         if content_type not in ["social", "forum"]:
             print(f"Warning: Unsupported content type '{content_type}'.")
             return []
 
-        post_ids = np.load(f'{content_type}_post_ids.npy')
-        post_embeddings = np.load(f'{content_type}_post_embs.npy')
-
-        dimension = post_embeddings.shape[1]  # Should be 768
-        index = faiss.IndexFlatIP(dimension)  # Using inner product for similarity
-        index.add(post_embeddings.astype(np.float32))  # Add vectors to the index
+        index = self.get_post_index(content_type)
 
-        q = user_vec.astype("float32").reshape(1, -1)
-        distances, indices = index.search(q, k=len(post_ids))  # Retrieve all posts
-
-        recommendationList = indices[0].tolist()
-        
+        # k-NN lookup on the resident index (no rebuild, no disk reload)
+        # k=None ranks every post; pass a bounded k to retrieve only a candidate window
+        post_ids, _ = index.search(user_vec, k=len(index) if k is None else k)
 
-        print(post_embeddings.shape)
-        return post_ids[indices[0]].tolist()  # Convert numpy array to Python list
\ No newline at end of file
+        return post_ids  # Already a Python list of ints
@@ -0,0 +1,342 @@
+"""
+Search Index
+以 SQLite FTS5 建立的全文搜尋索引（支援中文）
+
+原本的使用者、貼文、標籤、疾病檔案、飼料搜尋都是 icontains（LIKE '%q%'），
+每次搜尋都會掃描整張資料表。這裡把可搜尋的文字另外存進獨立的 FTS5 索引檔：
+
+- 斷詞：文字正規化（NFKC、小寫）後依非文字字元切成片段，每個片段產生
+  重疊的二字詞（bigram），片段最後一個字另外當作單字詞。
+  例如「寵物醫院」→「寵物 物醫 醫院 院」
+- 查詢：每個查詢片段轉成 bigram 的連續片語（phrase），等同於子字串比對；
+  單一字元的片段以前綴查詢比對。多個片段以 AND 結合
+- 排序：FTS5 內建的 bm25()，分數越高越相關
+- 更新：各 app 的 signals 在交易提交後寫入 / 刪除單筆文件
+- 索引檔不存在或某類索引尚未建立時，第一次查詢會從資料庫完整建立一次
+  （也可以用 python manage.py rebuild_search_index 手動重建）
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+
+
+# 各類索引的定義
+#   model: 來源模型
+#   fields: 全文欄位（模型屬性）與 bm25 權重
+#   attrs: 不參與全文比對、用於篩選或回傳的欄位（索引欄位名稱 -> 模型屬性）
+SEARCH_INDEXES = {
+    'users': {
+        'model': 'accounts.CustomUser',
+        'fields': {'username': 1.0, 'user_account': 1.0, 'user_fullname': 1.0},
+        'attrs': {},
+    },
+    'posts': {
+        'model': 'social.SoLContent',
+        'fields': {'content_text': 1.0},
+        'attrs': {'post_id': 'postFrame_id'},
+    },
+    'hashtags': {
+        'model': 'social.PostHashtag',
+        'fields': {'tag': 1.0},
+        'attrs': {'tag_text': 'tag', 'post_id': 'postFrame_id'},
+    },
+    'archives': {
+        'model': 'pets.DiseaseArchiveContent',
+        # 標題命中的權重較高（原本標題匹配的結果排在內容匹配之前）
+        'fields': {'archive_title': 10.0, 'content': 1.0},
+        'attrs': {'is_private': 'is_private'},
+    },
+    'feeds': {
+        'model': 'feeds.Feed',
+        'fields': {'name': 1.0, 'brand': 1.0},
+        'attrs': {'pet_type': 'pet_type'},
+    },
+}
+
+# 重建索引時每批寫入的筆數
+BUILD_CHUNK_SIZE = 2000
+
+_RUN_RE = re.compile(r'[^\W_]+')
+
+
+def _runs(text):
+    """正規化後切成連續的文字片段"""
+    if not text:
+        return []
+    return _RUN_RE.findall(unicodedata.normalize('NFKC', str(text)).lower())
+
+
+def tokenize(text):
+    """
+    把文字轉成 bigram 詞序列
+
+    Args:
+        text (str): 原始文字
+
+    Returns:
+        str: 以空白分隔的詞（存入 FTS5 欄位）
+    """
+    tokens = []
+    for run in _runs(text):
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return ' '.join(tokens)
+
+
+def build_match_query(query):
+    """
+    把使用者輸入轉成 FTS5 MATCH 查詢（子字串語意）
+
+    Returns:
+        str | None: MATCH 查詢，沒有可搜尋的文字時返回 None
+    """
+    clauses = []
+    for run in _runs(query):
+        if len(run) == 1:
+            clauses.append(f'"{run}"*')
+        else:
+            clauses.append('"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+    return ' AND '.join(clauses) or None
+
+
+class SearchIndex:
+    """FTS5 搜尋索引（每個執行緒各自持有連線）"""
+
+    def __init__(self, path):
+        """
+        初始化搜尋索引
+
+        Args:
+            path (str): 索引檔路徑（不存在時自動建立）
+        """
+        self.path = str(path)
+        self._local = threading.local()
+        self._build_lock = threading.Lock()
+        self._built = set()
+        self._ensure_schema()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """寫入交易（BEGIN IMMEDIATE，避免多個程序同時寫入時死鎖）"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _ensure_schema(self):
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS search_meta (name TEXT PRIMARY KEY, built_at REAL)')
+        for name, spec in SEARCH_INDEXES.items():
+            columns = list(spec['fields']) + [f'{attr} UNINDEXED' for attr in spec['attrs']]
+            conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+                f"{', '.join(columns)}, tokenize='unicode61 remove_diacritics 0', prefix='1')"
+            )
+
+    @staticmethod
+    def _document(spec, instance):
+        fields = [tokenize(getattr(instance, attr, '')) for attr in spec['fields']]
+        attrs = [getattr(instance, attr, None) for attr in spec['attrs'].values()]
+        return fields + attrs
+
+    @staticmethod
+    def _insert_sql(name, spec):
+        columns = ['rowid'] + list(spec['fields']) + list(spec['attrs'])
+        return f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def upsert(self, name, instance):
+        """
+        新增或更新一筆文件
+
+        Args:
+            name (str): 索引名稱（SEARCH_INDEXES 的 key）
+            instance: 模型實例
+        """
+        spec = SEARCH_INDEXES[name]
+        with self._write() as conn:
+            conn.execute(f'DELETE FROM {name} WHERE rowid = ?', (instance.pk,))
+            conn.execute(self._insert_sql(name, spec), [instance.pk] + self._document(spec, instance))
+
+    def delete(self, name, pk):
+        """刪除一筆文件"""
+        with self._write() as conn:
+            conn.execute(f'DELETE FROM {name} WHERE rowid = ?', (pk,))
+
+    def rebuild(self, name):
+        """
+        從資料庫完整重建一類索引
+
+        Returns:
+            int: 寫入的文件數
+        """
+        from django.apps import apps
+
+        spec = SEARCH_INDEXES[name]
+        model = apps.get_model(spec['model'])
+        insert_sql = self._insert_sql(name, spec)
+        count = 0
+        with self._write() as conn:
+            conn.execute(f'DELETE FROM {name}')
+            batch = []
+            for instance in model.objects.all().iterator(chunk_size=BUILD_CHUNK_SIZE):
+                batch.append([instance.pk] + self._document(spec, instance))
+                if len(batch) >= BUILD_CHUNK_SIZE:
+                    conn.executemany(insert_sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(insert_sql, batch)
+                count += len(batch)
+            conn.execute(
+                'INSERT OR REPLACE INTO search_meta (name, built_at) VALUES (?, ?)', (name, time.time())
+            )
+        self._built.add(name)
+        return count
+
+    def ensure_built(self, name):
+        """尚未建立的索引在第一次使用時從資料庫建立"""
+        if name in self._built:
+            return
+        with self._build_lock:
+            if name in self._built:
+                return
+            row = self._connection().execute(
+                'SELECT built_at FROM search_meta WHERE name = ?', (name,)
+            ).fetchone()
+            if row is None:
+                print(f"🔨 建立搜尋索引: {name}")
+                count = self.rebuild(name)
+                print(f"✅ 搜尋索引 {name} 建立完成，共 {count} 筆")
+            self._built.add(name)
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    def search(self, name, query, limit=50, filters=None):
+        """
+        全文搜尋
+
+        Args:
+            name (str): 索引名稱
+            query (str): 使用者輸入的關鍵字
+            limit (int): 最多返回筆數
+            filters (dict): 篩選條件（attrs 欄位 -> 值）
+
+        Returns:
+            list: [(主鍵, 相關分數, {attrs}), ...]，依相關分數由高到低排序
+        """
+        match = build_match_query(query)
+        if match is None:
+            return []
+        self.ensure_built(name)
+
+        spec = SEARCH_INDEXES[name]
+        attrs = list(spec['attrs'])
+        weights = ', '.join(str(weight) for weight in spec['fields'].values())
+        where = [f'{name} MATCH ?']
+        params = [match]
+        for attr, value in (filters or {}).items():
+            where.append(f'{attr} = ?')
+            params.append(value)
+        params.append(limit)
+
+        select = ', '.join(['rowid', f'bm25({name}, {weights})'] + attrs)
+        rows = self._connection().execute(
+            f"SELECT {select} FROM {name} WHERE {' AND '.join(where)} "
+            f"ORDER BY bm25({name}, {weights}) LIMIT ?",
+            params
+        ).fetchall()
+        return [(row[0], -row[1], dict(zip(attrs, row[2:]))) for row in rows]
+
+    def count(self, name, query, filters=None):
+        """符合查詢的文件總數"""
+        match = build_match_query(query)
+        if match is None:
+            return 0
+        self.ensure_built(name)
+
+        where = [f'{name} MATCH ?']
+        params = [match]
+        for attr, value in (filters or {}).items():
+            where.append(f'{attr} = ?')
+            params.append(value)
+        return self._connection().execute(
+            f"SELECT COUNT(*) FROM {name} WHERE {' AND '.join(where)}", params
+        ).fetchone()[0]
+
+    def search_ids(self, name, query, limit=50, filters=None):
+        """
+        全文搜尋，只返回主鍵與分數
+
+        Returns:
+            list: [(主鍵, 相關分數), ...]
+        """
+        return [(pk, score) for pk, score, _ in self.search(name, query, limit, filters)]
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """取得程序內共用的搜尋索引"""
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                path = getattr(settings, 'SEARCH_INDEX_PATH', None)
+                if not path:
+                    path = os.path.join(settings.BASE_DIR, 'search_index.sqlite3')
+                _search_index = SearchIndex(path)
+    return _search_index
+
+
+def index_on_commit(name, instance):
+    """交易提交後把實例寫入搜尋索引（signals 使用）"""
+    def apply():
+        try:
+            get_search_index().upsert(name, instance)
+        except Exception as e:
+            print(f"⚠️ 更新搜尋索引失敗（{name} {instance.pk}）: {str(e)}")
+    transaction.on_commit(apply)
+
+
+def remove_on_commit(name, pk):
+    """交易提交後從搜尋索引移除（signals 使用）"""
+    def apply():
+        try:
+            get_search_index().delete(name, pk)
+        except Exception as e:
+            print(f"⚠️ 移除搜尋索引失敗（{name} {pk}）: {str(e)}")
+    transaction.on_commit(apply)
+
+
+def order_by_ids(queryset, ids):
+    """依給定的主鍵順序排列查詢結果（不存在的主鍵略過）"""
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,232 @@
+"""
+SQLite Cache
+以本機 SQLite 檔案實作的 Django 快取後端（多個 worker 程序共用）
+
+原本沒有設定 CACHES，每個 worker 各自使用 LocMemCache：
+快取命中率隨 worker 數下降，invalidate 也只清得掉目前程序內的項目。
+這裡把快取存進一個 SQLite 檔案（WAL 模式，讀取不阻塞寫入），不需要 Redis / Memcached 等外部服務：
+
+- get_many / set_many / delete_many 各只執行一次 SQL（一次往返）
+- 值以 pickle 儲存；expires 為到期時間（NULL 表示永不過期）
+- 項目數超過 MAX_ENTRIES 時，依 CULL_FREQUENCY 淘汰最早到期的項目（每 CULL_EVERY_WRITES 次寫入檢查一次）
+
+設定方式（settings.CACHES）：
+    'default': {
+        'BACKEND': 'utils.sqlite_cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+    }
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# 每個連線寫入幾次後檢查一次項目數（避免每次寫入都 COUNT）
+CULL_EVERY_WRITES = 100
+
+# SQLite 單一查詢的參數數量上限（舊版 SQLite 為 999）
+MAX_QUERY_PARAMS = 900
+
+
+def _chunks(items, size=MAX_QUERY_PARAMS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """SQLite 快取後端（每個執行緒各自持有連線）"""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = os.path.abspath(str(location))
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # fork 出的子程序不能沿用父程序的連線
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.writes = 0
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """寫入交易（BEGIN IMMEDIATE，避免多個程序同時寫入時死鎖）"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY_WRITES == 0:
+            self._cull()
+
+    def _expires(self, timeout):
+        """轉換成到期時間（None 表示永不過期；timeout=0 表示立即過期）"""
+        return self.get_backend_timeout(timeout)
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _select(self, keys):
+        """一次查詢多個鍵，返回 {key: value}（不含已過期的項目）"""
+        found = {}
+        now = time.time()
+        conn = self._connection()
+        for chunk in _chunks(keys):
+            rows = conn.execute(
+                f"SELECT key, value FROM cache_entries WHERE key IN ({', '.join('?' * len(chunk))}) "
+                "AND (expires IS NULL OR expires > ?)",
+                [*chunk, now]
+            )
+            for key, value in rows:
+                found[key] = pickle.loads(value)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._select([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        found = self._select(list(key_map))
+        return {key_map[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def _upsert(self, conn, rows):
+        conn.executemany(
+            'INSERT INTO cache_entries (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires',
+            rows
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = pickle.dumps(value, self.pickle_protocol)
+        with self._write() as conn:
+            self._upsert(conn, [(key, value, self._expires(timeout))])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, self.pickle_protocol), expires)
+            for key, value in data.items()
+        ]
+        if rows:
+            with self._write() as conn:
+                self._upsert(conn, rows)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = pickle.dumps(value, self.pickle_protocol)
+        with self._write() as conn:
+            # 只覆蓋已過期的項目
+            cursor = conn.execute(
+                'INSERT INTO cache_entries (key, value, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+                'WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+                (key, value, self._expires(timeout), time.time())
+            )
+            return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            cursor = conn.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), key, time.time())
+            )
+            return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # 讀取與寫入在同一個寫入交易內，多個程序同時遞增不會遺失
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            conn.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (pickle.dumps(new_value, self.pickle_protocol), key)
+            )
+        return new_value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            return conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if not keys:
+            return
+        with self._write() as conn:
+            for chunk in _chunks(keys):
+                conn.execute(f"DELETE FROM cache_entries WHERE key IN ({', '.join('?' * len(chunk))})", chunk)
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache_entries')
+
+    def _cull(self):
+        """清除過期項目；項目數仍超過 MAX_ENTRIES 時，淘汰 1/CULL_FREQUENCY 最早到期的項目"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+            count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+            if count > self._max_entries:
+                if self._cull_frequency == 0:
+                    conn.execute('DELETE FROM cache_entries')
+                else:
+                    conn.execute(
+                        'DELETE FROM cache_entries WHERE key IN ('
+                        'SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                        (count // self._cull_frequency,)
+                    )
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def close(self, **kwargs):
+        # 連線在執行緒內重複使用（與 LocMemCache 相同，請求結束時不關閉）
+        pass
@@ -0,0 +1,408 @@
+"""
+Suggestion Index
+搜尋建議（typeahead）的記憶體前綴索引
+
+搜尋建議每打一個字就會呼叫一次，原本每次都對用戶與標籤做 icontains 查詢。
+這裡把建議詞條放在記憶體中的排序陣列：
+- 詞條：用戶帳號、用戶名稱、全名（及全名中以空白分隔的各段）、標籤文字，
+  正規化（NFKC、小寫）後排序，前綴查詢以 bisect 找出範圍
+- 權重：用戶以已確認的追蹤者數、標籤以使用次數排序
+- 程序啟動時載入快照檔（多個 worker 共用），快照過期或不存在時從資料庫建立並寫回快照
+- 用戶 / 頭像 / 追蹤 / 標籤變更時由 signals 在交易提交後更新單一項目；
+  其他 worker 在快照過期（SUGGESTION_INDEX_REFRESH_SECONDS）後重新載入
+
+注意：建議改為前綴比對，不再是原本的子字串比對
+（例如「小明」可以找到全名「小明」或「王 小明」，但找不到「王小明」）。
+"""
+
+import bisect
+import heapq
+import os
+import pickle
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+
+
+# 快照格式版本（資料結構變更時遞增，舊快照會被忽略）
+SNAPSHOT_VERSION = 1
+
+# 預設快照過期時間（秒）
+DEFAULT_REFRESH_SECONDS = 600
+
+# 大範圍前綴（例如兩個字的查詢）結果的記憶數量，任何變更時清空
+RESULT_CACHE_SIZE = 1024
+
+
+def normalize(text):
+    """正規化建議詞條與查詢（NFKC、小寫、去除前後空白）"""
+    if not text:
+        return ''
+    return unicodedata.normalize('NFKC', str(text)).lower().strip()
+
+
+def _user_terms(user):
+    terms = {normalize(user.user_account), normalize(user.username), normalize(user.user_fullname)}
+    terms.update(normalize(part) for part in (user.user_fullname or '').split())
+    terms.discard('')
+    return terms
+
+
+def _headshot_url(user):
+    try:
+        if hasattr(user, 'headshot') and user.headshot:
+            return user.headshot.firebase_url or ''
+    except Exception:
+        pass
+    return ''
+
+
+class SuggestionIndex:
+    """前綴建議索引（排序陣列 + bisect）"""
+
+    def __init__(self):
+        # 排序的 (詞條, 項目鍵)；項目鍵為 ('user', id) 或 ('hashtag', 正規化標籤)
+        self._terms = []
+        # 項目鍵 -> {'weight': 權重, 'terms': 詞條集合, 'value': 回傳資料}
+        self._entries = {}
+        self._results = OrderedDict()
+        self._lock = threading.RLock()
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def _remove_entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for term in entry['terms']:
+            position = bisect.bisect_left(self._terms, (term, key))
+            if position < len(self._terms) and self._terms[position] == (term, key):
+                del self._terms[position]
+
+    def _put_entry(self, key, terms, weight, value):
+        self._remove_entry(key)
+        if not terms:
+            return
+        self._entries[key] = {'weight': weight, 'terms': terms, 'value': value}
+        for term in terms:
+            bisect.insort(self._terms, (term, key))
+
+    def put_user(self, user, followers):
+        """
+        新增或更新用戶
+
+        Args:
+            user: CustomUser（頭像需已載入或可延遲載入）
+            followers (int): 已確認的追蹤者數
+        """
+        value = {
+            'username': user.username,
+            'user_account': user.user_account,
+            'headshot_url': _headshot_url(user),
+        }
+        with self._lock:
+            self._put_entry(('user', user.id), _user_terms(user), followers, value)
+            self._results.clear()
+
+    def set_user_weight(self, user_id, followers):
+        """更新用戶的追蹤者數"""
+        with self._lock:
+            entry = self._entries.get(('user', user_id))
+            if entry is not None:
+                entry['weight'] = followers
+                self._results.clear()
+
+    def set_user_headshot(self, user_id, headshot_url):
+        """更新用戶頭像"""
+        with self._lock:
+            entry = self._entries.get(('user', user_id))
+            if entry is not None:
+                entry['value'] = dict(entry['value'], headshot_url=headshot_url or '')
+
+    def remove_user(self, user_id):
+        """移除用戶"""
+        with self._lock:
+            self._remove_entry(('user', user_id))
+            self._results.clear()
+
+    def set_hashtag(self, tag, count):
+        """
+        設定標籤的使用次數（0 表示移除）
+
+        Args:
+            tag (str): 標籤文字
+            count (int): 使用次數
+        """
+        term = normalize(tag)
+        if not term:
+            return
+        key = ('hashtag', term)
+        with self._lock:
+            if count <= 0:
+                self._remove_entry(key)
+            else:
+                entry = self._entries.get(key)
+                value = entry['value'] if entry else tag.strip()
+                self._put_entry(key, {term}, count, value)
+            self._results.clear()
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    def suggest(self, kind, prefix, limit=5):
+        """
+        取得前綴相符、權重最高的建議
+
+        Args:
+            kind (str): 'user' 或 'hashtag'
+            prefix (str): 使用者輸入
+            limit (int): 最多返回筆數
+
+        Returns:
+            list: 回傳資料列表（用戶為 dict，標籤為文字），依權重由高到低排序
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        cache_key = (kind, prefix, limit)
+        with self._lock:
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                self._results.move_to_end(cache_key)
+                return cached
+
+            start = bisect.bisect_left(self._terms, (prefix,))
+            end = bisect.bisect_left(self._terms, (prefix + '\U0010ffff',), lo=start)
+            keys = {key for _, key in self._terms[start:end] if key[0] == kind}
+            best = heapq.nsmallest(
+                limit, keys, key=lambda key: (-self._entries[key]['weight'], str(key[1]))
+            )
+            result = [self._entries[key]['value'] for key in best]
+
+            self._results[cache_key] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return result
+
+    # ------------------------------------------------------------------
+    # 建立與快照
+    # ------------------------------------------------------------------
+
+    def build(self):
+        """從資料庫完整建立（用戶含追蹤者數、標籤使用次數各一次查詢）"""
+        from django.db.models import Count, Q
+        from accounts.models import CustomUser
+        from social.models import PostHashtag
+
+        users = CustomUser.objects.select_related('headshot').annotate(
+            followers_count=Count('followers', filter=Q(followers__confirm_or_not=True))
+        )
+        hashtags = {}
+        for tag, count in PostHashtag.objects.values_list('tag').annotate(count=Count('id')):
+            term = normalize(tag)
+            if not term:
+                continue
+            # 大小寫不同的標籤合併計數，顯示最常用的寫法
+            total, display, display_count = hashtags.get(term, (0, tag.strip(), 0))
+            if count > display_count:
+                display, display_count = tag.strip(), count
+            hashtags[term] = (total + count, display, display_count)
+
+        terms = []
+        entries = {}
+        for user in users.iterator(chunk_size=2000):
+            key = ('user', user.id)
+            user_terms = _user_terms(user)
+            entries[key] = {
+                'weight': user.followers_count,
+                'terms': user_terms,
+                'value': {
+                    'username': user.username,
+                    'user_account': user.user_account,
+                    'headshot_url': _headshot_url(user),
+                },
+            }
+            terms.extend((term, key) for term in user_terms)
+        for term, (total, display, _) in hashtags.items():
+            key = ('hashtag', term)
+            entries[key] = {'weight': total, 'terms': {term}, 'value': display}
+            terms.append((term, key))
+        terms.sort()
+
+        with self._lock:
+            self._terms = terms
+            self._entries = entries
+            self._results.clear()
+            self.built_at = time.time()
+
+    def save_snapshot(self, path):
+        """以原子方式寫入快照檔（先寫暫存檔再改名）"""
+        with self._lock:
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'built_at': self.built_at,
+                'terms': self._terms,
+                'entries': self._entries,
+            }
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.suggestion_index.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def load_snapshot(self, path):
+        """
+        載入快照檔
+
+        Returns:
+            bool: 是否成功載入（檔案不存在或版本不符時返回 False）
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            return False
+        with self._lock:
+            self._terms = data['terms']
+            self._entries = data['entries']
+            self._results.clear()
+            self.built_at = data['built_at']
+        return True
+
+
+_suggestion_index = None
+_suggestion_index_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def _snapshot_path():
+    path = getattr(settings, 'SUGGESTION_INDEX_SNAPSHOT_PATH', None)
+    if not path:
+        path = os.path.join(settings.BASE_DIR, 'suggestion_index.pickle')
+    return str(path)
+
+
+def _refresh_seconds():
+    return getattr(settings, 'SUGGESTION_INDEX_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)
+
+
+def _refresh(index):
+    """重新載入較新的快照，快照也過期時從資料庫重建並寫回快照"""
+    path = _snapshot_path()
+    try:
+        snapshot_time = os.path.getmtime(path)
+    except OSError:
+        snapshot_time = 0.0
+
+    if time.time() - snapshot_time < _refresh_seconds() and snapshot_time > index.built_at:
+        if index.load_snapshot(path):
+            return
+
+    started = time.time()
+    index.build()
+    print(f"✅ 搜尋建議索引建立完成，共 {len(index)} 筆（{time.time() - started:.2f}s）")
+    try:
+        index.save_snapshot(path)
+    except Exception as e:
+        print(f"⚠️ 寫入搜尋建議快照失敗: {str(e)}")
+
+
+def get_suggestion_index():
+    """
+    取得程序內共用的建議索引（第一次使用時載入快照或建立，過期時重新整理）
+
+    Returns:
+        SuggestionIndex: 建議索引
+    """
+    global _suggestion_index
+    if _suggestion_index is None:
+        with _suggestion_index_lock:
+            if _suggestion_index is None:
+                index = SuggestionIndex()
+                _refresh(index)
+                _suggestion_index = index
+
+    index = _suggestion_index
+    if time.time() - index.built_at >= _refresh_seconds():
+        # 只由一個執行緒重新整理，其他請求繼續使用目前的索引
+        if _refresh_lock.acquire(blocking=False):
+            try:
+                _refresh(index)
+            except Exception as e:
+                print(f"⚠️ 重新整理搜尋建議索引失敗: {str(e)}")
+            finally:
+                _refresh_lock.release()
+    return index
+
+
+def _apply_on_commit(description, func):
+    """交易提交後更新已載入的建議索引（尚未載入時不需要更新，載入時會讀取最新資料）"""
+    def apply():
+        if _suggestion_index is None:
+            return
+        try:
+            func(_suggestion_index)
+        except Exception as e:
+            print(f"⚠️ 更新搜尋建議索引失敗（{description}）: {str(e)}")
+    transaction.on_commit(apply)
+
+
+def update_user_on_commit(user_id):
+    """用戶新增或更新後重新讀取該用戶（signals 使用）"""
+    def apply(index):
+        from django.db.models import Count, Q
+        from accounts.models import CustomUser
+
+        user = CustomUser.objects.select_related('headshot').annotate(
+            followers_count=Count('followers', filter=Q(followers__confirm_or_not=True))
+        ).filter(id=user_id).first()
+        if user is None:
+            index.remove_user(user_id)
+        else:
+            index.put_user(user, user.followers_count)
+    _apply_on_commit(f'user {user_id}', apply)
+
+
+def update_followers_on_commit(user_id):
+    """追蹤關係變更後重新計算追蹤者數（signals 使用）"""
+    def apply(index):
+        from accounts.models import UserFollow
+        index.set_user_weight(user_id, UserFollow.objects.filter(follows_id=user_id, confirm_or_not=True).count())
+    _apply_on_commit(f'followers {user_id}', apply)
+
+
+def update_headshot_on_commit(user_id, headshot_url):
+    """用戶頭像變更後更新（signals 使用）"""
+    _apply_on_commit(f'headshot {user_id}', lambda index: index.set_user_headshot(user_id, headshot_url))
+
+
+def remove_user_on_commit(user_id):
+    """用戶刪除後移除（signals 使用）"""
+    _apply_on_commit(f'user {user_id}', lambda index: index.remove_user(user_id))
+
+
+def update_hashtag_on_commit(tag):
+    """標籤新增或刪除後重新計算使用次數（signals 使用）"""
+    def apply(index):
+        from social.models import PostHashtag
+        index.set_hashtag(tag, PostHashtag.objects.filter(tag__iexact=tag.strip()).count())
+    _apply_on_commit(f'hashtag {tag}', apply)
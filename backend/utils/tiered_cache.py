@@ -0,0 +1,252 @@
+"""
+Tiered Cache
+兩層快取：程序內 LRU + 各程序共用的快取後端
+
+讀取先查程序內的 LRU（不需要任何往返），沒有命中的鍵再以一次 get_many 向共用快取
+（settings.CACHES 中 SHARED 指定的別名，預設 default）查詢，查到的值寫回 LRU。
+
+跨程序失效以「版本鍵」處理：
+- delete / delete_many / clear 除了刪除共用快取與本程序 LRU 的項目，還會遞增共用快取中的版本鍵
+- 每個程序記錄 LRU 內容所對應的版本；向共用快取查詢時版本鍵跟著同一次 get_many 取回，
+  全部命中 LRU 時則最多每 SYNC_INTERVAL 秒檢查一次版本鍵
+- 版本與上次不同（其他程序做了失效）時清空本程序的 LRU
+因此其他程序最多在 SYNC_INTERVAL 秒後看到失效；本程序內立即生效。
+
+set 視為填入快取（不遞增版本）：值有變更時應先 delete 再 set，或直接 delete 讓下次讀取重新載入。
+LRU 項目另有 LOCAL_TIMEOUT 的存活上限，未經 delete 的覆寫最多在這段時間後被其他程序看到。
+
+設定方式（settings.CACHES）：
+    'images': {
+        'BACKEND': 'utils.tiered_cache.TieredCache',
+        'LOCATION': 'images',
+        'OPTIONS': {'SHARED': 'default', 'LOCAL_MAX_ENTRIES': 2048, 'SYNC_INTERVAL': 1.0},
+    }
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# 程序內 LRU 的預設項目數上限
+DEFAULT_LOCAL_MAX_ENTRIES = 1024
+
+# 全部命中 LRU 時檢查版本鍵的間隔（秒）
+DEFAULT_SYNC_INTERVAL = 1.0
+
+# LRU 項目的存活上限（秒）
+DEFAULT_LOCAL_TIMEOUT = 60
+
+# 同一程序內各執行緒共用的 LRU（django.core.cache.caches 是每個執行緒各自建立後端實例）
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class _LocalTier:
+    """程序內的 LRU（值以 pickle 儲存，呼叫端修改取回的物件不會影響快取）"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (pickled, expires)
+        self.lock = threading.Lock()
+        self.version = None
+        self.synced_at = None
+
+    def get_many(self, keys):
+        """返回 ({key: value}, [未命中的 key])"""
+        hits, misses = {}, []
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or entry[1] <= now:
+                    misses.append(key)
+                    continue
+                self.entries.move_to_end(key)
+                hits[key] = entry[0]
+        return {key: pickle.loads(value) for key, value in hits.items()}, misses
+
+    def set_many(self, data, expires):
+        with self.lock:
+            for key, value in data.items():
+                self.entries[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def sync_due(self, interval):
+        return self.synced_at is None or time.monotonic() - self.synced_at >= interval
+
+    def observe_version(self, version):
+        """
+        記錄共用快取中的版本
+
+        Returns:
+            bool: 版本是否改變（改變時已清空 LRU）
+        """
+        with self.lock:
+            changed = self.synced_at is not None and version != self.version
+            if changed:
+                self.entries.clear()
+            self.version = version
+            self.synced_at = time.monotonic()
+        return changed
+
+    def observe_own_bump(self, version):
+        """本程序遞增版本後呼叫：只有其他程序也同時做了失效時才需要清空"""
+        with self.lock:
+            if self.version is None or version != self.version + 1:
+                self.entries.clear()
+            self.version = version
+            self.synced_at = time.monotonic()
+
+
+class TieredCache(BaseCache):
+    """程序內 LRU + 共用快取的兩層快取後端"""
+
+    def __init__(self, location, params):
+        # 以 LOCATION 作為預設鍵前綴，多個兩層快取共用同一個後端時不會互相覆蓋
+        params = {**params, 'KEY_PREFIX': params.get('KEY_PREFIX') or location}
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'default')
+        self._sync_interval = options.get('SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT)
+        self._version_key = f'tiered_cache:{location}:version'
+        with _tiers_lock:
+            if location not in _tiers:
+                _tiers[location] = _LocalTier(options.get('LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES))
+            self._tier = _tiers[location]
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_expires(self, timeout):
+        """LRU 項目的到期時間（不超過 LOCAL_TIMEOUT）"""
+        local_expires = time.time() + self._local_timeout
+        expires = self.get_backend_timeout(timeout)
+        return local_expires if expires is None else min(expires, local_expires)
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _get_many(self, keys):
+        """以已轉換的鍵查詢，返回 {key: value}"""
+        found, misses = self._tier.get_many(keys)
+        if not misses and not self._tier.sync_due(self._sync_interval):
+            return found
+
+        # 沒有命中的鍵與版本鍵一起查詢（一次往返）
+        fetched = self.shared.get_many(misses + [self._version_key])
+        if self._tier.observe_version(fetched.pop(self._version_key, None)) and found:
+            # 其他程序做了失效，剛才從 LRU 取得的值不可信，重新查詢
+            fetched.update(self.shared.get_many(list(found)))
+            found = {}
+        if fetched:
+            self._tier.set_many(fetched, self._local_expires(self._timeout(DEFAULT_TIMEOUT)))
+        found.update(fetched)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        return {key_map[key]: value for key, value in self._get_many(list(key_map)).items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return key in self._get_many([key])
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+        if not data:
+            return []
+        timeout = self._timeout(timeout)
+        failed = self.shared.set_many(data, timeout)
+        self._tier.set_many({key: value for key, value in data.items() if key not in failed}, self._local_expires(timeout))
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout)
+        if added:
+            self._tier.set_many({key: value}, self._local_expires(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.shared.touch(key, self._timeout(timeout))
+
+    def incr(self, key, delta=1, version=None):
+        # 計數器只存在共用快取（LRU 中的值會過時）
+        key = self.make_and_validate_key(key, version=version)
+        self._tier.delete_many([key])
+        return self.shared.incr(key, delta)
+
+    # ------------------------------------------------------------------
+    # 失效
+    # ------------------------------------------------------------------
+
+    def _bump_version(self):
+        """遞增共用快取中的版本鍵，通知其他程序清空 LRU"""
+        shared = self.shared
+        try:
+            version = shared.incr(self._version_key)
+        except ValueError:
+            # 版本鍵不存在（第一次失效或已被淘汰）；以時間作為初始值，不會撞到其他程序記錄的舊版本
+            shared.add(self._version_key, time.time_ns(), None)
+            version = shared.get(self._version_key)
+        self._tier.observe_own_bump(version)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._tier.delete_many([key])
+        deleted = self.shared.delete(key)
+        self._bump_version()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if not keys:
+            return
+        self._tier.delete_many(keys)
+        self.shared.delete_many(keys)
+        self._bump_version()
+
+    def clear(self):
+        # 與 Django 其他後端相同，清空整個共用後端（包含同一後端中其他快取的項目）
+        self._tier.clear()
+        self.shared.clear()
+        self._bump_version()
+
+    def close(self, **kwargs):
+        pass
@@ -0,0 +1,68 @@
+"""
+TTL Cache
+執行緒安全的 LRU + TTL 記憶體快取
+
+用於 AI 助手的查詢向量與向量搜尋結果：
+超過容量時淘汰最久未使用的項目，超過存活時間的項目視為不存在。
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU + TTL 快取（程序內、執行緒安全）"""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        初始化快取
+
+        Args:
+            maxsize (int): 最多保留的項目數
+            ttl (float): 存活秒數（None 表示不過期，只依 LRU 淘汰）
+        """
+        self.maxsize = max(int(maxsize), 1)
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (到期時間, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        取得快取值（命中時移到最新）
+
+        Returns:
+            快取的值，不存在或已過期時返回 default
+        """
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """寫入快取，超過容量時淘汰最久未使用的項目"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """清空快取"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,283 @@
+"""
+Vector Index
+常駐記憶體的 FAISS 向量索引
+
+每個向量資料庫只保留一份索引，新增 / 刪除時直接更新索引，
+查詢時只需執行 k-NN 搜尋，不需要每次重建索引或重新讀取 .npy 檔案。
+索引採用 IndexIDMap 語意，以 PostFrame ID / 使用者 ID 等整數作為鍵。
+
+索引分為兩層：
+- 基礎層：向量儲存中不可變的 segment，以 mmap_mode='r' 直接映射，
+  搜尋時由 faiss.knn 直接讀取映射的記憶體，不複製向量，
+  同一台機器上的所有 worker 共用同一份 page cache
+- 增量層：載入之後新增的向量，放在小型的 IndexIDMap2 中
+"""
+
+import threading
+import numpy as np
+import faiss
+
+
+class VectorIndex:
+    """常駐 FAISS 索引（內積相似度，以 ID 為鍵）"""
+
+    def __init__(self, dimension=768):
+        """
+        初始化向量索引
+
+        Args:
+            dimension (int): 向量維度（BERT 為 768）
+        """
+        self.dimension = dimension
+        self._lock = threading.RLock()
+        self._segments = []   # [{'ids': int64 陣列, 'embs': float32 矩陣, 'alive': bool 遮罩或 None, 'dead': int}]
+        self._base = {}       # id -> (segment 索引, 列)
+        self._delta = self._new_index()
+        self._delta_ids = set()
+        # 每次內容變動（重建 / 新增 / 刪除）都會遞增，供搜尋結果快取判斷是否失效
+        self.version = 0
+
+    def _new_index(self):
+        # IndexIDMap2 支援 reconstruct(id)，可直接以 ID 取回向量
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+    @staticmethod
+    def _as_ids(ids):
+        return np.asarray(ids, dtype=np.int64).reshape(-1)
+
+    def _as_vectors(self, embeddings):
+        return np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+
+    def _as_segment_matrix(self, embeddings):
+        """確保是 float32、C-contiguous 的 (N, dimension) 矩陣；符合時不複製（保留 mmap）"""
+        embeddings = np.asarray(embeddings)
+        if (
+            embeddings.dtype == np.float32
+            and embeddings.ndim == 2
+            and embeddings.shape[1] == self.dimension
+            and embeddings.flags['C_CONTIGUOUS']
+        ):
+            return embeddings
+        return self._as_vectors(embeddings)
+
+    def reset(self, ids=None, embeddings=None):
+        """
+        以完整資料重建索引（僅在載入或重建資料庫時使用）
+
+        Args:
+            ids: ID 陣列
+            embeddings: 對應的向量矩陣（可為 mmap，不會被複製）
+        """
+        segments = []
+        if ids is not None and len(ids) > 0:
+            segments.append((ids, embeddings, None))
+        self.reset_segments(segments)
+
+    def reset_segments(self, segments, delta_ids=None, delta_embeddings=None):
+        """
+        以向量儲存的 segment 重建索引
+
+        Args:
+            segments (list): [(ids, embeddings, alive)]，alive 為 bool 遮罩或 None（全部有效）
+            delta_ids: 尚未封存（WAL 中）的 ID
+            delta_embeddings: 對應的向量
+        """
+        with self._lock:
+            self._segments = []
+            self._base = {}
+            self._delta = self._new_index()
+            self._delta_ids = set()
+
+            for ids, embeddings, alive in segments:
+                ids = self._as_ids(ids)
+                if len(ids) == 0:
+                    continue
+                seg_no = len(self._segments)
+                alive = None if alive is None or alive.all() else np.array(alive, dtype=bool)
+                self._segments.append({
+                    'ids': ids,
+                    'embs': self._as_segment_matrix(embeddings),
+                    'alive': alive,
+                    'dead': 0 if alive is None else int((~alive).sum()),
+                })
+                for row, item_id in enumerate(ids.tolist()):
+                    if alive is None or alive[row]:
+                        self._base[item_id] = (seg_no, row)
+
+            if delta_ids is not None and len(delta_ids) > 0:
+                self.add(delta_ids, delta_embeddings)
+            self.version += 1
+
+    def _kill_base(self, item_id):
+        seg_no, row = self._base.pop(item_id)
+        segment = self._segments[seg_no]
+        if segment['alive'] is None:
+            segment['alive'] = np.ones(len(segment['ids']), dtype=bool)
+        segment['alive'][row] = False
+        segment['dead'] += 1
+
+    def add(self, ids, embeddings):
+        """
+        新增或更新向量（已存在的 ID 會先移除再加入）
+
+        Args:
+            ids: ID 陣列
+            embeddings: 對應的向量矩陣
+        """
+        ids = self._as_ids(ids)
+        if len(ids) == 0:
+            return
+        vectors = self._as_vectors(embeddings)
+
+        with self._lock:
+            existing = [i for i in ids.tolist() if i in self]
+            if existing:
+                self.remove(existing)
+            self._delta.add_with_ids(vectors, ids)
+            self._delta_ids.update(ids.tolist())
+            self.version += 1
+
+    def remove(self, ids):
+        """
+        從索引移除向量
+
+        Args:
+            ids: 要移除的 ID 陣列
+
+        Returns:
+            int: 實際移除的數量
+        """
+        ids = self._as_ids(ids)
+        if len(ids) == 0:
+            return 0
+
+        removed = 0
+        with self._lock:
+            delta_ids = []
+            for item_id in ids.tolist():
+                if item_id in self._base:
+                    self._kill_base(item_id)
+                    removed += 1
+                elif item_id in self._delta_ids:
+                    delta_ids.append(item_id)
+            if delta_ids:
+                removed += int(self._delta.remove_ids(self._as_ids(delta_ids)))
+                self._delta_ids.difference_update(delta_ids)
+            if removed:
+                self.version += 1
+        return removed
+
+    def apply_changes(self, changes):
+        """
+        重播向量儲存的變更（SegmentedVectorStore.read_changes 的結果）
+
+        Args:
+            changes (list): [(id, embedding, metadata)]，embedding 為 None 表示刪除
+        """
+        with self._lock:
+            self.remove([item_id for item_id, embedding, _ in changes if embedding is None])
+            added = [(item_id, embedding) for item_id, embedding, _ in changes if embedding is not None]
+            if added:
+                self.add([item_id for item_id, _ in added], np.vstack([embedding for _, embedding in added]))
+
+    def search(self, query_embedding, k):
+        """
+        k-NN 搜尋
+
+        Args:
+            query_embedding (np.array): 查詢向量
+            k (int): 返回數量
+
+        Returns:
+            tuple: (ID 列表, 相似度列表)，依相似度由高到低排序
+        """
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        candidates = []
+
+        with self._lock:
+            k = min(int(k), len(self))
+            if k <= 0:
+                return [], []
+
+            for segment in self._segments:
+                rows = len(segment['ids'])
+                # 多取被刪除的數量，過濾後仍能保證 k 筆
+                seg_k = min(rows, k + segment['dead'])
+                if seg_k == 0 or segment['dead'] == rows:
+                    continue
+                distances, labels = faiss.knn(q, segment['embs'], seg_k, metric=faiss.METRIC_INNER_PRODUCT)
+                alive = segment['alive']
+                for row, score in zip(labels[0], distances[0]):
+                    if row < 0 or (alive is not None and not alive[row]):
+                        continue
+                    candidates.append((float(score), int(segment['ids'][row])))
+
+            if self._delta.ntotal > 0:
+                distances, labels = self._delta.search(q, min(k, self._delta.ntotal))
+                for label, score in zip(labels[0], distances[0]):
+                    if label >= 0:
+                        candidates.append((float(score), int(label)))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:k]
+        return [item_id for _, item_id in candidates], [score for score, _ in candidates]
+
+    def get(self, item_id):
+        """
+        取回指定 ID 的向量
+
+        Returns:
+            np.array | None: 向量，不存在時返回 None
+        """
+        item_id = int(item_id)
+        with self._lock:
+            location = self._base.get(item_id)
+            if location is not None:
+                seg_no, row = location
+                return np.array(self._segments[seg_no]['embs'][row])
+            if item_id in self._delta_ids:
+                return self._delta.reconstruct(item_id)
+            return None
+
+    def mean(self):
+        """
+        計算所有向量的平均值（用於沒有歷史紀錄時的預設向量）
+
+        Returns:
+            np.array | None: 平均向量，索引為空時返回 None
+        """
+        with self._lock:
+            total = len(self)
+            if total == 0:
+                return None
+
+            acc = np.zeros(self.dimension, dtype=np.float64)
+            for segment in self._segments:
+                if segment['alive'] is None:
+                    acc += segment['embs'].sum(axis=0, dtype=np.float64)
+                elif segment['dead'] < len(segment['ids']):
+                    acc += segment['embs'][segment['alive']].sum(axis=0, dtype=np.float64)
+            if self._delta.ntotal > 0:
+                acc += self._delta.index.reconstruct_n(0, self._delta.ntotal).sum(axis=0, dtype=np.float64)
+            return (acc / total).astype(np.float32)
+
+    def ids(self):
+        """
+        取得索引中的所有 ID
+
+        Returns:
+            list: ID 列表（依加入順序）
+        """
+        with self._lock:
+            delta = faiss.vector_to_array(self._delta.id_map).tolist() if self._delta.ntotal > 0 else []
+            return list(self._base.keys()) + delta
+
+    def __len__(self):
+        return len(self._base) + self._delta.ntotal
+
+    def __contains__(self, item_id):
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return False
+        return item_id in self._base or item_id in self._delta_ids
@@ -0,0 +1,552 @@
+"""
+Vector Store
+Append-only、可在當機後安全復原的向量儲存格式
+
+取代每次新增 / 刪除都重寫整份 *_embs.npy / *_ids.npy / *_metadata.npy 的做法：
+- 新增寫入 write-ahead log（WAL），刪除則寫入 tombstone，單次 I/O 為 O(1)
+- WAL 累積到一定數量後封存成不可變的 segment
+- 背景執行 compaction，把多個 segment 合併並清除已刪除的資料
+- segment 與 manifest 皆以「寫入暫存檔再 os.replace」的方式原子寫入，
+  讀取時以 memory mapping 載入（固定 float32、C-contiguous 格式），
+  同一台機器上的所有 worker 共用同一份 page cache，不需要反序列化
+- metadata 以欄位式（columnar）JSON 儲存，不使用 pickle
+
+目錄結構（每個向量資料庫一個目錄）:
+    MANIFEST.json                 目前有效的 segment 清單（提交點）
+    wal.log                       尚未封存的操作紀錄（JSON lines）
+    seg-000001.embs.npy           float32 向量矩陣
+    seg-000001.ids.npy            int64 ID 陣列
+    seg-000001.meta.json          欄位式 metadata 與此 segment 之前的刪除紀錄
+
+多個程序共用同一份儲存時，各程序以 load_versioned() 記下載入時的位置（StorePosition），
+之後以 read_changes() 取得其他程序寫入 WAL 的新紀錄並重播到常駐索引；
+封存、compaction 或重建會換掉 MANIFEST 與 WAL 檔案，此時需要重新載入。
+"""
+
+import os
+import json
+import base64
+import threading
+from collections import namedtuple
+import numpy as np
+from filelock import FileLock
+
+
+# 常駐索引已同步到的儲存位置
+# - manifest: MANIFEST 的 (inode, mtime_ns)，不存在時為 None（每次提交都以 os.replace 寫入新檔）
+# - wal: WAL 的 inode，不存在時為 None（封存後以 os.replace 換成新的空檔）
+# - offset: 已讀取的 WAL 位元組數
+StorePosition = namedtuple('StorePosition', ['manifest', 'wal', 'offset'])
+
+
+class SegmentedVectorStore:
+    """Log-structured 向量儲存（WAL + 不可變 segment + tombstone）"""
+
+    MANIFEST_NAME = 'MANIFEST.json'
+    WAL_NAME = 'wal.log'
+    LOCK_NAME = '.lock'
+
+    # WAL 累積多少筆操作後封存成 segment
+    WAL_FLUSH_THRESHOLD = 256
+    # segment 數量超過此值時進行 compaction
+    MAX_SEGMENTS = 8
+
+    def __init__(self, directory, dimension=768):
+        """
+        初始化向量儲存
+
+        Args:
+            directory (str): 儲存目錄
+            dimension (int): 向量維度
+        """
+        self.directory = directory
+        self.dimension = dimension
+        self.manifest_path = os.path.join(directory, self.MANIFEST_NAME)
+        self.wal_path = os.path.join(directory, self.WAL_NAME)
+
+        os.makedirs(directory, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(directory, self.LOCK_NAME))
+        self._lock = threading.RLock()
+        self._wal_records = 0
+        self._wal_checked = False
+        self._maintenance_thread = None
+
+    # ------------------------------------------------------------------
+    # 狀態
+    # ------------------------------------------------------------------
+
+    def exists(self):
+        """是否已有提交過的資料"""
+        return os.path.exists(self.manifest_path)
+
+    def last_modified(self):
+        """最後一次寫入的時間（timestamp），不存在時返回 None"""
+        paths = [p for p in (self.manifest_path, self.wal_path) if os.path.exists(p)]
+        if not paths:
+            return None
+        return max(os.path.getmtime(p) for p in paths)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'version': 1, 'dimension': self.dimension, 'segments': [], 'next_segment': 1}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        self._atomic_write_text(self.manifest_path, json.dumps(manifest, ensure_ascii=False))
+
+    # ------------------------------------------------------------------
+    # 原子寫入工具
+    # ------------------------------------------------------------------
+
+    def _atomic_write_text(self, path, text):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _atomic_write_array(self, path, array):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _segment_paths(self, name):
+        base = os.path.join(self.directory, name)
+        return f'{base}.embs.npy', f'{base}.ids.npy', f'{base}.meta.json'
+
+    def _write_segment(self, manifest, ids, embeddings, metadata, deletes=()):
+        """寫入新的不可變 segment（尚未加入 manifest）"""
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest['next_segment'] += 1
+
+        emb_path, ids_path, meta_path = self._segment_paths(name)
+        self._atomic_write_array(
+            emb_path,
+            np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        )
+        self._atomic_write_array(ids_path, np.asarray(ids, dtype=np.int64).reshape(-1))
+        self._atomic_write_text(meta_path, json.dumps({
+            'rows': len(ids),
+            'columns': self._encode_metadata(metadata),
+            'deletes': [int(i) for i in deletes],
+        }, ensure_ascii=False, default=str))
+        return name
+
+    @staticmethod
+    def _encode_metadata(metadata):
+        """
+        把逐列的 metadata dict 轉為欄位式格式
+
+        Returns:
+            dict: 欄位名稱 -> {'rows': [列索引], 'values': [值]}（只記錄有該欄位的列）
+        """
+        columns = {}
+        for row, meta in enumerate(metadata):
+            if not meta:
+                continue
+            for key, value in meta.items():
+                column = columns.setdefault(key, {'rows': [], 'values': []})
+                column['rows'].append(row)
+                column['values'].append(value)
+        return columns
+
+    @staticmethod
+    def _decode_metadata(meta, rows):
+        """把欄位式 metadata 還原為逐列的 dict 列表（沒有 metadata 的列為 None）"""
+        if 'metadata' in meta:
+            # 早期的逐列格式
+            return list(meta['metadata'])
+
+        metadata = [None] * rows
+        for key, column in (meta.get('columns') or {}).items():
+            for row, value in zip(column['rows'], column['values']):
+                if metadata[row] is None:
+                    metadata[row] = {}
+                metadata[row][key] = value
+        return metadata
+
+    def _remove_unreferenced_files(self, manifest):
+        """清除不在 manifest 中的 segment 檔案（compaction 後的舊檔或當機殘留）"""
+        referenced = set(manifest['segments'])
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('seg-'):
+                continue
+            name = filename.split('.', 1)[0]
+            if name in referenced:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                # 檔案仍被其他程序映射（例如 Windows），下次 compaction 再清除
+                pass
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _read_segment(self, name):
+        emb_path, ids_path, meta_path = self._segment_paths(name)
+        # 唯讀映射：向量不會被複製到 worker 的私有記憶體
+        embeddings = np.load(emb_path, mmap_mode='r')
+        ids = np.load(ids_path)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return ids, embeddings, self._decode_metadata(meta, len(ids)), meta.get('deletes') or []
+
+    def _read_wal(self):
+        """
+        讀取 WAL
+
+        當機時寫到一半的最後一筆紀錄會被截掉，避免之後的新紀錄接在殘缺內容後面。
+        """
+        records = []
+        if not os.path.exists(self.wal_path):
+            return records
+
+        valid_bytes = 0
+        with open(self.wal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records.append(json.loads(line.decode('utf-8')))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    break
+                valid_bytes += len(line)
+
+        if valid_bytes < os.path.getsize(self.wal_path):
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+        return records
+
+    def _decode_embedding(self, encoded):
+        return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+    def _collect(self, manifest):
+        """
+        依序重播 segment 與 WAL，取得目前有效的資料
+
+        Returns:
+            tuple: (segments, live)
+                - segments (list): [(ids, embeddings)]，embeddings 為 mmap
+                - live (dict): id -> (segment 索引, 列, embedding, metadata)，
+                  segment 索引為 -1 表示來自 WAL；保持插入順序
+        """
+        segments = []
+        live = {}
+        for name in manifest['segments']:
+            ids, embeddings, metadata, deletes = self._read_segment(name)
+            seg_no = len(segments)
+            segments.append((ids, embeddings))
+            for item_id in deletes:
+                live.pop(int(item_id), None)
+            for row, item_id in enumerate(ids.tolist()):
+                live.pop(item_id, None)
+                live[item_id] = (seg_no, row, embeddings[row], metadata[row])
+
+        records = self._read_wal()
+        for record in records:
+            item_id = int(record['id'])
+            live.pop(item_id, None)
+            if record['op'] == 'add':
+                live[item_id] = (-1, -1, self._decode_embedding(record['emb']), record.get('meta'))
+        self._wal_records = len(records)
+        return segments, live
+
+    def load(self):
+        """
+        載入目前有效的所有資料（segment 以 mmap 映射，不複製向量）
+
+        Returns:
+            tuple: (segments, delta, metadata)
+                - segments (list): [(ids, embeddings, alive)]，embeddings 為 float32 mmap，
+                  alive 為標示仍有效列的 bool 遮罩
+                - delta (tuple): (ids, embeddings)，WAL 中尚未封存的新增
+                - metadata (dict): id -> metadata
+        """
+        return self.load_versioned()[:3]
+
+    def load_versioned(self):
+        """
+        載入目前有效的所有資料，並返回載入時的儲存位置（之後交給 read_changes）
+
+        Returns:
+            tuple: (segments, delta, metadata, position)，前三項同 load()
+        """
+        with self._lock, self._file_lock:
+            segments, live = self._collect(self._read_manifest())
+            position = StorePosition(
+                self._manifest_stamp(),
+                self._wal_inode(),
+                os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0,
+            )
+
+        alive_masks = [np.zeros(len(ids), dtype=bool) for ids, _ in segments]
+        delta_ids, delta_embeddings = [], []
+        metadata = {}
+        for item_id, (seg_no, row, embedding, meta) in live.items():
+            if seg_no >= 0:
+                alive_masks[seg_no][row] = True
+            else:
+                delta_ids.append(item_id)
+                delta_embeddings.append(embedding)
+            if meta is not None:
+                metadata[item_id] = meta
+
+        delta = (
+            np.array(delta_ids, dtype=np.int64),
+            np.vstack(delta_embeddings) if delta_embeddings else np.zeros((0, self.dimension), dtype=np.float32)
+        )
+        loaded_segments = [
+            (ids, embeddings, alive)
+            for (ids, embeddings), alive in zip(segments, alive_masks)
+            if alive.any()
+        ]
+        return loaded_segments, delta, metadata, position
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _wal_inode(self):
+        try:
+            return os.stat(self.wal_path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def read_changes(self, position):
+        """
+        讀取 position 之後寫入 WAL 的紀錄（不取得檔案鎖，可在每次查詢前呼叫）
+
+        Args:
+            position (StorePosition): load_versioned / 上一次 read_changes 返回的位置
+
+        Returns:
+            tuple: (position, changes)
+                - position (StorePosition): 新的位置
+                - changes (list): [(id, embedding, metadata)]，embedding 為 None 表示刪除；
+                  沒有變更時為空列表，需要重新載入（封存、compaction、重建）時為 None
+        """
+        if position is None or self._manifest_stamp() != position.manifest:
+            return position, None
+
+        try:
+            f = open(self.wal_path, 'rb')
+        except FileNotFoundError:
+            return position, ([] if position.wal is None else None)
+
+        with f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != position.wal or stat.st_size < position.offset:
+                return position, None
+            if stat.st_size == position.offset:
+                return position, []
+
+            f.seek(position.offset)
+            changes = {}
+            consumed = 0
+            for line in f:
+                # 其他程序寫到一半的紀錄留到下次再讀
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    return position, None
+                item_id = int(record['id'])
+                changes.pop(item_id, None)
+                if record['op'] == 'add':
+                    changes[item_id] = (item_id, self._decode_embedding(record['emb']), record.get('meta'))
+                else:
+                    changes[item_id] = (item_id, None, None)
+                consumed += len(line)
+
+        return position._replace(offset=position.offset + consumed), list(changes.values())
+
+    # ------------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------------
+
+    def _append_wal(self, *records):
+        data = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+        with self._lock, self._file_lock:
+            if not self._wal_checked:
+                # 第一次寫入前先截掉殘缺的紀錄
+                self._wal_records = len(self._read_wal())
+                self._wal_checked = True
+            with open(self.wal_path, 'a', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if not self.exists():
+                self._write_manifest(self._read_manifest())
+            self._wal_records += len(records)
+
+        if self._wal_records >= self.WAL_FLUSH_THRESHOLD:
+            self.schedule_maintenance()
+
+    def _add_record(self, item_id, embedding, metadata):
+        vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+        return {
+            'op': 'add',
+            'id': int(item_id),
+            'emb': base64.b64encode(vector.tobytes()).decode('ascii'),
+            'meta': metadata,
+        }
+
+    def append(self, item_id, embedding, metadata=None):
+        """
+        新增（或覆蓋）一筆向量，只寫入 WAL
+
+        Args:
+            item_id (int): 項目 ID
+            embedding (np.array): 向量
+            metadata (dict): 元數據（可選）
+        """
+        self._append_wal(self._add_record(item_id, embedding, metadata))
+
+    def append_many(self, ids, embeddings, metadata=None):
+        """
+        批次新增（或覆蓋）多筆向量，整批只做一次 fsync
+
+        Args:
+            ids: ID 陣列
+            embeddings: 對應的向量矩陣
+            metadata (list): 每筆的元數據（可選）
+        """
+        if len(ids) == 0:
+            return
+        if metadata is None:
+            metadata = [None] * len(ids)
+        self._append_wal(*(
+            self._add_record(item_id, embedding, meta)
+            for item_id, embedding, meta in zip(ids, embeddings, metadata)
+        ))
+
+    def delete(self, item_id):
+        """
+        刪除一筆向量（寫入 tombstone）
+
+        Args:
+            item_id (int): 項目 ID
+        """
+        self._append_wal({'op': 'delete', 'id': int(item_id)})
+
+    def delete_many(self, ids):
+        """
+        批次刪除多筆向量（整批只做一次 fsync）
+
+        Args:
+            ids: ID 陣列
+        """
+        if len(ids) == 0:
+            return
+        self._append_wal(*({'op': 'delete', 'id': int(item_id)} for item_id in ids))
+
+    def write_snapshot(self, ids, embeddings, metadata=None):
+        """
+        以完整資料取代目前內容（用於從資料庫重建索引）
+
+        Args:
+            ids: ID 陣列
+            embeddings: 向量矩陣
+            metadata (list): 與 ids 對齊的 metadata（可選）
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if metadata is None:
+            metadata = [None] * len(ids)
+
+        with self._lock, self._file_lock:
+            manifest = self._read_manifest()
+            name = self._write_segment(manifest, ids, embeddings, metadata)
+            manifest['segments'] = [name]
+            self._write_manifest(manifest)
+            self._truncate_wal()
+            self._remove_unreferenced_files(manifest)
+
+    def _truncate_wal(self):
+        # 以新的空檔取代（而不是就地截斷），其他程序由 inode 得知 WAL 已封存
+        self._atomic_write_text(self.wal_path, '')
+        self._wal_records = 0
+
+    # ------------------------------------------------------------------
+    # 維護（封存 WAL / compaction）
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """
+        把 WAL 封存成新的 segment
+
+        segment 提交（寫入 manifest）後才清空 WAL；若在兩者之間當機，
+        重新載入時會再重播一次 WAL，因為新增為覆蓋、刪除為移除，結果相同。
+        """
+        with self._lock, self._file_lock:
+            records = self._read_wal()
+            if not records:
+                return
+
+            adds = {}
+            deletes = set()
+            for record in records:
+                item_id = int(record['id'])
+                adds.pop(item_id, None)
+                if record['op'] == 'add':
+                    adds[item_id] = record
+                else:
+                    deletes.add(item_id)
+
+            manifest = self._read_manifest()
+            ids = list(adds.keys())
+            embeddings = (
+                np.vstack([self._decode_embedding(r['emb']) for r in adds.values()])
+                if adds else np.zeros((0, self.dimension), dtype=np.float32)
+            )
+            metadata = [r.get('meta') for r in adds.values()]
+            name = self._write_segment(manifest, ids, embeddings, metadata, deletes=deletes)
+            manifest['segments'].append(name)
+            self._write_manifest(manifest)
+            self._truncate_wal()
+
+    def compact(self):
+        """把所有 segment 與 WAL 合併為單一 segment，並清除已刪除的資料"""
+        with self._lock, self._file_lock:
+            manifest = self._read_manifest()
+            _, live = self._collect(manifest)
+
+            ids = list(live.keys())
+            embeddings = (
+                np.vstack([emb for _, _, emb, _ in live.values()])
+                if live else np.zeros((0, self.dimension), dtype=np.float32)
+            )
+            metadata = [meta for _, _, _, meta in live.values()]
+            name = self._write_segment(manifest, ids, embeddings, metadata)
+            manifest['segments'] = [name]
+            self._write_manifest(manifest)
+            self._truncate_wal()
+            self._remove_unreferenced_files(manifest)
+
+    def _run_maintenance(self):
+        try:
+            self.flush()
+            if len(self._read_manifest()['segments']) > self.MAX_SEGMENTS:
+                self.compact()
+        except Exception as e:
+            print(f"⚠️ 向量儲存維護失敗 ({self.directory}): {str(e)}")
+
+    def schedule_maintenance(self):
+        """在背景執行 WAL 封存與 compaction（同時只會有一個背景工作）"""
+        with self._lock:
+            if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+                return
+            self._maintenance_thread = threading.Thread(target=self._run_maintenance, daemon=True)
+            self._maintenance_thread.start()